@@ -1,13 +1,20 @@
 import os
 import time
+import hashlib
+import warnings
 from collections import OrderedDict
-import numpy
 from dolfin import compile_cpp_code
 
 
-def _get_cpp_module(cpp_files, force_recompile=False):
+# Extra build arguments for modules with OpenMP parallel loops. The modules
+# with OpenMP loops are also available without these arguments, and the
+# OpenMP builds are only loaded when more than one thread is requested
+OPENMP_BUILD_ARGS = {'cxxflags': ('-fopenmp',), 'libs': ['gomp']}
+
+
+def _get_cpp_code(cpp_files):
     """
-    Use the dolfin machinery to compile, wrap with swig and load a c++ module
+    Read the C++ files and return the combined source code
     """
     cpp_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -21,32 +28,89 @@ def _get_cpp_module(cpp_files, force_recompile=False):
                 lines.append(line)
         cpp_sources.append(''.join(lines))
 
-    # Force recompilation
-    if force_recompile:
-        cpp_sources.append('// Force recompile, time is %s \n' % time.time())
-
     sep = '\n\n// ' + '$' * 77 + '\n\n'
-    cpp_code = sep.join(cpp_sources)
+    return sep.join(cpp_sources)
 
-    module = compile_cpp_code(cpp_code)
+
+def _get_cpp_module(cpp_code, force_recompile=False, build_args=None):
+    """
+    Use the dolfin machinery to compile, wrap with pybind11 and load a c++ module
+
+    The compiled module is stored in the dijitso disk cache, keyed by a hash
+    of the source code, so the compilation is done once for each version of
+    the code. The dolfin JIT compiles on one MPI rank and lets the others wait
+    and load the result, so this function must be called on all ranks
+
+    The build arguments (extra compiler flags and libraries) are written into
+    the source code as a comment, so the module gets its own cache entry. The
+    dolfin versions that do not take build arguments in compile_cpp_code get
+    them added to the dijitso build parameters instead. A warning is issued if
+    the module can not be built with the build arguments
+    """
+    # Force recompilation
+    if force_recompile:
+        cpp_code += '\n// Force recompile, time is %s \n' % time.time()
+
+    module = None
+    if build_args:
+        cpp_code += '\n// Build arguments: %r \n' % sorted(build_args.items())
+        try:
+            module = compile_cpp_code(cpp_code, **build_args)
+        except TypeError:
+            module = _compile_cpp_code_dijitso(cpp_code, build_args)
+    if module is None:
+        module = compile_cpp_code(cpp_code)
     assert module is not None
 
     return module
 
 
+def _compile_cpp_code_dijitso(cpp_code, build_args):
+    """
+    Compile the module with older versions of dolfin where compile_cpp_code
+    takes no build arguments. The extra flags and libraries are added to the
+    build parameters that compile_cpp_code passes on to dijitso.jit
+    """
+    import dijitso
+
+    jit = dijitso.jit
+
+    def jit_with_build_args(jitable, name, params, *args, **kwargs):
+        build = params['build']
+        build['cxxflags'] = tuple(build['cxxflags']) + tuple(build_args.get('cxxflags', ()))
+        build['libs'] = list(build['libs']) + list(build_args.get('libs', ()))
+        return jit(jitable, name, params, *args, **kwargs)
+
+    dijitso.jit = jit_with_build_args
+    try:
+        return compile_cpp_code(cpp_code)
+    except Exception as e:
+        warnings.warn(
+            'Could not compile C++ module with build arguments %r, compiling '
+            'without them. OpenMP loops will run in serial. Error: %s' % (build_args, e)
+        )
+    finally:
+        dijitso.jit = jit
+
+
 class _ModuleCache(object):
     def __init__(self):
         """
         A registry and cache of available C/C++ extension modules
+
+        The modules are compiled (or loaded from the disk cache) when they
+        are first requested, not when they are registered
         """
         self.available_modules = OrderedDict()
+        self.build_args = {}
         self.module_cache = {}
 
-    def add_module(self, name, cpp_files, test_compile=True):
+    def add_module(self, name, cpp_files, test_compile=False, build_args=None):
         """
         Add a module that can be compiled
         """
         self.available_modules[name] = cpp_files
+        self.build_args[name] = build_args
 
         if test_compile:
             # Compile at once to test the code
@@ -58,11 +122,19 @@ class _ModuleCache(object):
         """
         if force_recompile or name not in self.module_cache:
             cpp_files = self.available_modules[name]
-            mod = _get_cpp_module(cpp_files, force_recompile)
+            cpp_code = _get_cpp_code(cpp_files)
+            mod = _get_cpp_module(cpp_code, force_recompile, self.build_args[name])
             self.module_cache[name] = mod
 
         return self.module_cache[name]
 
+    def get_signature(self, name):
+        """
+        Return a hash of the source code of the module
+        """
+        cpp_code = _get_cpp_code(self.available_modules[name])
+        return hashlib.sha1(cpp_code.encode('utf8')).hexdigest()
+
 
 ###############################################################################################
 # Functions to be used by other modules
@@ -73,10 +145,21 @@ _MODULES.add_module(
     'hierarchical_taylor',
     ['slope_limiter/limiter_common.h', 'slope_limiter/hierarchical_taylor.h'],
 )
+_MODULES.add_module(
+    'hierarchical_taylor_openmp',
+    ['slope_limiter/limiter_common.h', 'slope_limiter/hierarchical_taylor.h'],
+    build_args=OPENMP_BUILD_ARGS,
+)
 _MODULES.add_module('measure_local_maxima', ['slope_limiter/measure_local_maxima.h'])
+_MODULES.add_module(
+    'measure_local_maxima_openmp',
+    ['slope_limiter/measure_local_maxima.h'],
+    build_args=OPENMP_BUILD_ARGS,
+)
 _MODULES.add_module(
     'linear_convection', ['gradient_reconstruction.h', 'linear_convection.h']
 )
+_MODULES.add_module('level_set_view', ['level_set_view.h'])
 
 
 def load_module(name, force_recompile=False):
@@ -85,3 +168,17 @@ def load_module(name, force_recompile=False):
     forces a cache-refresh, otherwise subsequent accesses are cached
     """
     return _MODULES.get_module(name, force_recompile)
+
+
+def available_modules():
+    """
+    Return the names of all registered C/C++ modules
+    """
+    return list(_MODULES.available_modules)
+
+
+def module_signature(name):
+    """
+    Return the hash of the source code of the C/C++ module with the given name
+    """
+    return _MODULES.get_signature(name)
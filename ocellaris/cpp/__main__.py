@@ -0,0 +1,52 @@
+"""
+Compile the Ocellaris C++ extension modules
+===========================================
+
+The C++ modules are normally compiled the first time they are used in a
+simulation. Running this command line utility before submitting a batch
+job makes sure the modules are already in the disk cache so the MPI ranks
+of the simulation can load them without compiling anything
+"""
+import sys
+import time
+import argparse
+from . import available_modules, module_signature, load_module
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='ocellaris_compile_cpp', description='Pre-compile the Ocellaris C++ modules'
+    )
+    parser.add_argument(
+        'modules',
+        nargs='*',
+        metavar='MODULE',
+        help='Names of the modules to compile (default: all). '
+        'Available modules: %s' % ', '.join(available_modules()),
+    )
+    parser.add_argument(
+        '--force-recompile', '-f', action='store_true', help='Do not use the disk cache'
+    )
+    return parser.parse_args(argv)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    args = parse_args(args)
+
+    names = args.modules or available_modules()
+    for name in names:
+        if name not in available_modules():
+            print('ERROR: unknown C++ module %r' % name)
+            exit(1)
+
+    for name in names:
+        t1 = time.time()
+        load_module(name, force_recompile=args.force_recompile)
+        signature = module_signature(name)[:12]
+        print('Loaded %-25s %s in %.1f seconds' % (name, signature, time.time() - t1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#ifndef __LEVEL_SET_VIEW_H
+#define __LEVEL_SET_VIEW_H
+
+#include <queue>
+#include <vector>
+#include <utility>
+#include <functional>
+#include <pybind11/pybind11.h>
+#include <pybind11/eigen.h>
+#include <Eigen/Core>
+
+
+namespace dolfin
+{
+
+
+using IntVecIn = Eigen::Ref<const Eigen::VectorXi>;
+using DoubleVecIn = Eigen::Ref<const Eigen::VectorXd>;
+using DoubleVec = Eigen::Ref<Eigen::VectorXd>;
+
+/*
+ * Dijkstra's algorithm for propagating distances along the edges of the dof
+ * graph given in CSR format (indptr, indices, weights). All dofs with a value
+ * lower than the cutoff are used as starting points. Only the first
+ * values.size() dofs are updated, edges to other dofs are ignored. Distances
+ * larger than the cutoff are not propagated further. Returns the number of
+ * dofs that were visited
+ */
+int propagate_distances(IntVecIn indptr,
+                        IntVecIn indices,
+                        DoubleVecIn weights,
+                        DoubleVec values,
+                        const double cutoff)
+{
+  typedef std::pair<double, int> Item;
+  std::priority_queue<Item, std::vector<Item>, std::greater<Item>> queue;
+
+  const int num_dofs = values.size();
+  for (int dof = 0; dof < num_dofs; dof++)
+  {
+    if (values[dof] < cutoff)
+      queue.push(Item(values[dof], dof));
+  }
+
+  int checks = 0;
+  while (!queue.empty())
+  {
+    const Item item = queue.top();
+    queue.pop();
+    const double dval = item.first;
+    const int dof = item.second;
+
+    // Skip outdated queue items
+    if (dval > values[dof])
+      continue;
+    checks++;
+
+    for (int i = indptr[dof]; i < indptr[dof + 1]; i++)
+    {
+      const int dof2 = indices[i];
+      if (dof2 >= num_dofs)
+        continue;
+
+      // Update if we have found a shorter path to a crossing
+      const double dval2 = dval + weights[i];
+      if (dval2 < values[dof2] && dval2 <= cutoff)
+      {
+        values[dof2] = dval2;
+        queue.push(Item(dval2, dof2));
+      }
+    }
+  }
+  return checks;
+}
+
+
+PYBIND11_MODULE(SIGNATURE, m)
+{
+  m.def("propagate_distances", &propagate_distances);
+}
+
+
+}
+
+#endif
@@ -3,6 +3,7 @@
 
 #include <cstdint>
 #include <vector>
+#include <algorithm>
 #include <dolfin/function/FunctionSpace.h>
 #include <dolfin/function/Function.h>
 #include <dolfin/la/GenericVector.h>
@@ -20,95 +21,309 @@ namespace dolfin
 {
 
 using DoubleVec = Eigen::Ref<Eigen::VectorXd>;
+using DoubleMat = Eigen::Ref<MatDoubleRM>;
+
+// The previous values are only read, so read only NumPy arrays are accepted
+using ConstDoubleVec = Eigen::Ref<const Eigen::VectorXd>;
+using ConstDoubleMat = Eigen::Ref<const MatDoubleRM>;
+
+/*
+ * With a single thread each cell is limited as soon as its limiter
+ * coefficients are known, so the bounds of later cells include the already
+ * limited values of earlier neighbour cells. This is the original limiter,
+ * and the Python implementation does the same.
+ *
+ * With more than one thread the limiters are run in two phases. First the
+ * limiter coefficients are computed for all cells from the unmodified Taylor
+ * values, then the Taylor values are limited. The cells are independent
+ * within each phase, so the cell loops can be run with OpenMP threads and
+ * the result does not depend on the number of threads or the order the
+ * cells are visited. The result is slightly different from the single
+ * thread result for DG2, and for DG1 when the global bounds are active
+ */
+
+// The data of one limited field, or one component of a limited vector field
+struct LimitedField
+{
+  const double *taylor;
+  const double *taylor_old;
+  const int *limit_cell;
+  const BoundaryDofType *boundary_dof_type;
+  const double *boundary_dof_value;
+  double global_min;
+  double global_max;
+};
+
+inline LimitedField scalar_field(const SlopeLimiterInput &input,
+                                 const double *taylor,
+                                 const double *taylor_old)
+{
+  return {taylor,
+          taylor_old,
+          input.limit_cell.data(),
+          input.boundary_dof_type.data(),
+          input.boundary_dof_value.data(),
+          input.global_min,
+          input.global_max};
+}
+
+inline std::vector<LimitedField> component_fields(const SlopeLimiterInput &input,
+                                                  const DoubleMat &taylor_arrs,
+                                                  const ConstDoubleMat &taylor_arrs_old)
+{
+  const int ncomp = input.num_components;
+  const int num_dofs_owned = input.num_cells_owned * input.cell_dofs.cols();
+  RANGE_CHECK(ncomp != taylor_arrs.rows());
+  RANGE_CHECK(ncomp != taylor_arrs_old.rows());
+
+  std::vector<LimitedField> fields;
+  for (int icomp = 0; icomp < ncomp; icomp++)
+  {
+    fields.push_back({&taylor_arrs(icomp, 0),
+                      &taylor_arrs_old(icomp, 0),
+                      &input.component_limit_cell(icomp, 0),
+                      &input.component_boundary_dof_type[icomp * num_dofs_owned],
+                      &input.component_boundary_dof_value(icomp, 0),
+                      input.component_global_min[icomp],
+                      input.component_global_max[icomp]});
+  }
+  return fields;
+}
 
 template <int Ndim> // Ndim is 2 for 2D triangles and 3 for 3D tetrahedra
-void hierarchical_taylor_slope_limiter_dg1(const SlopeLimiterInput &input,
-                                           DoubleVec taylor_arr,
-                                           DoubleVec taylor_arr_old,
-                                           DoubleVec alpha_arr)
+void check_input_arrays(const SlopeLimiterInput &input, const int dstride, const int num_dofs)
 {
   static_assert(Ndim == 2 or Ndim == 3, "Only 2D and 3D supported");
-
-  const int num_cells_owned = input.num_cells_owned;
-  const double global_min = input.global_min;
-  const double global_max = input.global_max;
   const int nvert = Ndim + 1;
-  const int dstride = nvert;
-
-  // Input array checks
   const int num_cells = input.cell_dofs.rows();
-  const int num_dofs_tot = num_cells * dstride;
-  const int num_dofs_owned = num_cells_owned * dstride;
-  RANGE_CHECK(num_dofs_tot != taylor_arr.size());
-  RANGE_CHECK(num_dofs_tot != taylor_arr_old.size());
-  RANGE_CHECK(num_cells_owned != alpha_arr.size());
+  RANGE_CHECK(num_cells * dstride != num_dofs);
   RANGE_CHECK(dstride != input.cell_dofs.cols());
   RANGE_CHECK(Ndim != input.vertex_coords.cols());
   RANGE_CHECK(nvert != input.cell_vertices.cols());
-  RANGE_CHECK(num_dofs_owned != input.boundary_dof_type.size());
-  RANGE_CHECK(num_cells_owned != input.limit_cell.size());
-
-  double cx, cy, cz = 0.0, dx, dy, dz = 0.0;
-  double center_phi, center_phix, center_phiy, center_phiz = 0.0;
+}
 
-  // Loop over all cells that are owned by this process
-  for (int ic = 0; ic < num_cells_owned; ic++)
+/*
+ * Compute the limiter coefficient of one DG1 cell. The cell average value,
+ * possibly clamped to the global bounds, is returned in center_phi
+ */
+template <int Ndim>
+inline double hierarchical_taylor_cell_dg1(const SlopeLimiterInput &input,
+                                           const LimitedField &field,
+                                           const int ic,
+                                           double &center_phi)
+{
+  const int nvert = Ndim + 1;
+  const double *taylor_arr = field.taylor;
+  const double *taylor_arr_old = field.taylor_old;
+  const double global_min = field.global_min;
+  const double global_max = field.global_max;
+
+  double alpha = 1.0;
+  double dx, dy, dz = 0.0;
+
+  // The cell centre is stored as vertex 4 (2D) or 5 (3D)
+  const double cx = input.cell_midpoints(ic, 0);
+  const double cy = input.cell_midpoints(ic, 1);
+  const double cz = Ndim == 3 ? input.cell_midpoints(ic, 2) : 0.0;
+
+  // Get the Taylor values for this cell
+  center_phi = taylor_arr[input.cell_dofs(ic, 0)];
+  const double center_phix = taylor_arr[input.cell_dofs(ic, 1)];
+  const double center_phiy = taylor_arr[input.cell_dofs(ic, 2)];
+  const double center_phiz = Ndim == 3 ? taylor_arr[input.cell_dofs(ic, 3)] : 0.0;
+
+  const bool skip_this_cell = (field.limit_cell[ic] == 0);
+  if (skip_this_cell)
+    return 1.0;
+
+  for (int ivert = 0; ivert < nvert; ivert++)
   {
-    double alpha = 1.0;
+    // Vertex index
+    const int vi = input.cell_vertices(ic, ivert);
 
-    // The cell centre is stored as vertex 4 (2D) or 5 (3D)
-    cx = input.cell_midpoints(ic, 0);
-    cy = input.cell_midpoints(ic, 1);
+    // Calculate the value of phi at the vertex
+    dx = input.vertex_coords(vi, 0) - cx;
+    dy = input.vertex_coords(vi, 1) - cy;
+    dz = 0.0;
     if (Ndim == 3)
-      cz = input.cell_midpoints(ic, 2);
+      dz = input.vertex_coords(vi, 2) - cz;
+    double vertex_value = center_phi + center_phix * dx + center_phiy * dy + center_phiz * dz;
+
+    // Find highest and lowest value in the connected neighbour cells
+    int dof = input.cell_dofs(ic, ivert);
+    double lo = center_phi;
+    double hi = center_phi;
+    for (int inb = 0; inb < input.num_neighbours[dof]; inb++)
+    {
+      int nb = input.neighbours(dof, inb);
+      int nb_dof = input.cell_dofs(nb, 0);
+      double nb_val = taylor_arr[nb_dof];
+      lo = std::min(lo, nb_val);
+      hi = std::max(hi, nb_val);
+
+      nb_val = taylor_arr_old[nb_dof];
+      lo = std::min(lo, nb_val);
+      hi = std::max(hi, nb_val);
+    }
+
+    // Modify local bounds to incorporate the boundary conditions
+    bool dof_is_dirichlet = field.boundary_dof_type[dof] == BoundaryDofType::DIRICHLET ||
+                            (field.boundary_dof_type[dof] == BoundaryDofType::ROBIN &&
+                             input.trust_robin_dval);
+    if (dof_is_dirichlet)
+    {
+      double bc_value = field.boundary_dof_value[dof];
+      lo = std::min(lo, bc_value);
+      hi = std::max(hi, bc_value);
+    }
+
+    // Modify local bounds to incorporate the global bounds
+    lo = std::max(lo, global_min);
+    hi = std::min(hi, global_max);
+    center_phi = std::max(center_phi, global_min);
+    center_phi = std::min(center_phi, global_max);
+
+    // Compute the slope limiter coefficient alpha
+    double a = 1.0;
+    if (vertex_value > center_phi)
+    {
+      a = (hi - center_phi) / (vertex_value - center_phi);
+    }
+    else if (vertex_value < center_phi)
+    {
+      a = (lo - center_phi) / (vertex_value - center_phi);
+    }
+    alpha = std::min(alpha, a);
+  }
+  return alpha;
+}
 
-    // Get the Taylor values for this cell
+/*
+ * Compute the two limiter coefficients of one DG2 cell. The cell average
+ * value, possibly clamped to the global bounds, is returned in center_phi
+ */
+template <int Ndim>
+inline void hierarchical_taylor_cell_dg2(const SlopeLimiterInput &input,
+                                         const LimitedField &field,
+                                         const int ic,
+                                         double &alpha1,
+                                         double &alpha2,
+                                         double &center_phi)
+{
+  const int nvert = Ndim + 1;
+  const double *taylor_arr = field.taylor;
+  const double *taylor_arr_old = field.taylor_old;
+  const double global_min = field.global_min;
+  const double global_max = field.global_max;
+
+  double alpha[4] = {1.0, 1.0, 1.0, 1.0};
+  double dx, dy, dz = 0.0;
+  double center_phix, center_phiy, center_phiz = 0.0;
+  double center_phixx, center_phiyy, center_phizz = 0.0;
+  double center_phixy, center_phixz = 0.0, center_phiyz = 0.0;
+
+  // The cell centre is stored as vertex 4 (2D) or 5 (3D)
+  const double cx = input.cell_midpoints(ic, 0);
+  const double cy = input.cell_midpoints(ic, 1);
+  const double cz = Ndim == 3 ? input.cell_midpoints(ic, 2) : 0.0;
+
+  // Get the Taylor values for this cell
+  if (Ndim == 2)
+  {
     center_phi = taylor_arr[input.cell_dofs(ic, 0)];
     center_phix = taylor_arr[input.cell_dofs(ic, 1)];
     center_phiy = taylor_arr[input.cell_dofs(ic, 2)];
-    if (Ndim == 3)
-      center_phiz = taylor_arr[input.cell_dofs(ic, 3)];
+    center_phixx = taylor_arr[input.cell_dofs(ic, 3)];
+    center_phiyy = taylor_arr[input.cell_dofs(ic, 4)];
+    center_phixy = taylor_arr[input.cell_dofs(ic, 5)];
+  }
+  else
+  {
+    center_phi = taylor_arr[input.cell_dofs(ic, 0)];
+    center_phix = taylor_arr[input.cell_dofs(ic, 1)];
+    center_phiy = taylor_arr[input.cell_dofs(ic, 2)];
+    center_phiz = taylor_arr[input.cell_dofs(ic, 3)];
+    center_phixx = taylor_arr[input.cell_dofs(ic, 4)];
+    center_phiyy = taylor_arr[input.cell_dofs(ic, 5)];
+    center_phizz = taylor_arr[input.cell_dofs(ic, 6)];
+    center_phixy = taylor_arr[input.cell_dofs(ic, 7)];
+    center_phixz = taylor_arr[input.cell_dofs(ic, 8)];
+    center_phiyz = taylor_arr[input.cell_dofs(ic, 9)];
+  }
 
-    const bool skip_this_cell = (input.limit_cell[ic] == 0);
-    if (!skip_this_cell)
+  alpha1 = alpha2 = 1.0;
+  const bool skip_this_cell = (field.limit_cell[ic] == 0);
+  if (skip_this_cell)
+    return;
+
+  for (int itaylor = 0; itaylor < nvert; itaylor++)
+  {
+    for (int ivert = 0; ivert < nvert; ivert++)
     {
-      for (int ivert = 0; ivert < nvert; ivert++)
+      // Vertex index
+      const int vi = input.cell_vertices(ic, ivert);
+
+      // Calculate the value of local coordinates
+      dx = input.vertex_coords(vi, 0) - cx;
+      dy = input.vertex_coords(vi, 1) - cy;
+      dz = 0.0;
+      if (Ndim == 3)
+        dz = input.vertex_coords(vi, 2) - cz;
+
+      double base_value, vertex_value;
+      if (itaylor == 0)
       {
-        // Vertex index
-        const int vi = input.cell_vertices(ic, ivert);
-
-        // Calculate the value of phi at the vertex
-        dx = input.vertex_coords(vi, 0) - cx;
-        dy = input.vertex_coords(vi, 1) - cy;
-        dz = 0.0;
-        if (Ndim == 3)
-          dz = input.vertex_coords(vi, 2) - cz;
-        double vertex_value = center_phi + center_phix * dx + center_phiy * dy + center_phiz * dz;
-
-        // Find highest and lowest value in the connected neighbour cells
-        int dof = input.cell_dofs(ic, ivert);
-        double lo = center_phi;
-        double hi = center_phi;
-        for (int inb = 0; inb < input.num_neighbours[dof]; inb++)
-        {
-          int nb = input.neighbours(dof, inb);
-          int nb_dof = input.cell_dofs(nb, 0);
-          double nb_val = taylor_arr[nb_dof];
-          lo = std::min(lo, nb_val);
-          hi = std::max(hi, nb_val);
-
-          nb_val = taylor_arr_old[nb_dof];
-          lo = std::min(lo, nb_val);
-          hi = std::max(hi, nb_val);
-        }
+        // Function value at the vertex (linear reconstruction)
+        vertex_value = center_phi + center_phix * dx + center_phiy * dy + center_phiz * dz;
+        base_value = center_phi;
+      }
+      else if (itaylor == 1)
+      {
+        // Derivative in x direction at the vertex (linear reconstruction)
+        vertex_value = center_phix + center_phixx * dx + center_phixy * dy + center_phixz * dz;
+        base_value = center_phix;
+      }
+      else if (itaylor == 2)
+      {
+        // Derivative in y direction at the vertex (linear reconstruction)
+        vertex_value = center_phiy + center_phiyy * dy + center_phixy * dx + center_phiyz * dz;
+        base_value = center_phiy;
+      }
+      else if (itaylor == 3)
+      {
+        // Derivative in z direction at the vertex (linear reconstruction)
+        vertex_value = center_phiz + center_phizz * dz + center_phixz * dx + center_phiyz * dy;
+        base_value = center_phiz;
+      }
+
+      // Find highest and lowest value in the connected neighbour cells
+      int dof = input.cell_dofs(ic, ivert);
+      double lo = base_value;
+      double hi = base_value;
+      for (int inb = 0; inb < input.num_neighbours[dof]; inb++)
+      {
+        int nb = input.neighbours(dof, inb);
+        int nb_dof = input.cell_dofs(nb, itaylor);
+        double nb_val = taylor_arr[nb_dof];
+        lo = std::min(lo, nb_val);
+        hi = std::max(hi, nb_val);
+
+        nb_val = taylor_arr_old[nb_dof];
+        lo = std::min(lo, nb_val);
+        hi = std::max(hi, nb_val);
+      }
 
+      // Handle boundary conditions and global bounds
+      bool dof_is_dirichlet = field.boundary_dof_type[dof] == BoundaryDofType::DIRICHLET ||
+                              (field.boundary_dof_type[dof] == BoundaryDofType::ROBIN &&
+                               input.trust_robin_dval);
+      if (itaylor == 0)
+      {
         // Modify local bounds to incorporate the boundary conditions
-        bool dof_is_dirichlet = input.boundary_dof_type[dof] == BoundaryDofType::DIRICHLET ||
-                                (input.boundary_dof_type[dof] == BoundaryDofType::ROBIN &&
-                                 input.trust_robin_dval);
         if (dof_is_dirichlet)
         {
-          double bc_value = input.boundary_dof_value[dof];
+          // Value in the centre of a mirrored cell on the other side of the boundary
+          double bc_value = 2 * field.boundary_dof_value[dof] - center_phi;
           lo = std::min(lo, bc_value);
           hi = std::max(hi, bc_value);
         }
@@ -118,262 +333,292 @@ void hierarchical_taylor_slope_limiter_dg1(const SlopeLimiterInput &input,
         hi = std::min(hi, global_max);
         center_phi = std::max(center_phi, global_min);
         center_phi = std::min(center_phi, global_max);
+      }
+      else if (itaylor == 1 && dof_is_dirichlet)
+      {
+        // The derivative in the x-direction at the centre of a mirrored cell
+        double ddx = (field.boundary_dof_value[dof] - center_phi) / dx;
+        double ddx2 = 4 * ddx - 3 * center_phix;
+        lo = std::min(lo, ddx2);
+        hi = std::max(hi, ddx2);
+      }
+      else if (itaylor == 2 && dof_is_dirichlet)
+      {
+        // The derivative in the y-direction at the centre of a mirrored cell
+        double ddy = (field.boundary_dof_value[dof] - center_phi) / dy;
+        double ddy2 = 4 * ddy - 3 * center_phiy;
+        lo = std::min(lo, ddy2);
+        hi = std::max(hi, ddy2);
+      }
+      else if (itaylor == 3 && dof_is_dirichlet)
+      {
+        // The derivative in the z-direction at the center of a mirrored cell
+        double ddz = (field.boundary_dof_value[dof] - center_phi) / dz;
+        double ddz2 = 4 * ddz - 3 * center_phiz;
+        lo = std::min(lo, ddz2);
+        hi = std::max(hi, ddz2);
+      }
 
-        // Compute the slope limiter coefficient alpha
-        double a = 1.0;
-        if (vertex_value > center_phi)
-        {
-          a = (hi - center_phi) / (vertex_value - center_phi);
-        }
-        else if (vertex_value < center_phi)
-        {
-          a = (lo - center_phi) / (vertex_value - center_phi);
-        }
-        alpha = std::min(alpha, a);
+      // Compute the slope limiter coefficient alpha
+      double a = 1.0;
+      if (vertex_value > base_value)
+      {
+        a = (hi - base_value) / (vertex_value - base_value);
       }
+      else if (vertex_value < base_value)
+      {
+        a = (lo - base_value) / (vertex_value - base_value);
+      }
+      alpha[itaylor] = std::min(alpha[itaylor], a);
     }
-    else
-    {
-      alpha = 1.0;
-    }
+  }
 
-    // Slope limit this cell
+  // Compute alpha values by the hierarchical method
+  alpha2 = std::min(alpha[1], alpha[2]);
+  alpha2 = std::min(alpha2, alpha[3]);
+  alpha1 = std::max(alpha[0], alpha2);
+}
+
+// Slope limit one cell given the (possibly clamped) cell average value
+template <int Ndim>
+inline void limit_cell_dg1(const SlopeLimiterInput &input,
+                           double *taylor_arr,
+                           const int ic,
+                           const double alpha,
+                           const double center_phi)
+{
+  taylor_arr[input.cell_dofs(ic, 0)] = center_phi;
+  taylor_arr[input.cell_dofs(ic, 1)] *= alpha;
+  taylor_arr[input.cell_dofs(ic, 2)] *= alpha;
+  if (Ndim == 3)
+    taylor_arr[input.cell_dofs(ic, 3)] *= alpha;
+}
+
+// Slope limit one cell given the (possibly clamped) cell average value
+template <int Ndim>
+inline void limit_cell_dg2(const SlopeLimiterInput &input,
+                           double *taylor_arr,
+                           const int ic,
+                           const double alpha1,
+                           const double alpha2,
+                           const double center_phi)
+{
+  const int num_first = Ndim + 1;
+  const int dstride = Ndim == 2 ? 6 : 10;
+  taylor_arr[input.cell_dofs(ic, 0)] = center_phi;
+  for (int i = 1; i < num_first; i++)
+    taylor_arr[input.cell_dofs(ic, i)] *= alpha1;
+  for (int i = num_first; i < dstride; i++)
+    taylor_arr[input.cell_dofs(ic, i)] *= alpha2;
+}
+
+template <int Ndim> // Ndim is 2 for 2D triangles and 3 for 3D tetrahedra
+void hierarchical_taylor_slope_limiter_dg1(const SlopeLimiterInput &input,
+                                           DoubleVec taylor_arr,
+                                           ConstDoubleVec taylor_arr_old,
+                                           DoubleVec alpha_arr)
+{
+  const int num_cells_owned = input.num_cells_owned;
+  const int num_threads = std::max(input.num_threads, 1);
+  const bool two_phase = num_threads > 1;
+
+  // Input array checks
+  check_input_arrays<Ndim>(input, Ndim + 1, taylor_arr.size());
+  RANGE_CHECK(taylor_arr.size() != taylor_arr_old.size());
+  RANGE_CHECK(num_cells_owned != alpha_arr.size());
+  RANGE_CHECK(num_cells_owned * (Ndim + 1) != input.boundary_dof_type.size());
+  RANGE_CHECK(num_cells_owned != input.limit_cell.size());
+
+  const LimitedField field = scalar_field(input, taylor_arr.data(), taylor_arr_old.data());
+  std::vector<double> center_values(num_cells_owned);
+
+  // Phase 1: compute the slope limiter coefficients of all owned cells,
+  // and limit them at once when running in a single phase
+  #pragma omp parallel for num_threads(num_threads) schedule(static) if (two_phase)
+  for (int ic = 0; ic < num_cells_owned; ic++)
+  {
+    const double alpha = hierarchical_taylor_cell_dg1<Ndim>(input, field, ic, center_values[ic]);
     alpha_arr[input.cell_dofs_dg0(ic)] = alpha;
-    taylor_arr[input.cell_dofs(ic, 0)] = center_phi;
-    taylor_arr[input.cell_dofs(ic, 1)] *= alpha;
-    taylor_arr[input.cell_dofs(ic, 2)] *= alpha;
-    if (Ndim == 3)
-      taylor_arr[input.cell_dofs(ic, 3)] *= alpha;
+    if (!two_phase)
+      limit_cell_dg1<Ndim>(input, taylor_arr.data(), ic, alpha, center_values[ic]);
+  }
+
+  // Phase 2: slope limit all owned cells
+  if (!two_phase)
+    return;
+  #pragma omp parallel for num_threads(num_threads) schedule(static)
+  for (int ic = 0; ic < num_cells_owned; ic++)
+  {
+    const double alpha = alpha_arr[input.cell_dofs_dg0(ic)];
+    limit_cell_dg1<Ndim>(input, taylor_arr.data(), ic, alpha, center_values[ic]);
   }
 }
 
 template <int Ndim> // Ndim is 2 for 2D triangles and 3 for 3D tetrahedra
 void hierarchical_taylor_slope_limiter_dg2(const SlopeLimiterInput &input,
                                            DoubleVec taylor_arr,
-                                           DoubleVec taylor_arr_old,
+                                           ConstDoubleVec taylor_arr_old,
                                            DoubleVec alpha1_arr,
                                            DoubleVec alpha2_arr)
 {
-  static_assert(Ndim == 2 or Ndim == 3, "Only 2D and 3D supported");
-
   const int num_cells_owned = input.num_cells_owned;
-  const double global_min = input.global_min;
-  const double global_max = input.global_max;
-  const int nvert = Ndim + 1;
+  const int num_threads = std::max(input.num_threads, 1);
+  const bool two_phase = num_threads > 1;
   const int dstride = Ndim == 2 ? 6 : 10;
 
   // Input array checks
-  const int num_cells = input.cell_dofs.rows();
-  const int num_dofs_tot = num_cells * dstride;
-  const int num_dofs_owned = num_cells_owned * dstride;
-  RANGE_CHECK(input.cell_dofs.cols() != dstride);
-  RANGE_CHECK(num_dofs_tot != taylor_arr.size());
-  RANGE_CHECK(num_dofs_tot != taylor_arr_old.size());
+  check_input_arrays<Ndim>(input, dstride, taylor_arr.size());
+  RANGE_CHECK(taylor_arr.size() != taylor_arr_old.size());
   RANGE_CHECK(num_cells_owned != alpha1_arr.size());
   RANGE_CHECK(num_cells_owned != alpha2_arr.size());
-  RANGE_CHECK(dstride != input.cell_dofs.cols());
-  RANGE_CHECK(Ndim != input.vertex_coords.cols());
-  RANGE_CHECK(nvert != input.cell_vertices.cols());
-  RANGE_CHECK(num_dofs_owned != input.boundary_dof_type.size());
+  RANGE_CHECK(num_cells_owned * dstride != input.boundary_dof_type.size());
   RANGE_CHECK(num_cells_owned != input.limit_cell.size());
 
-  double cx, cy, cz = 0.0, dx, dy, dz = 0.0;
-  double center_phi, center_phix, center_phiy, center_phiz = 0.0;
-  double center_phixx, center_phiyy, center_phizz = 0.0;
-  double center_phixy, center_phixz = 0.0, center_phiyz = 0.0;
+  const LimitedField field = scalar_field(input, taylor_arr.data(), taylor_arr_old.data());
+  std::vector<double> center_values(num_cells_owned);
 
-  // Loop over all cells that are owned by this process
+  // Phase 1: compute the slope limiter coefficients of all owned cells,
+  // and limit them at once when running in a single phase
+  #pragma omp parallel for num_threads(num_threads) schedule(static) if (two_phase)
   for (int ic = 0; ic < num_cells_owned; ic++)
   {
-    double alpha[4] = {1.0, 1.0, 1.0, 1.0};
-
-    // The cell centre is stored as vertex 4 (2D) or 5 (3D)
-    cx = input.cell_midpoints(ic, 0);
-    cy = input.cell_midpoints(ic, 1);
-    if (Ndim == 3)
-      cz = input.cell_midpoints(ic, 2);
-
-    // Get the Taylor values for this cell
-    if (Ndim == 2)
-    {
-      center_phi = taylor_arr[input.cell_dofs(ic, 0)];
-      center_phix = taylor_arr[input.cell_dofs(ic, 1)];
-      center_phiy = taylor_arr[input.cell_dofs(ic, 2)];
-      center_phixx = taylor_arr[input.cell_dofs(ic, 3)];
-      center_phiyy = taylor_arr[input.cell_dofs(ic, 4)];
-      center_phixy = taylor_arr[input.cell_dofs(ic, 5)];
-    }
-    else
-    {
-      center_phi = taylor_arr[input.cell_dofs(ic, 0)];
-      center_phix = taylor_arr[input.cell_dofs(ic, 1)];
-      center_phiy = taylor_arr[input.cell_dofs(ic, 2)];
-      center_phiz = taylor_arr[input.cell_dofs(ic, 3)];
-      center_phixx = taylor_arr[input.cell_dofs(ic, 4)];
-      center_phiyy = taylor_arr[input.cell_dofs(ic, 5)];
-      center_phizz = taylor_arr[input.cell_dofs(ic, 6)];
-      center_phixy = taylor_arr[input.cell_dofs(ic, 7)];
-      center_phixz = taylor_arr[input.cell_dofs(ic, 8)];
-      center_phiyz = taylor_arr[input.cell_dofs(ic, 9)];
-    }
-
-    const bool skip_this_cell = (input.limit_cell[ic] == 0);
-    for (int itaylor = 0; itaylor < nvert; itaylor++)
-    {
-      if (skip_this_cell)
-        break;
+    const int d0 = input.cell_dofs_dg0[ic];
+    hierarchical_taylor_cell_dg2<Ndim>(
+        input, field, ic, alpha1_arr[d0], alpha2_arr[d0], center_values[ic]);
+    if (!two_phase)
+      limit_cell_dg2<Ndim>(
+          input, taylor_arr.data(), ic, alpha1_arr[d0], alpha2_arr[d0], center_values[ic]);
+  }
 
-      for (int ivert = 0; ivert < nvert; ivert++)
-      {
-        // Vertex index
-        const int vi = input.cell_vertices(ic, ivert);
-
-        // Calculate the value of local coordinates
-        dx = input.vertex_coords(vi, 0) - cx;
-        dy = input.vertex_coords(vi, 1) - cy;
-        dz = 0.0;
-        if (Ndim == 3)
-          dz = input.vertex_coords(vi, 2) - cz;
-
-        double base_value, vertex_value;
-        if (itaylor == 0)
-        {
-          // Function value at the vertex (linear reconstruction)
-          vertex_value = center_phi + center_phix * dx + center_phiy * dy + center_phiz * dz;
-          base_value = center_phi;
-        }
-        else if (itaylor == 1)
-        {
-          // Derivative in x direction at the vertex (linear reconstruction)
-          vertex_value = center_phix + center_phixx * dx + center_phixy * dy + center_phixz * dz;
-          base_value = center_phix;
-        }
-        else if (itaylor == 2)
-        {
-          // Derivative in y direction at the vertex (linear reconstruction)
-          vertex_value = center_phiy + center_phiyy * dy + center_phixy * dx + center_phiyz * dz;
-          base_value = center_phiy;
-        }
-        else if (itaylor == 3)
-        {
-          // Derivative in z direction at the vertex (linear reconstruction)
-          vertex_value = center_phiz + center_phizz * dz + center_phixz * dx + center_phiyz * dy;
-          base_value = center_phiz;
-        }
+  // Phase 2: slope limit all owned cells
+  if (!two_phase)
+    return;
+  #pragma omp parallel for num_threads(num_threads) schedule(static)
+  for (int ic = 0; ic < num_cells_owned; ic++)
+  {
+    const int d0 = input.cell_dofs_dg0[ic];
+    limit_cell_dg2<Ndim>(
+        input, taylor_arr.data(), ic, alpha1_arr[d0], alpha2_arr[d0], center_values[ic]);
+  }
+}
 
-        // Find highest and lowest value in the connected neighbour cells
-        int dof = input.cell_dofs(ic, ivert);
-        double lo = base_value;
-        double hi = base_value;
-        for (int inb = 0; inb < input.num_neighbours[dof]; inb++)
-        {
-          int nb = input.neighbours(dof, inb);
-          int nb_dof = input.cell_dofs(nb, itaylor);
-          double nb_val = taylor_arr[nb_dof];
-          lo = std::min(lo, nb_val);
-          hi = std::max(hi, nb_val);
-
-          nb_val = taylor_arr_old[nb_dof];
-          lo = std::min(lo, nb_val);
-          hi = std::max(hi, nb_val);
-        }
+/*
+ * Slope limit all components of a vector field in one pass over the cells.
+ * The arrays have one row per component and the per component bounds,
+ * limit_cell and boundary values are given by set_component_values()
+ */
+template <int Ndim> // Ndim is 2 for 2D triangles and 3 for 3D tetrahedra
+void hierarchical_taylor_slope_limiter_dg1_vec(const SlopeLimiterInput &input,
+                                               DoubleMat taylor_arrs,
+                                               ConstDoubleMat taylor_arrs_old,
+                                               DoubleMat alpha_arrs)
+{
+  const int num_cells_owned = input.num_cells_owned;
+  const int num_threads = std::max(input.num_threads, 1);
+  const bool two_phase = num_threads > 1;
+  const int ncomp = input.num_components;
 
-        // Handle boundary conditions and global bounds
-        bool dof_is_dirichlet = input.boundary_dof_type[dof] == BoundaryDofType::DIRICHLET ||
-                                (input.boundary_dof_type[dof] == BoundaryDofType::ROBIN &&
-                                 input.trust_robin_dval);
-        if (itaylor == 0)
-        {
-          // Modify local bounds to incorporate the boundary conditions
-          if (dof_is_dirichlet)
-          {
-            // Value in the centre of a mirrored cell on the other side of the boundary
-            double bc_value = 2 * input.boundary_dof_value[dof] - center_phi;
-            lo = std::min(lo, bc_value);
-            hi = std::max(hi, bc_value);
-          }
-
-          // Modify local bounds to incorporate the global bounds
-          lo = std::max(lo, global_min);
-          hi = std::min(hi, global_max);
-          center_phi = std::max(center_phi, global_min);
-          center_phi = std::min(center_phi, global_max);
-        }
-        else if (itaylor == 1 && dof_is_dirichlet)
-        {
-          // The derivative in the x-direction at the centre of a mirrored cell
-          double ddx = (input.boundary_dof_value[dof] - center_phi) / dx;
-          double ddx2 = 4 * ddx - 3 * center_phix;
-          lo = std::min(lo, ddx2);
-          hi = std::max(hi, ddx2);
-        }
-        else if (itaylor == 2 && dof_is_dirichlet)
-        {
-          // The derivative in the y-direction at the centre of a mirrored cell
-          double ddy = (input.boundary_dof_value[dof] - center_phi) / dy;
-          double ddy2 = 4 * ddy - 3 * center_phiy;
-          lo = std::min(lo, ddy2);
-          hi = std::max(hi, ddy2);
-        }
-        else if (itaylor == 3 && dof_is_dirichlet)
-        {
-          // The derivative in the z-direction at the center of a mirrored cell
-          double ddz = (input.boundary_dof_value[dof] - center_phi) / dz;
-          double ddz2 = 4 * ddz - 3 * center_phiz;
-          lo = std::min(lo, ddz2);
-          hi = std::max(hi, ddz2);
-        }
+  // Input array checks
+  check_input_arrays<Ndim>(input, Ndim + 1, taylor_arrs.cols());
+  RANGE_CHECK(taylor_arrs.cols() != taylor_arrs_old.cols());
+  RANGE_CHECK(ncomp != alpha_arrs.rows());
+  RANGE_CHECK(num_cells_owned != alpha_arrs.cols());
 
-        // Compute the slope limiter coefficient alpha
-        double a = 1.0;
-        if (vertex_value > base_value)
-        {
-          a = (hi - base_value) / (vertex_value - base_value);
-        }
-        else if (vertex_value < base_value)
-        {
-          a = (lo - base_value) / (vertex_value - base_value);
-        }
-        alpha[itaylor] = std::min(alpha[itaylor], a);
-      }
-    }
+  const auto fields = component_fields(input, taylor_arrs, taylor_arrs_old);
+  MatDoubleRM center_values(num_cells_owned, ncomp);
 
-    double alpha1 = 1.0, alpha2 = 1.0;
-    if (!skip_this_cell)
+  // Phase 1: compute the slope limiter coefficients of all owned cells,
+  // and limit them at once when running in a single phase
+  #pragma omp parallel for num_threads(num_threads) schedule(static) if (two_phase)
+  for (int ic = 0; ic < num_cells_owned; ic++)
+  {
+    const int d0 = input.cell_dofs_dg0[ic];
+    for (int icomp = 0; icomp < ncomp; icomp++)
     {
-      // Compute alpha values by the hierarchical method
-      alpha2 = std::min(alpha[1], alpha[2]);
-      alpha2 = std::min(alpha2, alpha[3]);
-      alpha1 = std::max(alpha[0], alpha2);
+      alpha_arrs(icomp, d0) =
+          hierarchical_taylor_cell_dg1<Ndim>(input, fields[icomp], ic, center_values(ic, icomp));
+      if (!two_phase)
+        limit_cell_dg1<Ndim>(
+            input, &taylor_arrs(icomp, 0), ic, alpha_arrs(icomp, d0), center_values(ic, icomp));
     }
+  }
 
-    // Slope limit this cell
-    alpha1_arr[input.cell_dofs_dg0[ic]] = alpha1;
-    alpha2_arr[input.cell_dofs_dg0[ic]] = alpha2;
+  // Phase 2: slope limit all owned cells
+  if (!two_phase)
+    return;
+  #pragma omp parallel for num_threads(num_threads) schedule(static)
+  for (int ic = 0; ic < num_cells_owned; ic++)
+  {
+    const int d0 = input.cell_dofs_dg0[ic];
+    for (int icomp = 0; icomp < ncomp; icomp++)
+      limit_cell_dg1<Ndim>(
+          input, &taylor_arrs(icomp, 0), ic, alpha_arrs(icomp, d0), center_values(ic, icomp));
+  }
+}
 
-    if (Ndim == 2)
-    {
-      taylor_arr[input.cell_dofs(ic, 0)] = center_phi;
-      taylor_arr[input.cell_dofs(ic, 1)] *= alpha1;
-      taylor_arr[input.cell_dofs(ic, 2)] *= alpha1;
-      taylor_arr[input.cell_dofs(ic, 3)] *= alpha2;
-      taylor_arr[input.cell_dofs(ic, 4)] *= alpha2;
-      taylor_arr[input.cell_dofs(ic, 5)] *= alpha2;
-    }
-    else
+template <int Ndim> // Ndim is 2 for 2D triangles and 3 for 3D tetrahedra
+void hierarchical_taylor_slope_limiter_dg2_vec(const SlopeLimiterInput &input,
+                                               DoubleMat taylor_arrs,
+                                               ConstDoubleMat taylor_arrs_old,
+                                               DoubleMat alpha1_arrs,
+                                               DoubleMat alpha2_arrs)
+{
+  const int num_cells_owned = input.num_cells_owned;
+  const int num_threads = std::max(input.num_threads, 1);
+  const bool two_phase = num_threads > 1;
+  const int ncomp = input.num_components;
+  const int dstride = Ndim == 2 ? 6 : 10;
+
+  // Input array checks
+  check_input_arrays<Ndim>(input, dstride, taylor_arrs.cols());
+  RANGE_CHECK(taylor_arrs.cols() != taylor_arrs_old.cols());
+  RANGE_CHECK(ncomp != alpha1_arrs.rows());
+  RANGE_CHECK(ncomp != alpha2_arrs.rows());
+  RANGE_CHECK(num_cells_owned != alpha1_arrs.cols());
+  RANGE_CHECK(num_cells_owned != alpha2_arrs.cols());
+
+  const auto fields = component_fields(input, taylor_arrs, taylor_arrs_old);
+  MatDoubleRM center_values(num_cells_owned, ncomp);
+
+  // Phase 1: compute the slope limiter coefficients of all owned cells,
+  // and limit them at once when running in a single phase
+  #pragma omp parallel for num_threads(num_threads) schedule(static) if (two_phase)
+  for (int ic = 0; ic < num_cells_owned; ic++)
+  {
+    const int d0 = input.cell_dofs_dg0[ic];
+    for (int icomp = 0; icomp < ncomp; icomp++)
     {
-      taylor_arr[input.cell_dofs(ic, 0)] = center_phi;
-      taylor_arr[input.cell_dofs(ic, 1)] *= alpha1;
-      taylor_arr[input.cell_dofs(ic, 2)] *= alpha1;
-      taylor_arr[input.cell_dofs(ic, 3)] *= alpha1;
-      taylor_arr[input.cell_dofs(ic, 4)] *= alpha2;
-      taylor_arr[input.cell_dofs(ic, 5)] *= alpha2;
-      taylor_arr[input.cell_dofs(ic, 6)] *= alpha2;
-      taylor_arr[input.cell_dofs(ic, 7)] *= alpha2;
-      taylor_arr[input.cell_dofs(ic, 8)] *= alpha2;
-      taylor_arr[input.cell_dofs(ic, 9)] *= alpha2;
+      hierarchical_taylor_cell_dg2<Ndim>(input,
+                                         fields[icomp],
+                                         ic,
+                                         alpha1_arrs(icomp, d0),
+                                         alpha2_arrs(icomp, d0),
+                                         center_values(ic, icomp));
+      if (!two_phase)
+        limit_cell_dg2<Ndim>(input,
+                             &taylor_arrs(icomp, 0),
+                             ic,
+                             alpha1_arrs(icomp, d0),
+                             alpha2_arrs(icomp, d0),
+                             center_values(ic, icomp));
     }
   }
+
+  // Phase 2: slope limit all owned cells
+  if (!two_phase)
+    return;
+  #pragma omp parallel for num_threads(num_threads) schedule(static)
+  for (int ic = 0; ic < num_cells_owned; ic++)
+  {
+    const int d0 = input.cell_dofs_dg0[ic];
+    for (int icomp = 0; icomp < ncomp; icomp++)
+      limit_cell_dg2<Ndim>(input,
+                           &taylor_arrs(icomp, 0),
+                           ic,
+                           alpha1_arrs(icomp, d0),
+                           alpha2_arrs(icomp, d0),
+                           center_values(ic, icomp));
+  }
 }
 
 PYBIND11_MODULE(SIGNATURE, m)
@@ -383,18 +628,32 @@ PYBIND11_MODULE(SIGNATURE, m)
       .def_readwrite("global_min", &SlopeLimiterInput::global_min)
       .def_readwrite("global_max", &SlopeLimiterInput::global_max)
       .def_readwrite("trust_robin_dval", &SlopeLimiterInput::trust_robin_dval)
+      .def_readwrite("num_threads", &SlopeLimiterInput::num_threads)
       .def("set_arrays", &SlopeLimiterInput::set_arrays)
       .def("set_limit_cell", &SlopeLimiterInput::set_limit_cell)
       .def("set_boundary_values", &SlopeLimiterInput::set_boundary_values)
+      .def("set_component_values", &SlopeLimiterInput::set_component_values)
       // Read only  data properties, mostly used for testing
       .def_readonly("cell_midpoints", &SlopeLimiterInput::cell_midpoints)
       .def_readonly("limit_cell", &SlopeLimiterInput::limit_cell);
 
+  m.def("has_openmp", &has_openmp);
+
   // HT limiter functions
   m.def("hierarchical_taylor_slope_limiter_dg1_2D", &hierarchical_taylor_slope_limiter_dg1<2>);
   m.def("hierarchical_taylor_slope_limiter_dg1_3D", &hierarchical_taylor_slope_limiter_dg1<3>);
   m.def("hierarchical_taylor_slope_limiter_dg2_2D", &hierarchical_taylor_slope_limiter_dg2<2>);
   m.def("hierarchical_taylor_slope_limiter_dg2_3D", &hierarchical_taylor_slope_limiter_dg2<3>);
+
+  // HT limiter functions for all components of a vector field
+  m.def("hierarchical_taylor_slope_limiter_dg1_2D_vec",
+        &hierarchical_taylor_slope_limiter_dg1_vec<2>);
+  m.def("hierarchical_taylor_slope_limiter_dg1_3D_vec",
+        &hierarchical_taylor_slope_limiter_dg1_vec<3>);
+  m.def("hierarchical_taylor_slope_limiter_dg2_2D_vec",
+        &hierarchical_taylor_slope_limiter_dg2_vec<2>);
+  m.def("hierarchical_taylor_slope_limiter_dg2_3D_vec",
+        &hierarchical_taylor_slope_limiter_dg2_vec<3>);
 }
 
 } // namespace dolfin
@@ -7,6 +7,9 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/eigen.h>
 #include <Eigen/Core>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
 
 namespace dolfin
 {
@@ -64,6 +67,10 @@ struct SlopeLimiterInput
   // value is included in the valid value range for boundary dofs
   bool trust_robin_dval = true;
 
+  // Number of OpenMP threads used in the cell loops. The loops are run in
+  // serial if the module is compiled without OpenMP support
+  int num_threads = 1;
+
   void set_arrays(const int num_cells_owned,
                   IntVecIn num_neighbours,
                   IntMatIn neighbours,
@@ -182,8 +189,59 @@ struct SlopeLimiterInput
     this->boundary_dof_value = boundary_dof_value;
     this->enforce_boundary_conditions = enforce_bcs;
   }
+
+  // --------------------------------------------------------------------------
+  // Vector fields, all components share the connectivity and dofs above
+  // --------------------------------------------------------------------------
+
+  // Number of components and the data for each component (one row each)
+  int num_components = 0;
+  Eigen::VectorXd component_global_min;
+  Eigen::VectorXd component_global_max;
+  MatIntRM component_limit_cell;
+  std::vector<BoundaryDofType> component_boundary_dof_type;
+  MatDoubleRM component_boundary_dof_value;
+
+  void set_component_values(DoubleVecIn global_min,
+                            DoubleVecIn global_max,
+                            IntMatIn limit_cell,
+                            IntMatIn boundary_dof_type,
+                            DoubleMatIn boundary_dof_value)
+  {
+    const int Ncomp = global_min.size();
+    const int Ndofs = num_cells_owned * cell_dofs.cols();
+    if (global_max.size() != Ncomp or limit_cell.rows() != Ncomp or
+        boundary_dof_type.rows() != Ncomp or boundary_dof_value.rows() != Ncomp)
+      throw std::length_error("ERROR: inconsistent number of components");
+    if (limit_cell.cols() != num_cells_owned)
+      throw std::length_error("ERROR: limit_cell.cols() != num_cells_owned");
+    if (boundary_dof_type.cols() != Ndofs or boundary_dof_value.cols() != Ndofs)
+      throw std::length_error("ERROR: boundary_dof_type.cols() != Ndofs or boundary_dof_value.cols() != Ndofs");
+
+    this->num_components = Ncomp;
+    this->component_global_min = global_min;
+    this->component_global_max = global_max;
+    this->component_limit_cell = limit_cell;
+    this->component_boundary_dof_value = boundary_dof_value;
+
+    this->component_boundary_dof_type.resize(Ncomp * Ndofs);
+    for (int i = 0; i < Ncomp; i++)
+      for (int j = 0; j < Ndofs; j++)
+        this->component_boundary_dof_type[i * Ndofs + j] =
+            static_cast<BoundaryDofType>(boundary_dof_type(i, j));
+  }
 };
 
+// Return true if the module was compiled with OpenMP support
+inline bool has_openmp()
+{
+#ifdef _OPENMP
+  return true;
+#else
+  return false;
+#endif
+}
+
 } // end namespace dolfin
 
 #endif
@@ -1,6 +1,7 @@
 #include <iostream>
 #include <vector>
 #include <tuple>
+#include <algorithm>
 #include <dolfin/common/MPI.h>
 #include <dolfin/mesh/Mesh.h>
 #include <dolfin/fem/DofMap.h>
@@ -10,6 +11,9 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/eigen.h>
 #include <Eigen/Core>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
 
 
 namespace dolfin {
@@ -37,6 +41,7 @@ public:
     // Calculate cell average values for all cells, not only "regular" cells
     const std::size_t Ncells = _mesh->num_cells();
     std::vector<double> cell_averages(Ncells);
+    #pragma omp parallel for num_threads(nthreads()) schedule(static)
     for (std::size_t cid = 0; cid < Ncells; cid++)
     {
       const auto cell_dofs = dm->cell_dofs(cid);
@@ -47,9 +52,11 @@ public:
       cell_averages[cid] = (dof_values[d0] + dof_values[d1] + dof_values[d2]) / 3.0;
     }
 
-    // Calculate overshoot
-    double overshoot = 0.0;
+    // Calculate overshoot for each cell. The cell values are summed in a
+    // fixed order afterwards so the result does not depend on the threads
     const std::size_t Ncells_owned = _mesh->topology().ghost_offset(_ndim);
+    std::vector<double> cell_overshoot(Ncells_owned, 0.0);
+    #pragma omp parallel for num_threads(nthreads()) schedule(static)
     for (std::size_t cid = 0; cid < Ncells_owned; cid++)
     {
       const auto& cell_neighbours = _neighbours[cid];
@@ -75,19 +82,27 @@ public:
         double scale = 1.0 / std::max(lim_high - lim_low, 1e-8);
         if (value < lim_low)
         {
-          overshoot += (lim_low - value) * scale;
+          cell_overshoot[cid] += (lim_low - value) * scale;
         }
         else if (value > lim_high)
         {
-          overshoot += (value - lim_high) * scale;
+          cell_overshoot[cid] += (value - lim_high) * scale;
         }
       }
     }
+    double overshoot = 0.0;
+    for (const double val : cell_overshoot)
+      overshoot += val;
+
     // Sum all overshoots across processors
     MPI::sum(MPI_COMM_WORLD, overshoot);
     return overshoot;
   }
 
+  // Number of OpenMP threads used in the cell loops. The loops are run in
+  // serial if the module is compiled without OpenMP support
+  int num_threads = 1;
+
 private:
   // Data from outside
   const Mesh *_mesh;
@@ -96,6 +111,11 @@ private:
   // Neighbour cells for all vertices and facets for each of the cells
   std::vector<std::vector<std::vector<std::size_t> > > _neighbours;
 
+  int nthreads() const
+  {
+    return std::max(num_threads, 1);
+  }
+
   /*
    * For each cell and for each of the 3+3 vertices/facets in this
    * cell find the ids of all the connected neighbour cells (not
@@ -162,7 +182,8 @@ PYBIND11_MODULE(SIGNATURE, m)
 {
   pybind11::class_<LocalMaximaMeasurer>(m, "LocalMaximaMeasurer")
       .def(pybind11::init<const Mesh &>())
-      .def("measure", &LocalMaximaMeasurer::measure);
+      .def("measure", &LocalMaximaMeasurer::measure)
+      .def_readwrite("num_threads", &LocalMaximaMeasurer::num_threads);
 }
 
 } // end namespace dolfin
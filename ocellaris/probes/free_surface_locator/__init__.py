@@ -32,7 +32,8 @@ class FreeSurfaceLocator:
         Defines an attribute ``crossing_points`` that is a dictionary
         mapping cell index to a list of crossing points in that cell.
         Cells without any crossing points will not be contained in the
-        dictionary.
+        dictionary. The same information is available as arrays in the
+        ``crossings`` attribute
         """
         self.simulation = simulation
         self.density = density
@@ -55,15 +56,26 @@ class FreeSurfaceLocator:
         self.update()
 
     @property
-    def crossing_points(self):
+    def crossings(self):
         """
-        A dictionary mapping cell index to list of crossing point 
-        coordinates (tuples)
+        The crossing points as a Crossings object with arrays of the cell
+        indices, crossing point coordinates and direction vectors
         """
         if self._needs_update:
             # Update the position of the free surface based on an updated
             # density field. This can be an expensive operation
-            self._crossing_points = self.impl.compute_crossing_points()
+            self._crossings = self.impl.compute_crossing_points()
+            self._needs_update = False
+        return self._crossings
+
+    @property
+    def crossing_points(self):
+        """
+        A dictionary mapping cell index to list of crossing point
+        coordinates (tuples)
+        """
+        if self._crossing_points is None:
+            self._crossing_points = self.crossings.to_dict()
         return self._crossing_points
 
     def add_update_hook(self, hook_name, callback=None, description=None):
@@ -93,6 +105,7 @@ class FreeSurfaceLocator:
 
     def update(self):
         self._needs_update = True
+        self._crossings = None
         self._crossing_points = None
         for cb, descr in self.callbacks:
             if descr is None:
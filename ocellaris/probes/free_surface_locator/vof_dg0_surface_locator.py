@@ -1,6 +1,5 @@
 import numpy
-import dolfin
-from ocellaris.utils import get_local
+from ocellaris.utils import local_vector_view, cell_dofmap
 
 
 class FreeSurfaceLocatorImplDG0:
@@ -14,53 +13,75 @@ class FreeSurfaceLocatorImplDG0:
         return crossing_points_and_cells(self.simulation, self.field, self.value, self.cache)
 
 
+class Crossings:
+    def __init__(self, cells, points, directions):
+        """
+        Free surface crossing points stored as arrays. Crossing number i is
+        located in the cell with index cells[i] at the position points[i]
+        and the scaled direction towards the high value side is given by
+        directions[i]. The points and directions are 3-vectors
+        """
+        self.cells = cells
+        self.points = points
+        self.directions = directions
+
+    def __len__(self):
+        return len(self.cells)
+
+    def to_dict(self):
+        """
+        Return a dictionary mapping cell index to a list of crossing point
+        coordinates (tuples) and direction vectors in that cell
+        """
+        crossing_points = {}
+        for cid, pt, direction in zip(self.cells.tolist(), self.points, self.directions):
+            crossing_points.setdefault(cid, []).append((tuple(pt), direction))
+        return crossing_points
+
+
 def preprocess(simulation, field):
     """
     Store DOF and geometry info that will not change unless the mesh is
-    updated (which is not handled in any way)
+    updated (which is not handled in any way). All data is stored as arrays
+    with one row per interior facet
     """
     mesh = simulation.data['mesh']
-    dofmap = field.function_space().dofmap()
     conFC = simulation.data['connectivity_FC']
+    conCF = simulation.data['connectivity_CF']
+    tdim = mesh.topology().dim()
 
-    # Data to compute
-    facet_data = {}
-    cell_dofs = [None] * mesh.num_cells()
-    is_ghost_cell = [False] * mesh.num_cells()
-
-    cell_coords = numpy.zeros((2, 3), float)
-    for facet in dolfin.facets(mesh, 'all'):
-        fid = facet.index()
-        cell_ids = conFC(fid)
-        if len(cell_ids) != 2:
-            continue
+    # The number of cells connected to each facet, found from the fixed size
+    # cell to facet connectivity, gives the start of the cells of each facet
+    # in the flat facet to cell connectivity array
+    num_connected = numpy.bincount(numpy.asarray(conCF(), numpy.intp), minlength=mesh.num_facets())
+    flat_cells = numpy.asarray(conFC(), numpy.intc)
+    assert flat_cells.size == num_connected.sum()
+    starts = numpy.cumsum(num_connected) - num_connected
 
-        # Get midpoint coordinates of the two connected cells and the DG0
-        # dof needed to find the field value in each of the cells
-        for i, cell_id in enumerate(cell_ids):
-            cell = dolfin.Cell(mesh, cell_id)
-            is_ghost_cell[cell_id] = cell.is_ghost()
+    # Facets that are connected to two cells
+    starts = starts[num_connected == 2]
+    facet_cells = numpy.stack([flat_cells[starts], flat_cells[starts + 1]], axis=1)
 
-            pt = cell.midpoint()
-            cell_coords[i, 0] = pt.x()
-            cell_coords[i, 1] = pt.y()
-            cell_coords[i, 2] = pt.z()
+    # Midpoint coordinates of all cells (the average of the vertices, which is
+    # the same as dolfin.Cell.midpoint) as 3-vectors
+    gdim = mesh.geometry().dim()
+    cell_midpoints = numpy.zeros((mesh.num_cells(), 3), float)
+    cell_midpoints[:, :gdim] = mesh.coordinates()[mesh.cells()].mean(axis=1)
+    midpoints0 = cell_midpoints[facet_cells[:, 0]]
+    midpoints1 = cell_midpoints[facet_cells[:, 1]]
 
-            # Get the one and only DG0 dof for this cell
-            dofs = dofmap.cell_dofs(cell_id)
-            assert len(dofs) == 1
-            cell_dofs[cell_id] = dofs[0]
+    # Unit vector from cell 1 to cell 0
+    uvecs = midpoints0 - midpoints1
+    uvecs /= numpy.linalg.norm(uvecs, axis=1)[:, None]
 
-        # Unit vector from cell 1 to cell 0
-        uvec = cell_coords[0] - cell_coords[1]
-        uvec /= (uvec[0] ** 2 + uvec[1] ** 2 + uvec[2] ** 2) ** 0.5
+    # The DG0 dofs needed to find the field value in each of the cells
+    dofs = numpy.array(cell_dofmap(field.function_space()), numpy.intc)
+    facet_dofs = dofs[facet_cells]
 
-        # Store data for later use
-        coords0 = numpy.array(cell_coords[0])
-        coords1 = numpy.array(cell_coords[1])
-        facet_data[fid] = cell_ids[0], cell_ids[1], coords0, coords1, uvec
+    # Ghost cells are numbered after the regular cells
+    is_ghost = facet_cells >= mesh.topology().ghost_offset(tdim)
 
-    return facet_data, cell_dofs, is_ghost_cell
+    return facet_cells, facet_dofs, is_ghost, midpoints0, midpoints1, uvecs
 
 
 def crossing_points_and_cells(simulation, field, value, preprocessed):
@@ -79,42 +100,35 @@ def crossing_points_and_cells(simulation, field, value, preprocessed):
     water/air simulation). This is used such that the high value and the
     low value sides of the field can be approximately determined.
 
-    The field is assumed to be piecewice constant (DG0)
+    The field is assumed to be piecewice constant (DG0). All facets are
+    checked at once and the result is returned as a Crossings object
     """
-    facet_data, cell_dofs, is_ghost_cell = preprocessed
-    all_values = get_local(field)
+    facet_cells, facet_dofs, is_ghost, midpoints0, midpoints1, uvecs = preprocessed
 
     # We define acronym LCCM: line connecting cell midpoints
     #   - We restrinct ourselves to LCCMs that cross only ONE facet
     #   - We number LLCMs by the index of the crossed facet
 
-    # Find the crossing points where the contour crosses a LCCM
-    crossing_points = {}
-    for fid, fdata in facet_data.items():
-        # Get preprocessed data
-        cid0, cid1, coords0, coords1, uvec = fdata
-
-        # Check for level crossing
-        v0 = all_values[cell_dofs[cid0]]
-        v1 = all_values[cell_dofs[cid1]]
-        b1, b2 = v0 < value, v1 < value
-        if (b1 and b2) or not (b1 or b2):
-            # LCCM not crossed by contour
-            continue
-
-        # Find the location where the contour line crosses the LCCM
-        fac = (v0 - value) / (v0 - v1)
-        crossing_point = tuple((1 - fac) * coords0 + fac * coords1)
-
-        # Scaled direction vector
-        direction = uvec * (v0 - v1)
-
-        # Find the cell containing the contour line
-        surf_cid = cid0 if fac <= 0.5 else cid1
-        is_ghost = is_ghost_cell[cid0] if fac <= 0.5 else is_ghost_cell[cid1]
-
-        if not is_ghost:
-            # Store the point and direction towards the high value cell
-            crossing_points.setdefault(surf_cid, []).append((crossing_point, direction))
-
-    return crossing_points
+    # Find the LCCMs that are crossed by the contour
+    with local_vector_view(field) as all_values:
+        v0 = all_values[facet_dofs[:, 0]]
+        v1 = all_values[facet_dofs[:, 1]]
+    crossed = (v0 < value) != (v1 < value)
+    v0, v1 = v0[crossed], v1[crossed]
+
+    # Find the location where the contour line crosses the LCCM
+    fac = (v0 - value) / (v0 - v1)
+    points = (1 - fac[:, None]) * midpoints0[crossed] + fac[:, None] * midpoints1[crossed]
+
+    # Scaled direction vector
+    directions = uvecs[crossed] * (v0 - v1)[:, None]
+
+    # Find the cell containing the contour line
+    side = (fac > 0.5).astype(int)
+    rows = numpy.arange(len(side))
+    cells = facet_cells[crossed][rows, side]
+    ghost = is_ghost[crossed][rows, side]
+
+    # Store the points and directions towards the high value cell
+    owned = ~ghost
+    return Crossings(cells[owned], points[owned], directions[owned])
@@ -1,7 +1,7 @@
 import dolfin
 import numpy
 from collections import OrderedDict
-from ocellaris.utils import init_mesh_geometry, timeit, ocellaris_error
+from ocellaris.utils import init_mesh_geometry, timeit, ocellaris_error, exchange_arrays
 from ocellaris.simulation.io_impl.xdmf import get_xdmf_file_name
 from . import Probe, register_probe
 
@@ -146,27 +146,32 @@ class FunctionSlice:
                 for dof in dofmap_2d.cell_dofs(cid):
                     links_for_rank[orig_rank].append((dof, orig_cell_index))
 
-            # Distribute data to all ranks
-            distribute_this = []
+            # Distribute data to the ranks that have cells in the plane
+            send_positions, send_cells = {}, {}
             for rank in range(comm.size):
+                if not links_for_rank[rank]:
+                    continue
                 positions = [dof_pos_2d[i] for i, _ in links_for_rank[rank]]
                 orig_cells = [ocid for _, ocid in links_for_rank[rank]]
-                positions = numpy.array(positions, float)
-                orig_cells = numpy.array(orig_cells, numpy.intc)
-                distribute_this.append((positions, orig_cells))
+                send_positions[rank] = numpy.array(positions, float)
+                send_cells[rank] = numpy.array(orig_cells, numpy.intc)
 
             # Store which 2D dof belongs on which rank
-            self._dofs_for_rank = []
-            for rank in range(comm.size):
+            self._dofs_for_rank = {}
+            for rank in send_cells:
                 dfr = [dof for dof, _ in links_for_rank[rank]]
-                self._dofs_for_rank.append(numpy.array(dfr, int))
+                self._dofs_for_rank[rank] = numpy.array(dfr, int)
         else:
-            distribute_this = None
+            send_positions, send_cells = {}, {}
+            self._dofs_for_rank = {}
 
         # Get positions along with the index of the 3D cell for all points that
         # need to be evaluated in order to build the 2D function
         # Each rank gets positions corresponding to cells located on that rank
-        positions, cell_index_3d = comm.scatter(distribute_this)
+        positions = exchange_arrays(send_positions, float, comm).get(0, numpy.zeros(0, float))
+        cell_index_3d = exchange_arrays(send_cells, numpy.intc, comm).get(
+            0, numpy.zeros(0, numpy.intc)
+        )
 
         # Establish efficient ways to get the 2D data from the 3D function
         cell_dofs = [V3d.dofmap().cell_dofs(i) for i in cell_index_3d]
@@ -190,14 +195,18 @@ class FunctionSlice:
         cd = self._cell_dofs
         for i in range(N):
             local_data[i] = arr_3d[cd[i]].dot(facs[i])
-        all_data = comm.gather(local_data)
+
+        # Send the data to the root process, only from ranks with data
+        send = {0: local_data} if N > 0 else {}
+        recv_shapes = {rank: dofs.shape for rank, dofs in self._dofs_for_rank.items()}
+        all_data = exchange_arrays(send, float, comm, recv_shapes)
 
         if comm.rank == 0:
             if func_2d is None:
                 func_2d = dolfin.Function(self.slice_function_space)
             arr_2d = func_2d.vector().get_local()
-            for data, dofs in zip(all_data, self._dofs_for_rank):
-                arr_2d[dofs] = data
+            for rank, dofs in self._dofs_for_rank.items():
+                arr_2d[dofs] = all_data[rank]
             func_2d.vector().set_local(arr_2d)
             func_2d.vector().apply('insert')
 
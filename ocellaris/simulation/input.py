@@ -17,6 +17,12 @@ class KeyNotFound(OcellarisError):
 
 UNDEFINED = UndefinedParameter()
 
+# Names in a "py$" expression that makes the value change during the simulation
+TIME_DEPENDENT_NAMES = frozenset(('t', 'time', 'it', 'timestep', 'dt', 'simulation'))
+
+# Compiled "py$" expressions, the key is the expression string
+_COMPILED_EXPRESSIONS = {}
+
 
 # Some things that could be better in this implementation
 # TODO: do not subclass OrderedDict! This makes it hard to get read/write
@@ -40,6 +46,7 @@ class Input(collections.OrderedDict):
         self.simulation = simulation
         self.basepath = basepath
         self._already_logged = set()
+        self._generation = 0
 
         if basepath and not basepath.endswith('/'):
             self.basepath = basepath + '/'
@@ -60,6 +67,7 @@ class Input(collections.OrderedDict):
 
         self.clear()
         self.update(inp)
+        self._invalidate_accessors()
 
     def get_value(
         self,
@@ -338,6 +346,80 @@ class Input(collections.OrderedDict):
                 d[p] = collections.OrderedDict()
             d = d[p]
         d[path[-1]] = value
+        self._invalidate_accessors()
+
+    def get_accessor(
+        self,
+        path,
+        default_value=UNDEFINED,
+        required_type='any',
+        mpi_root_value=False,
+        safe_mode=False,
+        required_length=None,
+        volatile=None,
+    ):
+        """
+        Get a compiled accessor for an input value. The arguments are the
+        same as for get_value() with the addition of ``volatile``. Calling
+        ``accessor.get()`` returns the same as ``get_value()`` would, but
+        the validated value is cached until ``set_value()`` is called
+
+        Values containing "py$" expressions that refer to the time, the
+        time step or the simulation object are re-evaluated on every call.
+        Give volatile=True to always re-evaluate the value or volatile=False
+        to cache even time dependent "py$" expressions
+        """
+        return InputAccessor(
+            self,
+            path,
+            default_value,
+            required_type,
+            mpi_root_value,
+            safe_mode,
+            required_length,
+            volatile,
+        )
+
+    def get_raw_value(self, path, default_value=UNDEFINED):
+        """
+        Get the value at the given path without validating it and without
+        evaluating any "py$" expressions. Returns the default value if the
+        path cannot be followed without evaluating Python code
+        """
+        if isinstance(path, str):
+            path = path.split('/')
+
+        d = self
+        for p in path:
+            if isinstance(d, list):
+                try:
+                    p = int(p)
+                except ValueError:
+                    return default_value
+                if not -len(d) <= p < len(d):
+                    return default_value
+            elif not isinstance(d, dict) or p not in d:
+                return default_value
+            d = d[p]
+        return d
+
+    def _invalidate_accessors(self):
+        """
+        Make sure all InputAccessors re-read their values from the input
+        """
+        self._generation += 1
+        root = getattr(self.simulation, 'input', None)
+        if root is not None and root is not self:
+            root._generation += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if hasattr(self, '_generation'):
+            self._invalidate_accessors()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._invalidate_accessors()
 
     def has_path(self, path):
         """
@@ -405,6 +487,173 @@ class Input(collections.OrderedDict):
         return yaml.dump(inp, indent=4)
 
 
+class InputAccessor(object):
+    def __init__(
+        self,
+        inp,
+        path,
+        default_value,
+        required_type,
+        mpi_root_value,
+        safe_mode,
+        required_length,
+        volatile,
+    ):
+        """
+        A handle to an input value that caches the validated value. Create
+        it with Input.get_accessor() and read the value with .get()
+
+        The cache is invalidated when the input is changed through the Input
+        object (set_value etc). Values containing time dependent "py$"
+        expressions are evaluated every time unless volatile=False is given
+        """
+        if required_type == 'Input':
+            raise ValueError('InputAccessor does not support required_type="Input"')
+
+        if isinstance(path, str):
+            path = path.split('/')
+
+        self.input = inp
+        self.path = list(path)
+        self.default_value = default_value
+        self.required_type = required_type
+        self.mpi_root_value = mpi_root_value
+        self.safe_mode = safe_mode
+        self.required_length = required_length
+        self.force_volatile = volatile
+
+        self.volatile = None
+        self._cached_value = UNDEFINED
+        self._cached_generation = None
+
+    def _generation(self):
+        inp = self.input
+        root = getattr(inp.simulation, 'input', None)
+        if root is None or root is inp:
+            return inp._generation
+        return (inp._generation, root._generation)
+
+    def get(self):
+        """
+        Return the current value of the input parameter
+        """
+        generation = self._generation()
+        if generation == self._cached_generation and not self.volatile:
+            return _copy_mutable(self._cached_value)
+
+        value = self.input.get_value(
+            self.path,
+            self.default_value,
+            self.required_type,
+            self.mpi_root_value,
+            self.safe_mode,
+            self.required_length,
+        )
+
+        if self.force_volatile is not None:
+            self.volatile = self.force_volatile
+        else:
+            raw = self.input.get_raw_value(self.path, UNDEFINED)
+            if raw is UNDEFINED:
+                # The path is missing or goes through a "py$" expression
+                raw = _first_python_expression_on_path(self.input, self.path)
+            self.volatile = python_expression_is_volatile(raw)
+
+        self._cached_value = value
+        self._cached_generation = generation
+        return _copy_mutable(value)
+
+    def __repr__(self):
+        return '<InputAccessor %s%s volatile=%r>' % (
+            self.input.basepath,
+            '/'.join(str(p) for p in self.path),
+            self.volatile,
+        )
+
+
+def _copy_mutable(value):
+    """
+    Do not let the caller modify the cached value
+    """
+    if isinstance(value, list):
+        return list(value)
+    elif isinstance(value, collections.OrderedDict):
+        return collections.OrderedDict(value)
+    elif isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def _first_python_expression_on_path(inp, path):
+    """
+    Return the first "py$" expression found when walking the path in the
+    input dictionary or None if the path contains no such expressions
+    """
+    d = inp
+    for p in path:
+        if isinstance(d, str):
+            return d if d.strip().startswith('py$') else None
+        elif isinstance(d, list):
+            try:
+                d = d[int(p)]
+            except (ValueError, IndexError):
+                return None
+        elif isinstance(d, dict) and p in d:
+            d = d[p]
+        else:
+            return None
+    return None
+
+
+def python_expression_is_volatile(value):
+    """
+    Check if the raw input value contains "py$" expressions that can change
+    during the simulation, i.e., they use the time, the time step number or
+    the simulation object. Lists and dictionaries are checked recursively
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if not value.startswith('py$'):
+            return False
+        try:
+            code = compile_python_expression(value[3:])
+        except SyntaxError:
+            return True
+        return _code_uses_names(code, TIME_DEPENDENT_NAMES)
+    elif isinstance(value, dict):
+        return any(
+            python_expression_is_volatile(k) or python_expression_is_volatile(v)
+            for k, v in value.items()
+        )
+    elif isinstance(value, (list, tuple)):
+        return any(python_expression_is_volatile(v) for v in value)
+    return False
+
+
+def _code_uses_names(code, names):
+    """
+    Check if a code object, or any nested code objects (lambdas,
+    comprehensions), refers to any of the given names
+    """
+    if names.intersection(code.co_names) or names.intersection(code.co_varnames):
+        return True
+    for const in code.co_consts:
+        if hasattr(const, 'co_names') and _code_uses_names(const, names):
+            return True
+    return False
+
+
+def compile_python_expression(expr):
+    """
+    Compile a Python expression, compiled code is cached
+    """
+    code = _COMPILED_EXPRESSIONS.get(expr, None)
+    if code is None:
+        code = compile(expr.strip(), '<input py$ expression>', 'eval')
+        _COMPILED_EXPRESSIONS[expr] = code
+    return code
+
+
 def eval_python_expression(simulation, value, pathstr, safe_mode=False):
     """
     We run eval with the math functions and user constants available on string
@@ -446,7 +695,8 @@ def eval_python_expression(simulation, value, pathstr, safe_mode=False):
     eval_locals['ndim'] = simulation.ndim
 
     try:
-        value = eval(expr, globals(), eval_locals)
+        code = compile_python_expression(expr)
+        value = eval(code, globals(), eval_locals)
     except Exception:
         simulation.log.error('Cannot evaluate python code for %s' % pathstr)
         simulation.log.error('Python code is %s' % expr)
@@ -9,6 +9,7 @@ XDMF_WRITE_INTERVAL = 0
 HDF5_WRITE_INTERVAL = 0
 LVTK_WRITE_INTERVAL = 0
 SAVE_RESTART_AT_END = True
+HDF5_ASYNC = False
 
 
 class InputOutputHandling:
@@ -118,6 +119,9 @@ class InputOutputHandling:
             return
 
         sim = self.simulation
+        self.restart.wait_for_writes()
+        self._handle_finished_restart_writes()
+
         if self.last_savepoint_is_checkpoint:
             # Shutting down, but ready to restart from checkpoint
             self.write_restart_file()
@@ -145,6 +149,9 @@ class InputOutputHandling:
         if sim.restarted and sim.timestep_restart == 0:
             return
 
+        # Handle restart files that have been written in the background
+        self._handle_finished_restart_writes()
+
         # Call the output functions at the right intervals
         for func, interval_inp_key, default_interval in self._plotters:
             # Check this every timestep, it might change
@@ -164,7 +171,31 @@ class InputOutputHandling:
         direct calls to write_restart_file ...
         """
         sim = self.simulation
+        if sim.input.get_value('output/hdf5_async', HDF5_ASYNC, 'bool'):
+            # The file is handled in _savepoint_written() when it is complete
+            with dolfin.Timer('Ocellaris save hdf5'):
+                self.restart.write(asynchronous=True)
+            return
+
         h5_file_name = self.write_restart_file()
+        self._savepoint_written(h5_file_name)
+
+    def _handle_finished_restart_writes(self):
+        """
+        Check for save point files that the asynchronous writer has finished
+        """
+        for h5_file_name in self.restart.finished_writes():
+            self.simulation.log.info('Finished writing HDF5 restart file %s' % h5_file_name)
+            self._savepoint_written(h5_file_name)
+
+    def _savepoint_written(self, h5_file_name):
+        """
+        A save point file has been completely written to disk
+        """
+        sim = self.simulation
+
+        # The profile is written along with the save points
+        sim.profiler.write()
 
         # Write was successfull (no exception) -> delete previous files
         if sim.input.get_value('output/hdf5_only_store_latest', False, 'bool'):
@@ -173,7 +204,7 @@ class InputOutputHandling:
                     'Deleting previous save point file %r'
                     % self.prev_savepoint_file_name
                 )
-                os.unlink(self.prev_savepoint_file_name)
+                self.restart.delete_file(self.prev_savepoint_file_name)
             self.prev_savepoint_file_name = h5_file_name
 
     def write_restart_file(self, h5_file_name=None):
@@ -1,9 +1,56 @@
+import os
 import re
+import glob
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, Future
 import yaml
 import numpy
 import h5py
 import dolfin
-from ocellaris.utils import ocellaris_error
+from ocellaris.utils import ocellaris_error, get_owned_cell_dofs
+
+
+# Postfix for restart files that are being written by the asynchronous writer
+PARTIAL_FILE_POSTFIX = '.partial'
+
+# Name of the per process binary files that hold the function data written
+# by the asynchronous writer, formatted with the restart file name and rank
+PART_FILE_PATTERN = '%s.part%05d'
+
+# Columns of the part file index stored for each function. There is one row
+# per process and all offsets are in bytes
+PART_INDEX_COLUMNS = (
+    'layout_file',
+    'cells_offset',
+    'cell_dofs_offset',
+    'num_cells',
+    'cell_size',
+    'vector_file',
+    'vector_offset',
+    'vector_size',
+    'dof_start',
+)
+(
+    LAYOUT_FILE,
+    CELLS_OFFSET,
+    CELL_DOFS_OFFSET,
+    NUM_CELLS,
+    CELL_SIZE,
+    VECTOR_FILE,
+    VECTOR_OFFSET,
+    VECTOR_SIZE,
+    DOF_START,
+) = range(len(PART_INDEX_COLUMNS))
+
+# The values of the layout_file and vector_file columns
+IN_SAVEPOINT_PART = 0
+IN_RUN_PART = 1
+
+# Default values, can be changed in the input file
+RESTART_FILE_FORMAT = 2
+
+# Chunk size for the appended log data set in restart format 3 run files
+LOG_CHUNK_SIZE = 2 ** 16
 
 
 class RestartFileIO:
@@ -16,6 +63,16 @@ class RestartFileIO:
         self.simulation = simulation
         self.persisted_python_data = persisted_python_data
 
+        # Used when writing restart files asynchronously
+        self._async_executor = None
+        self._pending_writes = []
+        self._finished_writes = []
+
+        # Used when writing restart files on format 3. The state describes
+        # the contents of the run part file of this process
+        self._run_file_name = None
+        self._run_file_state = None
+
     def is_restart_file(self, file_name):
         """
         Is the given file an Ocellaris restart file
@@ -31,9 +88,13 @@ class RestartFileIO:
         except Exception:
             return False
 
-    def write(self, h5_file_name=None):
+    def write(self, h5_file_name=None, asynchronous=False):
         """
         Write fields to HDF5 file to support restarting the solver
+
+        If asynchronous is True the function values are copied and written
+        to a part file by a background thread on each process. The file is
+        given a temporary name until it is complete, see finished_writes()
         """
         sim = self.simulation
 
@@ -43,27 +104,32 @@ class RestartFileIO:
             )
             h5_file_name = h5_file_name % sim.timestep
 
+        file_format = sim.input.get_value(
+            'output/restart_file_format', RESTART_FILE_FORMAT, 'int'
+        )
+        if file_format == 3:
+            return self._write_incremental(h5_file_name, asynchronous)
+        elif file_format != 2:
+            ocellaris_error(
+                'Unsupported restart file format',
+                'Cannot write restart_file_format %r, supported formats are 2 and 3'
+                % file_format,
+            )
+
+        if asynchronous:
+            return self._write_async(h5_file_name)
+
         # Write dolfin objects using dolfin.HDF5File
         sim.log.info('Creating HDF5 restart file %s' % h5_file_name)
         comm = sim.data['mesh'].mpi_comm()
         with dolfin.HDF5File(comm, h5_file_name, 'w') as h5:
-            # Write mesh
-            h5.write(sim.data['mesh'], '/mesh')
-
-            # Write mesh facet regions (from mesh generator)
-            mfr = sim.data['mesh_facet_regions']
-            if mfr is not None:
-                h5.write(mfr, '/mesh_facet_regions')
+            self._write_mesh(h5)
 
             # Write functions, sorted to ensure deterministic output order
             funcnames = []
-            skip = {'coupled'}  # Skip these functions
-            funcs = sorted(sim.data.items())
-            for name, value in funcs:
-                if isinstance(value, dolfin.Function) and name not in skip:
-                    assert name not in funcnames
-                    h5.write(value, '/%s' % name)
-                    funcnames.append(name)
+            for name, value in self._get_functions():
+                h5.write(value, '/%s' % name)
+                funcnames.append(name)
 
         # Only write metadata on root process
         # Important: no collective operations below this point!
@@ -73,67 +139,320 @@ class RestartFileIO:
             return h5_file_name
 
         # Write numpy objects and metadata using h5py.File
+        metadata = self._get_metadata(funcnames)
         with h5py.File(h5_file_name, 'r+') as hdf:
-            # Metadata
-            meta = hdf.create_group('ocellaris')
-            meta.attrs['time'] = sim.time
-            meta.attrs['iteration'] = sim.timestep
-            meta.attrs['dt'] = sim.dt
-            meta.attrs['restart_file_format'] = 2
-
-            # Functions to save strings
-            string_dt = h5py.special_dtype(vlen=str)
-
-            def np_string(root, name, strdata):
-                np_data = numpy.array(str(strdata).encode('utf8'), dtype=object)
-                root.create_dataset(name, data=np_data, dtype=string_dt)
-
-            def np_stringlist(root, name, strlist):
-                np_list = numpy.array(
-                    [str(s).encode('utf8') for s in strlist], dtype=object
-                )
-                root.create_dataset(name, data=np_list, dtype=string_dt)
-
-            # List of names
-            repnames = list(sim.reporting.timestep_xy_reports.keys())
-            np_stringlist(meta, 'function_names', funcnames)
-            np_stringlist(meta, 'report_names', repnames)
-
-            # Save the current input and the full log file
-            np_string(meta, 'input_file', sim.input)
-            np_string(meta, 'full_log', sim.log.get_full_log())
-
-            # Save reports
-            reps = hdf.create_group('reports')
-            reps['timesteps'] = numpy.array(sim.reporting.timesteps, dtype=float)
-            for rep_name, values in sim.reporting.timestep_xy_reports.items():
-                reps[rep_name] = numpy.array(values, dtype=float)
-
-            # Save persistent data dictionaries
-            pdd = hdf.create_group('ocellaris_data')
-            i = 0
-            for name, data in self.persisted_python_data.items():
-                # Get stripped down data with only basic data types
-                data2 = {}
-                for k, v in data.items():
-                    if is_basic_datatype(k) and is_basic_datatype(v):
-                        data2[k] = v
-
-                if not data2:
-                    # no basic data to store, skip this dict
-                    continue
-
-                # Convert basic data type data to YAML format
-                data3 = yaml.dump(data2)
-
-                pdi = pdd.create_group('data_%02d' % i)
-                np_string(pdi, 'name', name)
-                np_string(pdi, 'data', data3)
-                i += 1
+            write_metadata(hdf, metadata)
 
         comm.barrier()
         return h5_file_name
 
+    def _write_mesh(self, h5):
+        """
+        Write the mesh and the mesh facet regions to an open dolfin.HDF5File
+        """
+        sim = self.simulation
+
+        # Write mesh
+        h5.write(sim.data['mesh'], '/mesh')
+
+        # Write mesh facet regions (from mesh generator)
+        mfr = sim.data['mesh_facet_regions']
+        if mfr is not None:
+            h5.write(mfr, '/mesh_facet_regions')
+
+    def _get_functions(self):
+        """
+        Get the (name, function) pairs that should be saved in restart files,
+        sorted to ensure deterministic output order
+        """
+        funcs = []
+        skip = {'coupled'}  # Skip these functions
+        for name, value in sorted(self.simulation.data.items()):
+            if isinstance(value, dolfin.Function) and name not in skip:
+                funcs.append((name, value))
+        return funcs
+
+    def _get_metadata(self, funcnames):
+        """
+        Make a copy of the simulation metadata that is saved in restart files
+        """
+        sim = self.simulation
+        metadata = {
+            'time': sim.time,
+            'iteration': sim.timestep,
+            'dt': sim.dt,
+            'function_names': list(funcnames),
+            'input_file': str(sim.input),
+            'full_log': sim.log.get_full_log(),
+            'report_timesteps': numpy.array(sim.reporting.timesteps, dtype=float),
+            'reports': [
+                (rep_name, numpy.array(sim.reporting.get_report(rep_name)[1], dtype=float))
+                for rep_name in sim.reporting.timestep_xy_reports
+            ],
+            'persisted_data': [],
+        }
+
+        # Persistent data dictionaries
+        for name, data in self.persisted_python_data.items():
+            # Get stripped down data with only basic data types
+            data2 = {}
+            for k, v in data.items():
+                if is_basic_datatype(k) and is_basic_datatype(v):
+                    data2[k] = v
+
+            if not data2:
+                # no basic data to store, skip this dict
+                continue
+
+            # Convert basic data type data to YAML format
+            metadata['persisted_data'].append((name, yaml.dump(data2)))
+
+        return metadata
+
+    def _write_async(self, h5_file_name):
+        """
+        Write the restart file in a background thread on each process. The
+        mesh is written first (collective), then each process copies its
+        owned function values into a per process part file that is written
+        by its background thread. The root process writes the metadata and
+        the index of the part files to the HDF5 file before returning
+        """
+        sim = self.simulation
+        comm = sim.data['mesh'].mpi_comm()
+        partial_file_name = h5_file_name + PARTIAL_FILE_POSTFIX
+
+        # Limit the memory use by only having one pending write at a time
+        self.wait_for_writes()
+
+        sim.log.info('Creating HDF5 restart file %s (asynchronous)' % h5_file_name)
+        with dolfin.HDF5File(comm, partial_file_name, 'w') as h5:
+            self._write_mesh(h5)
+
+        # Snapshot the local function values and plan the part file
+        part = PartFile(PART_FILE_PATTERN % (h5_file_name, comm.rank))
+        functions = []
+        for name, func in self._get_functions():
+            cells, cell_dofs = get_function_layout(func.function_space())
+            vector = func.vector().get_local()
+            row = numpy.zeros(len(PART_INDEX_COLUMNS), numpy.int64)
+            row[LAYOUT_FILE] = IN_SAVEPOINT_PART
+            row[CELLS_OFFSET] = part.add(cells)
+            row[CELL_DOFS_OFFSET] = part.add(cell_dofs)
+            row[NUM_CELLS], row[CELL_SIZE] = cell_dofs.shape
+            row[VECTOR_FILE] = IN_SAVEPOINT_PART
+            row[VECTOR_OFFSET] = part.add(vector)
+            row[VECTOR_SIZE] = vector.size
+            row[DOF_START] = func.vector().local_range()[0]
+            functions.append((name, func.function_space().element().signature(), row))
+
+        # The root process writes the part index of all processes
+        index = gather_part_index(comm, [row for _, _, row in functions])
+        if comm.rank == 0:
+            metadata = self._get_metadata([name for name, _, _ in functions])
+            with h5py.File(partial_file_name, 'r+') as hdf:
+                for i, (name, signature, _) in enumerate(functions):
+                    write_part_index(hdf, name, signature, index[:, i])
+                write_metadata(hdf, metadata)
+
+        self._submit_write(h5_file_name, partial_file_name, [part], asynchronous=True)
+        return h5_file_name
+
+    def _submit_write(self, h5_file_name, partial_file_name, parts, asynchronous):
+        """
+        Write the part files in the background writer thread, or right away
+        if not asynchronous. The partial file is renamed to h5_file_name by
+        _check_writes() when the part files are written on all processes
+        """
+        if asynchronous:
+            if self._async_executor is None:
+                self._async_executor = ThreadPoolExecutor(max_workers=1)
+            future = self._async_executor.submit(write_part_files, parts)
+        else:
+            future = Future()
+            try:
+                future.set_result(write_part_files(parts))
+            except Exception as e:
+                future.set_exception(e)
+
+        self._pending_writes.append((h5_file_name, partial_file_name, future, asynchronous))
+        if not asynchronous:
+            self._check_writes(wait=True)
+
+    def _write_incremental(self, h5_file_name, asynchronous):
+        """
+        Write a restart file on format 3. The mesh and the log are stored in
+        a run file that is written once per run (the log is appended). The
+        function space layouts and functions that do not change are written
+        once to the run part file of each process. Each save point file only
+        contains the time varying function values in its part files
+
+        The function values are hashed per process and the hashes are
+        combined over all processes so that all processes agree on which
+        functions have changed
+        """
+        sim = self.simulation
+        comm = sim.data['mesh'].mpi_comm()
+        partial_file_name = h5_file_name + PARTIAL_FILE_POSTFIX
+
+        # The run part files can only be modified by one writer at a time
+        self.wait_for_writes()
+
+        sim.log.info('Creating HDF5 restart file %s (format 3)' % h5_file_name)
+        if self._run_file_name is None:
+            run_file_name = sim.input.get_output_file_path(
+                'output/hdf5_run_file_name', '_restart_run_%08d.h5'
+            )
+            run_file_name = run_file_name % sim.timestep
+            sim.log.info('    Creating HDF5 restart run file %s' % run_file_name)
+            with dolfin.HDF5File(comm, run_file_name, 'w') as h5:
+                self._write_mesh(h5)
+            self._run_file_name = run_file_name
+            self._run_file_state = {'part_size': 0, 'layouts': {}, 'static': {}, 'prev': {}}
+        state = self._run_file_state
+
+        # A moving mesh must be stored in each save point file
+        mesh_in_savepoint = sim.mesh_morpher is not None and sim.mesh_morpher.active
+        if mesh_in_savepoint:
+            with dolfin.HDF5File(comm, partial_file_name, 'w') as h5:
+                self._write_mesh(h5)
+
+        # Snapshot the local function values and plan the part files
+        part = PartFile(PART_FILE_PATTERN % (h5_file_name, comm.rank))
+        run_part_file_name = PART_FILE_PATTERN % (self._run_file_name, comm.rank)
+        run_part = PartFile(run_part_file_name, state['part_size'])
+        functions = []
+        written = {}
+        for name, func in self._get_functions():
+            V = func.function_space()
+            cells, cell_dofs = get_function_layout(V)
+            vector = func.vector().get_local()
+            row = numpy.zeros(len(PART_INDEX_COLUMNS), numpy.int64)
+
+            # Function space layout, stored once in the run part file
+            layout_key = get_layout_key(comm, V)
+            if layout_key not in state['layouts']:
+                state['layouts'][layout_key] = (run_part.add(cells), run_part.add(cell_dofs))
+            row[LAYOUT_FILE] = IN_RUN_PART
+            row[CELLS_OFFSET], row[CELL_DOFS_OFFSET] = state['layouts'][layout_key]
+            row[NUM_CELLS], row[CELL_SIZE] = cell_dofs.shape
+
+            vec_hash = global_hash(comm, vector)
+            static = state['static'].get(name)
+            if static is None or static[0] != vec_hash:
+                # Functions that did not change since the previous save point
+                # are stored in the run part file and referenced from later
+                # save points
+                if state['prev'].get(name) == vec_hash:
+                    static = state['static'][name] = (vec_hash, run_part.add(vector))
+            state['prev'][name] = vec_hash
+
+            if static is not None and static[0] == vec_hash:
+                # Unchanged function, the values are in the run part file
+                row[VECTOR_FILE] = IN_RUN_PART
+                row[VECTOR_OFFSET] = static[1]
+            else:
+                # Functions with equal values in a save point are stored once
+                if vec_hash not in written:
+                    written[vec_hash] = part.add(vector)
+                row[VECTOR_FILE] = IN_SAVEPOINT_PART
+                row[VECTOR_OFFSET] = written[vec_hash]
+            row[VECTOR_SIZE] = vector.size
+            row[DOF_START] = func.vector().local_range()[0]
+            functions.append((name, V.element().signature(), row))
+        state['part_size'] = run_part.size
+
+        # The root process appends to the log and writes the part index
+        index = gather_part_index(comm, [row for _, _, row in functions])
+        if comm.rank == 0:
+            metadata = self._get_metadata([name for name, _, _ in functions])
+            full_log = metadata.pop('full_log').encode('utf8')
+            metadata['restart_file_format'] = 3
+            metadata['run_file'] = os.path.basename(self._run_file_name)
+            metadata['log_length'] = len(full_log)
+            append_run_file_log(self._run_file_name, full_log)
+
+            mode = 'r+' if mesh_in_savepoint else 'w'
+            with h5py.File(partial_file_name, mode) as hdf:
+                for i, (name, signature, _) in enumerate(functions):
+                    write_part_index(hdf, name, signature, index[:, i])
+                write_metadata(hdf, metadata)
+
+        self._submit_write(h5_file_name, partial_file_name, [part, run_part], asynchronous)
+        return h5_file_name
+
+    def finished_writes(self):
+        """
+        Return the names of restart files that have been completely written
+        by the asynchronous writer since the last call. Errors in the writer
+        are raised on all processes. This is a collective operation
+        """
+        self._check_writes(wait=False)
+        finished = self._finished_writes
+        self._finished_writes = []
+        return finished
+
+    def wait_for_writes(self):
+        """
+        Wait for any pending asynchronous writes to finish. The finished files
+        are still reported by the next call to finished_writes(). This is a
+        collective operation
+        """
+        for h5_file_name, _, future, _ in self._pending_writes:
+            if not future.done():
+                self.simulation.log.info('Waiting for HDF5 restart file %s' % h5_file_name)
+        self._check_writes(wait=True)
+
+    def _check_writes(self, wait):
+        """
+        Rename the partial restart files that have been written on all
+        processes, in the order they were started. An error in the writer on
+        any process is raised on all processes so that no process continues
+        into the next collective operation alone
+        """
+        comm = self.simulation.data['mesh'].mpi_comm()
+        renamed = False
+        while self._pending_writes:
+            h5_file_name, partial_file_name, future, report = self._pending_writes[0]
+            if wait:
+                # Blocks until the write is done
+                future.exception()
+
+            error = None
+            if future.done() and future.exception() is not None:
+                exc = future.exception()
+                error = '%s: %s' % (type(exc).__name__, exc)
+            states = comm.allgather((future.done(), error))
+
+            errors = ['process %d: %s' % (r, err) for r, (_, err) in enumerate(states) if err]
+            if errors:
+                self._pending_writes.pop(0)
+                ocellaris_error(
+                    'Error writing HDF5 restart file',
+                    'Could not write %s\n%s' % (h5_file_name, '\n'.join(errors)),
+                )
+            if not all(done for done, _ in states):
+                break
+
+            self._pending_writes.pop(0)
+            if comm.rank == 0 and partial_file_name is not None:
+                os.replace(partial_file_name, h5_file_name)
+            renamed = True
+            if report:
+                self._finished_writes.append(h5_file_name)
+
+        # Make sure the renamed files are visible to all processes
+        if renamed:
+            comm.barrier()
+
+    def delete_file(self, h5_file_name):
+        """
+        Delete a restart file and its part files. Only call this on the root
+        process
+        """
+        for part_file_name in glob.glob(glob.escape(h5_file_name) + '.part*'):
+            os.unlink(part_file_name)
+        os.unlink(h5_file_name)
+
     def read_metadata(self, h5_file_name, function_details=False):
         """
         Read HDF5 restart file metadata
@@ -149,12 +468,12 @@ class RestartFileIO:
 
             meta = hdf['ocellaris']
             restart_file_version = meta.attrs['restart_file_format']
-            if restart_file_version != 2:
+            if restart_file_version not in (2, 3):
                 ocellaris_error(
                     'Error reading restart file',
                     'Restart file version is %d, this version of Ocellaris only '
                     % restart_file_version
-                    + 'supports version 2',
+                    + 'supports version 2 and 3',
                 )
 
             t = float(meta.attrs['time'])
@@ -166,11 +485,13 @@ class RestartFileIO:
             # Read function signatures
             if function_details:
                 signatures = {}
+                layouts = {}
                 for fname in funcnames:
                     signatures[fname] = hdf[fname].attrs['signature']
+                    layouts[fname] = hdf[fname].attrs.get('layout', 'dolfin')
 
         if function_details:
-            return funcnames, signatures
+            return funcnames, signatures, layouts
         else:
             return t, it, dt, inpdata, funcnames
 
@@ -182,7 +503,8 @@ class RestartFileIO:
         t, it, dt, inpdata, funcnames = self.read_metadata(h5_file_name)
 
         sim = self.simulation
-        h5 = dolfin.HDF5File(dolfin.MPI.comm_world, h5_file_name, 'r')
+        mesh_file_name = get_mesh_file_name(h5_file_name)
+        h5 = dolfin.HDF5File(dolfin.MPI.comm_world, mesh_file_name, 'r')
 
         # This flag is used in sim.setup() to to skip mesh creation
         # and may be used by user code etc
@@ -212,16 +534,26 @@ class RestartFileIO:
         if read_results:
             sim.log.info('Reading fields from restart file %r' % h5_file_name)
             sim.timestep = it
+            _, _, layouts = self.read_metadata(h5_file_name, function_details=True)
 
-            # Read result field functions
+            # Read result field functions stored by dolfin.HDF5File
             for name in funcnames:
-                sim.log.info('    Function %s' % name)
-                h5.read(sim.data[name], '/%s' % name)
+                if layouts[name] == 'dolfin':
+                    sim.log.info('    Function %s' % name)
+                    h5.read(sim.data[name], '/%s' % name)
 
             h5.close()  # Close dolfin.HDF5File
 
-            # Read persisted data dictionaries with h5py
             with h5py.File(h5_file_name, 'r') as hdf:
+                # Read result field functions stored by Ocellaris (asynchronous writer
+                # and restart file format 3)
+                part_files = RestartPartFiles(h5_file_name)
+                for name in funcnames:
+                    if layouts[name] != 'dolfin':
+                        sim.log.info('    Function %s' % name)
+                        read_function_data(hdf[name], sim.data[name], part_files)
+
+                # Read persisted data dictionaries with h5py
                 pdd = hdf.get('ocellaris_data', {})
                 for pdi in pdd.values():
                     name = pdi['name'].value
@@ -231,6 +563,8 @@ class RestartFileIO:
                     data2 = yaml.load(data)
                     data3 = self.persisted_python_data.setdefault(name, {})
                     data3.update(data2)
+        else:
+            h5.close()
 
     def read_functions(self, h5_file_name):
         """
@@ -239,10 +573,11 @@ class RestartFileIO:
         None will be returned for these
         """
         # Check file format and read metadata
-        funcnames, signatures = self.read_metadata(h5_file_name, function_details=True)
+        funcnames, signatures, layouts = self.read_metadata(h5_file_name, function_details=True)
 
         # Read mesh data
-        h5 = dolfin.HDF5File(dolfin.MPI.comm_world, h5_file_name, 'r')
+        mesh_file_name = get_mesh_file_name(h5_file_name)
+        h5 = dolfin.HDF5File(dolfin.MPI.comm_world, mesh_file_name, 'r')
         mesh = dolfin.Mesh()
         h5.read(mesh, '/mesh', False)
 
@@ -269,13 +604,318 @@ class RestartFileIO:
         funcs = {}
         for name in funcnames:
             f = mk_func(name)
-            if f is not None:
+            if f is not None and layouts[name] == 'dolfin':
                 h5.read(f, '/%s' % name)
             funcs[name] = f
         h5.close()
+
+        with h5py.File(h5_file_name, 'r') as hdf:
+            part_files = RestartPartFiles(h5_file_name)
+            for name in funcnames:
+                if funcs[name] is not None and layouts[name] != 'dolfin':
+                    read_function_data(hdf[name], funcs[name], part_files)
         return funcs
 
 
+def write_metadata(hdf, metadata):
+    """
+    Write numpy objects and metadata to an open h5py.File
+    """
+    # Metadata
+    meta = hdf.create_group('ocellaris')
+    meta.attrs['time'] = metadata['time']
+    meta.attrs['iteration'] = metadata['iteration']
+    meta.attrs['dt'] = metadata['dt']
+    meta.attrs['restart_file_format'] = metadata.get('restart_file_format', 2)
+    if 'run_file' in metadata:
+        meta.attrs['run_file'] = metadata['run_file']
+        meta.attrs['log_length'] = metadata['log_length']
+
+    # List of names
+    repnames = [rep_name for rep_name, _ in metadata['reports']]
+    np_stringlist(meta, 'function_names', metadata['function_names'])
+    np_stringlist(meta, 'report_names', repnames)
+
+    # Save the current input and the full log file
+    np_string(meta, 'input_file', metadata['input_file'])
+    if 'full_log' in metadata:
+        np_string(meta, 'full_log', metadata['full_log'])
+
+    # Save reports
+    reps = hdf.create_group('reports')
+    reps['timesteps'] = metadata['report_timesteps']
+    for rep_name, values in metadata['reports']:
+        reps[rep_name] = values
+
+    # Save persistent data dictionaries
+    pdd = hdf.create_group('ocellaris_data')
+    for i, (name, data) in enumerate(metadata['persisted_data']):
+        pdi = pdd.create_group('data_%02d' % i)
+        np_string(pdi, 'name', name)
+        np_string(pdi, 'data', data)
+
+
+def np_string(root, name, strdata):
+    """
+    Save a string to an h5py group
+    """
+    string_dt = h5py.special_dtype(vlen=str)
+    np_data = numpy.array(str(strdata).encode('utf8'), dtype=object)
+    root.create_dataset(name, data=np_data, dtype=string_dt)
+
+
+def np_stringlist(root, name, strlist):
+    """
+    Save a list of strings to an h5py group
+    """
+    string_dt = h5py.special_dtype(vlen=str)
+    np_list = numpy.array([str(s).encode('utf8') for s in strlist], dtype=object)
+    root.create_dataset(name, data=np_list, dtype=string_dt)
+
+
+def get_function_layout(V):
+    """
+    Get the global cell numbers of the owned cells and the global dofs of
+    each of these cells for the function space V. This only depends on the
+    mesh topology and the dofmap, so the result is cached on V
+    """
+    layout = getattr(V, '_ocellaris_restart_layout', None)
+    if layout is not None:
+        return layout
+
+    mesh = V.mesh()
+    tdim = mesh.topology().dim()
+    num_cells = mesh.topology().ghost_offset(tdim)
+    global_cells = numpy.array(mesh.topology().global_indices(tdim)[:num_cells], numpy.int64)
+    local_to_global = numpy.array(V.dofmap().tabulate_local_to_global_dofs(), numpy.int64)
+    cell_dofs = local_to_global[get_owned_cell_dofs(V)]
+
+    layout = global_cells, cell_dofs
+    V._ocellaris_restart_layout = layout
+    return layout
+
+
+def get_layout_key(comm, V):
+    """
+    Get a key that identifies the layout of the function space V on all
+    processes. This is a collective operation the first time it is called
+    for V, the result is cached on V
+    """
+    key = getattr(V, '_ocellaris_restart_layout_key', None)
+    if key is None:
+        cells, cell_dofs = get_function_layout(V)
+        key = global_hash(comm, V.element().signature().encode('utf8'), cells, cell_dofs)
+        V._ocellaris_restart_layout_key = key
+    return key
+
+
+def global_hash(comm, *data):
+    """
+    Hash the local data on each process and combine the hashes of all
+    processes into one hash that is the same on all processes. This is
+    a collective operation
+    """
+    hasher = hashlib.sha1()
+    for d in data:
+        hasher.update(d if isinstance(d, bytes) else numpy.ascontiguousarray(d).tobytes())
+    hashes = comm.allgather(hasher.hexdigest())
+    return hashlib.sha1(' '.join(hashes).encode('ascii')).hexdigest()
+
+
+class PartFile:
+    def __init__(self, file_name, size=0):
+        """
+        A per process binary file with raw array data. The arrays are added
+        on the main thread, which gives their byte offsets in the file, and
+        written later by write_part_files() in the background writer thread.
+        Data before the given initial size is kept when the file is written
+        """
+        self.file_name = file_name
+        self.start = size
+        self.size = size
+        self.arrays = []
+
+    def add(self, arr):
+        """
+        Add an array to be written and return its offset in the file
+        """
+        offset = self.size
+        arr = numpy.ascontiguousarray(arr)
+        self.arrays.append(arr)
+        self.size += arr.nbytes
+        return offset
+
+    def write(self):
+        mode = 'r+b' if self.start else 'wb'
+        with open(self.file_name, mode) as f:
+            f.seek(self.start)
+            f.truncate()
+            for arr in self.arrays:
+                arr.tofile(f)
+        self.start = self.size
+        self.arrays = []
+
+
+def write_part_files(parts):
+    """
+    Write the arrays that have been added to the part files. This runs in
+    the background writer thread and does no HDF5 or MPI operations. NumPy
+    releases the GIL while writing the array data
+    """
+    for part in parts:
+        part.write()
+
+
+def gather_part_index(comm, rows):
+    """
+    Gather the part file index rows of all functions on the root process.
+    Returns an array of shape (num_processes, num_functions, num_columns)
+    on the root process and None on the other processes
+    """
+    local = numpy.array(rows, numpy.int64).reshape((len(rows), len(PART_INDEX_COLUMNS)))
+    index = comm.gather(local)
+    if comm.rank == 0:
+        return numpy.array(index, numpy.int64)
+
+
+def write_part_index(hdf, name, signature, index):
+    """
+    Write the part file index of a function to an open h5py.File
+    """
+    grp = hdf.create_group(name)
+    grp.attrs['signature'] = numpy.bytes_(signature.encode('utf8'))
+    grp.attrs['layout'] = 'ocellaris_parts'
+    grp['parts'] = index
+    grp['parts'].attrs['columns'] = numpy.array([c.encode('utf8') for c in PART_INDEX_COLUMNS])
+
+
+def append_run_file_log(run_file_name, full_log):
+    """
+    Append the new part of the log to a chunked data set in the run file.
+    Only call this on the root process
+    """
+    with h5py.File(run_file_name, 'r+') as run:
+        if 'log' not in run:
+            run.create_dataset(
+                'log', shape=(0,), maxshape=(None,), dtype=numpy.uint8, chunks=(LOG_CHUNK_SIZE,)
+            )
+        log = run['log']
+        start = log.shape[0]
+        if len(full_log) < start:
+            start = 0  # the log has been reset, rewrite it
+        log.resize((len(full_log),))
+        log[start:] = numpy.frombuffer(full_log[start:], dtype=numpy.uint8)
+
+
+def get_run_file_name(h5_file_name):
+    """
+    Return the name of the run file belonging to a restart file on format 3,
+    or None if the restart file is self contained (format 2)
+    """
+    with h5py.File(h5_file_name, 'r') as hdf:
+        meta = hdf['ocellaris']
+        if 'run_file' not in meta.attrs:
+            return None
+        run_file = meta.attrs['run_file']
+        if isinstance(run_file, bytes):
+            run_file = run_file.decode('utf8')
+    return os.path.join(os.path.dirname(os.path.abspath(h5_file_name)), run_file)
+
+
+def get_mesh_file_name(h5_file_name):
+    """
+    Return the name of the file containing the mesh for the given restart file
+    """
+    with h5py.File(h5_file_name, 'r') as hdf:
+        if 'mesh' in hdf:
+            return h5_file_name
+    run_file_name = get_run_file_name(h5_file_name)
+    return run_file_name if run_file_name is not None else h5_file_name
+
+
+class RestartPartFiles:
+    def __init__(self, h5_file_name):
+        """
+        Read only access to the part files belonging to a restart file. The
+        files are memory mapped when they are first used so that only the
+        data that is needed on this process is read from disk
+        """
+        self.file_names = {IN_SAVEPOINT_PART: h5_file_name}
+        run_file_name = get_run_file_name(h5_file_name)
+        if run_file_name is not None:
+            self.file_names[IN_RUN_PART] = run_file_name
+        self._buffers = {}
+
+    def get_array(self, kind, rank, offset, dtype, shape):
+        """
+        Return a view of an array stored in the part file of the given kind
+        (IN_SAVEPOINT_PART or IN_RUN_PART) written by the given process
+        """
+        key = (kind, rank)
+        if key not in self._buffers:
+            file_name = PART_FILE_PATTERN % (self.file_names[kind], rank)
+            if os.path.getsize(file_name) > 0:
+                buf = numpy.memmap(file_name, dtype=numpy.uint8, mode='r')
+            else:
+                buf = numpy.zeros(0, numpy.uint8)
+            self._buffers[key] = buf
+
+        nbytes = int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize
+        offset = int(offset)
+        return self._buffers[key][offset : offset + nbytes].view(dtype).reshape(shape)
+
+
+def read_function_data(grp, func, part_files):
+    """
+    Read function values stored in part files by the asynchronous writer or
+    on restart file format 3 into the given function. The part file index is
+    in the given h5py group
+
+    The mesh must have the same global cell numbering as the mesh the
+    function was written from, but the partitioning can be different
+    """
+    V = func.function_space()
+    global_cells, _ = get_function_layout(V)
+    local_cell_dofs = get_owned_cell_dofs(V)
+    index = grp['parts'][()]
+
+    # Find the global dofs in the file of the local cells
+    file_cell_dofs = numpy.zeros(local_cell_dofs.shape, numpy.int64)
+    for rank, row in enumerate(index):
+        if row[NUM_CELLS] == 0 or global_cells.size == 0:
+            continue
+        kind = row[LAYOUT_FILE]
+        cells = part_files.get_array(kind, rank, row[CELLS_OFFSET], numpy.int64, row[NUM_CELLS])
+        order = numpy.argsort(cells)
+        pos = numpy.searchsorted(cells[order], global_cells)
+        pos[pos == cells.size] = 0
+        match = cells[order[pos]] == global_cells
+        if not match.any():
+            continue
+        shape = (row[NUM_CELLS], row[CELL_SIZE])
+        cell_dofs = part_files.get_array(kind, rank, row[CELL_DOFS_OFFSET], numpy.int64, shape)
+        file_cell_dofs[match] = cell_dofs[order[pos[match]]]
+
+    # Read the values from the part files of the processes that owned the dofs
+    values = numpy.zeros(local_cell_dofs.shape, float)
+    dof_starts = index[:, DOF_START]
+    owners = numpy.searchsorted(dof_starts, file_cell_dofs, side='right') - 1
+    for rank in numpy.unique(owners):
+        row = index[rank]
+        kind = row[VECTOR_FILE]
+        vector = part_files.get_array(kind, rank, row[VECTOR_OFFSET], float, row[VECTOR_SIZE])
+        mask = owners == rank
+        values[mask] = vector[file_cell_dofs[mask] - row[DOF_START]]
+
+    # Insert into the owned part of the function vector
+    vec = func.vector()
+    arr = vec.get_local()
+    owned = local_cell_dofs < arr.size
+    arr[local_cell_dofs[owned]] = values[owned]
+    vec.set_local(arr)
+    vec.apply('insert')
+
+
 def is_basic_datatype(value):
     """
     We only save "basic" datatypes like ints, floats, strings and
@@ -0,0 +1,243 @@
+import os
+import resource
+import numpy
+import dolfin
+from ocellaris.utils import timeit
+from ocellaris.utils.timer import TimingRecorder
+
+
+# Default values, can be changed in the input file
+PROFILE = False
+PROFILE_FILE_NAME = '_profile.npz'
+PROFILE_COLLECT_INTERVAL = 0
+PROFILE_INNER_ITERATIONS = False
+
+
+class Profiler(object):
+    def __init__(self, simulation):
+        """
+        Record the time spent in each region timed by the timeit decorator
+        for each time step (and optionally each inner iteration), along
+        with counters like Krylov iterations and the memory usage. The
+        minimum, mean and maximum over all processes are written to a
+        NumPy npz file that can be loaded with ocellaris_post.Results
+
+        The file contains the full history and is only written at the end
+        of the simulation and when a save point file is written, so that
+        the cost of writing it does not grow with the number of time steps
+        between save points
+        """
+        self.simulation = simulation
+        self.active = False
+        self.recorder = None
+        simulation.hooks.add_pre_simulation_hook(self.setup, 'Profiling - setup')
+
+    def setup(self):
+        sim = self.simulation
+        self.active = sim.input.get_value('output/profile', PROFILE, 'bool')
+        if not self.active:
+            return
+
+        self.file_name = sim.input.get_output_file_path(
+            'output/profile_file_name', PROFILE_FILE_NAME
+        )
+        self.collect_interval = sim.input.get_value(
+            'output/profile_collect_interval', PROFILE_COLLECT_INTERVAL, 'int'
+        )
+        inner_iterations = sim.input.get_value(
+            'output/profile_inner_iterations', PROFILE_INNER_ITERATIONS, 'bool'
+        )
+
+        get_inner_iteration = None
+        if inner_iterations:
+            get_inner_iteration = self._get_inner_iteration
+
+        self.recorder = TimingRecorder(get_inner_iteration)
+        timeit.recorder = self.recorder
+
+        # Data not yet sent to the root process, and the collected data
+        self._rows = []
+        self._collected = ProfileData()
+        sim.hooks.add_post_simulation_hook(lambda success: self.write(), 'Profiling - write')
+        sim.log.info('Writing profiling data to %s' % self.file_name)
+
+    def _get_inner_iteration(self):
+        return getattr(self.simulation.solver, 'inner_iteration', 0)
+
+    def end_timestep(self):
+        """
+        Store the timings of the current time step. Called at the very end
+        of each time step on all processes
+        """
+        if not self.active:
+            return
+        sim = self.simulation
+        totals, inner, counters = self.recorder.reset()
+        self._rows.append((sim.timestep, sim.time, totals, inner, counters, get_rss()))
+
+        if self.collect_interval > 0 and sim.timestep % self.collect_interval == 0:
+            self.collect()
+
+    def collect(self):
+        """
+        Send the timings that have not yet been collected to the root
+        process. This is a collective operation
+        """
+        comm = dolfin.MPI.comm_world
+        all_rows = comm.gather(self._rows)
+        self._rows = []
+        if comm.rank == 0:
+            self._collected.add_rows(all_rows)
+
+    def write(self):
+        """
+        Collect the timings on the root process and write the profile file.
+        This is a collective operation
+        """
+        if not self.active:
+            return
+        self.collect()
+        if dolfin.MPI.comm_world.rank == 0:
+            self._collected.save(self.file_name)
+
+
+class ProfileData(object):
+    def __init__(self):
+        """
+        The profiling data collected from all processes, stored on the
+        root process
+        """
+        self.num_ranks = 0
+        self.timesteps = []
+        self.times = []
+        self.regions = {}  # region name -> column
+        self.counter_names = {}  # counter name -> column
+        self.wall = []  # per time step (nregions, 4) arrays: min, mean, max, calls
+        self.counters = []  # per time step (ncounters, 3) arrays: min, mean, max
+        self.rss = []  # per time step (min, mean, max)
+        self.inner = []  # (timestep, inner iteration, region column, min, mean, max)
+
+    def add_rows(self, all_rows):
+        """
+        Add rows from all processes, all_rows[rank][i] is the i'th time
+        step from the given rank. All processes must have the same number
+        of time steps
+        """
+        num_rows = [len(rank_rows) for rank_rows in all_rows]
+        assert len(set(num_rows)) <= 1, 'Different number of profile rows %r' % num_rows
+        self.num_ranks = len(all_rows)
+        for rank_rows in zip(*all_rows):
+            timestep, t = rank_rows[0][:2]
+            self.timesteps.append(timestep)
+            self.times.append(t)
+
+            # Time spent in each region
+            wall = self._reduce(
+                self.regions, [row[2] for row in rank_rows], lambda v: v[0], lambda v: v[1]
+            )
+            self.wall.append(wall)
+
+            # Counters
+            counters = self._reduce(self.counter_names, [row[4] for row in rank_rows])
+            self.counters.append(counters)
+
+            # Memory usage
+            rss = numpy.array([row[5] for row in rank_rows], float)
+            self.rss.append((rss.min(), rss.mean(), rss.max()))
+
+            # Time spent in each region for each inner iteration
+            inner_keys = sorted(set(k for row in rank_rows for k in row[3]))
+            for key in inner_keys:
+                values = numpy.array([row[3].get(key, 0.0) for row in rank_rows])
+                col = self.regions.setdefault(key[1], len(self.regions))
+                stats = values.min(), values.mean(), values.max()
+                self.inner.append((timestep, key[0], col) + stats)
+
+    def _reduce(self, columns, dicts, get_value=lambda v: v, get_count=None):
+        """
+        Compute the min, mean and max over all processes of the values in
+        the given dictionaries (one per process). Missing values count as
+        zero. Returns an array with one row per column
+        """
+        for name in sorted(set(k for d in dicts for k in d)):
+            columns.setdefault(name, len(columns))
+
+        ncol = 4 if get_count is not None else 3
+        res = numpy.zeros((len(columns), ncol), float)
+        values = numpy.zeros((len(dicts), len(columns)), float)
+        counts = numpy.zeros(len(columns), float)
+        for i, d in enumerate(dicts):
+            for name, v in d.items():
+                col = columns[name]
+                values[i, col] = get_value(v)
+                if get_count is not None:
+                    counts[col] = max(counts[col], get_count(v))
+        if len(dicts):
+            res[:, 0] = values.min(axis=0)
+            res[:, 1] = values.mean(axis=0)
+            res[:, 2] = values.max(axis=0)
+        if get_count is not None:
+            res[:, 3] = counts
+        return res
+
+    def save(self, file_name):
+        """
+        Write the profile to a NumPy npz file, one array per column. The
+        file is first written under a temporary name and then renamed
+        """
+        nt = len(self.timesteps)
+        nreg = len(self.regions)
+        ncnt = len(self.counter_names)
+
+        wall = numpy.zeros((nt, nreg, 4), float)
+        for i, w in enumerate(self.wall):
+            wall[i, : len(w)] = w
+        counters = numpy.zeros((nt, ncnt, 3), float)
+        for i, c in enumerate(self.counters):
+            counters[i, : len(c)] = c
+        rss = numpy.array(self.rss, float).reshape((nt, 3))
+        inner = numpy.array(self.inner, float).reshape((-1, 6))
+
+        region_names = sorted(self.regions, key=self.regions.get)
+        counter_names = sorted(self.counter_names, key=self.counter_names.get)
+        data = dict(
+            num_ranks=self.num_ranks,
+            timesteps=numpy.array(self.timesteps, int),
+            time=numpy.array(self.times, float),
+            region_names=numpy.array(region_names, str),
+            wall_min=wall[:, :, 0],
+            wall_mean=wall[:, :, 1],
+            wall_max=wall[:, :, 2],
+            calls=wall[:, :, 3].astype(int),
+            counter_names=numpy.array(counter_names, str),
+            counter_min=counters[:, :, 0],
+            counter_mean=counters[:, :, 1],
+            counter_max=counters[:, :, 2],
+            rss_min=rss[:, 0],
+            rss_mean=rss[:, 1],
+            rss_max=rss[:, 2],
+            inner_timestep=inner[:, 0].astype(int),
+            inner_iteration=inner[:, 1].astype(int),
+            inner_region=inner[:, 2].astype(int),
+            inner_wall_min=inner[:, 3],
+            inner_wall_mean=inner[:, 4],
+            inner_wall_max=inner[:, 5],
+        )
+
+        tmp_file_name = file_name + '.tmp'
+        with open(tmp_file_name, 'wb') as f:
+            numpy.savez_compressed(f, **data)
+        os.replace(tmp_file_name, file_name)
+
+
+def get_rss():
+    """
+    Return the resident set size of this process in bytes. Uses /proc on
+    Linux and the maximum RSS from getrusage elsewhere
+    """
+    try:
+        with open('/proc/self/statm', 'rt') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize()
+    except (IOError, OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -3,6 +3,9 @@ from matplotlib import pyplot
 from ocellaris.utils import ocellaris_error, timeit
 
 
+NaN = float('nan')
+
+
 class Reporting(object):
     def __init__(self, simulation):
         """
@@ -39,31 +42,36 @@ class Reporting(object):
 
     def report_timestep_value(self, report_name, value):
         """
-        Add a timestep to a report
+        Add a timestep to a report. Time steps where the report has no
+        value get the value NaN
         """
         time = self.simulation.time
         if not self.timesteps or not self.timesteps[-1] == time:
             self.timesteps.append(time)
         rep = self.timestep_xy_reports.setdefault(report_name, [])
-        rep.extend([None] * (len(self.timesteps) - len(rep)))
+        rep.extend([NaN] * (len(self.timesteps) - len(rep)))
         rep[-1] = value
 
     def get_report(self, report_name):
         """
-        Get a the time series of a reported value
+        Get a the time series of a reported value. The values are NaN for
+        time steps where the report was not computed
         """
         t = self.timesteps
         rep = self.timestep_xy_reports[report_name]
-        return t[: len(rep)], rep
+        return t, rep + [NaN] * (len(t) - len(rep))
 
     @timeit.named('reporting log_timestep_reports')
     def log_timestep_reports(self):
         """
-        Write all reports for the finished time step to the log
+        Write all reports for the finished time step to the log. Reports
+        that have no value for this time step are written as nan so that
+        all report lines have the same columns, see read_log_data() in
+        ocellaris_post
         """
         info = []
-        for report_name in self.timestep_xy_reports:
-            value = self.timestep_xy_reports[report_name][-1]
+        for report_name, rep in self.timestep_xy_reports.items():
+            value = rep[-1] if len(rep) == len(self.timesteps) else NaN
             info.append('%s = %10g' % (report_name, value))
         it, t = self.simulation.timestep, self.simulation.time
         self.simulation.log.info(
@@ -87,15 +95,7 @@ class Reporting(object):
                     'Cannot plot this report, it does not exist',
                 )
 
-            abscissa = self.timesteps
-            ordinate = self.timestep_xy_reports[report_name]
-
-            if len(abscissa) != len(ordinate):
-                ocellaris_error(
-                    'Malformed report data: "%s"' % report_name,
-                    'Length of t is %d while report is %d'
-                    % (len(abscissa), len(ordinate)),
-                )
+            abscissa, ordinate = self.get_report(report_name)
 
             fig, ax, line = self.figures[report_name]
             line.set_xdata(abscissa)
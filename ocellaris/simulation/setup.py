@@ -22,6 +22,7 @@ from ocellaris.solver_parts import (
     get_known_field,
     MeshMorpher,
     add_forcing_zone,
+    setup_dt_controller,
 )
 
 
@@ -123,6 +124,9 @@ def setup_simulation(simulation):
     # Setup the solution properties
     simulation.solution_properties.setup()
 
+    # Setup the time step controller, it may depend on the solution properties
+    simulation.dt_controller = setup_dt_controller(simulation)
+
     # Setup any hooks that may be present on the input file
     setup_hooks(simulation)
 
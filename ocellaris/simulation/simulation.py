@@ -8,6 +8,7 @@ from .reporting import Reporting
 from .log import Log
 from .io import InputOutputHandling
 from .solution_properties import SolutionProperties
+from .profiling import Profiler
 from .setup import setup_simulation
 
 
@@ -36,6 +37,7 @@ class Simulation(object):
         self.log = Log(self)
         self.io = InputOutputHandling(self)
         self.solution_properties = SolutionProperties(self)
+        self.profiler = Profiler(self)
 
         # Several parts of the code wants to know these things,
         # so we keep them in a central place
@@ -53,6 +55,8 @@ class Simulation(object):
         self.solver = None
         self.multi_phase_model = None
         self.mesh_morpher = None
+        self.dt_controller = None
+        self.input_dt = None  # Accessor for time/dt, see update_timestep()
         self.t_start = None
         self.probes = None
         self.iso_surface_locators = {}
@@ -182,6 +186,9 @@ class Simulation(object):
 
         self.flush()
 
+        # Store the timings of this time step
+        self.profiler.end_timestep()
+
     def flush(self, force=False):
         """
         Flush output files if an appropriate amount of time has passed. This
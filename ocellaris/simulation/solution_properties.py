@@ -1,12 +1,20 @@
 import numpy
 import dolfin as df
 from dolfin import dot, sqrt, grad, jump, avg, dx, dS, Form, Constant
-from ocellaris.utils import timeit, ocellaris_error, velocity_change
+from ocellaris.utils import timeit, ocellaris_error, global_max_and_sum
 
 
 # Stop simulation if Courant number exceeds a given value
 CO_LIM = 1e3
 
+# The diagnostics, each can be computed at a given time step interval with
+# output/solution_properties/<name>_interval in the input file
+DIAGNOSTICS = ('Co', 'Pe', 'div', 'mass', 'energy', 'div_conv', 'uconv_diff')
+
+# Kinds of cell quantities, see FusedCellQuantities
+CELL_AVERAGE = 'average'
+CELL_INTEGRAL = 'integral'
+
 
 class SolutionProperties(object):
     def __init__(self, simulation):
@@ -17,12 +25,24 @@ class SolutionProperties(object):
         self.divergence_method = None
         self.active = False
         self.has_div_conv = False
+        self.Co_max = None
+        self.intervals = {name: 1 for name in DIAGNOSTICS}
         self._div = {}
+        self._components = {}
+        self._fused = {}
 
     def setup(self):
         sim = self.simulation
 
-        self.active = sim.input.get_value('output/solution_properties', True, 'bool')
+        self.active = True
+        inp_sp = sim.input.get_value('output/solution_properties', True, 'any')
+        if isinstance(inp_sp, dict):
+            inp = sim.input.get_value('output/solution_properties', required_type='Input')
+            self.active = inp.get_value('active', True, 'bool')
+            for name in DIAGNOSTICS:
+                self.intervals[name] = inp.get_value('%s_interval' % name, 1, 'int')
+        else:
+            self.active = sim.input.get_value('output/solution_properties', True, 'bool')
         divergence_method = sim.input.get_value('output/divergence_method', 'div', 'string')
         plot_divergences = sim.input.get_value('output/plot_divergences', False, 'bool')
 
@@ -36,6 +56,7 @@ class SolutionProperties(object):
         sim.log.info('SolutionProperties active with div method %r' % divergence_method)
 
         self.mesh = sim.data['mesh']
+        self.V0 = df.FunctionSpace(self.mesh, 'DG', 0)
         u = sim.data['u']
         rho = sim.data['rho']
         nu = sim.data['nu']
@@ -59,43 +80,53 @@ class SolutionProperties(object):
                     sim.io.add_extra_output_function(self._div[name]['div_dS'])
                     sim.io.add_extra_output_function(self._div[name]['div_dx'])
 
+    def _is_due(self, name):
+        """
+        Check if the given diagnostic should be computed this time step
+        """
+        interval = self.intervals[name]
+        return interval > 0 and self.simulation.timestep % interval == 0
+
     @timeit.named('compute solution properties')
     def report(self, create_report=True):
         """
-        Compute and report the solution properties
+        Compute and report the solution properties. The diagnostics are
+        only computed every <name>_interval time steps, except when
+        create_report is False, then all diagnostics are computed
         """
         if not self.active:
             return
 
         sim = self.simulation
-        reports = []
-
-        Co_max = self.courant_number().vector().max()
-        Pe_max = self.peclet_number().vector().max()
-        div_dS_f, div_dx_f = self.divergences()
-        div_dS = div_dS_f.vector().max()
-        div_dx = div_dx_f.vector().max()
-        mass = self.total_mass()
-        Ek, Ep = self.total_energy()
-        reports.append(('Co', Co_max))
-        reports.append(('Pe', Pe_max))
-        reports.append(('div', div_dx + div_dS))
-        reports.append(('mass', mass))
-        reports.append(('Ek', Ek))
-        reports.append(('Ep', Ep))
-
+        names = [n for n in DIAGNOSTICS if n in self._components]
         if self.has_div_conv:
-            # Convecting and convected velocities are separate
-            div_conv_dS_f, div_conv_dx_f = self.divergences('u_conv')
-            div_conv_dS = div_conv_dS_f.vector().max()
-            div_conv_dx = div_conv_dx_f.vector().max()
-            reports.append(('div_conv', div_conv_dx + div_conv_dS))
+            names.append('uconv_diff')
+        if create_report:
+            names = [n for n in names if self._is_due(n)]
+        if not names:
+            return
 
+        values = self._compute(names)
+        reports = []
+        if 'Co' in names:
+            self.Co_max = values['Co']
+            reports.append(('Co', values['Co']))
+        if 'Pe' in names:
+            reports.append(('Pe', values['Pe']))
+        if 'div' in names:
+            reports.append(('div', values['div_dx'] + values['div_dS']))
+        if 'mass' in names:
+            reports.append(('mass', values['mass']))
+        if 'energy' in names:
+            reports.append(('Ek', values['Ek']))
+            reports.append(('Ep', values['Ep']))
+
+        if 'div_conv' in names:
+            # Convecting and convected velocities are separate
+            reports.append(('div_conv', values['div_conv_dx'] + values['div_conv_dS']))
+        if 'uconv_diff' in names:
             # Difference between the convective and the convected velocity
-            ucdiff = velocity_change(
-                u1=sim.data['up'], u2=sim.data['up_conv'], ui_tmp=sim.data['ui_tmp']
-            )
-            reports.append(('uconv_diff', ucdiff))
+            reports.append(('uconv_diff', values['uconv_diff']))
 
         if create_report:
             # Add computed solution properties to the timestep reports
@@ -112,6 +143,11 @@ class SolutionProperties(object):
                 % (sim.timestep, sim.time, ', '.join(info))
             )
 
+        # The Courant number limit is only checked when the Courant number
+        # is computed, i.e. every Co_interval time steps
+        if 'Co' not in names:
+            return
+        Co_max = values['Co']
         Co_lim = sim.input.get_value('simulation/Co_lim', CO_LIM, 'float')
         if Co_lim > 0 and Co_max > Co_lim:
             ocellaris_error(
@@ -120,97 +156,146 @@ class SolutionProperties(object):
         elif not numpy.isfinite(Co_max):
             ocellaris_error('Non finite Courant number', 'Found Co = %g' % Co_max)
 
+    def _compute(self, names):
+        """
+        Compute the given diagnostics. All cell quantities are computed with
+        one assembled form and all global reductions are done in one MPI
+        collective operation. Returns a dictionary of global values
+        """
+        components = []
+        for name in names:
+            components.extend(self._components.get(name, []))
+
+        key = tuple(names)
+        fused = self._fused.get(key)
+        if fused is None and components:
+            fused = self._fused[key] = FusedCellQuantities(self.V0, components)
+
+        maxima, sums = [], []
+        if fused is not None:
+            maxima, sums = fused.compute()
+
+        # Squared norms for the velocity change, see velocity_change()
+        num_sums = len(sums)
+        if 'uconv_diff' in names:
+            data = self.simulation.data
+            sums = list(sums)
+            for d in range(self.simulation.ndim):
+                u1 = data['up%d' % d].vector().get_local()
+                u2 = data['up_conv%d' % d].vector().get_local()
+                sums.append(((u1 - u2) ** 2).sum())
+                sums.append((u1 ** 2).sum())
+
+        maxima, sums = global_max_and_sum(maxima, sums)
+
+        values = {}
+        if fused is not None:
+            for name, value in zip(fused.max_names, maxima):
+                values[name] = value
+            for name, value in zip(fused.sum_names, sums):
+                values[name] = value
+
+        if 'uconv_diff' in names:
+            diff = 0
+            for nd2, n12 in sums[num_sums:].reshape((-1, 2)):
+                if n12 != 0:
+                    diff += nd2 ** 0.5 / n12 ** 0.5
+            values['uconv_diff'] = diff
+        return values
+
     def _setup_courant(self, vel, dt):
         """
         Co = a*dt/h where a = mag(vel)
         """
-        V = df.FunctionSpace(self.mesh, 'DG', 0)
         h = self.simulation.data['h']
-
-        u, v = df.TrialFunction(V), df.TestFunction(V)
-        a = u * v * dx
         vmag = sqrt(dot(vel, vel))
-        L = vmag * dt / h * v * dx
 
-        # Pre-factorize matrices and store for usage in projection
-        self._courant_solver = df.LocalSolver(a, L)
-        self._courant_solver.factorize()
-        self._courant = df.Function(V)
+        def L(v):
+            return vmag * dt / h * v * dx
+
+        self._courant = df.Function(self.V0)
+        self._components['Co'] = [('Co', CELL_AVERAGE, L, self._courant)]
 
     def _setup_peclet(self, vel, nu):
         """
         Pe = a*h/(2*nu) where a = mag(vel)
         """
-        V = df.FunctionSpace(self.mesh, 'DG', 0)
         h = self.simulation.data['h']
-        u, v = df.TrialFunction(V), df.TestFunction(V)
-        a = u * v * dx
-        L = dot(vel, vel) ** 0.5 * h / (2 * nu) * v * dx
+        self._peclet = df.Function(self.V0)
+
+        def L(v):
+            return dot(vel, vel) ** 0.5 * h / (2 * nu) * v * dx
 
-        # Pre-factorize matrices and store for usage in projection
-        self._peclet_solver = df.LocalSolver(a, L)
-        self._peclet_solver.factorize()
-        self._peclet = df.Function(V)
+        self._components['Pe'] = [('Pe', CELL_AVERAGE, L, self._peclet)]
 
     def _setup_divergence(self, vel, method, name='u'):
         """
         Calculate divergence and element to element velocity
         flux differences on the same edges
         """
-        V = df.FunctionSpace(self.mesh, 'DG', 0)
         n = df.FacetNormal(self.mesh)
-        u, v = df.TrialFunction(V), df.TestFunction(V)
 
         # The difference between the flux on the same facet between two different cells
-        a1 = u * v * dx
         w = dot(vel('+') - vel('-'), n('+'))
         if method == 'div0':
-            L1 = w * avg(v) * dS
+
+            def L1(v):
+                return w * avg(v) * dS
+
         else:
-            L1 = abs(w) * avg(v) * dS
+
+            def L1(v):
+                return abs(w) * avg(v) * dS
 
         # The divergence internally in the cell
-        a2 = u * v * dx
         if method in ('div', 'div0'):
-            L2 = abs(df.div(vel)) * v * dx
+
+            def L2(v):
+                return abs(df.div(vel)) * v * dx
+
         elif method == 'gradq_avg':
-            L2 = dot(avg(vel), n('+')) * jump(v) * dS - dot(vel, grad(v)) * dx
+
+            def L2(v):
+                return dot(avg(vel), n('+')) * jump(v) * dS - dot(vel, grad(v)) * dx
+
         else:
             raise ValueError('Divergence type %r not supported' % method)
 
         # Store for usage in projection
         storage = self._div[name] = {}
-        storage['dS_solver'] = df.LocalSolver(a1, L1)
-        storage['dx_solver'] = df.LocalSolver(a2, L2)
-        storage['div_dS'] = df.Function(V)
-        storage['div_dx'] = df.Function(V)
-
-        # Pre-factorize matrices
-        storage['dS_solver'].factorize()
-        storage['dx_solver'].factorize()
+        storage['div_dS'] = df.Function(self.V0)
+        storage['div_dx'] = df.Function(self.V0)
         storage['div_dS'].rename('Divergence_%s_dS' % name, 'Divergence_%s_dS' % name)
         storage['div_dx'].rename('Divergence_%s_dx' % name, 'Divergence_%s_dx' % name)
 
+        prefix = 'div' if name == 'u' else 'div_conv'
+        self._components[prefix] = [
+            (prefix + '_dS', CELL_AVERAGE, L1, storage['div_dS']),
+            (prefix + '_dx', CELL_AVERAGE, L2, storage['div_dx']),
+        ]
+
     def _setup_energy(self, rho, vel, gvec, x0):
         """
         Calculate kinetic and potential energy
         """
         x = df.SpatialCoordinate(self.mesh)
-        self._form_E_k = Form(1 / 2 * rho * dot(vel, vel) * dx(domain=self.mesh))
-        self._form_E_p = Form(rho * dot(-gvec, x - x0) * dx(domain=self.mesh))
+        self._components['energy'] = [
+            ('Ek', CELL_INTEGRAL, lambda v: 1 / 2 * rho * dot(vel, vel) * v * dx, None),
+            ('Ep', CELL_INTEGRAL, lambda v: rho * dot(-gvec, x - x0) * v * dx, None),
+        ]
 
     def _setup_mass(self, rho):
         """
         Calculate mass
         """
-        self._form_mass = Form(rho * dx(domain=self.mesh))
+        self._components['mass'] = [('mass', CELL_INTEGRAL, lambda v: rho * v * dx, None)]
 
     @timeit
     def courant_number(self):
         """
         Calculate the Courant numbers in each cell
         """
-        self._courant_solver.solve_local_rhs(self._courant)
+        self._compute(['Co'])
         return self._courant
 
     @timeit
@@ -218,7 +303,7 @@ class SolutionProperties(object):
         """
         Calculate the Peclet numbers in each cell
         """
-        self._peclet_solver.solve_local_rhs(self._peclet)
+        self._compute(['Pe'])
         return self._peclet
 
     @timeit
@@ -231,9 +316,8 @@ class SolutionProperties(object):
         Returns the sum of facet errors for each cell and the
         divergence error in each cell as DG0 functions
         """
+        self._compute(['div' if name == 'u' else 'div_conv'])
         storage = self._div[name]
-        storage['dS_solver'].solve_global_rhs(storage['div_dS'])
-        storage['dx_solver'].solve_global_rhs(storage['div_dx'])
         return storage['div_dS'], storage['div_dx']
 
     @timeit
@@ -241,14 +325,95 @@ class SolutionProperties(object):
         """
         Calculate the total energy in the field
         """
-        E_k = df.assemble(self._form_E_k)
-        E_p = df.assemble(self._form_E_p)
-        return E_k, E_p
+        values = self._compute(['energy'])
+        return values['Ek'], values['Ep']
 
     @timeit
     def total_mass(self):
         """
         Calculate the total mass
         """
-        mass = df.assemble(self._form_mass)
-        return mass
+        return self._compute(['mass'])['mass']
+
+
+class FusedCellQuantities(object):
+    def __init__(self, V0, components):
+        """
+        Compute several cell wise quantities with one assembled form. Each
+        component is a tuple (name, kind, form_func, function) where
+        form_func(v) returns a linear form in the DG0 test function v. The
+        form is assembled into a vector valued DG0 space, one component per
+        quantity.
+
+        CELL_AVERAGE components are divided by the cell volume, which is the
+        same as projecting to DG0, and the result is stored in the given
+        DG0 function. CELL_INTEGRAL components are summed over the cells
+        """
+        self.V0 = V0
+        self.components = components
+        N = len(components)
+        if N == 1:
+            W = V0
+            vs = [df.TestFunction(W)]
+        else:
+            W = df.VectorFunctionSpace(V0.mesh(), 'DG', 0, dim=N)
+            v = df.TestFunction(W)
+            vs = [v[i] for i in range(N)]
+        self.W = W
+
+        self.form = Form(sum(comp[2](vi) for comp, vi in zip(components, vs)))
+        self.tensor = df.assemble(self.form)
+        volumes = df.assemble(sum(vi * dx for vi in vs)).get_local()
+
+        # The owned dofs of each component
+        start = self.tensor.local_range()[0]
+        self.dofs = []
+        for i in range(N):
+            if N == 1:
+                dofs = numpy.arange(len(volumes))
+            else:
+                dofs = numpy.asarray(W.sub(i).dofmap().dofs(), numpy.intc) - start
+            self.dofs.append(dofs)
+
+        self.max_names = [c[0] for c in components if c[1] == CELL_AVERAGE]
+        self.sum_names = [c[0] for c in components if c[1] == CELL_INTEGRAL]
+        self.scale = numpy.ones_like(volumes)
+        self.assigners = []
+        for i, (_name, kind, _form_func, func) in enumerate(components):
+            if kind == CELL_AVERAGE:
+                dofs = self.dofs[i]
+                self.scale[dofs] = 1 / volumes[dofs]
+                if N > 1:
+                    self.assigners.append(df.FunctionAssigner(V0, W.sub(i)))
+        if N > 1:
+            self.tmp = df.Function(W)
+
+    def compute(self):
+        """
+        Assemble the form and update the cell average functions. Returns
+        the local maxima of the cell averages and the local sums of the
+        cell integrals, the global values are not computed here
+        """
+        df.assemble(self.form, tensor=self.tensor)
+        values = self.tensor.get_local()
+        values *= self.scale
+
+        if len(self.components) > 1:
+            self.tmp.vector().set_local(values)
+            self.tmp.vector().apply('insert')
+
+        maxima, sums = [], []
+        assigners = iter(self.assigners)
+        for i, (_name, kind, _form_func, func) in enumerate(self.components):
+            dofs = self.dofs[i]
+            if kind == CELL_INTEGRAL:
+                sums.append(values[dofs].sum())
+                continue
+
+            maxima.append(values[dofs].max() if len(dofs) else -numpy.inf)
+            if len(self.components) > 1:
+                next(assigners).assign(func, self.tmp.sub(i))
+            else:
+                func.vector().set_local(values)
+                func.vector().apply('insert')
+        return maxima, sums
@@ -15,3 +15,5 @@ from .bdm import VelocityBDMProjection
 from .ale import MeshMorpher
 from .timestepping import before_simulation, after_timestep, update_timestep
 from .forcing_zone import add_forcing_zone
+from .dt_controller import setup_dt_controller, get_dt_controller, register_dt_controller
+from .fieldsplit import get_fieldsplit_parameters, setup_coupled_fieldsplit
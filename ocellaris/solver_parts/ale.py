@@ -9,6 +9,7 @@ class MeshMorpher(object):
         """
         self.simulation = simulation
         self.active = False
+        simulation.hooks.register_custom_hook_point('MeshMoved')
 
         # The user can give a mesh velocity function to simulate a piston or similar
         prescribed_velocity_input = simulation.input.get_value('mesh/prescribed_velocity', None)
@@ -118,3 +119,6 @@ class MeshMorpher(object):
         dolfin.ALE.move(mesh, self.displacement)
         mesh.bounding_box_tree().build(mesh)
         sim.update_mesh_data(connectivity_changed=False)
+
+        # Let other parts of the code update cached geometry information
+        sim.hooks.run_custom_hook('MeshMoved')
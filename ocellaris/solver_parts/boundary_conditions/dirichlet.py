@@ -42,7 +42,12 @@ class OcellarisDirichletBC(dolfin.DirichletBC):
         BCs for a segregated solver (default) to BCs for a coupled solver
         """
         return OcellarisDirichletBC(
-            self.simulation, V, self._value, self.subdomain_marker, self.subdomain_id
+            self.simulation,
+            V,
+            self._value,
+            self.subdomain_marker,
+            self.subdomain_id,
+            updater=self._updater,
         )
 
     def update(self):
@@ -132,19 +137,23 @@ class CodedDirichletBoundary(BoundaryConditionCreator):
                 name = '%s%d' % (var_name, d)
                 description = 'coded value boundary condition for %s' % name
                 sub_code = inp_dict.get_value('code/%d' % d, required_type='string')
-                expr = CodedExpression(simulation, sub_code, description)
-                self.register_dirichlet_condition(name, expr, subdomains, subdomain_id)
+                expr, updater = CodedExpression(
+                    simulation, sub_code, description, V=self.func_space, return_updater=True
+                )
+                self.register_dirichlet_condition(name, expr, subdomains, subdomain_id, updater)
         else:
             description = 'coded value boundary condition for %s' % var_name
-            expr = CodedExpression(simulation, code, description)
-            self.register_dirichlet_condition(var_name, expr, subdomains, subdomain_id)
+            expr, updater = CodedExpression(
+                simulation, code, description, V=self.func_space, return_updater=True
+            )
+            self.register_dirichlet_condition(var_name, expr, subdomains, subdomain_id, updater)
 
-    def register_dirichlet_condition(self, var_name, expr, subdomains, subdomain_id):
+    def register_dirichlet_condition(self, var_name, expr, subdomains, subdomain_id, updater):
         """
         Store the boundary condition for use in the solver
         """
         bc = OcellarisDirichletBC(
-            self.simulation, self.func_space, expr, subdomains, subdomain_id
+            self.simulation, self.func_space, expr, subdomains, subdomain_id, updater
         )
         bcs = self.simulation.data['dirichlet_bcs']
         bcs.setdefault(var_name, []).append(bc)
@@ -1,6 +1,6 @@
 import numpy
 import dolfin
-from ocellaris.utils import timeit, OcellarisError
+from ocellaris.utils import timeit, OcellarisError, get_same_loc_dof_groups
 
 
 @timeit
@@ -113,22 +113,14 @@ def get_same_loc_dofs(V):
     location in space. V should obviously be a discontinuous space,
     otherwise there will not be multiple dofs in the same location
     """
-    gdim = V.mesh().geometry().dim()
-    dof_coordinates = V.tabulate_dof_coordinates().reshape((-1, gdim))
-
-    # Map dof coordinate to dofs, this is for DG so multiple dofs
-    # will share the same location
-    coord_to_dofs = {}
-    max_neighbours = 0
-    for dof in range(len(dof_coordinates)):
-        coord = tuple(round(x, 5) for x in dof_coordinates[dof])
-        dofs = coord_to_dofs.setdefault(coord, [])
-        dofs.append(dof)
-        max_neighbours = max(max_neighbours, len(dofs) - 1)
-
-    # Loop through dofs at same coordinate and map them to each other
+    groups = get_same_loc_dof_groups(V)
+    order = numpy.argsort(groups, kind='stable')
+    splits = numpy.flatnonzero(numpy.diff(groups[order])) + 1
+
+    # Loop through dofs at same location and map them to each other
     same_loc_dofs = {}
-    for dofs in coord_to_dofs.values():
+    for dofs in numpy.split(order, splits):
+        dofs = dofs.tolist()
         for dof in dofs:
             same_loc_dofs[dof] = tuple(d for d in dofs if d != dof)
 
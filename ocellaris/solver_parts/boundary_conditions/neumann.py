@@ -80,6 +80,14 @@ class CodedNeumannBoundary(BoundaryConditionCreator):
         Neumann condition with coded value
         """
         self.simulation = simulation
+        # The function space is only used for vectorised evaluation, which
+        # is skipped for variables without a function space
+        if var_name[-1].isdigit():
+            # A var_name like "u0" was given. Look up "Vu"
+            V = simulation.data.get('V%s' % var_name[:-1])
+        else:
+            # A var_name like "u" was given. Look up "Vu"
+            V = simulation.data.get('V%s' % var_name)
 
         # Make a dolfin Expression object that runs the code string
         code = inp_dict.get_value('code', required_type='any')
@@ -93,13 +101,13 @@ class CodedNeumannBoundary(BoundaryConditionCreator):
                 name = '%s%d' % (var_name, d)
                 description = 'coded gradient boundary condition for %s' % name
                 sub_code = inp_dict.get_value('code/%d' % d, required_type='string')
-                expr = CodedExpression(simulation, sub_code, description)
+                expr = CodedExpression(simulation, sub_code, description, V=V)
                 self.register_neumann_condition(
                     name, expr, subdomains, subdomain_id, enforce_zero_flux
                 )
         else:
             description = 'coded gradient boundary condition for %s' % var_name
-            expr = CodedExpression(simulation, code, description)
+            expr = CodedExpression(simulation, code, description, V=V)
             self.register_neumann_condition(
                 var_name, expr, subdomains, subdomain_id, enforce_zero_flux
             )
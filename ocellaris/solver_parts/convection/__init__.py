@@ -122,23 +122,11 @@ def initialize_cpp_input(simulation, cpp_mod, Vcell, Vfacet):
 
     # Pass facet info to C++
     fi = simulation.data['facet_info']
-    area = numpy.zeros(len(fi), float)
-    normals = numpy.zeros((len(fi), simulation.ndim), float)
-    midpnts = numpy.zeros((len(fi), simulation.ndim), float)
-    for i, finfo in enumerate(fi):
-        area[i] = finfo.area
-        normals[i] = finfo.normal
-        midpnts[i] = finfo.midpoint
-    cpp_inp.set_facet_info(area, normals, midpnts)
+    cpp_inp.set_facet_info(fi.areas, fi.normals, fi.midpoints)
 
     # Pass cell info to C++
     ci = simulation.data['cell_info']
-    volume = numpy.zeros(len(ci), float)
-    midpnts = numpy.zeros((len(ci), simulation.ndim), float)
-    for i, cinfo in enumerate(ci):
-        volume[i] = cinfo.volume
-        midpnts[i] = cinfo.midpoint
-    cpp_inp.set_cell_info(volume, midpnts)
+    cpp_inp.set_cell_info(ci.volumes, ci.midpoints)
 
     return cpp_inp
 
@@ -148,33 +136,48 @@ class VelocityDGT0Projector(object):
         """
         Given a velocity in DG, e.g DG2, produce a velocity in DGT0,
         i.e. a constant on each facet
+
+        The DGT0 mass matrix is diagonal with the facet measures on the
+        diagonal, so the projection is the facet integral of the velocity
+        divided by the facet measure. The inverse facet measures are computed
+        once, and again only if the mesh moves
         """
         V = u_conv[0].function_space()
         V_dgt0 = dolfin.FunctionSpace(V.mesh(), 'DGT', 0)
-        u = dolfin.TrialFunction(V_dgt0)
         v = dolfin.TestFunction(V_dgt0)
 
         ndim = simulation.ndim
         w = u_conv
         w_new = dolfin.as_vector([dolfin.Function(V_dgt0) for _ in range(ndim)])
 
-        dot, avg, dS, ds = dolfin.dot, dolfin.avg, dolfin.dS, dolfin.ds
-        a = dot(avg(u), avg(v)) * dS + dot(u, v) * ds
+        avg, dS, ds = dolfin.avg, dolfin.dS, dolfin.ds
+        self.facet_measure = dolfin.Form(avg(v) * dS + v * ds)
 
         L = []
         for d in range(ndim):
             L.append(avg(w[d]) * avg(v) * dS + w[d] * v * ds)
 
-        self.lhs = [dolfin.Form(Li) for Li in L]
-        self.A = dolfin.assemble(a)
-        self.solver = dolfin.PETScKrylovSolver('cg')
+        self.simulation = simulation
+        self.rhs = [dolfin.Form(Li) for Li in L]
+        self.b = dolfin.Function(V_dgt0).vector()
+        self.inv_measure = None
         self.velocity = simulation.data['u_conv_dgt0'] = w_new
 
+    def update_facet_measures(self):
+        dolfin.assemble(self.facet_measure, tensor=self.b)
+        self.inv_measure = 1.0 / self.b.get_local()
+
     def update(self):
         with dolfin.Timer('Ocellaris produce u_conv_dgt0'):
-            for d, L in enumerate(self.lhs):
-                b = dolfin.assemble(L)
-                self.solver.solve(self.A, self.velocity[d].vector(), b)
+            mesh_morpher = getattr(self.simulation, 'mesh_morpher', None)
+            if self.inv_measure is None or (mesh_morpher is not None and mesh_morpher.active):
+                self.update_facet_measures()
+
+            for d, L in enumerate(self.rhs):
+                dolfin.assemble(L, tensor=self.b)
+                vec = self.velocity[d].vector()
+                vec.set_local(self.b.get_local() * self.inv_measure)
+                vec.apply('insert')
 
 
 from . import upwind
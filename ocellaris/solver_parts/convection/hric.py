@@ -3,7 +3,8 @@ The HRIC upwind/downwind blending sheme
 """
 import numpy
 import dolfin
-from ocellaris.utils import ocellaris_error, get_local, set_local
+from contextlib import ExitStack
+from ocellaris.utils import ocellaris_error, get_local, set_local, local_vector_view
 from . import ConvectionScheme, register_convection_scheme
 
 
@@ -76,20 +77,22 @@ class ConvectionSchemeHric2D(ConvectionScheme):
         self.simulation.reporting.report_timestep_value('Cof_max', Co_max)
 
     def update_cpp(self, dt, velocity):
-        alpha = get_local(self.alpha_function)
-        beta = get_local(self.blending_function)
-        gradient = [get_local(gi) for gi in self.gradient_reconstructor.gradient]
-        velocity = [get_local(vi) for vi in velocity]
-        g_vecs = numpy.array(gradient, dtype=float)
-        v_vecs = numpy.array(velocity, dtype=float)
-        assert g_vecs.shape[0] == g_vecs.shape[0] == self.simulation.ndim
-
-        hric_funcs = {2: self.cpp_mod.hric_2D, 3: self.cpp_mod.hric_3D}
-        hric_func = hric_funcs[self.simulation.ndim]
-        Co_max = hric_func(
-            self.cpp_inp, self.mesh, alpha, g_vecs, v_vecs, beta, dt, self.variant
-        )
-        set_local(self.blending_function, beta, apply='insert')
+        # Views of the local values, the blending function is updated in place
+        gradient = self.gradient_reconstructor.gradient
+        with ExitStack() as stack:
+            alpha = stack.enter_context(local_vector_view(self.alpha_function))
+            beta = stack.enter_context(local_vector_view(self.blending_function, writable=True))
+            gradient = [stack.enter_context(local_vector_view(gi)) for gi in gradient]
+            velocity = [stack.enter_context(local_vector_view(vi)) for vi in velocity]
+            g_vecs = numpy.array(gradient, dtype=float)
+            v_vecs = numpy.array(velocity, dtype=float)
+            assert g_vecs.shape[0] == g_vecs.shape[0] == self.simulation.ndim
+
+            hric_funcs = {2: self.cpp_mod.hric_2D, 3: self.cpp_mod.hric_3D}
+            hric_func = hric_funcs[self.simulation.ndim]
+            Co_max = hric_func(
+                self.cpp_inp, self.mesh, alpha, g_vecs, v_vecs, beta, dt, self.variant
+            )
         return Co_max
 
     def update_python(self, dt, velocity):
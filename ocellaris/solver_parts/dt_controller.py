@@ -0,0 +1,178 @@
+import math
+import dolfin
+from ocellaris.utils import ocellaris_error
+
+
+_DT_CONTROLLERS = {}
+
+# Relative tolerance used when landing on a given time
+LANDING_EPS = 1e-8
+
+
+def add_dt_controller(name, controller_class):
+    """
+    Register a time step controller
+    """
+    _DT_CONTROLLERS[name] = controller_class
+
+
+def register_dt_controller(name):
+    """
+    A class decorator to register time step controllers
+    """
+
+    def register(controller_class):
+        add_dt_controller(name, controller_class)
+        return controller_class
+
+    return register
+
+
+def get_dt_controller(name):
+    """
+    Return a time step controller by name
+    """
+    try:
+        return _DT_CONTROLLERS[name]
+    except KeyError:
+        ocellaris_error(
+            'Time step controller "%s" not found' % name,
+            'Available time step controllers:\n'
+            + '\n'.join(
+                '  %-20s - %s' % (n, s.description) for n, s in sorted(_DT_CONTROLLERS.items())
+            ),
+        )
+        raise
+
+
+def setup_dt_controller(simulation):
+    """
+    Create the time step controller given in time/dt_controller, returns
+    None if no controller is given in the input file
+    """
+    name = simulation.input.get_value('time/dt_controller/type', None, 'string')
+    if name is None:
+        return None
+    controller_class = get_dt_controller(name)
+    simulation.log.info('Using time step controller %r' % name)
+    return controller_class(simulation)
+
+
+class DtController(object):
+    description = 'No description available'
+
+    def __init__(self, simulation):
+        """
+        Base class for time step controllers. The solver calls get_dt() at
+        the start of each time step, before the end time check
+        """
+        self.simulation = simulation
+        inp = simulation.input
+        self.dt_min = inp.get_value('time/dt_controller/dt_min', 0.0, 'float')
+        self.dt_max = inp.get_value('time/dt_controller/dt_max', 1e100, 'float')
+        self.output_interval = inp.get_value('time/dt_controller/output_interval', 0.0, 'float')
+        self.tstart = inp.get_value('time/tstart', 0.0, 'float')
+
+    def compute_dt(self, dt_prev):
+        """
+        Compute the next time step from the previous one, to be implemented
+        by subclasses
+        """
+        raise NotImplementedError()
+
+    def get_dt(self, t, tmax):
+        """
+        Return the time step to use from time t. The time step is limited
+        to [dt_min, dt_max], shortened to land exactly on the next output
+        time and on tmax, and is the same on all processes
+        """
+        dt = self.compute_dt(self.simulation.dt)
+        dt = min(max(dt, self.dt_min), self.dt_max)
+
+        if self.output_interval > 0:
+            n = math.floor((t - self.tstart) / self.output_interval * (1 + LANDING_EPS)) + 1
+            dt = land_on_time(t, dt, self.tstart + n * self.output_interval)
+        dt = land_on_time(t, dt, tmax)
+
+        return dolfin.MPI.min(dolfin.MPI.comm_world, float(dt))
+
+
+def land_on_time(t, dt, t_target):
+    """
+    Shorten the time step to land exactly on t_target. When the target is
+    less than two time steps away the remaining time is split in two equal
+    steps to avoid a very short final step. Time steps that start at or
+    after the target are not changed
+    """
+    remaining = t_target - t
+    if remaining <= abs(t_target) * LANDING_EPS:
+        return dt
+    elif dt >= remaining * (1 - LANDING_EPS):
+        return remaining
+    elif 2 * dt > remaining:
+        return remaining / 2
+    return dt
+
+
+@register_dt_controller('CFL')
+class CflDtController(DtController):
+    description = 'Choose dt from the Courant number'
+
+    def __init__(self, simulation):
+        """
+        Choose the time step such that the maximum Courant number reported
+        by SolutionProperties is close to target_Co. The change from one
+        time step to the next is limited by max_growth and max_shrink, and
+        the time step is not increased if the previous time step needed
+        inner_iter_limit or more inner iterations
+        """
+        super().__init__(simulation)
+        inp = simulation.input
+        self.target_Co = inp.get_value('time/dt_controller/target_Co', 0.5, 'float')
+        self.max_growth = inp.get_value('time/dt_controller/max_growth', 1.2, 'float')
+        self.max_shrink = inp.get_value('time/dt_controller/max_shrink', 0.5, 'float')
+        self.inner_iter_limit = inp.get_value('time/dt_controller/inner_iter_limit', 0, 'int')
+
+        solution_properties = simulation.solution_properties
+        if not solution_properties.active:
+            ocellaris_error(
+                'CFL time step controller error',
+                'The CFL time step controller needs the Courant number, '
+                'please enable output/solution_properties',
+            )
+        elif solution_properties.intervals['Co'] != 1:
+            ocellaris_error(
+                'CFL time step controller error',
+                'The CFL time step controller needs the Courant number every '
+                'time step, please set output/solution_properties/Co_interval to 1',
+            )
+
+    def compute_dt(self, dt_prev):
+        sim = self.simulation
+        Co = sim.solution_properties.Co_max
+        if Co is None or Co <= 0:
+            factor = self.max_growth
+        else:
+            factor = min(max(self.target_Co / Co, self.max_shrink), self.max_growth)
+
+        # Do not increase the time step when the inner iterations struggle
+        if self.inner_iter_limit > 0 and factor > 1:
+            if self.previous_inner_iterations() >= self.inner_iter_limit:
+                factor = 1.0
+
+        dt = dt_prev * factor
+        if factor != 1.0:
+            sim.log.info(
+                'Time step controller: Co = %.3g, changing dt from %.3e to %.3e'
+                % (Co or 0.0, dt_prev, dt)
+            )
+        return dt
+
+    def previous_inner_iterations(self):
+        """
+        The number of inner iterations performed in the previous time step.
+        The solvers increment solver.inner_iteration after each inner
+        iteration, also the last one, so this is inner_iteration - 1. Solvers
+        without inner iterations count as zero inner iterations
+        """
+        return getattr(self.simulation.solver, 'inner_iteration', 1) - 1
@@ -0,0 +1,301 @@
+import numpy
+import dolfin
+from ocellaris.utils import (
+    ocellaris_error,
+    verify_key,
+    SchurComplement,
+    get_block_diagonal_blocks,
+    set_block_diagonal_blocks,
+)
+from ocellaris.utils.linear_solvers import KSPLinearSolverWrapper
+
+
+# Default value, can be changed in the input file
+SCHUR_PRECONDITIONER = 'petsc'
+
+# Common PETSc options for the block Schur complement presets. The velocity
+# block is named 'u' and the pressure block 'p', so the options of the inner
+# solvers have the prefix sol_coupled_fieldsplit_u_ and sol_coupled_fieldsplit_p_
+_SCHUR_FIELDSPLIT = {
+    'use_ksp': True,
+    'report_statistics': True,
+    'inner_iter_max_it': [200, 200, 200],
+    'petsc_ksp_type': 'fgmres',
+    'petsc_ksp_gmres_restart': 100,
+    'petsc_ksp_initial_guess_nonzero': True,
+    'petsc_pc_type': 'fieldsplit',
+    'petsc_pc_fieldsplit_type': 'schur',
+    'petsc_pc_fieldsplit_schur_fact_type': 'upper',
+    'petsc_fieldsplit_u_ksp_type': 'preonly',
+    'petsc_fieldsplit_u_pc_type': 'asm',
+    'petsc_fieldsplit_p_ksp_type': 'preonly',
+    'petsc_fieldsplit_p_pc_type': 'hypre',
+    'petsc_fieldsplit_p_pc_hypre_type': 'boomeramg',
+}
+
+# Solver parameter presets for the coupled solvers, selected by the
+# fieldsplit_preset key in the input of the coupled solver
+FIELDSPLIT_PRESETS = {
+    'schur_selfp': dict(
+        _SCHUR_FIELDSPLIT,
+        petsc_pc_fieldsplit_schur_precondition='selfp',
+        schur_preconditioner='petsc',
+    ),
+    'schur_pressure_mass': dict(
+        _SCHUR_FIELDSPLIT,
+        petsc_pc_fieldsplit_schur_precondition='user',
+        schur_preconditioner='pressure_mass',
+    ),
+    'schur_block_diagonal': dict(
+        _SCHUR_FIELDSPLIT,
+        petsc_pc_fieldsplit_schur_precondition='user',
+        schur_preconditioner='block_diagonal',
+    ),
+}
+
+SCHUR_PRECONDITIONERS = ('petsc', 'pressure_mass', 'block_diagonal')
+
+
+def get_fieldsplit_parameters(simulation, input_path, default_parameters):
+    """
+    Return the default linear solver parameters for a coupled solver. If
+    a preset is given in <input_path>/fieldsplit_preset then the preset
+    parameters are added to the given defaults. The returned parameters
+    can still be changed in the input file
+    """
+    preset = simulation.input.get_value('%s/fieldsplit_preset' % input_path, None, 'string')
+    if preset is None:
+        return default_parameters
+
+    verify_key('field split preset', preset, FIELDSPLIT_PRESETS, input_path)
+    simulation.log.info('    Using field split preset %r for %s' % (preset, input_path))
+    params = dict(default_parameters or {})
+    params.update(FIELDSPLIT_PRESETS[preset])
+    return params
+
+
+def setup_coupled_fieldsplit(simulation, solver, input_path, V, p_index, schur_sign):
+    """
+    Register the velocity and pressure blocks of the mixed function space V
+    with the linear solver. Returns None if the solver is not a PETSc KSP
+    solver with a field split preconditioner
+    """
+    if not isinstance(solver, KSPLinearSolverWrapper):
+        return None
+    if solver.ksp().getPC().getType() != 'fieldsplit':
+        return None
+    return CoupledFieldSplit(simulation, solver, input_path, V, p_index, schur_sign)
+
+
+class CoupledFieldSplit(object):
+    def __init__(self, simulation, solver, input_path, V, p_index, schur_sign):
+        """
+        Block preconditioning of a coupled velocity-pressure equation system
+        with the PETSc field split preconditioner. The pressure block 'p' is
+        subspace number p_index of the mixed function space V and the
+        velocity block 'u' contains all the other subspaces. The index sets
+        of the blocks are found from the dofmaps of the subspaces.
+
+        The sign of the Schur complement A11 - A10⋅A00⁻¹⋅A01 follows from the
+        signs of the pressure gradient and continuity terms in the equations,
+        and is given by the equation class, see schur_complement_sign in
+        CoupledEquationsDG. The pressure mass matrix gets this sign.
+
+        The preconditioner of the Schur complement is selected by the
+        schur_preconditioner input:
+
+        - petsc: let PETSc build it, see pc_fieldsplit_schur_precondition
+        - pressure_mass: the pressure mass matrix scaled by 1/μ
+        - block_diagonal: A11 - A10⋅Ã⁻¹⋅A01 where Ã is the cell block
+          diagonal of the velocity block A00. Requires DG velocities
+
+        The last two are given to PETSc as a user provided matrix and are
+        only rebuilt when the assembled operator has changed
+        """
+        self.simulation = simulation
+        self.solver = solver
+        self.V = V
+        self.p_index = p_index
+        self.p_subspace = V.sub(p_index)
+        self.schur_sign = schur_sign
+        self.u_subspaces = [V.sub(i) for i in range(V.num_sub_spaces()) if i != p_index]
+
+        # The default depends on the preset used to create the solver
+        inp = simulation.input
+        preset = inp.get_value('%s/fieldsplit_preset' % input_path, None, 'string')
+        default = SCHUR_PRECONDITIONER
+        if preset in FIELDSPLIT_PRESETS:
+            default = FIELDSPLIT_PRESETS[preset]['schur_preconditioner']
+        self.schur_preconditioner = inp.get_value(
+            '%s/schur_preconditioner' % input_path, default, 'string'
+        )
+        verify_key(
+            'Schur complement preconditioner',
+            self.schur_preconditioner,
+            SCHUR_PRECONDITIONERS,
+            input_path,
+        )
+        simulation.log.info(
+            '    Using field split Schur complement preconditioner %r' % self.schur_preconditioner
+        )
+
+        self._create_index_sets()
+        self.solver.ksp().getPC().setFieldSplitIS(('u', self.is_u), ('p', self.is_p))
+
+        self._submatrices = {}
+        self._schur = None
+        self._Ainv = None
+        self._mass = None
+        self._mass_form = None
+        self._is_p_in_Vp = None
+        self._velocity_cell_dofs = None
+        self.schur_matrix = None
+
+    def _create_index_sets(self):
+        """
+        Create the PETSc index sets of the velocity and pressure blocks. The
+        dofs in each set are sorted, so the row number in a sub matrix is the
+        position of the dof in the set
+        """
+        from petsc4py import PETSc
+
+        comm = self.V.mesh().mpi_comm()
+        start = self.V.dofmap().ownership_range()[0]
+        p_dofs = numpy.asarray(self.p_subspace.dofmap().dofs(), PETSc.IntType)
+        all_dofs = numpy.arange(start, self.V.dofmap().ownership_range()[1], dtype=PETSc.IntType)
+        u_dofs = numpy.setdiff1d(all_dofs, p_dofs)
+        p_dofs.sort()
+
+        self.is_u = PETSc.IS().createGeneral(u_dofs, comm=comm)
+        self.is_p = PETSc.IS().createGeneral(p_dofs, comm=comm)
+        self.u_dofs_local = u_dofs - start
+        self.p_dofs_local = p_dofs - start
+
+    def update(self, A):
+        """
+        Prepare the preconditioner for solving with the matrix A. The
+        preconditioner is only rebuilt when A has changed
+        """
+        changed = self.solver.operator_changed(A)
+        self.solver.set_reuse_preconditioner(not changed)
+        if not changed or self.schur_preconditioner == 'petsc':
+            return
+
+        from petsc4py import PETSc
+
+        if self.schur_preconditioner == 'pressure_mass':
+            S = self._pressure_mass_schur(A)
+        else:
+            S = self._block_diagonal_schur(A)
+        self.schur_matrix = S
+        pc = self.solver.ksp().getPC()
+        pc.setFieldSplitSchurPreType(PETSc.PC.SchurPreType.USER, S)
+
+    def _get_submatrix(self, A, name, isrow, iscol):
+        """
+        Extract a block of the matrix A, reusing the sub matrix of the
+        previous call with the same name
+        """
+        prev = self._submatrices.get(name)
+        mat = dolfin.as_backend_type(A).mat().createSubMatrix(isrow, iscol, submat=prev)
+        self._submatrices[name] = mat
+        return mat
+
+    def _pressure_mass_schur(self, A):
+        """
+        The pressure mass matrix scaled by 1/μ and with the same sign as the
+        Schur complement. The matrix is assembled on the collapsed pressure
+        space and mapped to the rows of the pressure block. Re-assembled
+        every time since μ and the mesh may change
+        """
+        if self._mass_form is None:
+            sim = self.simulation
+            mu = sim.multi_phase_model.get_laminar_dynamic_viscosity(0)
+            Vp, collapsed_dofs = self.p_subspace.collapse(collapsed_dofs=True)
+            p, q = dolfin.TrialFunction(Vp), dolfin.TestFunction(Vp)
+            self._mass_form = dolfin.Form(1 / mu * p * q * dolfin.dx)
+            self._is_p_in_Vp = self._get_pressure_block_dofs(Vp, collapsed_dofs)
+
+        self._mass = dolfin.assemble(self._mass_form, tensor=self._mass)
+        isp = self._is_p_in_Vp
+        Mp = self._get_submatrix(self._mass, 'Mp', isp, isp)
+        Mp.scale(self.schur_sign)
+        return Mp
+
+    def _get_pressure_block_dofs(self, Vp, collapsed_dofs):
+        """
+        The global dofs of the collapsed pressure space Vp in the order of
+        the rows of the pressure block. The collapsed_dofs dictionary maps
+        the local dofs of Vp to the local dofs of the mixed space
+        """
+        from petsc4py import PETSc
+
+        mixed_to_Vp = {mixed: dof for dof, mixed in collapsed_dofs.items()}
+        dm = Vp.dofmap()
+        dofs = [dm.local_to_global_index(mixed_to_Vp[dof]) for dof in self.p_dofs_local]
+        dofs = numpy.array(dofs, PETSc.IntType)
+        return PETSc.IS().createGeneral(dofs, comm=self.V.mesh().mpi_comm())
+
+    def _block_diagonal_schur(self, A):
+        """
+        The approximate Schur complement A11 - A10⋅Ã⁻¹⋅A01 where Ã is the
+        cell block diagonal of the velocity block A00. The product is
+        computed by SchurComplement
+        """
+        from petsc4py import PETSc
+
+        A00 = dolfin.PETScMatrix(self._get_submatrix(A, 'A00', self.is_u, self.is_u))
+        A01 = dolfin.PETScMatrix(self._get_submatrix(A, 'A01', self.is_u, self.is_p))
+        A10 = dolfin.PETScMatrix(self._get_submatrix(A, 'A10', self.is_p, self.is_u))
+        A11 = self._get_submatrix(A, 'A11', self.is_p, self.is_p)
+
+        # Invert the dense cell blocks of A00
+        cell_dofs = self._get_velocity_cell_dofs()
+        blocks = get_block_diagonal_blocks(A00, cell_dofs)
+        self._Ainv = set_block_diagonal_blocks(A00, cell_dofs, numpy.linalg.inv(blocks), self._Ainv)
+
+        # Compute A11 - A10⋅Ã⁻¹⋅A01
+        if self._schur is None:
+            self._schur = SchurComplement(self.simulation, 'coupled A10 Atinv A01')
+        self._schur.update(A10, self._Ainv, A01)
+        S = self._schur.preconditioner_matrix.mat().copy()
+        S.aypx(-1.0, A11, structure=PETSc.Mat.Structure.DIFFERENT_NONZERO_PATTERN)
+        return S
+
+    def _get_velocity_cell_dofs(self):
+        """
+        The rows of the velocity block A00 belonging to each cell, shape
+        (ncells, N). All velocity dofs must be owned by exactly one cell
+        """
+        if self._velocity_cell_dofs is not None:
+            return self._velocity_cell_dofs
+
+        mesh = self.V.mesh()
+        num_cells = mesh.topology().ghost_offset(mesh.topology().dim())
+        dofmaps = [V.dofmap() for V in self.u_subspaces]
+        N = sum(V.element().space_dimension() for V in self.u_subspaces)
+        cell_dofs = numpy.zeros((num_cells, N), numpy.int64)
+        for i in range(num_cells):
+            cell_dofs[i] = numpy.concatenate([dm.cell_dofs(i) for dm in dofmaps])
+
+        # Position of each local dof in the velocity block, -1 if not in it
+        num_owned = self.V.dofmap().ownership_range()
+        num_owned = num_owned[1] - num_owned[0]
+        pos = numpy.full(num_owned + 1, -1, numpy.int64)
+        pos[self.u_dofs_local] = numpy.arange(len(self.u_dofs_local))
+        cell_dofs = pos[numpy.minimum(cell_dofs, num_owned)]
+
+        rows = numpy.sort(cell_dofs.ravel())
+        ok = rows.size == len(self.u_dofs_local) and numpy.array_equal(
+            rows, numpy.arange(len(self.u_dofs_local))
+        )
+        if dolfin.MPI.min(self.V.mesh().mpi_comm(), float(ok)) < 1:
+            ocellaris_error(
+                'Block diagonal Schur complement preconditioner error',
+                'The block_diagonal Schur complement preconditioner requires '
+                'DG velocities with all dofs in the velocity block, use the '
+                'pressure_mass or petsc Schur complement preconditioner instead',
+            )
+
+        self._velocity_cell_dofs = cell_dofs.astype(numpy.intc)
+        return self._velocity_cell_dofs
@@ -72,6 +72,10 @@ class HydrostaticPressure:
             self.null_space.orthogonalize(b)
             self.solver.solve(A, self.func.vector(), b)
 
+            # The matrix never changes, so the preconditioner can be reused
+            if getattr(self.solver, 'reuse_unchanged_operator', False):
+                self.solver.set_reuse_preconditioner(True)
+
         if not self.every_timestep:
             # Give initial values for p, but do not continuously compute p_hydrostatic
             sim = self.simulation
@@ -1,8 +1,17 @@
-from collections import deque
+import heapq
 import numpy
 import dolfin
+from ocellaris.cpp import load_module
 from ocellaris.probes.free_surface_locator import get_free_surface_locator
-from ocellaris.utils import get_local
+from ocellaris.utils import local_vector_view, GhostExchange
+
+
+# Default values, can be changed in the input file
+USE_CPP = True
+NARROW_BAND = 0
+
+# The distance value of dofs that have not been reached from a crossing
+UNREACHED = 1e100
 
 
 class LevelSetView:
@@ -32,6 +41,22 @@ class LevelSetView:
         self.level_set_function = dolfin.Function(V)
         self.cache = preprocess(simulation, self.level_set_function)
 
+        inp = simulation.input
+        self.use_cpp = inp.get_value('multiphase_solver/level_set_view_use_cpp', USE_CPP, 'bool')
+
+        # Only compute distances within a narrow band of N cell layers
+        # around the free surface. Values outside are set to the band width
+        num_layers = inp.get_value(
+            'multiphase_solver/level_set_view_narrow_band', NARROW_BAND, 'int'
+        )
+        if num_layers > 0:
+            weights = self.cache[4]
+            max_edge = weights.max() if len(weights) else 0.0
+            max_edge = dolfin.MPI.max(mesh.mpi_comm(), float(max_edge))
+            self.band_width = num_layers * max_edge
+        else:
+            self.band_width = None
+
     def add_update_callback(self, cb):
         """
         Other functionality may depend on the level set view and want to
@@ -82,8 +107,15 @@ class LevelSetView:
     def _update_from_vof(self):
         # This can be expensive, will involve recomputing the crossing
         # points if the density function has changed since the last access
-        crossings = self._locator.crossing_points
-        update_level_set_view(self.simulation, self.level_set_function, crossings, self.cache)
+        crossings = self._locator.crossings
+        update_level_set_view(
+            self.simulation,
+            self.level_set_function,
+            crossings,
+            self.cache,
+            self.band_width,
+            self.use_cpp,
+        )
 
 
 def float_to_ident(v):
@@ -95,7 +127,10 @@ def float_to_ident(v):
 
 def preprocess(simulation, level_set_view):
     """
-    Compute distance between dofs
+    Compute the dof graph with the distances between dofs that share a
+    cell. The graph is returned in CSR format, the neighbours of dof i are
+    indices[indptr[i]:indptr[i + 1]] with the distances in the same
+    positions in the weights array
     """
     V = level_set_view.function_space()
     mesh = V.mesh()
@@ -103,118 +138,110 @@ def preprocess(simulation, level_set_view):
 
     # Get coordinates of both regular and ghost dofs
     dofs_x, Nlocal = all_dof_coordinates(V)
-
-    cell_dofs = [None] * mesh.num_cells()
-    dof_cells = [[] for _ in range(V.dim())]
-    dof_dist = {}
-    for cell in dolfin.cells(mesh, 'all'):
-        cid = cell.index()
-        dofs = dm.cell_dofs(cid)
-        cell_dofs[cid] = list(dofs)
-        for dof in dofs:
-            dof_cells[dof].append(cid)
-
-            # Store distance between the cell dofs
-            for dof2 in dofs:
-                if dof == dof2:
-                    continue
-                p1 = dofs_x[dof]
-                p2 = dofs_x[dof2]
-                vec = p1 - p2
-                d = (vec[0] ** 2 + vec[1] ** 2 + vec[2] ** 2) ** 0.5
-                dof_dist[(dof, dof2)] = d
-                dof_dist[(dof2, dof)] = d
-
-    return dofs_x, dof_dist, cell_dofs, dof_cells
-
-
-def update_level_set_view(simulation, level_set_view, crossings, cache):
+    Ndofs = len(dofs_x)
+
+    # Dofs of both regular and ghost cells
+    cell_dofs = numpy.array([dm.cell_dofs(cid) for cid in range(mesh.num_cells())], numpy.intc)
+    cell_dofs = cell_dofs.reshape((mesh.num_cells(), -1))
+
+    # All pairs of different dofs in the same cell, each pair only once
+    ndpc = cell_dofs.shape[1]
+    rows, cols = [], []
+    for i in range(ndpc):
+        for j in range(ndpc):
+            if i != j:
+                rows.append(cell_dofs[:, i])
+                cols.append(cell_dofs[:, j])
+    keys = numpy.concatenate(rows).astype(numpy.int64) * Ndofs + numpy.concatenate(cols)
+    keys = numpy.unique(keys)
+    rows = keys // Ndofs
+    cols = keys % Ndofs
+
+    # The graph in CSR format with the distance between dofs as edge weights
+    indptr = numpy.zeros(Ndofs + 1, numpy.intc)
+    indptr[1:] = numpy.cumsum(numpy.bincount(rows, minlength=Ndofs))
+    indices = cols.astype(numpy.intc)
+    weights = numpy.linalg.norm(dofs_x[rows] - dofs_x[cols], axis=1)
+
+    return dofs_x, cell_dofs, indptr, indices, weights
+
+
+def update_level_set_view(
+    simulation, level_set_view, crossings, cache, band_width=None, use_cpp=USE_CPP
+):
     """
     Create a level set CG1 scalar function where the value is 0 at the
-    given crossing point locations and approximately the distance to the
+    given crossing point locations (a Crossings object) and approximately the distance to the
     nearest crossing point by following the edges of the mesh away from
     the crossing points and keeping track of the closest such point
+
+    If a band width is given the distances are only computed up to this
+    value, and all dofs further away are given the band width as value
     """
-    dofs_x, dof_dist, cell_dofs, dof_cells = cache
+    dofs_x, cell_dofs = cache[:2]
+    cutoff = UNREACHED if band_width is None else band_width
 
     values = level_set_view.vector().get_local()
-    values[:] = 1e100
+    values[:] = UNREACHED
     Nlocal = len(values)
 
     # For MPI ranks that contain the free surface we first fill out the
     # distance values starting at the free surface
-    if crossings:
+    if len(crossings):
         # Mark distances in cells with a free surface
-        for cid, cross in crossings.items():
-            for crossing_point, direction in cross:
-                for dof in cell_dofs[cid]:
-                    if dof < Nlocal:
-                        dpos = dofs_x[dof]
-                        vec = dpos - crossing_point
-                        dist = (vec[0] ** 2 + vec[1] ** 2 + vec[2] ** 2) ** 0.5
-
-                        # Make the level set function a signed distance function
-                        # if vec.dot(direction) < 0:
-                        #     dist = -dist
-
-                        if abs(dist) < abs(values[dof]):
-                            values[dof] = dist
-
-        # Breadth-first search to populate all of the local domain
-        queue = deque()
-        for cid in crossings:
-            queue.extend([d for d in cell_dofs[cid] if d < Nlocal])
-        bfs(queue, values, cell_dofs, dof_cells, dof_dist)
+        dofs = cell_dofs[crossings.cells]
+        dist = numpy.linalg.norm(dofs_x[dofs] - crossings.points[:, None, :], axis=2)
+        owned = dofs < Nlocal
+        numpy.minimum.at(values, dofs[owned], dist[owned])
+
+        # Propagate the distances to all of the local domain
+        propagate_distances(values, cache, cutoff, use_cpp)
 
     # Update ghost cell values
     level_set_view.vector().set_local(values)
     level_set_view.vector().apply('insert')
 
-    # Breadth first search from ghost dofs
-    values2 = get_local(level_set_view)
-    queue = deque(range(Nlocal, len(values2)))
-    bfs(queue, values2, cell_dofs, dof_cells, dof_dist)
-    level_set_view.vector().set_local(values2[:Nlocal])
-    level_set_view.vector().apply('insert')
+    # Propagate distances from the ghost dofs
+    with local_vector_view(level_set_view, writable=True) as values2:
+        propagate_distances(values2, cache, cutoff, use_cpp)
+        if band_width is not None:
+            values2[values2 > band_width] = band_width
 
 
-def bfs(queue, values, cell_dofs, dof_cells, dof_dist):
+def propagate_distances(values, cache, cutoff=UNREACHED, use_cpp=USE_CPP):
     """
-    Breadth-first search to populate all of the local domain, starting
-    from a deque "queue" which contains dofs indices where the search
-    should start
+    Dijkstra's algorithm to populate all of the local domain starting from
+    the dofs with a value lower than the cutoff. Only the dofs with indices
+    lower than len(values) are updated. Returns the number of visited dofs
     """
-    checks = 0
+    indptr, indices, weights = cache[2:]
+    if use_cpp:
+        cpp_mod = load_module('level_set_view')
+        return cpp_mod.propagate_distances(indptr, indices, weights, values, cutoff)
+
     Nval = len(values)
+    queue = [(v, dof) for dof, v in enumerate(values) if v < cutoff]
+    heapq.heapify(queue)
+    checks = 0
 
     while queue:
-        dof = queue.popleft()
-        checks += 1
-        dval = values[dof]
-
-        for cid in dof_cells[dof]:
-            for dof2 in cell_dofs[cid]:
-                if dof2 == dof or dof2 >= Nval:
-                    continue
-
-                # Compute the additional distance to dof2
-                dx = dof_dist[(dof, dof2)]
-                dval2 = values[dof2]
+        dval, dof = heapq.heappop(queue)
 
-                # Used when the level set function is the signed distance.
-                # Has some problems with inaccurate surface normals
-                # s = 1 if dval >= 0 else -1
-                # distance_to_crossing = dval + s * dx
-
-                # Unsigned distance function
-                distance_to_crossing = dval + dx
+        # Skip outdated queue items
+        if dval > values[dof]:
+            continue
+        checks += 1
 
-                # Update if we have found a shorter path to a crossing
-                if abs(distance_to_crossing) < abs(dval2):
-                    values[dof2] = distance_to_crossing
+        for i in range(indptr[dof], indptr[dof + 1]):
+            dof2 = indices[i]
+            if dof2 >= Nval:
+                continue
 
-                    # Update neighbours since we changed
-                    queue.append(dof2)
+            # Update if we have found a shorter path to a crossing
+            distance_to_crossing = dval + weights[i]
+            if distance_to_crossing < values[dof2] and distance_to_crossing <= cutoff:
+                values[dof2] = distance_to_crossing
+                heapq.heappush(queue, (distance_to_crossing, dof2))
 
     return checks
 
@@ -225,16 +252,14 @@ def all_dof_coordinates(V):
     but also includes the ghosts dofs. This always returns 3-vectors for
     the coordinates, even if the mesh is 2D or 1D.
 
-    This has all communication going via the root. Consider rewriting this
-    by using DofMap.off_process_owner to avoid the root botleneck for
-    large MPI runs
+    The ghost dof coordinates are fetched from the processes that own the
+    ghost dofs, there is no communication via the root process
     """
     mesh = V.mesh()
 
     # Get coordinates of regular dofs
     gdim = mesh.geometry().dim()
     dofs_x = V.tabulate_dof_coordinates().reshape((-1, gdim))
-    global_dofs = V.dofmap().tabulate_local_to_global_dofs()
     Nlocal = len(dofs_x)
 
     # Make sure dof positions are 3-vectors
@@ -248,40 +273,8 @@ def all_dof_coordinates(V):
     if comm.size == 1:
         return dofs_x, Nlocal
 
-    # Missing and present information
-    missing_dofs = global_dofs[Nlocal:]
-    present_dofs = global_dofs[:Nlocal]
-
-    # Send list of global dofs which we want to know the coordinates for
-    # along with the global dofs where we know the coordinates
-    alldata = comm.gather((missing_dofs, present_dofs, dofs_x))
-
-    # Global dof coordinate map, may need to be changed for comm.size >> 1
-    if comm.rank == 0:
-        # Build global dof coordinate mapping using each ranks info
-        global_dofs_x = {}
-        for _rank_missing_dofs, rank_present_dofs, rank_dofs_x in alldata:
-            for gdof, coord in zip(rank_present_dofs, rank_dofs_x):
-                global_dofs_x[gdof] = coord
-
-        # Find the missing local data in the global mapping for each rank
-        ret_data = []
-        for rank_missing_dofs, _rank_present_dofs, _rank_dofs_x in alldata:
-            ret = []
-            ret_data.append(ret)
-            for gdof in rank_missing_dofs:
-                ret.append(global_dofs_x[gdof])
-    else:
-        ret_data = None
-
-    # Get back the missing values
-    ghost_coords = comm.scatter(ret_data)
-
     # Create dof coordinates with ghost positions
-    dofs_x_all = numpy.zeros((len(global_dofs), 3), float)
-    dofs_x_all[:Nlocal] = dofs_x
-    for i, coord in enumerate(ghost_coords):
-        dofs_x_all[Nlocal + i] = coord
+    ghost_coords = GhostExchange(V).get_ghost_values(dofs_x)
+    dofs_x_all = numpy.concatenate([dofs_x, ghost_coords])
 
     return dofs_x_all, Nlocal
-
@@ -180,6 +180,17 @@ def SlopeLimiter(simulation, phi_name, phi):
 
 from ocellaris.cpp import load_module
 
-LocalMaximaMeasurer = load_module('measure_local_maxima').LocalMaximaMeasurer
+
+def LocalMaximaMeasurer(mesh, num_threads=1):
+    """
+    Create the C++ local maxima measurer, the C++ module is compiled or
+    loaded from the cache the first time this is called. The module is
+    compiled with OpenMP support when more than one thread is requested
+    """
+    name = 'measure_local_maxima_openmp' if num_threads > 1 else 'measure_local_maxima'
+    measurer = load_module(name).LocalMaximaMeasurer(mesh)
+    measurer.num_threads = num_threads
+    return measurer
+
 
 from . import hierarchical_taylor
@@ -1,11 +1,16 @@
+from contextlib import ExitStack
 import numpy
 import dolfin as df
 from ocellaris.utils import verify_key, OcellarisError
-from ocellaris.utils import lagrange_to_taylor, taylor_to_lagrange, get_local, set_local
+from ocellaris.utils import lagrange_to_taylor, taylor_to_lagrange, get_local, local_vector_view
 from . import register_slope_limiter, SlopeLimiterBase
 from .limiter_cpp_utils import SlopeLimiterInput
 
 
+# Default values, can be changed in the input file
+NUM_THREADS = 1
+
+
 @register_slope_limiter('HierarchicalTaylor')
 class HierarchicalTaylorSlopeLimiter(SlopeLimiterBase):
     description = 'Uses a Taylor DG decomposition to limit derivatives at the vertices'
@@ -37,6 +42,7 @@ class HierarchicalTaylorSlopeLimiter(SlopeLimiterBase):
         enforce_bcs = limiter_input.get_value('enforce_bcs', True, 'bool')
         use_weak_bcs = limiter_input.get_value('use_weak_bcs', True, 'bool')
         trust_robin_dval = limiter_input.get_value('trust_robin_dval', True, 'bool')
+        num_threads = limiter_input.get_value('num_threads', NUM_THREADS, 'int')
         simulation.log.info('        Enforce global bounds: %r' % enforce_bounds)
         simulation.log.info('        Enforcing BCs: %r' % enforce_bcs)
         simulation.log.info('        Using weak BCs: %r' % use_weak_bcs)
@@ -80,10 +86,22 @@ class HierarchicalTaylorSlopeLimiter(SlopeLimiterBase):
                 self.limit_cell[cid] = 0
 
         self.input = SlopeLimiterInput(
-            mesh, V, V0, use_cpp=use_cpp, trust_robin_dval=trust_robin_dval
+            mesh,
+            V,
+            V0,
+            use_cpp=use_cpp,
+            trust_robin_dval=trust_robin_dval,
+            num_threads=num_threads,
         )
         if use_cpp:
             self.cpp_mod = self.input.get_cpp_mod()
+            if num_threads > 1 and not self.cpp_mod.has_openmp():
+                simulation.log.warning(
+                    '        The C++ limiter could not be compiled with OpenMP, '
+                    'running the cell loops for num_threads = %d in serial' % num_threads
+                )
+            elif num_threads > 1:
+                simulation.log.info('        Using %d threads' % num_threads)
 
     def run(self, use_weak_bcs=None):
         """
@@ -96,7 +114,6 @@ class HierarchicalTaylorSlopeLimiter(SlopeLimiterBase):
 
         # Update the Taylor function with the current Lagrange values
         lagrange_to_taylor(self.phi, self.taylor)
-        taylor_arr = get_local(self.taylor)
         alpha_arrs = [alpha.vector().get_local() for alpha in self.alpha_funcs]
 
         # Get global bounds, see SlopeLimiterBase.set_initial_field()
@@ -105,57 +122,70 @@ class HierarchicalTaylorSlopeLimiter(SlopeLimiterBase):
         # Update previous field values Taylor functions
         if self.phi_old is not None:
             lagrange_to_taylor(self.phi_old, self.taylor_old)
-            taylor_arr_old = get_local(self.taylor_old)
-        else:
-            taylor_arr_old = taylor_arr
-
-        # Get updated boundary conditions
-        weak_vals = None
-        use_weak_bcs = self.use_weak_bcs if use_weak_bcs is None else use_weak_bcs
-        if use_weak_bcs:
-            weak_vals = self.phi.vector().get_local()
-        boundary_dof_type, boundary_dof_value = self.boundary_conditions.get_bcs(weak_vals)
-
-        # Run the limiter implementation
-        if self.use_cpp:
-            self._run_cpp(
-                taylor_arr,
-                taylor_arr_old,
-                alpha_arrs,
-                global_min,
-                global_max,
-                boundary_dof_type,
-                boundary_dof_value,
-            )
-        elif self.degree == 1 and self.ndim == 2:
-            self._run_dg1(
-                taylor_arr,
-                taylor_arr_old,
-                alpha_arrs[0],
-                global_min,
-                global_max,
-                boundary_dof_type,
-                boundary_dof_value,
-            )
-        elif self.degree == 2 and self.ndim == 2:
-            self._run_dg2(
-                taylor_arr,
-                taylor_arr_old,
-                alpha_arrs[0],
-                alpha_arrs[1],
-                global_min,
-                global_max,
-                boundary_dof_type,
-                boundary_dof_value,
-            )
-        else:
-            raise OcellarisError(
-                'Unsupported dimension for Python version of the HierarchalTaylor limiter',
-                'Only 2D is supported',
-            )
 
+        # The limiter works directly on the local values of the Taylor
+        # function, the ghost values are updated at the end of the block
+        with ExitStack() as stack:
+            taylor_arr = stack.enter_context(local_vector_view(self.taylor, writable=True))
+            if self.phi_old is not None:
+                taylor_arr_old = stack.enter_context(local_vector_view(self.taylor_old))
+            else:
+                taylor_arr_old = taylor_arr
+
+            # Get updated boundary conditions
+            weak_vals = None
+            use_weak_bcs = self.use_weak_bcs if use_weak_bcs is None else use_weak_bcs
+            if use_weak_bcs:
+                weak_vals = self.phi.vector().get_local()
+            boundary_dof_type, boundary_dof_value = self.boundary_conditions.get_bcs(weak_vals)
+
+            # Run the limiter implementation
+            if self.use_cpp:
+                self._run_cpp(
+                    taylor_arr,
+                    taylor_arr_old,
+                    alpha_arrs,
+                    global_min,
+                    global_max,
+                    boundary_dof_type,
+                    boundary_dof_value,
+                )
+            elif self.degree == 1 and self.ndim == 2:
+                self._run_dg1(
+                    taylor_arr,
+                    taylor_arr_old,
+                    alpha_arrs[0],
+                    global_min,
+                    global_max,
+                    boundary_dof_type,
+                    boundary_dof_value,
+                )
+            elif self.degree == 2 and self.ndim == 2:
+                self._run_dg2(
+                    taylor_arr,
+                    taylor_arr_old,
+                    alpha_arrs[0],
+                    alpha_arrs[1],
+                    global_min,
+                    global_max,
+                    boundary_dof_type,
+                    boundary_dof_value,
+                )
+            else:
+                raise OcellarisError(
+                    'Unsupported dimension for Python version of the HierarchalTaylor limiter',
+                    'Only 2D is supported',
+                )
+
+        self._update_lagrange(boundary_dof_type, boundary_dof_value, alpha_arrs)
+        timer.stop()
+
+    def _update_lagrange(self, boundary_dof_type, boundary_dof_value, alpha_arrs):
+        """
+        Update the Lagrange function and the alpha functions after the Taylor
+        function has been limited
+        """
         # Update the Lagrange function with the limited Taylor values
-        set_local(self.taylor, taylor_arr, apply='insert')
         taylor_to_lagrange(self.taylor, self.phi)
 
         # Enforce boundary conditions
@@ -171,8 +201,6 @@ class HierarchicalTaylorSlopeLimiter(SlopeLimiterBase):
             alpha.vector().set_local(alpha_arr)
             alpha.vector().apply('insert')
 
-        timer.stop()
-
     def _run_cpp(
         self,
         taylor_arr,
@@ -378,3 +406,116 @@ class HierarchicalTaylorSlopeLimiter(SlopeLimiterBase):
             dof_dg0 = self.cell_dofs_V0[icell]
             alpha1_arr[dof_dg0] = alpha1
             alpha2_arr[dof_dg0] = alpha2
+
+
+class HierarchicalTaylorSlopeLimiterVector(object):
+    def __init__(self, limiters):
+        """
+        Limit all components of a vector field in one call to the C++
+        HierarchicalTaylor limiter. The component limiters must all be
+        HierarchicalTaylorSlopeLimiters using the C++ implementation on the
+        same function space, see the supports() method. The connectivity of
+        the first component limiter is shared by all components, while the
+        bounds, boundary conditions and cells to limit are taken from each
+        component limiter every time the limiter runs
+        """
+        assert self.supports(limiters)
+        self.limiters = limiters
+        lim0 = limiters[0]
+        self.degree = lim0.degree
+        self.ndim = lim0.ndim
+        self.input = lim0.input
+        self.cpp_mod = lim0.cpp_mod
+
+        funcs = {
+            (2, 1): self.cpp_mod.hierarchical_taylor_slope_limiter_dg1_2D_vec,
+            (2, 2): self.cpp_mod.hierarchical_taylor_slope_limiter_dg2_2D_vec,
+            (3, 1): self.cpp_mod.hierarchical_taylor_slope_limiter_dg1_3D_vec,
+            (3, 2): self.cpp_mod.hierarchical_taylor_slope_limiter_dg2_3D_vec,
+        }
+        key = (self.ndim, self.degree)
+        if key not in funcs:
+            raise OcellarisError(
+                'Unsupported dimension %d with degree %d' % key,
+                'Not supported in C++ version of the HierarchalTaylor limiter',
+            )
+        self.limiter = funcs[key]
+
+        # Work arrays with one row per component
+        ncomp = len(limiters)
+        num_dofs = get_local(lim0.taylor).size
+        num_dofs_owned = lim0.phi.vector().local_size()
+        num_cells_owned = lim0.num_cells_owned
+        self.taylor_arrs = numpy.zeros((ncomp, num_dofs), float)
+        self.taylor_arrs_old = numpy.zeros((ncomp, num_dofs), float)
+        self.alpha_arrs = [numpy.zeros((ncomp, num_cells_owned), float) for _ in range(self.degree)]
+        self.limit_cell = numpy.zeros((ncomp, num_cells_owned), numpy.intc)
+        self.boundary_dof_type = numpy.zeros((ncomp, num_dofs_owned), numpy.intc)
+        self.boundary_dof_value = numpy.zeros((ncomp, num_dofs_owned), float)
+
+    @staticmethod
+    def supports(limiters):
+        """
+        Check if the given component limiters can be run as one vector limiter
+        """
+        if not limiters:
+            return False
+        lim0 = limiters[0]
+        V0 = lim0.phi.function_space()
+        for lim in limiters:
+            if not isinstance(lim, HierarchicalTaylorSlopeLimiter):
+                return False
+            if not lim.use_cpp or lim.degree == 0 or lim.degree != lim0.degree:
+                return False
+            if lim.phi.function_space() != V0:
+                return False
+        return True
+
+    def run(self, use_weak_bcs=None):
+        """
+        Perform slope limiting of all the DG Lagrange component functions
+        """
+        timer = df.Timer('Ocellaris HierarchalTaylorSlopeLimiterVector')
+        lims = self.limiters
+        has_old = all(lim.phi_old is not None for lim in lims)
+        global_min = numpy.zeros(len(lims), float)
+        global_max = numpy.zeros(len(lims), float)
+
+        # Gather the Taylor values and boundary conditions of all components
+        for i, lim in enumerate(lims):
+            lagrange_to_taylor(lim.phi, lim.taylor)
+            with local_vector_view(lim.taylor) as arr:
+                self.taylor_arrs[i] = arr
+            if has_old:
+                lagrange_to_taylor(lim.phi_old, lim.taylor_old)
+                with local_vector_view(lim.taylor_old) as arr:
+                    self.taylor_arrs_old[i] = arr
+
+            weak_vals = None
+            use_weak = lim.use_weak_bcs if use_weak_bcs is None else use_weak_bcs
+            if use_weak:
+                weak_vals = lim.phi.vector().get_local()
+            bc_type, bc_value = lim.boundary_conditions.get_bcs(weak_vals)
+            self.boundary_dof_type[i] = bc_type
+            self.boundary_dof_value[i] = bc_value
+            self.limit_cell[i] = lim.limit_cell
+            global_min[i], global_max[i] = lim.global_bounds
+
+        # Run the C++ limiter for all components at once
+        self.input.cpp_obj.set_component_values(
+            global_min, global_max, self.limit_cell, self.boundary_dof_type, self.boundary_dof_value
+        )
+        taylor_arrs_old = self.taylor_arrs_old if has_old else self.taylor_arrs
+        self.limiter(self.input.cpp_obj, self.taylor_arrs, taylor_arrs_old, *self.alpha_arrs)
+
+        # Update the Lagrange functions with the limited Taylor values
+        for i, lim in enumerate(lims):
+            with local_vector_view(lim.taylor, writable=True) as arr:
+                arr[:] = self.taylor_arrs[i]
+            lim._update_lagrange(
+                self.boundary_dof_type[i],
+                self.boundary_dof_value[i],
+                [alpha_arrs[i] for alpha_arrs in self.alpha_arrs],
+            )
+
+        timer.stop()
@@ -4,7 +4,7 @@ from ocellaris.utils import get_dof_neighbours
 
 
 class SlopeLimiterInput(object):
-    def __init__(self, mesh, V, V0, use_cpp=True, trust_robin_dval=True):
+    def __init__(self, mesh, V, V0, use_cpp=True, trust_robin_dval=True, num_threads=1):
         """
         This class stores the connectivity and dof maps necessary to
         perform slope limiting in an efficient manner in the C++ code
@@ -35,7 +35,10 @@ class SlopeLimiterInput(object):
 
         # Call the C++ method that makes the arrays available to the C++ limiter
         if use_cpp:
-            self.cpp_mod = load_module('hierarchical_taylor')
+            if num_threads > 1:
+                self.cpp_mod = load_module('hierarchical_taylor_openmp')
+            else:
+                self.cpp_mod = load_module('hierarchical_taylor')
             self.cpp_obj = self.cpp_mod.SlopeLimiterInput()
             self.cpp_obj.set_arrays(
                 self.num_cells_owned,
@@ -47,6 +50,7 @@ class SlopeLimiterInput(object):
                 self.vertex_coordinates,
             )
             self.cpp_obj.trust_robin_dval = trust_robin_dval
+            self.cpp_obj.num_threads = num_threads
 
     def set_global_bounds(self, global_min, global_max):
         """
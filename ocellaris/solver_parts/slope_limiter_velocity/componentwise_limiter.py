@@ -1,6 +1,9 @@
 import numpy
 from ocellaris.utils import ocellaris_error, verify_key
 from ocellaris.solver_parts.slope_limiter import SlopeLimiter
+from ocellaris.solver_parts.slope_limiter.hierarchical_taylor import (
+    HierarchicalTaylorSlopeLimiterVector,
+)
 from . import register_velocity_slope_limiter, VelocitySlopeLimiterBase
 from .velocity_limiter_helpers import create_component_limiters
 
@@ -33,6 +36,12 @@ class ComponentwiseSlopeLimiterVelocity(VelocitySlopeLimiterBase):
             simulation, vel_name, vel_u, comp_method
         )
 
+        # Limit all components in one go if the component limiters support it
+        self.vector_limiter = None
+        if HierarchicalTaylorSlopeLimiterVector.supports(self.limiters):
+            self.vector_limiter = HierarchicalTaylorSlopeLimiterVector(self.limiters)
+            simulation.log.info('    Limiting all components of %s together' % vel_name)
+
         # Check that we can limit only certain cells
         if self.limit_selected_cells_only:
             for lim in self.limiters:
@@ -93,8 +102,11 @@ class ComponentwiseSlopeLimiterVelocity(VelocitySlopeLimiterBase):
                 lim.limit_cell[:] = surface_cells[:Ncells]
 
         # Perform limiting
-        for lim in self.limiters:
-            lim.run()
+        if self.vector_limiter is not None:
+            self.vector_limiter.run()
+        else:
+            for lim in self.limiters:
+                lim.run()
 
         # Apply limiting also to the convective field?
         if self.limit_conv:
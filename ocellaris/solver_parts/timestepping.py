@@ -23,37 +23,108 @@ def before_simulation(simulation, force_steady=False):
 
     if force_steady:
         simulation.log.info('Setting time derivatives to zero')
-        simulation.data['time_coeffs'].assign(dolfin.Constant([0.0, 0.0, 0.0]))
     elif starting_order == 2:
         # Switch to second order time stepping
         simulation.log.info(
             'Initial values for upp are found and used, '
             'starting with second order time stepping.'
         )
-        simulation.data['time_coeffs'].assign(dolfin.Constant([3 / 2, -2.0, 1 / 2]))
     else:
         # Standard first order time stepping
         simulation.log.info(
             'Initial values for upp are not found, ' 'starting with first order time stepping.'
         )
-        simulation.data['time_coeffs'].assign(dolfin.Constant([1.0, -1.0, 0.0]))
+    set_time_coefficients(simulation, starting_order, force_steady=force_steady)
     update_convection(simulation, starting_order, force_steady=force_steady)
 
+    # Correct the coefficients when the time step changes. This hook is added
+    # last, so it runs before the other pre timestep hooks
+    simulation.hooks.add_pre_timestep_hook(
+        lambda timestep_number, t, dt: on_new_timestep(simulation),
+        'Update time stepping coefficients',
+    )
+
     simulation.log.info('\nTime loop is now starting\n', flush='force')
 
 
-def update_timestep(simulation):
+def update_timestep(simulation, t, tmax):
+    """
+    Get the time step for the next time step, starting at time t. This is
+    chosen by the time step controller if one is given in the input file.
+    The time stepping coefficients are corrected for a changed time step
+    when the new time step starts, see on_new_timestep()
+    """
+    if simulation.dt_controller is not None:
+        return simulation.dt_controller.get_dt(t, tmax)
+
+    if simulation.input_dt is None:
+        simulation.input_dt = simulation.input.get_accessor('time/dt', required_type='float')
+    return simulation.input_dt.get()
+
+
+def on_new_timestep(simulation):
+    """
+    Recompute the time stepping coefficients and the extrapolated
+    convecting velocity if the time step differs from the previous one.
+    Runs at the start of each time step, after simulation.dt has been
+    updated. The values computed in after_timestep() assume an unchanged
+    time step, so nothing needs to be done in the common case
+    """
+    ratio = get_timestep_ratio(simulation)
+    if ratio == 1.0:
+        return
+
+    order = simulation.data['time_coeffs_order']
+    force_steady = order == 0
+    set_time_coefficients(simulation, order, ratio, force_steady)
+    update_convection(simulation, order, ratio, force_steady)
+
+
+def get_timestep_ratio(simulation):
+    """
+    The ratio ω = dt / dt_prev between the current and the previous time
+    step. The ratio is 1.0 for the first time step
+    """
+    if simulation.dt_prev <= 0:
+        return 1.0
+    return simulation.dt / simulation.dt_prev
+
+
+def bdf_coefficients(order, ratio=1.0):
+    """
+    Coefficients c1, c2, c3 such that (c1 u + c2 up + c3 upp) / dt is a
+    backward difference approximation of the time derivative when the
+    previous time step was dt / ratio. For ratio = 1.0 the second order
+    coefficients are the standard BDF2 coefficients [3/2, -2, 1/2]
+    """
+    if order == 0:
+        return [0.0, 0.0, 0.0]
+    elif order == 1:
+        return [1.0, -1.0, 0.0]
+    w = ratio
+    return [(1 + 2 * w) / (1 + w), -(1 + w), w ** 2 / (1 + w)]
+
+
+def extrapolation_coefficients(order, ratio=1.0):
     """
-    Switch to first order time stepping if the timestep has changed
+    Coefficients e1, e2 such that e1 up + e2 upp extrapolates the velocity
+    to the next time step when the previous time step was dt / ratio. For
+    ratio = 1.0 the second order coefficients are [2, -1]
     """
-    dt = simulation.input.get_value('time/dt', required_type='float')
-    dt_prev = simulation.dt
+    if order < 2:
+        return [1.0, 0.0]
+    return [1.0 + ratio, -ratio]
 
-    if dt != dt_prev:
-        simulation.log.info('Temporarily changing to first order time stepping')
-        simulation.data['time_coeffs'].assign(dolfin.Constant([1.0, -1.0, 0.0]))
 
-    return dt
+def set_time_coefficients(simulation, order, ratio=1.0, force_steady=False):
+    """
+    Set the time_coeffs Constant to variable step BDF coefficients of the
+    given order (1 or 2), or to zero for steady simulations
+    """
+    if force_steady:
+        order = 0
+    simulation.data['time_coeffs_order'] = order
+    simulation.data['time_coeffs'].assign(dolfin.Constant(bdf_coefficients(order, ratio)))
 
 
 def after_timestep(simulation, is_steady, force_steady=False):
@@ -73,11 +144,9 @@ def after_timestep(simulation, is_steady, force_steady=False):
     shift_fields(simulation, ['u%d', 'up%d', 'upp%d'])
     shift_fields(simulation, ['u_conv%d', 'up_conv%d', 'upp_conv%d'])
 
-    if force_steady:
-        simulation.data['time_coeffs'].assign(dolfin.Constant([0.0, 0.0, 0.0]))
-    else:
-        # Change time coefficient to second order
-        simulation.data['time_coeffs'].assign(dolfin.Constant([3 / 2, -2, 1 / 2]))
+    # Change time coefficient to second order. The next time step is assumed
+    # to be equal to this one, on_new_timestep() corrects this if needed
+    set_time_coefficients(simulation, 2, force_steady=force_steady)
 
     # Extrapolate the convecting velocity to the next step
     update_convection(simulation, force_steady=force_steady)
@@ -85,12 +154,14 @@ def after_timestep(simulation, is_steady, force_steady=False):
     return vel_diff
 
 
-def update_convection(simulation, order=2, force_steady=False):
+def update_convection(simulation, order=2, ratio=1.0, force_steady=False):
     """
-    Update terms used to linearise and discretise the convective term
+    Update terms used to linearise and discretise the convective term. The
+    ratio is dt / dt_prev, see extrapolation_coefficients()
     """
     ndim = simulation.ndim
     data = simulation.data
+    e1, e2 = extrapolation_coefficients(order, ratio)
 
     # Update convective velocity field components
     for d in range(ndim):
@@ -101,8 +172,8 @@ def update_convection(simulation, order=2, force_steady=False):
         if order == 1 or force_steady:
             uic.assign(uip)
         else:
-            # Backwards difference formulation - standard linear extrapolation
+            # Backwards difference formulation - linear extrapolation
             uic.vector().zero()
-            uic.vector().axpy(2.0, uip.vector())
-            uic.vector().axpy(-1.0, uipp.vector())
+            uic.vector().axpy(e1, uip.vector())
+            uic.vector().axpy(e2, uipp.vector())
             uic.vector().apply('insert')
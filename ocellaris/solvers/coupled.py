@@ -8,6 +8,7 @@ from ocellaris.utils import (
     create_vector_functions,
     shift_fields,
     velocity_change,
+    ConstantNullSpace,
 )
 from ocellaris.solver_parts import (
     setup_hydrostatic_pressure,
@@ -15,6 +16,9 @@ from ocellaris.solver_parts import (
     SlopeLimiterVelocity,
     before_simulation,
     after_timestep,
+    update_timestep,
+    get_fieldsplit_parameters,
+    setup_coupled_fieldsplit,
 )
 from . import Solver, register_solver, BDM, UPWIND
 from .coupled_equations import EQUATION_SUBTYPES
@@ -48,6 +52,7 @@ class SolverCoupled(Solver):
         self.simulation = sim = simulation
         self.read_input()
         self.create_functions()
+        self.setup_fieldsplit()
         self.hydrostatic_pressure = setup_hydrostatic_pressure(
             simulation, needs_initial_value=False
         )
@@ -112,8 +117,9 @@ class SolverCoupled(Solver):
 
         # Solver for the coupled system
         default_lu_solver = LU_SOLVER_1CPU if sim.ncpu == 1 else LU_SOLVER_NCPU
+        default_params = get_fieldsplit_parameters(sim, 'solver/coupled', LU_PARAMETERS)
         self.coupled_solver = linear_solver_from_input(
-            sim, 'solver/coupled', 'lu', None, default_lu_solver, LU_PARAMETERS
+            sim, 'solver/coupled', 'lu', None, default_lu_solver, default_params
         )
 
         # Get the class to be used for the equation system assembly
@@ -128,19 +134,10 @@ class SolverCoupled(Solver):
                 % (self.equation_subtype, available_methods),
             )
 
-        # Give warning if using iterative solver
-        if isinstance(self.coupled_solver, dolfin.PETScKrylovSolver):
-            sim.log.warning(
-                'WARNING: Using a Krylov solver for the coupled NS equations is not a good idea'
-            )
-        else:
-            # Removed in DOLFIN 2018.1, causes segfault now (Nov 2018)
-            # self.coupled_solver.set_parameter('same_nonzero_pattern', True)
-            pass
-
         # Lagrange multiplicator or remove null space via PETSc or just normalize after solving
         self.remove_null_space = True
         self.pressure_null_space = None
+        self.pressure_constant_mode = None
         self.use_lagrange_multiplicator = sim.input.get_value(
             'solver/use_lagrange_multiplicator', USE_LAGRANGE_MULTIPLICATOR, 'bool'
         )
@@ -156,7 +153,7 @@ class SolverCoupled(Solver):
         does_not_support_null_space = ('mumps',)
         if (
             self.remove_null_space
-            and self.coupled_solver.created_with_lu_method in does_not_support_null_space
+            and getattr(self.coupled_solver, 'lu_method', None) in does_not_support_null_space
         ):
             self.normalize_pressure = True
             self.remove_null_space = False
@@ -240,6 +237,39 @@ class SolverCoupled(Solver):
         sim.data['p'] = dolfin.Function(Vp)
         sim.data['ui_tmp'] = dolfin.Function(Vu)
 
+    def setup_fieldsplit(self):
+        """
+        Register the velocity and pressure blocks with the coupled solver if
+        it uses a field split preconditioner
+        """
+        sim = self.simulation
+        CoupledEquations = EQUATION_SUBTYPES[self.equation_subtype]
+        self.fieldsplit = setup_coupled_fieldsplit(
+            sim,
+            self.coupled_solver,
+            'solver/coupled',
+            sim.data['Vcoupled'],
+            sim.ndim,
+            CoupledEquations.schur_complement_sign,
+        )
+
+        # The Lagrange multiplicator would end up in the velocity block
+        if self.fieldsplit is not None and self.use_lagrange_multiplicator:
+            ocellaris_error(
+                'Field split preconditioner error',
+                'The field split preconditioner does not support the Lagrange '
+                'multiplicator for the pressure null space. Set '
+                'solver/use_lagrange_multiplicator to false to let the Krylov '
+                'solver remove the null space instead',
+            )
+
+        # Give warning if using iterative solver without block preconditioning
+        if self.coupled_solver.is_iterative and self.fieldsplit is None:
+            sim.log.warning(
+                'WARNING: Using a Krylov solver for the coupled NS equations is not a good idea'
+                ' without a field split preconditioner, see solver/coupled/fieldsplit_preset'
+            )
+
     def coupled_boundary_conditions(self, use_strong_bcs):
         """
         Convert boundary conditions from segregated to coupled function spaces
@@ -327,6 +357,8 @@ class SolverCoupled(Solver):
 
         # Solve the equation system
         self.simulation.hooks.matrix_ready('Coupled', A, b)
+        if self.fieldsplit is not None:
+            self.fieldsplit.update(A)
         self.coupled_solver.solve(A, self.coupled_func.vector(), b)
 
         # Assign into the regular (split) functions from the coupled function
@@ -340,14 +372,12 @@ class SolverCoupled(Solver):
         # removing the proper null space of the equation, so we also fix this here
         if self.normalize_pressure or self.remove_null_space or self.fix_pressure_dof:
             p = self.simulation.data['p']
-            dx2 = dolfin.dx(domain=p.function_space().mesh())
-            vol = dolfin.assemble(dolfin.Constant(1) * dx2)
+            if self.pressure_constant_mode is None:
+                Vp = p.function_space()
+                self.pressure_constant_mode = ConstantNullSpace(self.simulation, Vp)
             # Perform correction multiple times due to round-of error. The first correction
             # can be i.e 1e14 while the next correction is around unity
-            pavg = 1e10
-            while abs(pavg) > 1000:
-                pavg = dolfin.assemble(p * dx2) / vol
-                p.vector()[:] -= pavg
+            self.pressure_constant_mode.remove_mean(p.vector(), tolerance=1000)
 
     @timeit.named('run coupled solver')
     def run(self):
@@ -364,14 +394,19 @@ class SolverCoupled(Solver):
         # Time loop
         t = sim.time
         it = sim.timestep
+        # Accessors for input values that can possibly change over time
+        inp_tmax = sim.input.get_accessor('time/tmax', required_type='float')
+        inp_steady_eps = sim.input.get_accessor(
+            'solver/steady_velocity_stopping_criterion', -1, 'float'
+        )
+        inp_force_steady = sim.input.get_accessor('solver/force_steady', False, 'bool')
+
         while True:
             # Get input values, these can possibly change over time
-            dt = sim.input.get_value('time/dt', required_type='float')
-            tmax = sim.input.get_value('time/tmax', required_type='float')
-            steady_eps = sim.input.get_value(
-                'solver/steady_velocity_stopping_criterion', -1, 'float'
-            )
-            force_steady = sim.input.get_value('solver/force_steady', False, 'bool')
+            tmax = inp_tmax.get()
+            dt = update_timestep(sim, t, tmax)
+            steady_eps = inp_steady_eps.get()
+            force_steady = inp_force_steady.get()
 
             # Check if the simulation is done
             if t + dt > tmax + 1e-6:
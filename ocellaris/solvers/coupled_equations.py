@@ -1,5 +1,6 @@
 import dolfin
 from dolfin import div, grad, dot, jump, avg
+from ocellaris.utils import SplitFormAssembler
 from . import UPWIND
 from ..solver_parts import navier_stokes_stabilization_penalties
 from .coupled_equations_cg import CoupledEquationsCG
@@ -8,6 +9,11 @@ from .coupled_equations_cg import CoupledEquationsCG
 class CoupledEquationsDG(object):
     use_strong_bcs = False
 
+    # The continuity equation is +q∇⋅u and the pressure term -p∇⋅v (or the
+    # equivalent integrated by parts forms), so the Schur complement of the
+    # pressure block A11 - A10⋅A00⁻¹⋅A01 = A11 + D⋅A00⁻¹⋅Dᵀ has a positive sign
+    schur_complement_sign = 1.0
+
     def __init__(
         self,
         simulation,
@@ -92,13 +98,13 @@ class CoupledEquationsDG(object):
         self.form_lhs = a
         self.form_rhs = L
         self.tensor_lhs = None
+        self.lhs_assembler = None
         self.tensor_rhs = None
 
     def assemble_lhs(self):
-        if self.tensor_lhs is None:
-            self.tensor_lhs = dolfin.assemble(self.form_lhs)
-        else:
-            dolfin.assemble(self.form_lhs, tensor=self.tensor_lhs)
+        if self.lhs_assembler is None:
+            self.lhs_assembler = SplitFormAssembler(self.simulation, self.form_lhs)
+        self.tensor_lhs = self.lhs_assembler.assemble()
         return self.tensor_lhs
 
     def assemble_rhs(self):
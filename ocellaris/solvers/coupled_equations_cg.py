@@ -1,10 +1,14 @@
 import dolfin
 from dolfin import dx, div, grad, dot
+from ocellaris.utils import SplitFormAssembler
 
 
 class CoupledEquationsCG(object):
     use_strong_bcs = True
 
+    # Same sign convention as CoupledEquationsDG
+    schur_complement_sign = 1.0
+
     def __init__(
         self,
         simulation,
@@ -160,13 +164,13 @@ class CoupledEquationsCG(object):
         self.form_lhs = a
         self.form_rhs = L
         self.tensor_lhs = None
+        self.lhs_assembler = None
         self.tensor_rhs = None
 
     def assemble_lhs(self):
-        if self.tensor_lhs is None:
-            self.tensor_lhs = dolfin.assemble(self.form_lhs)
-        else:
-            dolfin.assemble(self.form_lhs, tensor=self.tensor_lhs)
+        if self.lhs_assembler is None:
+            self.lhs_assembler = SplitFormAssembler(self.simulation, self.form_lhs)
+        self.tensor_lhs = self.lhs_assembler.assemble()
         return self.tensor_lhs
 
     def assemble_rhs(self):
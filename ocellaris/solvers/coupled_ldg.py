@@ -1,9 +1,19 @@
 import numpy
 import dolfin
 from dolfin import dx, dS, div, grad, dot, inner, outer, jump, avg, Constant
-from ocellaris.utils import ocellaris_error, timeit, linear_solver_from_input
+from ocellaris.utils import (
+    ocellaris_error,
+    timeit,
+    linear_solver_from_input,
+    SplitFormAssembler,
+    ConstantNullSpace,
+)
 from . import Solver, register_solver, BDM
-from ..solver_parts import VelocityBDMProjection
+from ..solver_parts import (
+    VelocityBDMProjection,
+    get_fieldsplit_parameters,
+    setup_coupled_fieldsplit,
+)
 from .coupled import get_global_row_number
 
 
@@ -27,6 +37,7 @@ class SolverCoupledLDG(Solver):
         self.simulation = sim = simulation
         self.read_input()
         self.create_functions()
+        self.setup_fieldsplit()
 
         # First time step timestepping coefficients
         self.set_timestepping_coefficients([1, -1, 0])
@@ -57,27 +68,22 @@ class SolverCoupledLDG(Solver):
 
         # Solver for the coupled system
         default_lu_solver = LU_SOLVER_1CPU if sim.ncpu == 1 else LU_SOLVER_NCPU
+        default_params = get_fieldsplit_parameters(sim, 'solver/coupled', LU_PARAMETERS)
         self.coupled_solver = linear_solver_from_input(
-            sim, 'solver/coupled', 'lu', None, default_lu_solver, LU_PARAMETERS
+            sim, 'solver/coupled', 'lu', None, default_lu_solver, default_params
         )
 
-        # Give warning if using iterative solver
-        if isinstance(self.coupled_solver, dolfin.PETScKrylovSolver):
-            sim.log.warning(
-                'WARNING: Using a Krylov solver for the coupled NS equations is not a good idea'
-            )
-        else:
-            # Removed in DOLFIN 2018.1
-            # self.coupled_solver.set_parameter('same_nonzero_pattern', True)
-            pass
-
         # Deal with pressure null space
         self.fix_pressure_dof = sim.input.get_value(
             'solver/fix_pressure_dof', FIX_PRESSURE_DOF, 'bool'
         )
+        self.remove_null_space = not self.fix_pressure_dof
         # No need for any tricks if the pressure is set via Dirichlet conditions somewhere
         if self.simulation.data['dirichlet_bcs'].get('p', []):
             self.fix_pressure_dof = False
+            self.remove_null_space = False
+        self.pressure_null_space = None
+        self.pressure_constant_mode = None
 
         # Representation of velocity
         Vu_family = sim.data['Vu'].ufl_element().family()
@@ -187,6 +193,29 @@ class SolverCoupledLDG(Solver):
 
         self.is_first_timestep = False
 
+    def setup_fieldsplit(self):
+        """
+        Register the velocity and pressure blocks with the coupled solver if
+        it uses a field split preconditioner. The stresses are included in
+        the velocity block
+        """
+        sim = self.simulation
+        self.fieldsplit = setup_coupled_fieldsplit(
+            sim,
+            self.coupled_solver,
+            'solver/coupled',
+            sim.data['Vcoupled'],
+            sim.ndim,
+            CoupledEquationsLDG.schur_complement_sign,
+        )
+
+        # Give warning if using iterative solver without block preconditioning
+        if self.coupled_solver.is_iterative and self.fieldsplit is None:
+            sim.log.warning(
+                'WARNING: Using a Krylov solver for the coupled NS equations is not a good idea'
+                ' without a field split preconditioner, see solver/coupled/fieldsplit_preset'
+            )
+
     @timeit
     def postprocess_velocity(self):
         """
@@ -231,6 +260,8 @@ class SolverCoupledLDG(Solver):
 
         # Solve the equation system
         self.simulation.hooks.matrix_ready('Coupled', A, b)
+        if self.fieldsplit is not None:
+            self.fieldsplit.update(A)
         self.coupled_solver.solve(A, self.coupled_func.vector(), b)
 
         # Assign into the regular (split) functions from the coupled function
@@ -241,14 +272,12 @@ class SolverCoupledLDG(Solver):
         # removing the proper null space of the equation, so we fix this here
         if self.fix_pressure_dof:
             p = self.simulation.data['p']
-            dx2 = dolfin.dx(domain=p.function_space().mesh())
-            vol = dolfin.assemble(dolfin.Constant(1) * dx2)
+            if self.pressure_constant_mode is None:
+                Vp = p.function_space()
+                self.pressure_constant_mode = ConstantNullSpace(self.simulation, Vp)
             # Perform correction multiple times due to round-of error. The first correction
             # can be i.e 1e14 while the next correction is around unity
-            pavg = 1e10
-            while abs(pavg) > 1000:
-                pavg = dolfin.assemble(p * dx2) / vol
-                p.vector()[:] -= pavg
+            self.pressure_constant_mode.remove_mean(p.vector(), tolerance=1000)
 
     @timeit
     def run(self):
@@ -274,10 +303,14 @@ class SolverCoupledLDG(Solver):
             self.is_first_timestep = False
             self.set_timestepping_coefficients([3 / 2, -2, 1 / 2])
 
+        # Accessors for input values that can possibly change over time
+        inp_dt = sim.input.get_accessor('time/dt', required_type='float')
+        inp_tmax = sim.input.get_accessor('time/tmax', required_type='float')
+
         while True:
             # Get input values, these can possibly change over time
-            dt = sim.input.get_value('time/dt', required_type='float')
-            tmax = sim.input.get_value('time/tmax', required_type='float')
+            dt = inp_dt.get()
+            tmax = inp_tmax.get()
 
             # Check if the simulation is done
             if t + dt > tmax + 1e-6:
@@ -331,6 +364,9 @@ class SolverCoupledLDG(Solver):
 
 
 class CoupledEquationsLDG(object):
+    # Same sign convention as CoupledEquationsDG
+    schur_complement_sign = 1.0
+
     def __init__(self, simulation):
         """
         This class assembles the coupled Navier-Stokes equations with LDG discretization
@@ -499,13 +535,13 @@ class CoupledEquationsLDG(object):
         self.form_lhs = a
         self.form_rhs = L
         self.tensor_lhs = None
+        self.lhs_assembler = None
         self.tensor_rhs = None
 
     def assemble_lhs(self):
-        if self.tensor_lhs is None:
-            self.tensor_lhs = dolfin.assemble(self.form_lhs)
-        else:
-            dolfin.assemble(self.form_lhs, tensor=self.tensor_lhs)
+        if self.lhs_assembler is None:
+            self.lhs_assembler = SplitFormAssembler(self.simulation, self.form_lhs)
+        self.tensor_lhs = self.lhs_assembler.assemble()
         return self.tensor_lhs
 
     def assemble_rhs(self):
@@ -517,6 +553,9 @@ class CoupledEquationsLDG(object):
 
 
 class CoupledEquationsLDG2(object):
+    # Same sign convention as CoupledEquationsDG
+    schur_complement_sign = 1.0
+
     def __init__(self, simulation):
         """
         This class assembles the coupled Navier-Stokes equations with LDG discretization
@@ -665,13 +704,13 @@ class CoupledEquationsLDG2(object):
         self.form_lhs = a
         self.form_rhs = L
         self.tensor_lhs = None
+        self.lhs_assembler = None
         self.tensor_rhs = None
 
     def assemble_lhs(self):
-        if self.tensor_lhs is None:
-            self.tensor_lhs = dolfin.assemble(self.form_lhs)
-        else:
-            dolfin.assemble(self.form_lhs, tensor=self.tensor_lhs)
+        if self.lhs_assembler is None:
+            self.lhs_assembler = SplitFormAssembler(self.simulation, self.form_lhs)
+        self.tensor_lhs = self.lhs_assembler.assemble()
         return self.tensor_lhs
 
     def assemble_rhs(self):
@@ -6,6 +6,7 @@ from ocellaris.utils import (
     create_vector_functions,
     shift_fields,
     velocity_change,
+    ConstantNullSpace,
 )
 from . import Solver, register_solver, BDM
 from ..solver_parts import (
@@ -14,6 +15,7 @@ from ..solver_parts import (
     SlopeLimiterVelocity,
     before_simulation,
     after_timestep,
+    update_timestep,
 )
 from .ipcs_equations import EQUATION_SUBTYPES
 
@@ -263,9 +265,11 @@ class SolverIPCS(Solver):
         uvw_temp = sim.data['uvw_temp']
         uvw_temp.assign(uvw_star)
 
+        Au_changed = None
         if self.inner_iteration == 1:
             # Assemble the A matrix only the first inner iteration
             self.Au = dolfin.as_backend_type(eq.assemble_lhs())
+            Au_changed = eq.lhs_changed
 
         A = self.Au
         b = dolfin.as_backend_type(eq.assemble_rhs())
@@ -276,6 +280,7 @@ class SolverIPCS(Solver):
             b,
             in_iter=self.inner_iteration,
             co_iter=self.co_inner_iter,
+            operator_changed=Au_changed,
         )
         self.assigner_split.assign(list(sim.data['u']), uvw_star)
 
@@ -300,42 +305,43 @@ class SolverIPCS(Solver):
         p_hat.vector().zero()
         p_hat.vector().axpy(-1, p.vector())
 
-        # Assemble the A matrix only the first inner iteration
+        # Assemble the A matrix only the first inner iteration. The matrix only
+        # depends on the density and the mesh, so it is not re-assembled for a
+        # single density fluid on a fixed mesh
+        Ap_changed = None
         if self.inner_iteration == 1:
             self.Ap = dolfin.as_backend_type(self.eq_pressure.assemble_lhs())
+            Ap_changed = self.eq_pressure.lhs_changed
         A = self.Ap
         b = dolfin.as_backend_type(self.eq_pressure.assemble_rhs())
 
         # Inform PETSc about the null space
         if self.remove_null_space:
             if self.pressure_null_space is None:
-                # Create vector that spans the null space
-                null_vec = dolfin.Vector(p.vector())
-                null_vec[:] = 1
-                null_vec *= 1 / null_vec.norm("l2")
-
-                # Create null space basis object
-                self.pressure_null_space = dolfin.VectorSpaceBasis([null_vec])
+                # Create the null space basis and the constant mode mass vector
+                self.pressure_null_space = ConstantNullSpace(self.simulation, p.function_space())
 
             # Make sure the null space is set on the matrix
             if self.inner_iteration == 1:
-                A.set_nullspace(self.pressure_null_space)
+                A.set_nullspace(self.pressure_null_space.basis)
 
             # Orthogonalize b with respect to the null space
-            self.pressure_null_space.orthogonalize(b)
+            self.pressure_null_space.basis.orthogonalize(b)
 
         # Solve for the new pressure correction
         self.niters_p = self.pressure_solver.inner_solve(
-            A, p.vector(), b, in_iter=self.inner_iteration, co_iter=self.co_inner_iter
+            A,
+            p.vector(),
+            b,
+            in_iter=self.inner_iteration,
+            co_iter=self.co_inner_iter,
+            operator_changed=Ap_changed,
         )
 
         # Removing the null space of the matrix system is not strictly the same as removing
         # the null space of the equation, so we correct for this here
         if self.remove_null_space:
-            dx2 = dolfin.dx(domain=p.function_space().mesh())
-            vol = dolfin.assemble(dolfin.Constant(1) * dx2)
-            pavg = dolfin.assemble(p * dx2) / vol
-            p.vector()[:] -= pavg
+            self.pressure_null_space.remove_mean(p.vector())
 
         # Calculate p_hat = p_new - p_old
         p_hat.vector().axpy(1, p.vector())
@@ -419,16 +425,19 @@ class SolverIPCS(Solver):
         t = sim.time
         it = sim.timestep
 
+        # Accessors for input values that can possibly change over time
+        inp_tmax = sim.input.get_accessor('time/tmax', required_type='float')
+        inp_num_inner_iter = sim.input.get_accessor('solver/num_inner_iter', MAX_INNER_ITER, 'int')
+        inp_allowable_error_inner = sim.input.get_accessor(
+            'solver/allowable_error_inner', ALLOWABLE_ERROR_INNER, 'float'
+        )
+
         while True:
             # Get input values, these can possibly change over time
-            dt = sim.input.get_value('time/dt', required_type='float')
-            tmax = sim.input.get_value('time/tmax', required_type='float')
-            num_inner_iter = sim.input.get_value(
-                'solver/num_inner_iter', MAX_INNER_ITER, 'int'
-            )
-            allowable_error_inner = sim.input.get_value(
-                'solver/allowable_error_inner', ALLOWABLE_ERROR_INNER, 'float'
-            )
+            tmax = inp_tmax.get()
+            dt = update_timestep(sim, t, tmax)
+            num_inner_iter = inp_num_inner_iter.get()
+            allowable_error_inner = inp_allowable_error_inner.get()
 
             # Check if the simulation is done
             if t + dt > tmax + 1e-6:
@@ -9,6 +9,8 @@ from ocellaris.utils import (
     matmul,
     split_form_into_matrix,
     invert_block_diagonal_matrix,
+    SchurComplement,
+    ConstantNullSpace,
 )
 from . import Solver, register_solver, BDM
 from .coupled_equations import define_dg_equations
@@ -123,7 +125,7 @@ class SolverIPCSA(Solver):
 
         # Matrix and vector storage
         self.MplusA = self.B = self.C = self.M = self.Minv = self.D = self.E = None
-        self.MinvB = self.CMinvB = None
+        self.schur = SchurComplement(sim, 'C Minv B')
 
         # Store number of iterations
         self.niters_u = None
@@ -460,12 +462,12 @@ class SolverIPCSA(Solver):
                 self.E = assemble_into(self.eqE, self.E)
 
             # Compute LHS
-            self.MinvB = matmul(self.Minv, self.B, self.MinvB)
-            self.CMinvB = matmul(self.C, self.MinvB, self.CMinvB)
+            self.schur.update(self.C, self.Minv, self.B)
 
         # The equation system
-        lhs = self.CMinvB
-        rhs = self.CMinvB * p_star.vector()
+        lhs = self.schur.operator
+        lhs_pc = self.schur.preconditioner_matrix if self.schur.matrix_free else None
+        rhs = self.schur.mult(p_star.vector())
         rhs.axpy(1, self.C * u_star.vector())
         if self.eqE is not None:
             rhs.axpy(-1, self.E)
@@ -474,20 +476,17 @@ class SolverIPCSA(Solver):
         # Inform PETSc about the pressure null space
         if self.remove_null_space:
             if self.pressure_null_space is None:
-                # Create vector that spans the null space
-                null_vec = dolfin.Vector(p_star.vector())
-                null_vec[:] = 1
-                null_vec *= 1 / null_vec.norm("l2")
-
-                # Create null space basis object
-                self.pressure_null_space = dolfin.VectorSpaceBasis([null_vec])
+                # Create the null space basis and the constant mode mass vector
+                self.pressure_null_space = ConstantNullSpace(sim, p_star.function_space())
 
             # Make sure the null space is set on the matrix
             if self.inner_iteration == 1:
-                lhs.set_nullspace(self.pressure_null_space)
+                lhs.set_nullspace(self.pressure_null_space.basis)
+                if lhs_pc is not None:
+                    lhs_pc.set_nullspace(self.pressure_null_space.basis)
 
             # Orthogonalize b with respect to the null space
-            self.pressure_null_space.orthogonalize(rhs)
+            self.pressure_null_space.basis.orthogonalize(rhs)
 
         # Temporarily store the old pressure
         p_hat.vector().zero()
@@ -495,16 +494,18 @@ class SolverIPCSA(Solver):
 
         # Solve for the new pressure correction
         self.niters_p = self.pressure_solver.inner_solve(
-            lhs, p_star.vector(), rhs, in_iter=self.inner_iteration, co_iter=self.co_inner_iter
+            lhs,
+            p_star.vector(),
+            rhs,
+            in_iter=self.inner_iteration,
+            co_iter=self.co_inner_iter,
+            P=lhs_pc,
         )
 
         # Removing the null space of the matrix system is not strictly the same as removing
         # the null space of the equation, so we correct for this here
         if self.remove_null_space:
-            dx2 = dolfin.dx(domain=p_star.function_space().mesh())
-            vol = dolfin.assemble(dolfin.Constant(1) * dx2)
-            pavg = dolfin.assemble(p_star * dx2) / vol
-            p_star.vector()[:] -= pavg
+            self.pressure_null_space.remove_mean(p_star.vector())
 
         # Calculate p_hat = p_new - p_old
         p_hat.vector().axpy(1, p_star.vector())
@@ -519,7 +520,7 @@ class SolverIPCSA(Solver):
         """
         p_hat = self.simulation.data['p_hat']
         uvw = self.simulation.data['uvw_star']
-        uvw.vector().axpy(-1, self.MinvB * p_hat.vector())
+        uvw.vector().axpy(-1, self.schur.AinvB * p_hat.vector())
         uvw.vector().apply('insert')
 
     @timeit
@@ -574,15 +575,20 @@ class SolverIPCSA(Solver):
         t = sim.time
         it = sim.timestep
 
+        # Accessors for input values that can possibly change over time
+        inp_tmax = sim.input.get_accessor('time/tmax', required_type='float')
+        inp_num_inner_iter = sim.input.get_accessor('solver/num_inner_iter', MAX_INNER_ITER, 'int')
+        inp_allowable_error_inner = sim.input.get_accessor(
+            'solver/allowable_error_inner', ALLOWABLE_ERROR_INNER, 'float'
+        )
+
         with dolfin.Timer('Ocellaris run IPCS-A solver'):
             while True:
                 # Get input values, these can possibly change over time
-                dt = update_timestep(sim)
-                tmax = sim.input.get_value('time/tmax', required_type='float')
-                num_inner_iter = sim.input.get_value('solver/num_inner_iter', MAX_INNER_ITER, 'int')
-                allowable_error_inner = sim.input.get_value(
-                    'solver/allowable_error_inner', ALLOWABLE_ERROR_INNER, 'float'
-                )
+                tmax = inp_tmax.get()
+                dt = update_timestep(sim, t, tmax)
+                num_inner_iter = inp_num_inner_iter.get()
+                allowable_error_inner = inp_allowable_error_inner.get()
 
                 # Check if the simulation is done
                 if t + dt > tmax + 1e-6:
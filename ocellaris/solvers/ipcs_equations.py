@@ -1,6 +1,7 @@
 import dolfin
 from ufl.constantvalue import Zero
 from dolfin import dot, grad, avg, jump, dx, dS, Constant
+from ocellaris.utils import SplitFormAssembler
 from ..solver_parts import define_penalty
 from .coupled_equations import define_dg_equations
 
@@ -9,14 +10,21 @@ class BaseEquation(object):
     # Will be shadowed by object properties after first assemble
     tensor_lhs = None
     tensor_rhs = None
+    lhs_assembler = None
 
     def assemble_lhs(self):
-        if self.tensor_lhs is None:
-            self.tensor_lhs = dolfin.assemble(self.form_lhs)
-        else:
-            dolfin.assemble(self.form_lhs, tensor=self.tensor_lhs)
+        if self.lhs_assembler is None:
+            self.lhs_assembler = SplitFormAssembler(self.simulation, self.form_lhs)
+        self.tensor_lhs = self.lhs_assembler.assemble()
         return self.tensor_lhs
 
+    @property
+    def lhs_changed(self):
+        """
+        Did the last call to assemble_lhs() change the matrix
+        """
+        return self.lhs_assembler is None or self.lhs_assembler.changed
+
     def assemble_rhs(self):
         if self.tensor_rhs is None:
             self.tensor_rhs = dolfin.assemble(self.form_rhs)
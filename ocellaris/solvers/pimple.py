@@ -6,7 +6,8 @@ from ocellaris.utils import (
     create_vector_functions,
     shift_fields,
     velocity_change,
-    matmul,
+    SchurComplement,
+    ConstantNullSpace,
 )
 from . import Solver, register_solver, BDM
 from .simple_equations import SimpleEquations
@@ -16,6 +17,7 @@ from ..solver_parts import (
     SlopeLimiterVelocity,
     before_simulation,
     after_timestep,
+    update_timestep,
 )
 
 
@@ -157,7 +159,8 @@ class SolverPIMPLE(Solver):
 
         # Matrix and vector storage
         self.A = self.B = self.C = self.At = self.Atinv = self.D = self.E = None
-        self.AtinvB = self.CAtinvB = self.AtinvA = self.CAtinvA = None
+        self.schur_B = SchurComplement(sim, 'C Atinv B')
+        self.schur_A = SchurComplement(sim, 'C Atinv A')
 
         # Store number of iterations
         self.niters_u = None
@@ -360,12 +363,10 @@ class SolverPIMPLE(Solver):
             self.E = dolfin.as_backend_type(self.matrices.assemble_E())
 
             # Compute LHS
-            self.AtinvB = matmul(self.A_tilde_inv, self.B, self.AtinvB)
-            self.CAtinvB = matmul(self.C, self.AtinvB, self.CAtinvB)
+            self.schur_B.update(self.C, self.A_tilde_inv, self.B)
 
             # Needed for RHS
-            self.AtinvA = matmul(self.A_tilde_inv, self.A, self.AtinvA)
-            self.CAtinvA = matmul(self.C, self.AtinvA, self.CAtinvA)
+            self.schur_A.update(self.C, self.A_tilde_inv, self.A)
 
         # Compute the residual divergence
         U = u_star.vector()
@@ -373,14 +374,15 @@ class SolverPIMPLE(Solver):
         div_err = div.norm('l2')
 
         # The equation system
-        lhs = self.CAtinvB
-        rhs = div - self.CAtinvA * U + self.C * (self.A_tilde_inv * self.D)
+        lhs = self.schur_B.operator
+        lhs_pc = self.schur_B.preconditioner_matrix if self.schur_B.matrix_free else None
+        rhs = div - self.schur_A.mult(U) + self.C * (self.A_tilde_inv * self.D)
 
         if DEBUG_RHS:
             # Quantify RHS contributions
             c0 = (self.C * U).norm('l2')
             c1 = (self.E).norm('l2')
-            c2 = (self.CAtinvA * U).norm('l2')
+            c2 = self.schur_A.mult(U).norm('l2')
             c3 = (self.C * (self.A_tilde_inv * self.D)).norm('l2')
             cT = max([c0, c1, c2, c3])
             sim.log.info(
@@ -392,25 +394,27 @@ class SolverPIMPLE(Solver):
         # Inform PETSc about the pressure null space
         if self.remove_null_space:
             if self.pressure_null_space is None:
-                # Create vector that spans the null space
-                null_vec = dolfin.Vector(p_star.vector())
-                null_vec[:] = 1
-                null_vec *= 1 / null_vec.norm("l2")
-
-                # Create null space basis object
-                self.pressure_null_space = dolfin.VectorSpaceBasis([null_vec])
+                # Create the null space basis and the constant mode mass vector
+                self.pressure_null_space = ConstantNullSpace(sim, p_star.function_space())
 
             # Make sure the null space is set on the matrix
             if self.inner_iteration == 1:
-                lhs.set_nullspace(self.pressure_null_space)
+                lhs.set_nullspace(self.pressure_null_space.basis)
+                if lhs_pc is not None:
+                    lhs_pc.set_nullspace(self.pressure_null_space.basis)
 
             # Orthogonalize b with respect to the null space
-            self.pressure_null_space.orthogonalize(rhs)
+            self.pressure_null_space.basis.orthogonalize(rhs)
 
         # Solve for the new pressure correction
         minus_p_hat.assign(p_star)
         self.niters_p = self.pressure_solver.inner_solve(
-            lhs, p_star.vector(), rhs, in_iter=self.inner_iteration, co_iter=self.co_inner_iter
+            lhs,
+            p_star.vector(),
+            rhs,
+            in_iter=self.inner_iteration,
+            co_iter=self.co_inner_iter,
+            P=lhs_pc,
         )
 
         # Compute change from last iteration
@@ -420,10 +424,7 @@ class SolverPIMPLE(Solver):
         # Removing the null space of the matrix system is not strictly the same as removing
         # the null space of the equation, so we correct for this here
         if self.remove_null_space:
-            dx2 = dolfin.dx(domain=p_star.function_space().mesh())
-            vol = dolfin.assemble(dolfin.Constant(1) * dx2)
-            pavg = dolfin.assemble(p_star * dx2) / vol
-            p_star.vector()[:] -= pavg
+            self.pressure_null_space.remove_mean(p_star.vector())
 
         # Explicit relaxation
         if self.last_inner_iter and last_piso_iter:
@@ -447,8 +448,8 @@ class SolverPIMPLE(Solver):
         
         # Explicit velocity update
         #Ati = self.A_tilde_inv
-        #AtiA = self.AtinvA
-        #AtiB = self.AtinvB
+        #AtiA = self.schur_A.AinvB
+        #AtiB = self.schur_B.AinvB
         #delta_u = Ati * self.D - AtiA * uvw.vector() - AtiB * p.vector()
 
         # Explicit velocity update
@@ -469,8 +470,8 @@ class SolverPIMPLE(Solver):
 
         if DEBUG_RHS:
             # Quantify RHS contributions
-            c0 = (self.AtinvA * uvw.vector()).norm('l2')
-            c1 = (self.AtinvB * p.vector()).norm('l2')
+            c0 = (self.schur_A.AinvB * uvw.vector()).norm('l2')
+            c1 = (self.schur_B.AinvB * p.vector()).norm('l2')
             c2 = (self.A_tilde_inv * self.D).norm('l2')
             cT = max([c0, c1, c2])
             self.simulation.log.info(
@@ -523,15 +524,20 @@ class SolverPIMPLE(Solver):
         t = sim.time
         it = sim.timestep
 
+        # Accessors for input values that can possibly change over time
+        inp_tmax = sim.input.get_accessor('time/tmax', required_type='float')
+        inp_num_inner_iter = sim.input.get_accessor('solver/num_inner_iter', MAX_INNER_ITER, 'int')
+        inp_allowable_error_inner = sim.input.get_accessor(
+            'solver/allowable_error_inner', ALLOWABLE_ERROR_INNER, 'float'
+        )
+
         with dolfin.Timer('Ocellaris run IPCS-A solver'):
             while True:
                 # Get input values, these can possibly change over time
-                dt = sim.input.get_value('time/dt', required_type='float')
-                tmax = sim.input.get_value('time/tmax', required_type='float')
-                num_inner_iter = sim.input.get_value('solver/num_inner_iter', MAX_INNER_ITER, 'int')
-                allowable_error_inner = sim.input.get_value(
-                    'solver/allowable_error_inner', ALLOWABLE_ERROR_INNER, 'float'
-                )
+                tmax = inp_tmax.get()
+                dt = update_timestep(sim, t, tmax)
+                num_inner_iter = inp_num_inner_iter.get()
+                allowable_error_inner = inp_allowable_error_inner.get()
 
                 # Check if the simulation is done
                 if t + dt > tmax + 1e-6:
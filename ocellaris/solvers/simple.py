@@ -6,7 +6,8 @@ from ocellaris.utils import (
     create_vector_functions,
     shift_fields,
     velocity_change,
-    matmul,
+    SchurComplement,
+    ConstantNullSpace,
 )
 from . import Solver, register_solver, BDM
 from ..solver_parts import (
@@ -15,6 +16,7 @@ from ..solver_parts import (
     SlopeLimiterVelocity,
     before_simulation,
     after_timestep,
+    update_timestep,
 )
 from .simple_equations import EQUATION_SUBTYPES
 
@@ -173,11 +175,9 @@ class SolverSIMPLE(Solver):
         self.B = None
         self.C = None
 
-        # Temporary matrices to store matrix matrix products
-        self.mat_AinvB = None  # SIMPLE & PISO
-        self.mat_CAinvB = None  # SIMPLE & PISO
-        self.mat_AinvA = None  # PISO
-        self.mat_CAinvA = None  # PISO
+        # Matrix matrix products
+        self.schur_B = SchurComplement(sim, 'C Atinv B')  # SIMPLE & PISO
+        self.schur_A = SchurComplement(sim, 'C Atinv A')  # PISO
 
         # Store number of iterations
         self.niters_u = None
@@ -426,11 +426,9 @@ class SolverSIMPLE(Solver):
 
         # Compute the LHS = C⋅Ãinv⋅B
         if self.inner_iteration == 1:
-            C, Ainv, B = self.C, self.A_tilde_inv, self.B
-            self.mat_AinvB = matmul(Ainv, B, self.mat_AinvB)
-            self.mat_CAinvB = matmul(C, self.mat_AinvB, self.mat_CAinvB)
-            self.LHS_pressure = dolfin.as_backend_type(self.mat_CAinvB.copy())
-        LHS = self.LHS_pressure
+            self.schur_B.update(self.C, self.A_tilde_inv, self.B)
+        LHS = self.schur_B.operator
+        LHS_pc = self.schur_B.preconditioner_matrix if self.schur_B.matrix_free else None
 
         # Compute the RHS
         if not piso_rhs:
@@ -444,27 +442,23 @@ class SolverSIMPLE(Solver):
             # Compute the RHS = - C⋅Ãinv⋅(Ãinv - A)⋅û
             C, Ainv, A = self.C, self.A_tilde_inv, self.A
             if self.inner_iteration == 1:
-                self.mat_AinvA = matmul(Ainv, A, self.mat_AinvA)
-                self.mat_CAinvA = matmul(C, self.mat_AinvA, self.mat_CAinvA)
-            RHS = self.mat_CAinvA * self.minus_uvw_hat - C * self.minus_uvw_hat
+                self.schur_A.update(C, Ainv, A)
+            RHS = self.schur_A.mult(self.minus_uvw_hat) - C * self.minus_uvw_hat
 
         # Inform PETSc about the null space
         if self.remove_null_space:
             if self.pressure_null_space is None:
-                # Create vector that spans the null space
-                null_vec = dolfin.Vector(p_hat.vector())
-                null_vec[:] = 1
-                null_vec *= 1 / null_vec.norm("l2")
-
-                # Create null space basis object
-                self.pressure_null_space = dolfin.VectorSpaceBasis([null_vec])
+                # Create the null space basis and the constant mode mass vector
+                self.pressure_null_space = ConstantNullSpace(sim, p_hat.function_space())
 
             # Make sure the null space is set on the matrix
             if self.inner_iteration == 1:
-                LHS.set_nullspace(self.pressure_null_space)
+                LHS.set_nullspace(self.pressure_null_space.basis)
+                if LHS_pc is not None:
+                    LHS_pc.set_nullspace(self.pressure_null_space.basis)
 
             # Orthogonalize b with respect to the null space
-            self.pressure_null_space.orthogonalize(RHS)
+            self.pressure_null_space.basis.orthogonalize(RHS)
 
         # Solve for the new pressure correction
         self.niters_p += self.pressure_solver.inner_solve(
@@ -473,15 +467,13 @@ class SolverSIMPLE(Solver):
             RHS,
             in_iter=self.inner_iteration,
             co_iter=self.co_inner_iter,
+            P=LHS_pc,
         )
 
         # Removing the null space of the matrix system is not strictly the same as removing
         # the null space of the equation, so we correct for this here
         if self.remove_null_space:
-            dx2 = dolfin.dx(domain=p_hat.function_space().mesh())
-            vol = dolfin.assemble(dolfin.Constant(1) * dx2)
-            pavg = dolfin.assemble(p_hat * dx2) / vol
-            p_hat.vector()[:] -= pavg
+            self.pressure_null_space.remove_mean(p_hat.vector())
 
         # Calculate p = p* + α p^
         sim.data['p'].vector().axpy(alpha, p_hat.vector())
@@ -497,7 +489,7 @@ class SolverSIMPLE(Solver):
         """
         uvw = self.simulation.data['uvw_star']
         p_hat = self.simulation.data['p_hat']
-        minus_uvw_hat = self.mat_AinvB * p_hat.vector()
+        minus_uvw_hat = self.schur_B.AinvB * p_hat.vector()
         uvw.vector().axpy(-1.0, minus_uvw_hat)
         uvw.vector().apply('insert')
 
@@ -571,16 +563,19 @@ class SolverSIMPLE(Solver):
         t = sim.time
         it = sim.timestep
 
+        # Accessors for input values that can possibly change over time
+        inp_tmax = sim.input.get_accessor('time/tmax', required_type='float')
+        inp_num_inner_iter = sim.input.get_accessor('solver/num_inner_iter', MAX_INNER_ITER, 'int')
+        inp_allowable_error_inner = sim.input.get_accessor(
+            'solver/allowable_error_inner', ALLOWABLE_ERROR_INNER, 'float'
+        )
+
         while True:
             # Get input values, these can possibly change over time
-            dt = sim.input.get_value('time/dt', required_type='float')
-            tmax = sim.input.get_value('time/tmax', required_type='float')
-            num_inner_iter = sim.input.get_value(
-                'solver/num_inner_iter', MAX_INNER_ITER, 'int'
-            )
-            allowable_error_inner = sim.input.get_value(
-                'solver/allowable_error_inner', ALLOWABLE_ERROR_INNER, 'float'
-            )
+            tmax = inp_tmax.get()
+            dt = update_timestep(sim, t, tmax)
+            num_inner_iter = inp_num_inner_iter.get()
+            allowable_error_inner = inp_allowable_error_inner.get()
 
             # Check if the simulation is done
             if t + dt > tmax + 1e-6:
@@ -1,7 +1,14 @@
 from collections import deque
 import numpy
 import dolfin
-from ocellaris.utils import timeit, split_form_into_matrix, create_block_matrix
+from ocellaris.utils import (
+    timeit,
+    split_form_into_matrix,
+    create_block_matrix,
+    get_owned_cell_dofs,
+    get_block_diagonal_blocks,
+    set_block_diagonal_blocks,
+)
 from .coupled_equations import define_dg_equations
 
 
@@ -218,30 +225,15 @@ class SimpleEquations(object):
         are the dofs in a single element
         """
         Aglobal = self.M if self.a_tilde_is_mass else self.A
-        if self.A_tilde is None:
-            At = Aglobal.copy()
-            Ati = Aglobal.copy()
-        else:
-            At = self.A_tilde
-            Ati = self.A_tilde_inv
-        At.zero()
-        Ati.zero()
 
-        dm = self.Vuvw.dofmap()
-        N = dm.cell_dofs(0).shape[0]
-        Alocal = numpy.zeros((N, N), float)
-
-        # Loop over cells and get the block diagonal parts (should be moved to C++)
-        for cell in dolfin.cells(self.simulation.data['mesh'], 'regular'):
-            # Get global dofs
-            istart = Aglobal.local_range(0)[0]
-            dofs = dm.cell_dofs(cell.index()) + istart
-
-            # Get block diagonal part of A, invert and insert into approximations
-            Aglobal.get(Alocal, dofs, dofs)
-            Alocal_inv = numpy.linalg.inv(Alocal)
-            At.set(Alocal, dofs, dofs)
-            Ati.set(Alocal_inv, dofs, dofs)
+        # Get the block diagonal parts of A and invert them in one batch
+        cell_dofs = get_owned_cell_dofs(self.Vuvw)
+        Ablocks = get_block_diagonal_blocks(Aglobal, cell_dofs)
+        Ablocks_inv = numpy.linalg.inv(Ablocks)
+
+        # Insert into the approximations, reusing the sparsity patterns if possible
+        At = set_block_diagonal_blocks(Aglobal, cell_dofs, Ablocks, self.A_tilde)
+        Ati = set_block_diagonal_blocks(Aglobal, cell_dofs, Ablocks_inv, self.A_tilde_inv)
         return At, Ati
 
     @timeit
@@ -9,15 +9,27 @@ from .interactive_console import interactive_console_hook, run_debug_console
 from .timer import timeit, log_timings
 from .code_runner import RunnablePythonString, CodedExpression
 from .cpp_expression import OcellarisCppExpression, ocellaris_interpolate
-from .dofmap import cell_dofmap, facet_dofmap, get_dof_neighbours
+from .dofmap import cell_dofmap, facet_dofmap, get_dof_neighbours, get_same_loc_dof_groups
 from .linear_solvers import (
     linear_solver_from_input,
     condition_number,
     create_block_matrix,
     matmul,
+    SchurComplement,
+    ConstantNullSpace,
     invert_block_diagonal_matrix,
+    get_owned_cell_dofs,
+    get_block_diagonal_blocks,
+    set_block_diagonal_blocks,
+)
+from .mpi import (
+    get_root_value,
+    sync_arrays,
+    gather_lines_on_root,
+    exchange_arrays,
+    GhostExchange,
+    global_max_and_sum,
 )
-from .mpi import get_root_value, sync_arrays, gather_lines_on_root
 from .taylor_basis import lagrange_to_taylor, taylor_to_lagrange
 from .small_helpers import (
     create_vector_functions,
@@ -25,9 +37,15 @@ from .small_helpers import (
     velocity_change,
     get_local,
     set_local,
+    local_vector_view,
     dolfin_log_level,
 )
 from .field_inspector import FieldInspector
-from .ufl_transformers import is_zero_ufl_expression, split_form_into_matrix
+from .ufl_transformers import (
+    is_zero_ufl_expression,
+    split_form_into_matrix,
+    split_form_by_coefficients,
+)
+from .form_assembly import SplitFormAssembler
 from .meshio import load_meshio_mesh, build_distributed_mesh, init_mesh_geometry
 from .debug import enable_super_debug
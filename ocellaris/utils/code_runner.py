@@ -15,6 +15,20 @@ from dolfin import *
 __all__ = ['RunnablePythonString', 'CodedExpression']
 
 
+# Default value, can be changed in the input file
+VECTORISED_CODED_EXPRESSIONS = False
+
+# Names that make the result of the code change with time
+TIME_DEPENDENT_NAMES = frozenset(('t', 'time', 'it', 'timestep', 'dt'))
+
+# Names that cannot be used in vectorised code, the code may depend on
+# simulation data that changes at any time or on the current cell
+NON_VECTORISABLE_NAMES = frozenset(('sim', 'simulation', 'ufc_cell'))
+
+# Number of dofs where the vectorised result is compared to the per point result
+NUM_VECTORISED_CHECKS = 5
+
+
 class RunnablePythonString(object):
     def __init__(self, simulation, code_string, description, var_name=None):
         """
@@ -36,6 +50,12 @@ class RunnablePythonString(object):
         filename = '<input-file-code %s>' % description
         self.code = compile(code_string, filename, 'exec' if needs_exec else 'eval')
         self.needs_exec = needs_exec
+        self.names = get_code_names(self.code)
+
+        # The user constants are read from the input when they change
+        self._user_constants = simulation.input.get_accessor(
+            'user_code/constants', {}, 'dict(string:basic)'
+        )
 
     def _validate_code(self, code_string):
         """
@@ -65,6 +85,9 @@ class RunnablePythonString(object):
         """
         Run the code
         """
+        return self._run(kwargs, log_errors=True)
+
+    def _run(self, kwargs, log_errors):
         # Make sure some useful variables are available
         sim = simulation = self.simulation
         t = time = simulation.time
@@ -80,20 +103,15 @@ class RunnablePythonString(object):
         code_locals.update(kwargs)
 
         # Make sure the user constants are accessible
-        user_constants = simulation.input.get_value(
-            'user_code/constants', {}, 'dict(string:basic)'
-        )
-        constants = {}
-        for name, value in user_constants.items():
-            constants[name] = value
-        code_locals.update(constants)
+        code_locals.update(self._user_constants.get())
 
         if self.needs_exec:
             try:
                 exec(self.code, globals(), code_locals)
             except Exception:
-                sim.log.error('Python code exec failed for the below code:')
-                sim.log.error(self.code)
+                if log_errors:
+                    sim.log.error('Python code exec failed for the below code:')
+                    sim.log.error(self.code)
                 raise
 
             if self.var_name is not None:
@@ -107,27 +125,181 @@ class RunnablePythonString(object):
             try:
                 return eval(self.code, globals(), code_locals)
             except Exception:
-                sim.log.error('Python code eval failed for the below code:')
-                sim.log.error(self.code)
+                if log_errors:
+                    sim.log.error('Python code eval failed for the below code:')
+                    sim.log.error(self.code)
                 raise
 
+    def run_vectorised(self, x):
+        """
+        Run the code with x given as an array of shape (gdim, N) such that
+        x[0] contains the first coordinate of all N points. Returns an array
+        of shape (N,). Raises an exception if the code fails or gives a
+        result with the wrong shape, it is then not vectorisable
+        """
+        N = x.shape[1]
+        value = numpy.zeros((1, N), float)
+        ret = self._run(dict(value=value, x=x, dt=self.simulation.dt), log_errors=False)
+        if self.needs_exec and ret is value:
+            ret = value[0]
+        ret = numpy.asarray(ret, dtype=float)
+        if ret.shape == (1, N):
+            ret = ret[0]
+        if ret.shape not in ((), (N,), (1,)):
+            raise ValueError('Vectorised code returned shape %r for %d points' % (ret.shape, N))
+        return numpy.array(numpy.broadcast_to(ret, (N,)))
+
+    def run_point(self, x):
+        """
+        Run the code for a single point, like CodedExpression0.eval_cell
+        """
+        value = numpy.zeros(1, float)
+        kwargs = dict(value=value, x=x, ufc_cell=None, dt=self.simulation.dt)
+        ret = self._run(kwargs, log_errors=False)
+        if self.needs_exec and ret is value:
+            return value[0]
+        return float(numpy.asarray(ret).flat[0])
+
+    def is_time_dependent(self):
+        return bool(TIME_DEPENDENT_NAMES.intersection(self.names))
 
-def CodedExpression(simulation, code_string, description, value_shape=()):
+    def may_be_vectorised(self):
+        """
+        Check if the code can possibly be run for all points at once. The
+        code must not depend on the current cell or on simulation data. The
+        time step is given as a number, not as the simulation data Constant
+        """
+        excluded = NON_VECTORISABLE_NAMES.union(set(self.simulation.data) - TIME_DEPENDENT_NAMES)
+        return not excluded.intersection(self.names)
+
+
+def get_code_names(code):
+    """
+    Return the names used in a code object and its nested code objects
+    (lambdas, comprehensions, functions)
+    """
+    names = set(code.co_names)
+    names.update(code.co_varnames)
+    for const in code.co_consts:
+        if hasattr(const, 'co_names'):
+            names.update(get_code_names(const))
+    return names
+
+
+def CodedExpression(
+    simulation, code_string, description, value_shape=(), V=None, return_updater=False
+):
     """
     This Expression sub-class factory creates objects that run the given
     RunnablePythonString object when asked to evaluate
+
+    If a scalar function space V with point evaluation dofs is given and
+    user_code/vectorised_expressions is on, the code is first tried run
+    once for all dof coordinates with NumPy arrays and a Function in V is
+    returned instead of an Expression. The Function is updated at the start
+    of each time step if the code depends on the time and when the mesh
+    moves. If the code cannot be vectorised the per point Expression is used
+    """
+    runnable = RunnablePythonString(simulation, code_string, description, 'value')
+
+    func = updater = None
+    use_vectorised = simulation.input.get_value(
+        'user_code/vectorised_expressions', VECTORISED_CODED_EXPRESSIONS, 'bool'
+    )
+    if V is not None and value_shape == () and use_vectorised:
+        func, updater = make_vectorised_coded_function(simulation, runnable, V)
+
+    if func is None:
+        # I guess dolfin overloads __new__ in some strange way ???
+        # This type of thing should really be unnecessary ...
+        if value_shape == ():
+            func = CodedExpression0()
+        elif value_shape == (2,):
+            func = CodedExpression2()
+        elif value_shape == (3,):
+            func = CodedExpression3()
+        func._runnable = runnable
+
+    if return_updater:
+        return func, updater
+    else:
+        return func
+
+
+def make_vectorised_coded_function(simulation, runnable, V):
+    """
+    Try to create a Function in V with values given by running the code
+    for all dof coordinates at once. Returns (None, None) if this is not
+    possible, otherwise the Function and an updater that is also run at the
+    start of each time step if the code is time dependent. The updater only
+    runs the code again if the time has changed (for time dependent code)
+    or the mesh has moved since the previous run
     """
-    # I guess dolfin overloads __new__ in some strange way ???
-    # This type of thing should really be unnecessary ...
-    if value_shape == ():
-        expr = CodedExpression0()
-    elif value_shape == (2,):
-        expr = CodedExpression2()
-    elif value_shape == (3,):
-        expr = CodedExpression2()
-
-    expr._runnable = RunnablePythonString(simulation, code_string, description, 'value')
-    return expr
+    family = V.ufl_element().family()
+    if family not in ('Lagrange', 'Discontinuous Lagrange') or V.ufl_element().value_shape():
+        return None, None
+    if not runnable.may_be_vectorised():
+        return None, None
+
+    gdim = V.mesh().geometry().dim()
+    func = dolfin.Function(V)
+    vec = func.vector()
+    nlocal = vec.local_size()
+    time_dependent = runnable.is_time_dependent()
+    state = {'x': None, 'key': None}
+
+    def get_key():
+        if time_dependent:
+            return (simulation.timestep, simulation.time, simulation.dt)
+
+    def compute():
+        if state['x'] is None:
+            coords = V.tabulate_dof_coordinates().reshape((-1, gdim))
+            state['x'] = numpy.ascontiguousarray(coords.T)
+        state['key'] = get_key()
+        values = runnable.run_vectorised(state['x'])
+        vec.set_local(values[:nlocal])
+        vec.apply('insert')
+        return values
+
+    def updater(timestep_number=None, t=None, dt=None):
+        if state['x'] is None or state['key'] != get_key():
+            compute()
+
+    def mesh_moved():
+        # The dof coordinates have changed
+        state['x'] = None
+        compute()
+
+    # Run the code and check some of the results against the per point
+    # evaluation, code like "min(x[0], 0.5)" runs, but gives wrong results
+    description = runnable.description
+    try:
+        with numpy.errstate(all='ignore'):
+            values = compute()
+            coords = state['x'].T
+            N = len(coords)
+            ok = True
+            for i in numpy.linspace(0, N - 1, min(N, NUM_VECTORISED_CHECKS)).astype(int):
+                ok = ok and numpy.isclose(values[i], runnable.run_point(coords[i].copy()))
+    except Exception:
+        ok = False
+    ok = dolfin.MPI.min(V.mesh().mpi_comm(), float(ok)) > 0
+
+    if not ok:
+        simulation.log.info('    Using per point evaluation of %s' % description)
+        return None, None
+
+    simulation.log.info('    Using vectorised evaluation of %s' % description)
+    if time_dependent:
+        simulation.hooks.add_pre_timestep_hook(
+            updater, 'Update coded function "%s"' % description, 'Update coded function'
+        )
+    if getattr(simulation, 'mesh_morpher', None) is not None:
+        simulation.hooks.add_custom_hook(
+            'MeshMoved', mesh_moved, 'Update coded function "%s"' % description
+        )
+    return func, updater
 
 
 ################################################################################
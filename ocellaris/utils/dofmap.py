@@ -49,50 +49,79 @@ def facet_dofmap(V):
     return facet_dofmap
 
 
+def get_same_loc_dof_groups(V, rel_tol=1e-6):
+    """
+    Given a DG function space, return an array with a group number for each
+    local dof (including ghosts). Dofs that are at the same location in space
+    get the same group number. Groups are numbered from 0 upwards
+
+    The dof coordinates are sorted one axis at the time and split into groups
+    where the gap between consecutive coordinates is larger than a tolerance
+    relative to the smallest cell size. Unlike rounding the coordinates this
+    does not depend on the magnitude of the coordinates or where the rounding
+    boundaries fall
+    """
+    mesh = V.mesh()
+    gdim = mesh.geometry().dim()
+    dof_coordinates = V.tabulate_dof_coordinates().reshape((-1, gdim))
+    tol = mesh.hmin() * rel_tol
+
+    N = len(dof_coordinates)
+    groups = numpy.zeros(N, numpy.intp)
+    for d in range(gdim):
+        # Sort by the current group and then by the coordinate along axis d
+        coords = dof_coordinates[:, d]
+        order = numpy.lexsort((coords, groups))
+        sorted_groups = groups[order]
+        sorted_coords = coords[order]
+
+        # Start a new group where the group changes or there is a gap
+        new_group = numpy.zeros(N, bool)
+        new_group[1:] = (sorted_groups[1:] != sorted_groups[:-1]) | (
+            sorted_coords[1:] - sorted_coords[:-1] > tol
+        )
+        groups[order] = numpy.cumsum(new_group)
+
+    return groups
+
+
 def get_dof_neighbours(V):
     """
     Given a DG function space find, for each dof, the indices
     of the cells with dofs at the same locations
     """
     dm = V.dofmap()
-    gdim = V.mesh().geometry().dim()
     num_cells_all = V.mesh().num_cells()
-    dof_coordinates = V.tabulate_dof_coordinates().reshape((-1, gdim))
     local_Vdim = dm.index_map().size(dm.index_map().MapSize.ALL)
 
     # Get "owning cell" indices for all dofs
-    cell_for_dof = [None] * local_Vdim
-    for ic in range(num_cells_all):
-        dofs = dm.cell_dofs(ic)
-        for dof in dofs:
-            assert cell_for_dof[dof] is None
-            cell_for_dof[dof] = ic
-
-    # Map dof coordinate to dofs, this is for DG so multiple dofs
-    # will share the same location
-    coord_to_dofs = {}
-    max_neighbours = 0
-    for dof in range(len(dof_coordinates)):
-        coord = tuple(round(x, 5) for x in dof_coordinates[dof])
-        dofs = coord_to_dofs.setdefault(coord, [])
-        dofs.append(dof)
-        max_neighbours = max(max_neighbours, len(dofs) - 1)
+    cell_dofs = numpy.array([dm.cell_dofs(ic) for ic in range(num_cells_all)], numpy.intc)
+    cell_for_dof = numpy.zeros(local_Vdim, numpy.intc) - 1
+    cell_for_dof[cell_dofs] = numpy.arange(num_cells_all, dtype=numpy.intc)[:, None]
+    assert (cell_for_dof >= 0).all()
+
+    # Group dofs that share the same location, this is for DG so multiple
+    # dofs will share the same location. Within a group the dofs are
+    # sorted by dof number
+    groups = get_same_loc_dof_groups(V)
+    order = numpy.argsort(groups, kind='stable')
+    group_sizes = numpy.bincount(groups)
+    group_starts = numpy.zeros_like(group_sizes)
+    group_starts[1:] = numpy.cumsum(group_sizes)[:-1]
+    max_neighbours = group_sizes.max() - 1 if local_Vdim else 0
 
     # Find number of neighbour cells and their indices for each dof
-    num_neighbours = numpy.zeros(local_Vdim, numpy.intc)
+    num_neighbours = (group_sizes[groups] - 1).astype(numpy.intc)
     neighbours = numpy.zeros((local_Vdim, max_neighbours), numpy.intc) - 1
-    for nbs in coord_to_dofs.values():
-        # Loop through dofs at this location
-        for dof in nbs:
-            # Loop through the dofs neighbours
-            for nb in nbs:
-                # Skip the dof itself
-                if dof == nb:
-                    continue
-                # Get the neighbours "owning cell" index and store this
-                nb_cell = cell_for_dof[nb]
-                nn_prev = num_neighbours[dof]
-                neighbours[dof, nn_prev] = nb_cell
-                num_neighbours[dof] += 1
+    dofs = numpy.arange(local_Vdim)
+    count = numpy.zeros(local_Vdim, numpy.intc)
+    for k in range(max_neighbours + 1):
+        # The k'th dof in the group of each dof, skipping the dof itself
+        has_k = k < group_sizes[groups]
+        nb = numpy.zeros(local_Vdim, numpy.intp)
+        nb[has_k] = order[group_starts[groups[has_k]] + k]
+        use = has_k & (nb != dofs)
+        neighbours[dofs[use], count[use]] = cell_for_dof[nb[use]]
+        count[use] += 1
 
     return num_neighbours, neighbours
@@ -0,0 +1,122 @@
+import dolfin
+from .ufl_transformers import split_form_by_coefficients
+
+
+# Default value, can be changed in the input file
+SPLIT_LHS_ASSEMBLY = False
+
+# Names of the parts of a split bilinear form
+PART_CONSTANT = 'constant'
+PART_DT = 'dt'
+PART_FUNCTIONS = 'functions'
+
+
+class SplitFormAssembler(object):
+    def __init__(self, simulation, form):
+        """
+        Assemble a bilinear form that is split into parts that are cached
+        as separate matrices and only re-assembled when needed:
+
+        - constant: terms that only contain dolfin Constants (penalties,
+          viscosity and density for single phase flows etc.)
+        - dt: terms that contain the time step or the time stepping
+          coefficients, but no other time dependent coefficients
+        - functions: terms that contain Functions or Expressions (the
+          convecting velocity, the density field of a multi phase flow etc.)
+
+        The constant and dt parts are re-assembled when the values of their
+        Constants change, the functions part is re-assembled every time. All
+        parts are re-assembled when the mesh moves. The full matrix is the
+        sum of the parts, computed with axpy since all parts are assembled
+        into matrices with the same sparsity pattern
+
+        This uses more memory (one matrix per part in addition to the full
+        matrix) and an axpy per part when the matrix is rebuilt, so it is
+        only enabled with solver/split_lhs_assembly in the input file
+        """
+        self.simulation = simulation
+        self.form = form
+        self.tensor = None
+        self.changed = True
+
+        self.enabled = simulation.input.get_value(
+            'solver/split_lhs_assembly', SPLIT_LHS_ASSEMBLY, 'bool'
+        )
+        if not self.enabled:
+            self.parts = None
+            return
+
+        dt_coefficients = set()
+        for name in ('dt', 'time_coeffs'):
+            if name in simulation.data:
+                dt_coefficients.add(id(simulation.data[name]))
+
+        def classify(coefficients):
+            if any(not isinstance(c, dolfin.Constant) for c in coefficients):
+                return PART_FUNCTIONS
+            elif any(id(c) in dt_coefficients for c in coefficients):
+                return PART_DT
+            return PART_CONSTANT
+
+        self.parts = []
+        for name, part_form, coefficients in split_form_by_coefficients(form, classify):
+            self.parts.append(SplitFormPart(name, part_form, coefficients))
+
+    def assemble(self):
+        """
+        Assemble the form and return the matrix. The same matrix object is
+        returned each time
+        """
+        if not self.enabled:
+            if self.tensor is None:
+                self.tensor = dolfin.assemble(self.form)
+            else:
+                dolfin.assemble(self.form, tensor=self.tensor)
+            return self.tensor
+
+        if self.tensor is None:
+            # Assemble the full form to get the sparsity pattern of the sum
+            # of the parts, and create the part matrices with this pattern
+            self.tensor = dolfin.assemble(self.form)
+            for part in self.parts:
+                part.tensor = self.tensor.copy()
+
+        mesh_morpher = getattr(self.simulation, 'mesh_morpher', None)
+        mesh_moved = mesh_morpher is not None and mesh_morpher.active
+
+        self.changed = False
+        for part in self.parts:
+            if part.needs_assembly(mesh_moved):
+                dolfin.assemble(part.form, tensor=part.tensor)
+                self.changed = True
+
+        # Sum the parts, the matrix may have been modified by boundary
+        # conditions after the previous assembly so this is always done
+        self.tensor.zero()
+        for part in self.parts:
+            self.tensor.axpy(1.0, part.tensor, True)
+        return self.tensor
+
+
+class SplitFormPart(object):
+    def __init__(self, name, form, coefficients):
+        """
+        One part of a split bilinear form, see SplitFormAssembler
+        """
+        self.name = name
+        self.form = dolfin.Form(form)
+        self.constants = [c for c in coefficients if isinstance(c, dolfin.Constant)]
+        self.tensor = None
+        self._fingerprint = None
+
+    def needs_assembly(self, mesh_moved):
+        """
+        Check if the part must be re-assembled. Also updates the stored
+        Constant values, so this should only be called once per assembly
+        """
+        if self.name == PART_FUNCTIONS:
+            return True
+        fingerprint = tuple(tuple(c.values()) for c in self.constants)
+        changed = fingerprint != self._fingerprint
+        self._fingerprint = fingerprint
+        return changed or mesh_moved
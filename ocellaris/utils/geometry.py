@@ -1,5 +1,4 @@
 import numpy
-import dolfin
 from collections import namedtuple
 
 
@@ -59,20 +58,7 @@ def precompute_cell_data(simulation):
     Get cell volume and midpoint in an easy to use format
     """
     mesh = simulation.data['mesh']
-    ndim = simulation.ndim
-
-    cell_info = [None] * mesh.num_cells()
-    for cell in dolfin.cells(mesh, 'all'):
-        mp = cell.midpoint()
-        if ndim == 2:
-            midpoint = numpy.array([mp.x(), mp.y()], float)
-        else:
-            midpoint = numpy.array([mp.x(), mp.y(), mp.z()], float)
-
-        volume = cell.volume()
-        cell_info[cell.index()] = CellInfo(volume, midpoint)
-
-    simulation.data['cell_info'] = cell_info
+    simulation.data['cell_info'] = CellGeometry.from_mesh(mesh)
 
 
 def precompute_facet_data(simulation):
@@ -80,57 +66,128 @@ def precompute_facet_data(simulation):
     Get facet normal and areas in an easy to use format
     """
     mesh = simulation.data['mesh']
-    conFC = simulation.data['connectivity_FC']
-    ndim = simulation.ndim
     cell_info = simulation.data['cell_info']
-
-    # Get the facet areas from the cells
-    areas = {}
-    for cell in dolfin.cells(mesh, 'all'):
-        # Get the connected facets
-        facet_idxs = cell.entities(ndim - 1)
-
-        # Loop over connected facets and get the area
-        for i, fidx in enumerate(facet_idxs):
-            a = cell.facet_area(i)
-            if fidx in areas:
-                assert a == areas[fidx]
-            else:
-                areas[fidx] = a
-
-    # Loop over facets and gather the required information
-    facet_info = [None] * mesh.num_facets()
-    for facet in dolfin.facets(mesh, 'all'):
-        fidx = facet.index()
-
-        mp = facet.midpoint()
-        if ndim == 2:
-            midpoint = numpy.array([mp.x(), mp.y()], float)
-        else:
-            midpoint = numpy.array([mp.x(), mp.y(), mp.z()], float)
-
-        # Find one cell connected to this facet. There can be one or two
-        # connected cells, we only need the first one
-        connected_cells = conFC(fidx)
-        icell0 = connected_cells[0]
-        on_boundary = len(connected_cells) == 1
-
-        # Midpoint of local cell 0
-        cell0_mp = cell_info[icell0].midpoint
-
-        # Vector from local cell midpoint to face midpoint
-        vec0 = midpoint - cell0_mp
-
-        # Find a normal pointing out from cell 0
-        normalpt = facet.normal()
+    simulation.data['facet_info'] = FacetGeometry.from_mesh(mesh, cell_info)
+
+
+class CellGeometry(object):
+    def __init__(self, volumes, midpoints):
+        """
+        Array backed cell geometry. The arrays contain one entry for each
+        cell in the mesh, including ghost cells. Indexing returns a CellInfo
+        tuple with views into the arrays, so old code using the syntax
+        ``cell_info[i].midpoint`` still works
+        """
+        self.volumes = volumes
+        self.midpoints = midpoints
+
+    @staticmethod
+    def from_mesh(mesh):
+        ndim = mesh.geometry().dim()
+        cell_coords = get_cell_vertex_coordinates(mesh)
+
+        midpoints = cell_coords.mean(axis=1)
+        volumes = simplex_volumes(cell_coords, ndim)
+        return CellGeometry(volumes, midpoints)
+
+    def __len__(self):
+        return self.volumes.shape[0]
+
+    def __getitem__(self, idx):
+        return CellInfo(self.volumes[idx], self.midpoints[idx])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+class FacetGeometry(object):
+    def __init__(self, areas, midpoints, normals, on_boundary):
+        """
+        Array backed facet geometry. The arrays contain one entry for each
+        facet in the mesh, including ghost facets. The normals point out of
+        the first cell connected to each facet. Indexing returns a FacetInfo
+        tuple with views into the arrays, so old code using the syntax
+        ``facet_info[i].normal`` still works
+        """
+        self.areas = areas
+        self.midpoints = midpoints
+        self.normals = normals
+        self.on_boundary = on_boundary
+
+    @staticmethod
+    def from_mesh(mesh, cell_info):
+        ndim = mesh.geometry().dim()
+        mesh.init(ndim - 1, 0)
+        mesh.init(ndim, ndim - 1)
+        coords = mesh.coordinates()
+        num_facets = mesh.num_entities(ndim - 1)
+
+        # Vertex coordinates for each facet, shape (num_facets, ndim, ndim)
+        facet_verts = numpy.asarray(mesh.topology()(ndim - 1, 0)(), dtype=numpy.intp)
+        facet_coords = coords[facet_verts.reshape(num_facets, ndim)]
+        midpoints = facet_coords.mean(axis=1)
+
+        # Un-normalised normal vectors, the length is the facet area times (ndim - 1)
         if ndim == 2:
-            normal = numpy.array([normalpt.x(), normalpt.y()], float)
+            tangent = facet_coords[:, 1] - facet_coords[:, 0]
+            normals = numpy.zeros_like(tangent)
+            normals[:, 0] = tangent[:, 1]
+            normals[:, 1] = -tangent[:, 0]
         else:
-            normal = numpy.array([normalpt.x(), normalpt.y(), normalpt.z()], float)
-        if numpy.dot(vec0, normal) < 0:
-            normal *= -1
+            normals = numpy.cross(
+                facet_coords[:, 1] - facet_coords[:, 0], facet_coords[:, 2] - facet_coords[:, 0]
+            )
+        lengths = numpy.sqrt((normals ** 2).sum(axis=1))
+        areas = lengths / (ndim - 1)
+        normals /= lengths[:, None]
+
+        # Find the number of connected cells and the first (lowest numbered)
+        # connected cell of each facet from the cell to facet connectivity
+        num_cells = mesh.num_cells()
+        cell_facets = numpy.asarray(mesh.topology()(ndim, ndim - 1)(), dtype=numpy.intp)
+        cell_indices = numpy.repeat(numpy.arange(num_cells), ndim + 1)
+        num_connected = numpy.bincount(cell_facets, minlength=num_facets)
+        first_cell = numpy.full(num_facets, num_cells, dtype=numpy.intp)
+        numpy.minimum.at(first_cell, cell_facets, cell_indices)
+        on_boundary = num_connected == 1
+
+        # Make the normals point out of the first connected cell
+        vec0 = midpoints - cell_info.midpoints[first_cell]
+        flip = (vec0 * normals).sum(axis=1) < 0
+        normals[flip] *= -1
+
+        return FacetGeometry(areas, midpoints, normals, on_boundary)
+
+    def __len__(self):
+        return self.areas.shape[0]
+
+    def __getitem__(self, idx):
+        return FacetInfo(
+            self.areas[idx], self.midpoints[idx], self.normals[idx], bool(self.on_boundary[idx])
+        )
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+def get_cell_vertex_coordinates(mesh):
+    """
+    Return the vertex coordinates of all cells (including ghost cells) as
+    an array of shape (num_cells, num_vertices_per_cell, gdim)
+    """
+    coords = mesh.coordinates()
+    cell_verts = numpy.asarray(mesh.cells(), dtype=numpy.intp)
+    return coords[cell_verts]
 
-        area = areas[fidx]
-        facet_info[fidx] = FacetInfo(area, midpoint, normal, on_boundary)
 
-    simulation.data['facet_info'] = facet_info
+def simplex_volumes(cell_coords, ndim):
+    """
+    Return the volumes of simplices given the vertex coordinates of the
+    simplices as an array of shape (num_cells, ndim + 1, ndim)
+    """
+    assert cell_coords.shape[1] == ndim + 1, 'Only simplex cells are supported'
+    jacobians = cell_coords[:, 1:, :] - cell_coords[:, :1, :]
+    factorial = 2 if ndim == 2 else 6
+    return abs(numpy.linalg.det(jacobians)) / factorial
@@ -78,7 +78,7 @@ def interactive_console_hook(simulation):
                 '\nCommand line action:\n  Setting simulation '
                 'control parameter tmax to %r\n' % simulation.time
             )
-            simulation.input['time']['tmax'] = simulation.time
+            simulation.input.set_value('time/tmax', simulation.time)
 
         elif command == 't':
             # t == "timings" -> show timings
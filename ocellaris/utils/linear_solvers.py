@@ -1,8 +1,10 @@
+import hashlib
 import numpy
 import numpy.linalg
 import dolfin
 import contextlib
 from .timer import timeit
+from .error_handling import ocellaris_error, verify_key
 
 
 # Default parameters when use_ksp is True
@@ -11,6 +13,16 @@ DEFAULT_RTOL = [1e-6, 1e-8, 1e-10]
 DEFAULT_ATOL = [1e-8, 1e-10, 1e-15]
 DEFAULT_NITK = [10, 40, 100]
 
+# Default parameters for operator reuse and Krylov subspace recycling
+DEFAULT_REUSE_UNCHANGED_OPERATOR = False
+DEFAULT_KRYLOV_RECYCLING = 'none'
+KRYLOV_RECYCLING_GUESS_TYPES = {'fischer': 'fischer', 'pod': 'pod'}
+
+# Default values for the Schur complement products, can be changed in the input file
+SCHUR_COMPLEMENT_METHOD = 'block_diagonal'
+SCHUR_COMPLEMENT_MATRIX_FREE = False
+SCHUR_COMPLEMENT_PC_INTERVAL = 1
+
 
 def linear_solver_from_input(
     simulation,
@@ -62,6 +74,12 @@ def linear_solver_from_input(
     options that do not take a value, like ``-ksp_view`` and ``-help`` a special
     signal value 'ENABLED' can be specified on the input file. This is automatically
     translated to the correct syntax.
+
+    With use_ksp and ``reuse_unchanged_operator: yes`` the preconditioner is only
+    rebuilt when the assembled operator has changed (default off). Information from previous
+    solves can be used for the initial guess with ``krylov_recycling: fischer`` or
+    ``pod``, and ``report_statistics: yes`` adds the number of solves, Krylov
+    iterations and preconditioner setups per time step to the reports.
     """
     simulation.log.info('    Creating linear equation solver from input "%s"' % path)
 
@@ -165,11 +183,23 @@ class LinearSolverWrapper(object):
         self.is_first_solve = False
         return ret
 
-    def inner_solve(self, A, x, b, in_iter, co_iter):
+    def inner_solve(self, A, x, b, in_iter, co_iter, operator_changed=None, P=None):
         """
         This is not implemented for dolfin solvers, so just solve as usual
+
+        If P is given it is used to build the preconditioner instead of A,
+        which is only possible for iterative solvers
         """
-        return self.solve(A, x, b)
+        if P is None:
+            return self.solve(A, x, b)
+
+        if not self.is_iterative:
+            ocellaris_error(
+                'Cannot use a separate preconditioner matrix',
+                'The %s solver is not iterative' % self.solver_method,
+            )
+        self._solver.set_operators(A, P)
+        return self.solve(x, b)
 
     @property
     def parameters(self):
@@ -245,6 +275,21 @@ class KSPLinearSolverWrapper(object):
                 # Normal option with value
                 dolfin.PETScOptions.set(option, value)
 
+        # Carry Krylov information across solves (time steps) by projecting the
+        # new solution onto the space spanned by the previous solutions
+        recycling = params.get('krylov_recycling', DEFAULT_KRYLOV_RECYCLING)
+        if recycling != 'none' and 'petsc_ksp_guess_type' not in params:
+            if recycling not in KRYLOV_RECYCLING_GUESS_TYPES:
+                ocellaris_error(
+                    'Unknown Krylov recycling method',
+                    'Expected krylov_recycling in %r for solver %s, got %r'
+                    % (['none'] + sorted(KRYLOV_RECYCLING_GUESS_TYPES), input_path, recycling),
+                )
+            option = prefix + 'ksp_guess_type'
+            value = KRYLOV_RECYCLING_GUESS_TYPES[recycling]
+            simulation.log.info('        %-50s: %20r' % (option, value))
+            dolfin.PETScOptions.set(option, value)
+
         if request_petsc_help:
             simulation.log.warning('PETSc help coming up')
             simulation.log.warning('-' * 80)
@@ -262,21 +307,41 @@ class KSPLinearSolverWrapper(object):
         # Only used when calling the basic .solve() method
         self.reuse_precon = False
 
+        # The inner iteration controls may be changed by user code, these
+        # accessors give fresh info without re-reading the input every solve
+        def accessor(key, default, required_type):
+            prev = params.get(key, default)
+            path = '%s/%s' % (input_path, key)
+            return simulation.input.get_accessor(path, prev, required_type)
+
+        self._inp_itr_ctrl = accessor('inner_iter_control', DEFAULT_ITR_CTRL, 'list(int)')
+        self._inp_rtol = accessor('inner_iter_rtol', DEFAULT_RTOL, 'list(float)')
+        self._inp_atol = accessor('inner_iter_atol', DEFAULT_ATOL, 'list(float)')
+        self._inp_max_it = accessor('inner_iter_max_it', DEFAULT_NITK, 'list(int)')
+
+        # Skip the preconditioner setup when the operator has not changed
+        self.reuse_unchanged_operator = params.get(
+            'reuse_unchanged_operator', DEFAULT_REUSE_UNCHANGED_OPERATOR
+        )
+        self._operator_fingerprint = None
+
+        # Per time step solver statistics
+        self.report_name = input_path.split('/')[-1]
+        self.report_statistics = params.get('report_statistics', False)
+        self.statistics = KrylovStatistics()
+        if self.report_statistics:
+            simulation.hooks.add_post_timestep_hook(
+                self._report_statistics, 'Report Krylov statistics for %s' % input_path
+            )
+
     @timeit.named('petsc4py solve')
     def solve(self, *argv, **kwargs):
         self._solver.set_from_options()
 
-        inp = self.simulation.input.get_value(self._input_path, {}, 'Input')
-
-        def get_updated(key, default, required_type):
-            "The key may be changed by user code, lets get fresh info"
-            prev = self._config_params.get(key, default)
-            return inp.get_value(key, prev, required_type)
-
         # Use the setup for the final inner iterations (assumed to be strictest)
-        rtol = get_updated('inner_iter_rtol', DEFAULT_RTOL, 'list(float)')[-1]
-        atol = get_updated('inner_iter_atol', DEFAULT_ATOL, 'list(float)')[-1]
-        nitk = get_updated('inner_iter_max_it', DEFAULT_NITK, 'list(int)')[-1]
+        rtol = self._inp_rtol.get()[-1]
+        atol = self._inp_atol.get()[-1]
+        nitk = self._inp_max_it.get()[-1]
 
         # Solver setup with petsc4py
         ksp = self._solver.ksp()
@@ -287,10 +352,15 @@ class KSPLinearSolverWrapper(object):
         # Solve using the standard dolfin interface
         ret = self._solver.solve(*argv, **kwargs)
         self.is_first_solve = False
+
+        niter = ksp.getIterationNumber()
+        self.statistics.add_solve(niter, ksp.getConvergedReason(), not self.reuse_precon)
+        timeit.count('krylov_iterations %s' % self.report_name, niter)
+        timeit.count('pc_setups %s' % self.report_name, int(not self.reuse_precon))
         return ret
 
     @timeit.named('petsc4py inner_solve')
-    def inner_solve(self, A, x, b, in_iter, co_iter):
+    def inner_solve(self, A, x, b, in_iter, co_iter, operator_changed=None, P=None):
         """
         This solver method uses different convergence criteria depending
         on how far in into the inner iterations loop the solve is located
@@ -309,28 +379,37 @@ class KSPLinearSolverWrapper(object):
         inner iterations to perform iterative pressure corrections and in
         each of these inner iterations there are Krylov iterations to actually
         solve the resulting linear systems.
-        """
-        inp = self.simulation.input.get_value(self._input_path, {}, 'Input')
 
-        def get_updated(key, default, required_type):
-            "The key may be changed by user code, lets get fresh info"
-            prev = self._config_params.get(key, default)
-            return inp.get_value(key, prev, required_type)
+        The preconditioner is rebuilt in the first inner iteration. With
+        reuse_unchanged_operator it is only rebuilt if the operator has
+        changed. The caller can then signal this explicitly with
+        operator_changed, or leave it as None to compare with the operator
+        used in the previous time step. The operator_changed argument is
+        ignored when reuse_unchanged_operator is off
 
-        firstN, lastN = get_updated('inner_iter_control', DEFAULT_ITR_CTRL, 'list(int)')
-        rtol_beg, rtol_mid, rtol_end = get_updated('inner_iter_rtol', DEFAULT_RTOL, 'list(float)')
-        atol_beg, atol_mid, atol_end = get_updated('inner_iter_atol', DEFAULT_ATOL, 'list(float)')
-        nitk_beg, nitk_mid, nitk_end = get_updated('inner_iter_max_it', DEFAULT_NITK, 'list(int)')
+        If P is given it is used to build the preconditioner instead of A,
+        and it is P that is checked for changes. This is used with matrix
+        free operators
+        """
+        firstN, lastN = self._inp_itr_ctrl.get()
+        rtol_beg, rtol_mid, rtol_end = self._inp_rtol.get()
+        atol_beg, atol_mid, atol_end = self._inp_atol.get()
+        nitk_beg, nitk_mid, nitk_end = self._inp_max_it.get()
 
         # Solver setup with petsc4py
         ksp = self._solver.ksp()
         pc = ksp.getPC()
 
-        # Special treatment of first inner iteration
+        # Special treatment of first inner iteration, the operator may have
+        # changed since the previous time step
         reuse_pc = True
         if in_iter == 1:
-            reuse_pc = False
-            ksp.setOperators(A.mat())
+            Pmat = A if P is None else P
+            if operator_changed is None or not self.reuse_unchanged_operator:
+                operator_changed = self.operator_changed(Pmat)
+            if operator_changed:
+                reuse_pc = False
+                ksp.setOperators(A.mat(), Pmat.mat())
 
         if co_iter < lastN:
             # This is one of the last iterations
@@ -352,14 +431,51 @@ class KSPLinearSolverWrapper(object):
         ksp.setTolerances(rtol=rtol, atol=atol, max_it=max_it)
         ksp.solve(b.vec(), x.vec())
         x.update_ghost_values()
-        return ksp.getIterationNumber()
+
+        niter = ksp.getIterationNumber()
+        self.statistics.add_solve(niter, ksp.getConvergedReason(), not reuse_pc)
+        timeit.count('krylov_iterations %s' % self.report_name, niter)
+        timeit.count('pc_setups %s' % self.report_name, int(not reuse_pc))
+        return niter
+
+    def operator_changed(self, A):
+        """
+        Check if the operator has changed since the last call. This is
+        always True unless reuse_unchanged_operator is enabled. Comparing
+        the assembled matrix values is much cheaper than setting up an
+        algebraic multigrid preconditioner
+        """
+        if not self.reuse_unchanged_operator:
+            return True
+
+        mat = A.mat()
+        fingerprint = (mat.handle, get_matrix_fingerprint(mat))
+        changed = fingerprint != self._operator_fingerprint
+        self._operator_fingerprint = fingerprint
+
+        # The preconditioner must be rebuilt on all processes or none
+        comm = A.mpi_comm()
+        return dolfin.MPI.max(comm, float(changed)) > 0
+
+    def _report_statistics(self):
+        """
+        Report the solver statistics for the current time step
+        """
+        sim = self.simulation
+        stats = self.statistics
+        name = self.report_name
+        sim.reporting.report_timestep_value('ksp_%s_solves' % name, stats.num_solves)
+        sim.reporting.report_timestep_value('ksp_%s_its' % name, stats.num_iterations)
+        sim.reporting.report_timestep_value('ksp_%s_pc_setups' % name, stats.num_pc_setups)
+        sim.reporting.report_timestep_value('ksp_%s_diverged' % name, stats.num_diverged)
+        self.statistics = KrylovStatistics()
 
     @property
     def parameters(self):
         raise ValueError('Do not use dolfin parameters to configure KSP solver')
 
     def set_operator(self, A):
-        self._ksp.setOperators(A.mat())
+        self.ksp().setOperators(A.mat())
 
     def set_reuse_preconditioner(self, reuse_preconditioner):
         # Only used when calling the basic .solve() method
@@ -369,7 +485,36 @@ class KSPLinearSolverWrapper(object):
         return self._solver.ksp()
 
     def __repr__(self):
-        return '<KSPLinearSolverWrapper prefix=%r>' % self._ksp.getOptionsPrefix()
+        return '<KSPLinearSolverWrapper prefix=%r>' % self.ksp().getOptionsPrefix()
+
+
+class KrylovStatistics(object):
+    def __init__(self):
+        """
+        Statistics for the Krylov solves in one time step
+        """
+        self.num_solves = 0
+        self.num_iterations = 0
+        self.num_pc_setups = 0
+        self.num_diverged = 0
+
+    def add_solve(self, num_iterations, converged_reason, pc_setup):
+        self.num_solves += 1
+        self.num_iterations += num_iterations
+        self.num_pc_setups += int(pc_setup)
+        self.num_diverged += int(converged_reason < 0)
+
+
+def get_matrix_fingerprint(mat):
+    """
+    Return a hash of the local part of a petsc4py AIJ matrix, including the
+    sparsity pattern. Equal hashes means that the local values are equal
+    """
+    indptr, indices, values = mat.getValuesCSR()
+    hasher = hashlib.sha1(indptr.tobytes())
+    hasher.update(indices.tobytes())
+    hasher.update(values.tobytes())
+    return hasher.hexdigest()
 
 
 def apply_settings(solver_method, parameters, new_values):
@@ -488,11 +633,446 @@ def matmul(A, B, out=None):
     return C
 
 
-def invert_block_diagonal_matrix(V, M, Minv=None):
+class BlockDiagonalProduct(object):
+    def __init__(self, Ainv, B):
+        """
+        Compute the product Ã⁻¹⋅B where Ã⁻¹ is a block diagonal matrix whose
+        blocks only couple dofs owned by the local process, like the inverse
+        of a DG mass matrix or the A_tilde_inv matrix of the SIMPLE type
+        solvers. Each row block of the product is the dense product of an
+        Ã⁻¹ block and the corresponding rows of B, so no communication is
+        needed. The sparsity pattern of the product is computed once and
+        only the values are computed in update()
+
+        Check the supported attribute after construction, it is False if
+        Ã⁻¹ does not have the required structure. The structure checks are
+        combined over all processes, so all processes take the same branch
+        """
+        amat = dolfin.as_backend_type(Ainv).mat()
+        bmat = dolfin.as_backend_type(B).mat()
+        self.istart, self.iend = amat.getOwnershipRange()
+        self.bsizes = bmat.getSizes()
+        self.comm = bmat.getComm()
+        self.ncols = bmat.getSize()[1]
+        self.tensor = None
+
+        a_indptr, a_cols, _ = amat.getValuesCSR()
+        b_indptr, b_cols, _ = bmat.getValuesCSR()
+        self.pattern = (a_indptr, a_cols, b_indptr, b_cols)
+        ok = self._setup(a_indptr, a_cols, b_indptr, b_cols)
+        self.supported = self._on_all_processes(ok)
+
+    def _on_all_processes(self, ok):
+        """
+        Return True only if ok is True on all processes sharing B
+        """
+        return dolfin.MPI.min(self.comm.tompi4py(), float(ok)) > 0
+
+    def same_pattern(self, a_indptr, a_cols, b_indptr, b_cols):
+        """
+        Check if the given CSR structures are the ones used in the setup on
+        all processes
+        """
+        ok = True
+        for old, new in zip(self.pattern, (a_indptr, a_cols, b_indptr, b_cols)):
+            if old.shape != new.shape or not numpy.array_equal(old, new):
+                ok = False
+        return self._on_all_processes(ok)
+
+    def _setup(self, a_indptr, a_cols, b_indptr, b_cols):
+        """
+        Find the blocks of Ã⁻¹ and the sparsity pattern of the product, and
+        the index arrays used to compute the product values
+        """
+        from petsc4py import PETSc
+
+        nrows = len(a_indptr) - 1
+        nnz_row = numpy.diff(a_indptr)
+        if len(b_indptr) != nrows + 1:
+            return False
+        elif nrows == 0:
+            # No owned rows on this process
+            self.p_indptr = numpy.zeros(1, PETSc.IntType)
+            self.p_cols = numpy.zeros(0, PETSc.IntType)
+            self.p_vals = numpy.zeros(0, float)
+            self.groups = []
+            return True
+        elif nnz_row.min() == 0:
+            return False
+
+        # All columns of Ã⁻¹ must be owned rows, sorted within each row
+        cols = a_cols.astype(numpy.int64) - self.istart
+        if cols.min() < 0 or cols.max() >= nrows:
+            return False
+        row_of_entry = numpy.repeat(numpy.arange(nrows), nnz_row)
+        same_row = row_of_entry[1:] == row_of_entry[:-1]
+        if numpy.any(cols[1:][same_row] <= cols[:-1][same_row]):
+            return False
+
+        # Rows in the same block have the same first column, and all columns
+        # of a row must be rows in the same block as the row itself
+        first = cols[a_indptr[:-1]]
+        block_size = numpy.bincount(first, minlength=nrows)[first]
+        if numpy.any(block_size != nnz_row) or numpy.any(first[cols] != first[row_of_entry]):
+            return False
+
+        # Number the blocks and find the position of each row in its block.
+        # The rows are ordered by block and then by row number, so the
+        # position in the block is also the column in the dense block
+        order = numpy.lexsort((numpy.arange(nrows), first))
+        is_block_start = numpy.ones(nrows, bool)
+        is_block_start[1:] = first[order[1:]] != first[order[:-1]]
+        block_of_row = numpy.empty(nrows, numpy.int64)
+        block_of_row[order] = numpy.cumsum(is_block_start) - 1
+        pos_in_block = numpy.empty(nrows, numpy.int64)
+        block_starts = numpy.flatnonzero(is_block_start)
+        pos_in_block[order] = numpy.arange(nrows) - numpy.repeat(
+            block_starts, numpy.diff(numpy.append(block_starts, nrows))
+        )
+        nblocks = len(block_starts)
+
+        # The columns of each product block are all the columns of B in the
+        # rows of the block. Find the unique (block, column) pairs
+        b_row_of_entry = numpy.repeat(numpy.arange(nrows), numpy.diff(b_indptr))
+        keys = block_of_row[b_row_of_entry] * self.ncols + b_cols
+        uniq, inverse = numpy.unique(keys, return_inverse=True)
+        uniq_block = uniq // self.ncols
+        block_ncols = numpy.bincount(uniq_block, minlength=nblocks)
+        block_col_start = numpy.zeros(nblocks, numpy.int64)
+        block_col_start[1:] = numpy.cumsum(block_ncols)[:-1]
+        b_slot = (numpy.arange(len(uniq)) - block_col_start[uniq_block])[inverse]
+
+        # The sparsity pattern of the product
+        row_ncols = block_ncols[block_of_row]
+        p_indptr = numpy.zeros(nrows + 1, PETSc.IntType)
+        p_indptr[1:] = numpy.cumsum(row_ncols)
+        p_row_of_entry = numpy.repeat(numpy.arange(nrows), row_ncols)
+        p_slot = numpy.arange(p_indptr[-1]) - p_indptr[p_row_of_entry]
+        p_block = block_of_row[p_row_of_entry]
+        p_cols = (uniq % self.ncols)[block_col_start[p_block] + p_slot]
+        self.p_indptr = p_indptr
+        self.p_cols = p_cols.astype(PETSc.IntType)
+        self.p_vals = numpy.zeros(p_indptr[-1], float)
+
+        # Index arrays for each group of blocks with the same size. The B
+        # values are gathered into dense (nblocks, N, M) arrays padded with
+        # zeros, where M is the largest number of columns in these blocks
+        self.groups = []
+        block_N = nnz_row[order[block_starts]]
+        b_block = block_of_row[b_row_of_entry]
+        for N in numpy.unique(block_N):
+            blocks = numpy.flatnonzero(block_N == N)
+            local_block = numpy.full(nblocks, -1, numpy.int64)
+            local_block[blocks] = numpy.arange(len(blocks))
+            M = block_ncols[blocks].max()
+
+            # The rows of each block, in block order
+            rows = order[(block_starts[blocks][:, None] + numpy.arange(N)[None, :]).ravel()]
+            a_src = (a_indptr[rows][:, None] + numpy.arange(N)[None, :]).ravel()
+
+            # Where to put the B values in the dense blocks
+            b_sel = numpy.flatnonzero(local_block[b_block] >= 0)
+            b_dst = (
+                local_block[b_block[b_sel]] * N + pos_in_block[b_row_of_entry[b_sel]]
+            ) * M + b_slot[b_sel]
+
+            # Where to get the product values from the dense blocks
+            p_sel = numpy.flatnonzero(local_block[p_block] >= 0)
+            p_src = (
+                local_block[p_block[p_sel]] * N + pos_in_block[p_row_of_entry[p_sel]]
+            ) * M + p_slot[p_sel]
+
+            dense = numpy.zeros((len(blocks), N, M), float)
+            self.groups.append((N, a_src, b_sel, b_dst, p_sel, p_src, dense))
+        return True
+
+    def compute_values(self, a_vals, b_vals):
+        """
+        Compute the values of the product in CSR order from the CSR values
+        of Ã⁻¹ and B
+        """
+        for N, a_src, b_sel, b_dst, p_sel, p_src, dense in self.groups:
+            a_blocks = a_vals[a_src].reshape(-1, N, N)
+            dense.reshape(-1)[b_dst] = b_vals[b_sel]
+            prod = numpy.matmul(a_blocks, dense)
+            self.p_vals[p_sel] = prod.reshape(-1)[p_src]
+        return self.p_vals
+
+    def update(self, Ainv, B):
+        """
+        Compute the product and return it as a dolfin PETScMatrix. The same
+        matrix is returned every time. Returns None if the sparsity pattern
+        of Ã⁻¹ or B has changed since the setup
+        """
+        from petsc4py import PETSc
+
+        a_indptr, a_cols, a_vals = dolfin.as_backend_type(Ainv).mat().getValuesCSR()
+        b_indptr, b_cols, b_vals = dolfin.as_backend_type(B).mat().getValuesCSR()
+        if not self.same_pattern(a_indptr, a_cols, b_indptr, b_cols):
+            return None
+
+        p_vals = self.compute_values(a_vals, b_vals)
+        if self.tensor is None:
+            mat = PETSc.Mat().createAIJ(
+                size=self.bsizes, csr=(self.p_indptr, self.p_cols, p_vals), comm=self.comm
+            )
+            mat.assemble()
+            self.tensor = dolfin.PETScMatrix(mat)
+        else:
+            mat = self.tensor.mat()
+            mat.setValuesCSR(self.p_indptr, self.p_cols, p_vals)
+            mat.assemble()
+        return self.tensor
+
+
+class SchurComplement(object):
+    def __init__(self, simulation, name):
+        """
+        The product S = C⋅Ã⁻¹⋅B used in the pressure correction equations of
+        the SIMPLE, PISO, PIMPLE and IPCS-A solvers, where Ã⁻¹ is a block
+        diagonal approximation to the inverse of the velocity matrix. Call
+        update() when C, Ã⁻¹ or B has changed.
+
+        With the default block_diagonal method the product Ã⁻¹⋅B is computed
+        locally from the dense blocks of Ã⁻¹ with a sparsity pattern that is
+        computed once (see BlockDiagonalProduct). The method falls back to
+        PETSc matrix-matrix products if Ã⁻¹ does not have the required
+        structure. With the matmul method PETSc is used for both products.
+        The final product with C is always computed by PETSc, reusing the
+        result matrix so that only the numeric phase is repeated.
+
+        In matrix free mode C⋅Ã⁻¹⋅B is not computed in update(). The operator
+        is then a shell matrix that applies C and Ã⁻¹⋅B in turn, and the
+        assembled product, which is used to build the preconditioner, is
+        only recomputed every schur_complement_pc_interval updates
+        """
+        inp = simulation.input
+        self.simulation = simulation
+        self.name = name
+        self.method = inp.get_value(
+            'solver/schur_complement_method', SCHUR_COMPLEMENT_METHOD, 'string'
+        )
+        self.matrix_free = inp.get_value(
+            'solver/schur_complement_matrix_free', SCHUR_COMPLEMENT_MATRIX_FREE, 'bool'
+        )
+        self.pc_interval = inp.get_value(
+            'solver/schur_complement_pc_interval', SCHUR_COMPLEMENT_PC_INTERVAL, 'int'
+        )
+        verify_key(
+            'Schur complement method',
+            self.method,
+            ('block_diagonal', 'matmul'),
+            'Schur complement %s' % name,
+        )
+
+        self.C = None
+        self.AinvB = None
+        self._product = None
+        self._block_product = None
+        self._shell = None
+        self._num_updates_since_pc = 0
+
+    def update(self, C, Ainv, B):
+        """
+        Update the Schur complement after C, Ã⁻¹ or B has changed. The
+        checks in BlockDiagonalProduct are collective, so all processes
+        use the same method and create new matrices at the same time
+        """
+        self.C = C
+        AinvB = None
+        if self.method == 'block_diagonal':
+            blk = self._block_product
+            if blk is not None:
+                AinvB = blk.update(Ainv, B)
+            if AinvB is None:
+                blk = self._block_product = BlockDiagonalProduct(Ainv, B)
+                if not blk.supported:
+                    self.simulation.log.info(
+                        'Schur complement %s: A_tilde_inv is not block diagonal, '
+                        'using PETSc matrix products' % self.name
+                    )
+                    self.method = 'matmul'
+                    self.AinvB = None
+                else:
+                    AinvB = blk.update(Ainv, B)
+                # The sparsity pattern of C⋅Ã⁻¹⋅B may have changed
+                self._product = None
+
+        if AinvB is None:
+            AinvB = matmul(Ainv, B, self.AinvB)
+        self.AinvB = AinvB
+
+        self._num_updates_since_pc += 1
+        if not self.matrix_free:
+            self._compute_product()
+
+    def _compute_product(self):
+        self._product = matmul(self.C, self.AinvB, self._product)
+        self._num_updates_since_pc = 0
+
+    @property
+    def operator(self):
+        """
+        The Schur complement as a matrix for use in a Krylov solver, this is
+        a shell matrix in matrix free mode
+        """
+        if not self.matrix_free:
+            return self._product
+
+        if self._shell is None:
+            from petsc4py import PETSc
+
+            cmat = self.C.mat()
+            sizes = (cmat.getSizes()[0], cmat.getSizes()[0])
+            context = SchurComplementShell(self)
+            shell = PETSc.Mat().createPython(sizes, context, comm=cmat.getComm())
+            shell.setUp()
+            self._shell = dolfin.PETScMatrix(shell)
+        return self._shell
+
+    @property
+    def preconditioner_matrix(self):
+        """
+        The assembled Schur complement. In matrix free mode this is only
+        recomputed every pc_interval updates
+        """
+        if self.matrix_free:
+            if self._product is None or self._num_updates_since_pc >= self.pc_interval:
+                self._compute_product()
+        return self._product
+
+    def mult(self, x):
+        """
+        Return C⋅Ã⁻¹⋅B⋅x as a new vector
+        """
+        if not self.matrix_free:
+            return self._product * x
+        return self.C * (self.AinvB * x)
+
+
+class SchurComplementShell(object):
+    def __init__(self, schur):
+        """
+        A petsc4py Python matrix context applying a matrix free Schur
+        complement. Used by SchurComplement.operator
+        """
+        self.schur = schur
+        self._tmp = None
+
+    def mult(self, mat, x, y):
+        AinvB = self.schur.AinvB.mat()
+        if self._tmp is None:
+            self._tmp = AinvB.createVecLeft()
+        AinvB.mult(x, self._tmp)
+        self.schur.C.mat().mult(self._tmp, y)
+
+
+class ConstantNullSpace(object):
+    def __init__(self, simulation, V):
+        """
+        The null space of constant functions in V, as seen in pressure
+        equations without Dirichlet boundary conditions. Provides the null
+        space basis for the Krylov solvers and removes the mean value of a
+        function in V.
+
+        The constant mode mass vector ∫φ_i dx is assembled once, and again
+        after each time the mesh moves (the MeshMoved hook of the mesh
+        morpher), so the mean value is a dot product and the shift is an
+        axpy. A constant function must have all dof values equal to the
+        constant, as in the Lagrange type function spaces used for the
+        pressure
+        """
+        self.simulation = simulation
+        self.ones = dolfin.Function(V).vector()
+        self.ones[:] = 1.0
+
+        # Create vector that spans the null space and the null space basis
+        null_vec = self.ones.copy()
+        null_vec *= 1 / null_vec.norm('l2')
+        self.basis = dolfin.VectorSpaceBasis([null_vec])
+
+        self._mass_form = dolfin.Form(dolfin.TestFunction(V) * dolfin.dx(domain=V.mesh()))
+        self._mass = None
+        self._volume = None
+        self._mass_outdated = True
+
+        # The mass vector must be assembled again when the mesh moves
+        if getattr(simulation, 'mesh_morpher', None) is not None:
+            simulation.hooks.add_custom_hook(
+                'MeshMoved', self._mesh_moved, 'Update constant null space mass vector'
+            )
+
+    def _mesh_moved(self):
+        self._mass_outdated = True
+
+    def _update_mass(self):
+        """
+        Assemble the constant mode mass vector if it does not exist or if
+        the mesh has moved since the previous assembly
+        """
+        if not self._mass_outdated:
+            return
+        elif self._mass is None:
+            self._mass = dolfin.assemble(self._mass_form)
+        else:
+            dolfin.assemble(self._mass_form, tensor=self._mass)
+        self._volume = self._mass.inner(self.ones)
+        self._mass_outdated = False
+
+    def mean(self, vec):
+        """
+        The mean value of the function with the given dof vector
+        """
+        self._update_mass()
+        return self._mass.inner(vec) / self._volume
+
+    def remove_mean(self, vec, tolerance=None, max_passes=10):
+        """
+        Shift the function with the given dof vector to zero mean. If a
+        tolerance is given the shift is repeated until the removed mean is
+        below the tolerance, at most max_passes times. This is needed when
+        the mean is very large compared to the round off errors in the first
+        shift. A vector with a non-finite mean (a diverging solution) is not
+        changed
+        """
+        for _ in range(max_passes):
+            avg = self.mean(vec)
+            if not numpy.isfinite(avg):
+                break
+            vec.axpy(-avg, self.ones)
+            if tolerance is None or abs(avg) <= tolerance:
+                break
+        vec.apply('insert')
+
+
+def invert_block_diagonal_matrix(V, M, Minv=None, method='batched'):
     """
     Given a block diagonal matrix (DG mass matrix or similar), use local
     dense inverses to compute the  inverse matrix and return it, optionally
     reusing the given Minv tensor
+
+    The default batched method gathers all cell blocks into an array of
+    shape (ncells, N, N), inverts them with one stacked LAPACK call and
+    writes them back in one bulk insert. When Minv is given its sparsity
+    pattern is reused and only the values are refreshed. The Minv matrix
+    must then contain the cell blocks in its sparsity pattern, which is
+    the case if it was returned from a previous call with the same V.
+    Use method='loop' to use the slower cell by cell implementation
+    """
+    if method == 'loop':
+        return _invert_block_diagonal_matrix_loop(V, M, Minv)
+    elif method != 'batched':
+        raise ValueError('Unknown block diagonal inversion method %r' % method)
+
+    cell_dofs = get_owned_cell_dofs(V)
+    blocks = get_block_diagonal_blocks(M, cell_dofs)
+    blocks_inv = numpy.linalg.inv(blocks)
+    return set_block_diagonal_blocks(M, cell_dofs, blocks_inv, Minv)
+
+
+def _invert_block_diagonal_matrix_loop(V, M, Minv=None):
+    """
+    Cell by cell version of invert_block_diagonal_matrix()
     """
     mesh = V.mesh()
     dm = V.dofmap()
@@ -502,7 +1082,7 @@ def invert_block_diagonal_matrix(V, M, Minv=None):
     if Minv is None:
         Minv = dolfin.as_backend_type(M.copy())
 
-    # Loop over cells and get the block diagonal parts (should be moved to C++)
+    # Loop over cells and get the block diagonal parts
     istart = M.local_range(0)[0]
     for cell in dolfin.cells(mesh, 'regular'):
         # Get global dofs
@@ -517,6 +1097,107 @@ def invert_block_diagonal_matrix(V, M, Minv=None):
     return Minv
 
 
+def get_owned_cell_dofs(V):
+    """
+    Return the local dofs of all regular (non-ghost) cells as an array of
+    shape (ncells, N). For DG function spaces these are the owned dofs.
+    The array is cached on the function space object, so it is freed
+    along with the function space
+    """
+    cell_dofs = getattr(V, '_ocellaris_owned_cell_dofs', None)
+    if cell_dofs is not None:
+        return cell_dofs
+
+    mesh = V.mesh()
+    dm = V.dofmap()
+    num_cells = mesh.topology().ghost_offset(mesh.topology().dim())
+    N = V.element().space_dimension()
+    cell_dofs = numpy.array([dm.cell_dofs(i) for i in range(num_cells)], numpy.intc)
+    cell_dofs = cell_dofs.reshape((num_cells, N))
+    V._ocellaris_owned_cell_dofs = cell_dofs
+    return cell_dofs
+
+
+def get_block_diagonal_blocks(M, cell_dofs):
+    """
+    Gather the dense diagonal blocks of the matrix M into an array of shape
+    (ncells, N, N). The cell_dofs array contains the local row numbers of
+    each block, see get_owned_cell_dofs(). Entries that are not in the
+    sparsity pattern of M are returned as zeros
+    """
+    ncells, N = cell_dofs.shape
+    mat = dolfin.as_backend_type(M).mat()
+    istart = mat.getOwnershipRange()[0]
+    ncols = mat.getSize()[1]
+    indptr, indices, values = mat.getValuesCSR()
+
+    # Sortable keys for the nonzero entries in the local CSR arrays. PETSc
+    # stores sorted column indices, so the keys should already be sorted
+    rows = numpy.repeat(numpy.arange(len(indptr) - 1, dtype=numpy.int64), numpy.diff(indptr))
+    keys = rows * ncols + indices
+    if not numpy.all(keys[1:] > keys[:-1]):
+        order = numpy.argsort(keys)
+        keys = keys[order]
+        values = values[order]
+
+    # Keys for the wanted block entries, shape (ncells, N, N)
+    block_rows = cell_dofs.astype(numpy.int64)[:, :, None]
+    block_cols = cell_dofs.astype(numpy.int64)[:, None, :] + istart
+    wanted = (block_rows * ncols + block_cols).ravel()
+
+    # Look up all entries in one go
+    pos = numpy.searchsorted(keys, wanted)
+    pos[pos == len(keys)] = 0
+    found = keys[pos] == wanted if len(keys) else numpy.zeros(wanted.shape, bool)
+    blocks = numpy.zeros(wanted.shape, float)
+    blocks[found] = values[pos[found]]
+    return blocks.reshape(ncells, N, N)
+
+
+def set_block_diagonal_blocks(M, cell_dofs, blocks, out=None):
+    """
+    Create a block diagonal matrix with the same parallel layout as M
+    containing the given dense blocks (shape (ncells, N, N)) and nothing
+    else. If out is given then the sparsity pattern is assumed to be
+    compatible and only the values are replaced
+    """
+    from petsc4py import PETSc
+
+    ncells, N = cell_dofs.shape
+    mat = dolfin.as_backend_type(M).mat()
+    istart, iend = mat.getOwnershipRange()
+    nrows = iend - istart
+    assert nrows == ncells * N, 'Every owned row must be in exactly one block'
+
+    # Sort the columns in each block to get a valid CSR structure
+    perm = numpy.argsort(cell_dofs, axis=1)
+    block_cols = numpy.take_along_axis(cell_dofs, perm, axis=1) + istart
+    block_vals = numpy.take_along_axis(blocks, perm[:, None, :], axis=2)
+
+    # Each row has N entries, the column indices of the block it belongs to
+    row_ids = cell_dofs.ravel()
+    row_cols = numpy.empty((nrows, N), dtype=PETSc.IntType)
+    row_vals = numpy.empty((nrows, N), dtype=float)
+    row_cols[row_ids] = numpy.repeat(block_cols, N, axis=0)
+    row_vals[row_ids] = block_vals.reshape(ncells * N, N)
+    indptr = numpy.arange(0, nrows * N + 1, N, dtype=PETSc.IntType)
+    row_cols = row_cols.ravel()
+    row_vals = row_vals.ravel()
+
+    if out is None:
+        new_mat = PETSc.Mat().createAIJ(
+            size=mat.getSizes(), csr=(indptr, row_cols, row_vals), comm=mat.getComm()
+        )
+        new_mat.assemble()
+        return dolfin.PETScMatrix(new_mat)
+
+    out_mat = dolfin.as_backend_type(out).mat()
+    out_mat.zeroEntries()
+    out_mat.setValuesCSR(indptr, row_cols, row_vals)
+    out_mat.assemble()
+    return out
+
+
 def condition_number(A, method='simplified'):
     """
     Estimate the condition number of the matrix A
@@ -17,6 +17,106 @@ def get_root_value(value, comm=None):
     return comm.bcast(value)
 
 
+def exchange_arrays(send, dtype=float, comm=None, recv_shapes=None):
+    """
+    Point-to-point exchange of NumPy arrays between ranks that have data to
+    send to each other. The send argument is a dictionary that maps from a
+    rank to the array that should be sent there. Returns a dictionary that
+    maps from a rank to the array that was received from there
+
+    If the shapes of the arrays that will be received are not known, i.e.
+    recv_shapes is None, the shapes are first sent with an alltoall, this
+    does not go via the root process, but it does involve all processes.
+    All arrays must have the given dtype
+    """
+    if comm is None:
+        comm = dolfin.MPI.comm_world  # a mpi4py communicator
+
+    if recv_shapes is None:
+        shapes = [None] * comm.size
+        for rank, arr in send.items():
+            shapes[rank] = arr.shape
+        shapes = comm.alltoall(shapes)
+        recv_shapes = {rank: shape for rank, shape in enumerate(shapes) if shape is not None}
+
+    received = {}
+    requests = []
+    for rank, shape in sorted(recv_shapes.items()):
+        arr = numpy.empty(shape, dtype)
+        received[rank] = arr
+        if rank == comm.rank:
+            arr[...] = send[rank]
+        else:
+            requests.append(comm.Irecv(arr, source=rank))
+
+    # The send buffers must be kept alive until the sends are complete
+    buffers = []
+    for rank, arr in sorted(send.items()):
+        if rank != comm.rank:
+            buf = numpy.ascontiguousarray(arr, dtype)
+            buffers.append(buf)
+            requests.append(comm.Isend(buf, dest=rank))
+
+    for req in requests:
+        req.Wait()
+    return received
+
+
+class GhostExchange(object):
+    def __init__(self, V):
+        """
+        Get values of the ghost dofs of the function space V from the owning
+        processes by exchanging data only with the neighbouring processes
+        that own the ghost dofs. The communication pattern is computed once
+        and can be used to exchange any array with one row per dof
+        """
+        dm = V.dofmap()
+        comm = V.mesh().mpi_comm()
+        self.comm = comm
+
+        im = dm.index_map()
+        r0 = dm.ownership_range()[0]
+        self.num_owned = im.size(im.MapSize.OWNED)
+        global_dofs = dm.tabulate_local_to_global_dofs()
+        ghost_global = numpy.array(global_dofs[self.num_owned :], numpy.int64)
+        self.num_ghosts = len(ghost_global)
+
+        # The owners are given per block of dofs
+        owners = numpy.array(dm.off_process_owner(), int)
+        if len(owners) != self.num_ghosts:
+            owners = numpy.repeat(owners, im.block_size())
+
+        # Local ghost indices for each of the owning processes
+        self.recv_indices = {}
+        requests = {}
+        for rank in numpy.unique(owners):
+            idx = numpy.flatnonzero(owners == rank)
+            self.recv_indices[rank] = idx
+            requests[rank] = ghost_global[idx]
+
+        # Tell the owners which dofs we need, the owners then know which of
+        # their local dofs they must send to each of their neighbours
+        received = exchange_arrays(requests, numpy.int64, comm)
+        self.send_indices = {rank: gdofs - r0 for rank, gdofs in received.items()}
+
+    def get_ghost_values(self, values):
+        """
+        Given an array with at least one row per owned dof, return an array
+        with the corresponding rows for the ghost dofs. This is a collective
+        operation on the neighbouring processes
+        """
+        values = numpy.asarray(values)
+        shape = values.shape[1:]
+        send = {rank: values[idx] for rank, idx in self.send_indices.items()}
+        recv_shapes = {rank: (len(idx),) + shape for rank, idx in self.recv_indices.items()}
+        received = exchange_arrays(send, values.dtype, self.comm, recv_shapes)
+
+        ghost_values = numpy.zeros((self.num_ghosts,) + shape, values.dtype)
+        for rank, idx in self.recv_indices.items():
+            ghost_values[idx] = received[rank]
+        return ghost_values
+
+
 def sync_arrays(array_list, sync_all=False, comm=None):
     """
     Given a list of arrays on each process (dtype=float, various length
@@ -36,74 +136,69 @@ def sync_arrays(array_list, sync_all=False, comm=None):
         return
 
     # Receive on root (rank 0), send on all other ranks > 0
-    if rank == 0:
-        # Loop through non-root processes and get their lines
-        for proc in range(1, ncpu):
-            _sync_array_list_one_way(
-                comm, rank, array_list, from_rank=proc, to_rank=rank
-            )
-    else:
-        _sync_array_list_one_way(comm, rank, array_list, from_rank=rank, to_rank=0)
-
-    # Syncronize all processes
-    comm.barrier()
+    send_lengths, send_data = {}, {}
+    if rank != 0 and array_list:
+        send_lengths[0], send_data[0] = _pack_array_list(array_list)
+    all_lengths = exchange_arrays(send_lengths, int, comm)
+    recv_shapes = {proc: (lengths.sum(),) for proc, lengths in all_lengths.items()}
+    all_data = exchange_arrays(send_data, float, comm, recv_shapes)
+    for proc in sorted(all_data):
+        array_list.extend(_unpack_array_list(all_lengths[proc], all_data[proc]))
 
     if not sync_all:
         return
 
     # Send on root rank and recieve on all other ranks
-    if rank == 0:
-        # Loop through non-root processes and send the result to them
+    send_lengths, send_data = {}, {}
+    if rank == 0 and array_list:
+        lengths, data = _pack_array_list(array_list)
         for proc in range(1, ncpu):
-            _sync_array_list_one_way(
-                comm, rank, array_list, from_rank=rank, to_rank=proc
-            )
-    else:
+            send_lengths[proc], send_data[proc] = lengths, data
+    all_lengths = exchange_arrays(send_lengths, int, comm)
+    recv_shapes = {proc: (lengths.sum(),) for proc, lengths in all_lengths.items()}
+    all_data = exchange_arrays(send_data, float, comm, recv_shapes)
+    if rank != 0:
         del array_list[:]
-        _sync_array_list_one_way(comm, rank, array_list, from_rank=0, to_rank=rank)
+        for proc in all_data:
+            array_list.extend(_unpack_array_list(all_lengths[proc], all_data[proc]))
 
-    # Syncronize all processes
-    comm.barrier()
+
+def global_max_and_sum(maxima, sums, comm=None):
+    """
+    Compute the global maxima and sums of two small arrays of local values
+    with a single collective operation. The local values from all processes
+    are gathered on all processes and reduced in rank order, so the results
+    are identical on all processes
+    """
+    if comm is None:
+        comm = dolfin.MPI.comm_world  # a mpi4py communicator
+
+    maxima = numpy.asarray(maxima, float)
+    sums = numpy.asarray(sums, float)
+    if dolfin.MPI.size(comm) == 1:
+        return maxima.copy(), sums.copy()
+
+    local = numpy.concatenate([maxima, sums])
+    everything = numpy.zeros((comm.size, local.size), float)
+    comm.Allgather(local, everything)
+    N = maxima.size
+    return everything[:, :N].max(axis=0), everything[:, N:].sum(axis=0)
+
+
+def _pack_array_list(array_list):
+    """
+    Return the lengths of the 1D arrays and the concatenated data
+    """
+    lengths = numpy.array([len(arr) for arr in array_list], int)
+    data = numpy.concatenate([numpy.asarray(arr, float) for arr in array_list])
+    return lengths, data
 
 
-def _sync_array_list_one_way(comm, rank, array_list, from_rank, to_rank):
+def _unpack_array_list(lengths, data):
     """
-    Send a list of arrays from one rank to be appended in the list
-    of arrays in a different rank
+    Split concatenated data into arrays with the given lengths
     """
-    if rank == from_rank:
-        # Send number of arrays
-        N = len(array_list)
-        comm.isend(N, dest=to_rank)
-
-        if N > 0:
-            # Send array lengths
-            array_lengths = numpy.empty(N, int)
-            for i, arr in enumerate(array_list):
-                M, = arr.shape  # implicitly checks shape
-                array_lengths[i] = M
-            comm.Isend(array_lengths, dest=to_rank)
-
-            # Send arrays
-            for arr in array_list:
-                comm.Isend(arr, dest=to_rank)
-
-    else:
-        assert rank == to_rank
-
-        # Recieve number of arrays
-        N = comm.irecv(source=from_rank).wait()
-
-        if N > 0:
-            # Recieve line lengths
-            array_lengths = numpy.empty(N, int)
-            comm.Irecv(array_lengths, source=from_rank).Wait()
-
-            # Recieve arrays
-            for M in array_lengths:
-                arr = numpy.empty(M, float)
-                comm.Irecv(arr, source=from_rank).Wait()
-                array_list.append(arr)
+    return numpy.split(data, numpy.cumsum(lengths)[:-1])
 
 
 def gather_lines_on_root(lines, comm=None):
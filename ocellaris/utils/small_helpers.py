@@ -88,10 +88,8 @@ def get_local(v, V=None, include_ghosts=True):
     if not include_ghosts:
         return v.get_local()
     else:
-        im = V.dofmap().index_map()
-        num_dofs_local_and_ghosts = im.size(im.MapSize.ALL)
-        indices = numpy.arange(num_dofs_local_and_ghosts, dtype=numpy.intc)
-        return v.get_local(indices)
+        with local_vector_view(v, V) as arr:
+            return arr.copy()
 
 
 def set_local(v, arr, V=None, apply=None):
@@ -119,6 +117,46 @@ def set_local(v, arr, V=None, apply=None):
         v.apply(apply)
 
 
+@contextmanager
+def local_vector_view(v, V=None, writable=False):
+    """
+    Context manager giving the local values of vector v belonging to
+    function space V, including the ghost values, as a NumPy array. For
+    PETSc vectors the array is a view of the PETSc local form, so nothing
+    is copied. The array must not be used after the with block
+
+    If writable is True the owned values can be changed, and the ghost
+    values are updated from the owning processes at the end of the with
+    block (changes to the ghost values are hence lost). You can pass a
+    Function as first argument and V = None to automativally get v and V
+    from the function
+    """
+    if V is None and hasattr(v, 'function_space'):
+        # A Function was passed
+        V = v.function_space()
+        v = v.vector()
+
+    vec = dolfin.as_backend_type(v)
+    if not hasattr(vec, 'vec'):
+        # Not a PETSc vector, copy the values
+        if V is None:
+            arr = v.get_local()
+        else:
+            im = V.dofmap().index_map()
+            arr = v.get_local(numpy.arange(im.size(im.MapSize.ALL), dtype=numpy.intc))
+        yield arr
+        if writable:
+            v.set_local(arr[: v.local_size()])
+            v.apply('insert')
+        return
+
+    petsc_vec = vec.vec()
+    with petsc_vec.localForm() as local_form:
+        yield local_form.getArray(readonly=not writable)
+    if writable:
+        v.apply('insert')
+
+
 @contextmanager
 def dolfin_log_level(level):
     old_level = dolfin.get_log_level()
@@ -22,16 +22,22 @@ def timeit(f):
 
     @wraps(f)
     def wrapper(*args, **kwds):
+        recorder = timeit.recorder
+        if recorder is not None:
+            t0 = time.perf_counter()
         with dolfin.Timer('Ocellaris %s' % timed_task_name):
             # print('<%s>' % timed_task_name)
             ret = f(*args, **kwds)
             # print('</%s>' % timed_task_name)
+        if recorder is not None:
+            recorder.add(timed_task_name, time.perf_counter() - t0)
         return ret
 
     return wrapper
 
 
 timeit.next_name = None
+timeit.recorder = None
 
 
 def timeit_named(name):
@@ -46,6 +52,63 @@ def timeit_named(name):
 timeit.named = timeit_named
 
 
+def timeit_count(name, value=1):
+    """
+    Add to a named counter (Krylov iterations etc) in the active timing
+    recorder. Does nothing when profiling is not enabled
+    """
+    recorder = timeit.recorder
+    if recorder is not None:
+        recorder.count(name, value)
+
+
+timeit.count = timeit_count
+
+
+class TimingRecorder(object):
+    def __init__(self, get_inner_iteration=None):
+        """
+        Record the wall time spent in each region timed by the timeit
+        decorator, along with named counters. The profiler takes out the
+        recorded data at the end of each time step with reset()
+
+        If get_inner_iteration is given, the timings are also recorded
+        for each inner iteration number returned by this function
+        """
+        self.get_inner_iteration = get_inner_iteration
+        self.totals = {}
+        self.inner = {}
+        self.counters = {}
+
+    def add(self, name, elapsed):
+        totals = self.totals.get(name)
+        if totals is None:
+            self.totals[name] = [elapsed, 1]
+        else:
+            totals[0] += elapsed
+            totals[1] += 1
+
+        if self.get_inner_iteration is not None:
+            key = (self.get_inner_iteration(), name)
+            self.inner[key] = self.inner.get(key, 0.0) + elapsed
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        """
+        Return (totals, inner, counters) recorded since the previous reset
+        and start recording anew. The totals map region names to a list of
+        the wall time and the number of calls, inner maps (inner iteration,
+        region name) to wall time and counters map names to values
+        """
+        ret = self.totals, self.inner, self.counters
+        self.totals = {}
+        self.inner = {}
+        self.counters = {}
+        return ret
+
+
 def log_timings(simulation, clear=False):
     """
     Print the FEniCS + Ocellaris timings to the log
@@ -1,7 +1,7 @@
 import numpy
 import dolfin
 from ufl import as_vector, Form
-from ufl.classes import FixedIndex, Indexed, ListTensor, MultiIndex, Zero
+from ufl.classes import FixedIndex, Indexed, ListTensor, MultiIndex, Zero, Sum
 from ufl.algorithms import (
     expand_indices,
     expand_compounds,
@@ -9,6 +9,7 @@ from ufl.algorithms import (
     compute_form_lhs,
     compute_form_rhs,
 )
+from ufl.algorithms.analysis import extract_coefficients
 from ufl.corealg.multifunction import MultiFunction
 from ufl.corealg.map_dag import map_expr_dag
 
@@ -59,6 +60,44 @@ def split_form_into_matrix(full_form, Wv, Wu, empty_cell_value=None, check_zeros
     return form_matrix, form_vector
 
 
+def split_form_by_coefficients(form, classify):
+    """
+    Split a form into parts based on the coefficients used in each term.
+    The integrands are split into the terms of the top level sums, and the
+    function classify(coefficients) is called with the coefficients of each
+    term. It must return a key, and all terms with equal keys are collected
+    in one form. The sum of the returned forms equals the input form
+
+    Returns a list of (key, form, coefficients) tuples in the order the
+    keys are first encountered, which is the same on all processes
+    """
+    parts = {}
+    for integral in form.integrals():
+        for term in get_sum_terms(integral.integrand()):
+            coefficients = extract_coefficients(term)
+            key = classify(coefficients)
+            integrals, coeffs = parts.setdefault(key, ([], []))
+            integrals.append(integral.reconstruct(term))
+            coeffs.extend(c for c in coefficients if c not in coeffs)
+
+    return [(key, Form(integrals), coeffs) for key, (integrals, coeffs) in parts.items()]
+
+
+def get_sum_terms(expr):
+    """
+    Return the terms of the top level sums in the given UFL expression
+    """
+    terms = []
+    to_visit = [expr]
+    while to_visit:
+        e = to_visit.pop()
+        if isinstance(e, Sum):
+            to_visit.extend(reversed(e.ufl_operands))
+        else:
+            terms.append(e)
+    return terms
+
+
 def is_zero_ufl_expression(expr, return_val=False):
     """
     Is the given expression always identically zero or not
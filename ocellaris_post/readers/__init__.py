@@ -1,2 +1,3 @@
 from .iso_surfaces import read_surfaces
 from .point_probes import read_point_probes
+from .profile import read_profile
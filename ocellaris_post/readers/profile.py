@@ -0,0 +1,81 @@
+import os
+import numpy
+
+
+def read_profile(res):
+    """
+    Read the profiling data written by Ocellaris when output/profile is on
+    """
+    res.profile = None
+    inp = res.input.get('output', {})
+    if not inp.get('profile', False):
+        return
+
+    prefix = res.get_file_path('', check=False)
+    file_name = inp.get('profile_file_name', None)
+    if file_name is None:
+        file_name = prefix + '_profile.npz'
+    else:
+        file_name = prefix + file_name
+
+    if not os.path.isfile(file_name):
+        res.warnings.append('Profile file not found: %s' % file_name)
+        return
+
+    res.profile = Profile(file_name)
+
+
+class Profile(object):
+    def __init__(self, file_name):
+        """
+        Timings for each time step, see ocellaris.simulation.profiling
+        """
+        self.file_name = file_name
+        self.reload()
+
+    def reload(self):
+        with numpy.load(self.file_name) as data:
+            self.data = {key: data[key] for key in data.files}
+        self.num_ranks = int(self.data['num_ranks'])
+        self.time = self.data['time']
+        self.region_names = list(self.data['region_names'])
+        self.counter_names = list(self.data['counter_names'])
+
+    def get_region(self, name, stat='max'):
+        """
+        Return the time spent in the given region in each time step. The
+        statistic over the processes is 'min', 'mean' or 'max'
+        """
+        col = self.region_names.index(name)
+        return self.data['wall_%s' % stat][:, col]
+
+    def get_counter(self, name, stat='max'):
+        col = self.counter_names.index(name)
+        return self.data['counter_%s' % stat][:, col]
+
+    def get_inner_iterations(self, name, stat='max'):
+        """
+        Return the time step numbers, the inner iteration numbers and the
+        time spent in the given region for each inner iteration
+        """
+        col = self.region_names.index(name)
+        sieve = self.data['inner_region'] == col
+        return (
+            self.data['inner_timestep'][sieve],
+            self.data['inner_iteration'][sieve],
+            self.data['inner_wall_%s' % stat][sieve],
+        )
+
+    def get_reports(self):
+        """
+        Return a dictionary of time step reports
+        """
+        reps = {}
+        for name in self.region_names:
+            reps['Profile:%s:mean' % name] = self.get_region(name, 'mean')
+            reps['Profile:%s:max' % name] = self.get_region(name, 'max')
+        for name in self.counter_names:
+            reps['Profile:%s' % name] = self.get_counter(name, 'mean')
+        reps['Profile:RSS:mean'] = self.data['rss_mean']
+        reps['Profile:RSS:max'] = self.data['rss_max']
+        return reps
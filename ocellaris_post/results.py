@@ -4,7 +4,7 @@ import numpy
 import yaml
 from io import StringIO
 from .files import get_result_file_type
-from .readers import read_surfaces, read_point_probes
+from .readers import read_surfaces, read_point_probes, read_profile
 
 
 if sys.version[0] != '2':
@@ -38,6 +38,7 @@ class Results(object):
         self.reports_x = None
         self.surfaces = None
         self.point_probes = None
+        self.profile = None
         self.input = None
         self.warnings = []
 
@@ -113,6 +114,12 @@ class Results(object):
             for probe in self.point_probes.values():
                 probe.reload()
 
+        # Read profiling data
+        if self.profile is None:
+            read_profile(self)
+        else:
+            self.profile.reload()
+
         # Include point probe values among the time step reports
         if include_auxiliary_reports:
             for probe in self.point_probes.values():
@@ -123,6 +130,12 @@ class Results(object):
                     self.reports_x[rep_name] = tarr
                     self.reports[rep_name] = parr
 
+            # Include the profiling data among the time step reports
+            if self.profile is not None:
+                for rep_name, values in self.profile.get_reports().items():
+                    self.reports_x[rep_name] = self.profile.time
+                    self.reports[rep_name] = values
+
     def get_file_path(self, name, check=True):
         """
         Try to get the path of an output file based on
@@ -189,18 +202,26 @@ def read_h5_data(results):
 
     # Read reports
     reps = {}
-    N = 1e100
     for rep_name in hdf['/reports']:
-        arr = numpy.array(hdf['/reports'][rep_name])
-        reps[rep_name] = arr
-        N = min(N, len(arr))
+        reps[rep_name] = numpy.array(hdf['/reports'][rep_name], dtype=float)
 
-    # Ensure equal length arrays
+    # Ensure equal length arrays. Reports that were not computed in the
+    # last time steps may be shorter in older files
+    N = max([len(arr) for arr in reps.values()] + [0])
     for key in list(reps.keys()):
-        reps[key] = reps[key][:N]
+        reps[key] = pad_with_nan(reps[key], N)
 
     # Read log
-    if string_datasets:
+    meta = hdf['/ocellaris']
+    if 'run_file' in meta.attrs:
+        # Restart file format 3, the log is stored in the run file
+        run_file = meta.attrs['run_file']
+        if isinstance(run_file, bytes):
+            run_file = run_file.decode('utf8')
+        run_file = os.path.join(os.path.dirname(os.path.abspath(results.file_name)), run_file)
+        with h5py.File(run_file, 'r') as run:
+            log = run['log'][: meta.attrs['log_length']].tobytes().decode('utf8')
+    elif string_datasets:
         log = hdf['/ocellaris/full_log'].value
     else:
         log = []
@@ -225,6 +246,7 @@ def read_log_data(results):
     INP_END = '------------------------------ configuration end -'
     in_input_section = False
     data = {}
+    num_lines = 0
 
     # Read input and timestep reports from log file
     with open(results.file_name, 'rt') as f:
@@ -237,15 +259,19 @@ def read_log_data(results):
             elif in_input_section:
                 input_strs.append(line)
             elif line.startswith('Reports for timestep'):
+                # Reports that are not on a line get the value NaN
                 parts = line[12:].split(',')
                 for pair in parts:
                     try:
                         key, value = pair.split('=')
                         key = key.strip()
                         value = float(value)
-                        data.setdefault(key, []).append(value)
                     except Exception:
                         break
+                    values = data.setdefault(key, [])
+                    values.extend([numpy.nan] * (num_lines - len(values)))
+                    values.append(value)
+                num_lines += 1
         f.seek(0)
         log = f.read()
     if data:
@@ -258,24 +284,27 @@ def read_log_data(results):
     else:
         results.input = {}
 
+    # Ensure equal length arrays in case of partially written
+    # time steps on the log file
     reps = {}
-    N = 1e100
     for key, values in data.items():
-        arr = numpy.array(values)
         if key == 'time':
             key = 'timesteps'
-        reps[key] = arr
-        N = min(N, len(arr))
-
-    # Ensure equal length arrays in case of partially written
-    # time steps on the log file
-    for key in list(reps.keys()):
-        reps[key] = reps[key][:N]
+        reps[key] = pad_with_nan(numpy.array(values, dtype=float), num_lines)
 
     results.reports = reps
     results.log = log
 
 
+def pad_with_nan(arr, N):
+    """
+    Return the array extended with NaN values to length N
+    """
+    if len(arr) >= N:
+        return arr
+    return numpy.concatenate([arr, numpy.full(N - len(arr), numpy.nan)])
+
+
 def read_iteration_reports(results):
     """
     Read less inportant reports that are on the log file, but not
@@ -124,6 +124,7 @@ setup(
             'ocellaris=ocellaris.__main__:run_from_console',
             'ocellaris_inspector=ocellaris_post.inspector.__main__:main',
             'ocellaris_logstats=ocellaris_post.logstats:main',
+            'ocellaris_compile_cpp=ocellaris.cpp.__main__:main',
         ]
     },
     # Configure the "test" command
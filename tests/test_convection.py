@@ -1,3 +1,6 @@
+from types import SimpleNamespace
+import numpy
+import dolfin
 from dolfin import (
     UnitSquareMesh,
     UnitCubeMesh,
@@ -59,6 +62,70 @@ def mk_vel(sim, Vname, Vorder, cpp_exprs):
     return as_vector(vel)
 
 
+def project_dgt0_krylov(vel):
+    """
+    Reference DGT0 projection with a mass matrix and a CG solver for each
+    velocity component
+    """
+    V_dgt0 = FunctionSpace(vel[0].function_space().mesh(), 'DGT', 0)
+    u = dolfin.TrialFunction(V_dgt0)
+    v = dolfin.TestFunction(V_dgt0)
+
+    dot, avg, dS, ds = dolfin.dot, dolfin.avg, dolfin.dS, dolfin.ds
+    A = dolfin.assemble(dot(avg(u), avg(v)) * dS + dot(u, v) * ds)
+    solver = dolfin.PETScKrylovSolver('cg')
+    solver.parameters['relative_tolerance'] = 1e-14
+    solver.parameters['absolute_tolerance'] = 1e-15
+
+    res = []
+    for w in vel:
+        b = dolfin.assemble(avg(w) * avg(v) * dS + w * v * ds)
+        u_dgt0 = Function(V_dgt0)
+        solver.solve(A, u_dgt0.vector(), b)
+        res.append(u_dgt0)
+    return res
+
+
+@pytest.mark.parametrize("dim", [2, 3])
+def test_velocity_dgt0_projector(dim):
+    N = 4
+    if dim == 2:
+        mesh = UnitSquareMesh(MPI.comm_world, N, N)
+    else:
+        mesh = UnitCubeMesh(MPI.comm_world, N, N, N)
+    sim = Simulation()
+    sim.set_mesh(mesh)
+
+    # A velocity which is discontinuous between the cells
+    exprs = ['1 + x[0]*x[1]', 'sin(x[0]) - x[1]*x[1]', 'x[2]*x[0] - 0.5'][:dim]
+    vel = mk_vel(sim, 'DG', 2, exprs)
+    numpy.random.seed(42)
+    for d in range(dim):
+        vec = vel[d].vector()
+        vec.set_local(vec.get_local() + 0.1 * numpy.random.rand(vec.local_size()))
+        vec.apply('insert')
+
+    proj = VelocityDGT0Projector(sim, vel)
+    assert sim.data['u_conv_dgt0'] is proj.velocity
+
+    def check():
+        proj.update()
+        expected = project_dgt0_krylov(vel)
+        for d in range(dim):
+            diff = proj.velocity[d].vector().copy()
+            diff.axpy(-1, expected[d].vector())
+            assert expected[d].vector().norm('l2') > 1
+            assert diff.norm('linf') < 1e-10
+
+    check()
+
+    # The facet measures are updated when the mesh moves
+    coords = mesh.coordinates()
+    coords[:] += 0.04 * numpy.sin(5 * coords[:, ::-1])
+    sim.mesh_morpher = SimpleNamespace(active=True)
+    check()
+
+
 def mk_blending_factor(convection_inp, dim=2, comm=None):
     """
     Create convected function and convection scheme
@@ -0,0 +1,133 @@
+from types import SimpleNamespace
+import numpy
+import dolfin
+from dolfin import dot, div, grad, inner, dx
+from ocellaris import Simulation
+from ocellaris.utils import OcellarisError, linear_solver_from_input
+from ocellaris.solver_parts.fieldsplit import (
+    FIELDSPLIT_PRESETS,
+    get_fieldsplit_parameters,
+    setup_coupled_fieldsplit,
+)
+from helpers import skip_in_parallel
+import pytest
+
+
+DEFAULTS = {'use_ksp': True, 'petsc_ksp_type': 'gmres', 'petsc_pc_type': 'lu'}
+
+
+def mk_fieldsplit(preset, schur_sign=1.0, mu=2.0):
+    """
+    A Stokes type system on a mixed DG2 velocity, DG1 pressure space with
+    the same sign convention as the coupled solvers. The velocity block has
+    no facet terms, so it is exactly block diagonal
+    """
+    mesh = dolfin.UnitSquareMesh(dolfin.MPI.comm_world, 3, 3)
+    eu = dolfin.FiniteElement('DG', mesh.ufl_cell(), 2)
+    ep = dolfin.FiniteElement('DG', mesh.ufl_cell(), 1)
+    V = dolfin.FunctionSpace(mesh, dolfin.MixedElement([eu, eu, ep]))
+    u0, u1, p = dolfin.TrialFunctions(V)
+    v0, v1, q = dolfin.TestFunctions(V)
+    u = dolfin.as_vector([u0, u1])
+    v = dolfin.as_vector([v0, v1])
+    a = (dot(u, v) + inner(grad(u), grad(v)) - p * div(v) + q * div(u) + 0.1 * p * q) * dx
+    A = dolfin.as_backend_type(dolfin.assemble(a))
+
+    sim = Simulation()
+    sim.input.set_value('solver/coupled/fieldsplit_preset', preset)
+    sim.multi_phase_model = SimpleNamespace(
+        get_laminar_dynamic_viscosity=lambda k: dolfin.Constant(mu)
+    )
+    params = get_fieldsplit_parameters(sim, 'solver/coupled', DEFAULTS)
+    solver = linear_solver_from_input(sim, 'solver/coupled', default_parameters=params)
+    fs = setup_coupled_fieldsplit(sim, solver, 'solver/coupled', V, 2, schur_sign)
+    return fs, V, A
+
+
+def mat_to_dense(mat):
+    m, n = mat.getSize()
+    return mat.getValues(range(m), range(n))
+
+
+def test_fieldsplit_parameters():
+    sim = Simulation()
+    assert get_fieldsplit_parameters(sim, 'solver/coupled', DEFAULTS) is DEFAULTS
+
+    # The preset is added to the defaults without changing them
+    sim.input.set_value('solver/coupled/fieldsplit_preset', 'schur_pressure_mass')
+    defaults = dict(DEFAULTS, petsc_ksp_rtol=1e-8)
+    params = get_fieldsplit_parameters(sim, 'solver/coupled', defaults)
+    assert params == dict(defaults, **FIELDSPLIT_PRESETS['schur_pressure_mass'])
+    assert params['petsc_pc_type'] == 'fieldsplit'
+    assert params['petsc_ksp_rtol'] == 1e-8
+    assert defaults['petsc_pc_type'] == 'lu'
+
+    sim.input.set_value('solver/coupled/fieldsplit_preset', 'schur_does_not_exist')
+    with pytest.raises(OcellarisError):
+        get_fieldsplit_parameters(sim, 'solver/coupled', DEFAULTS)
+
+
+def test_fieldsplit_index_sets():
+    fs, V, _A = mk_fieldsplit('schur_selfp')
+    assert fs.schur_preconditioner == 'petsc'
+    start, end = V.dofmap().ownership_range()
+    is_u, is_p = fs.is_u.getIndices(), fs.is_p.getIndices()
+
+    # The blocks are sorted and partition the owned dofs of the mixed space
+    assert numpy.all(numpy.diff(is_u) > 0) and numpy.all(numpy.diff(is_p) > 0)
+    assert len(is_u) + len(is_p) == end - start
+    assert numpy.array_equal(numpy.union1d(is_u, is_p), numpy.arange(start, end))
+
+    # The blocks match the dofmaps of the subspaces
+    u_dofs = numpy.concatenate([V.sub(i).dofmap().dofs() for i in range(2)])
+    assert numpy.array_equal(is_u, numpy.sort(u_dofs))
+    assert numpy.array_equal(is_p, numpy.sort(V.sub(2).dofmap().dofs()))
+    assert numpy.array_equal(fs.u_dofs_local, is_u - start)
+
+
+@pytest.mark.parametrize("schur_sign", [1.0, -1.0])
+def test_fieldsplit_pressure_mass(schur_sign):
+    mu = 2.0
+    fs, V, A = mk_fieldsplit('schur_pressure_mass', schur_sign, mu)
+    fs.update(A)
+    S = fs.schur_matrix
+
+    # Compare with the mass matrix assembled on the mixed function space
+    p, q = dolfin.TrialFunctions(V)[2], dolfin.TestFunctions(V)[2]
+    M = dolfin.as_backend_type(dolfin.assemble(1 / mu * p * q * dx))
+    M = M.mat().createSubMatrix(fs.is_p, fs.is_p)
+    assert S.getSizes() == M.getSizes()
+
+    x = S.createVecRight()
+    start, end = x.getOwnershipRange()
+    x.setArray(numpy.arange(start, end, dtype=float) % 5 + 1.0)
+    y1, y2 = S.createVecLeft(), M.createVecLeft()
+    S.mult(x, y1)
+    M.mult(x, y2)
+    assert y2.norm() > 0
+    y2.scale(schur_sign)
+    y1.axpy(-1.0, y2)
+    assert y1.norm() < 1e-12 * y2.norm()
+
+    # The sub matrix is reused when the preconditioner is rebuilt
+    fs.update(A)
+    assert fs.schur_matrix is S
+
+
+@skip_in_parallel
+def test_fieldsplit_block_diagonal():
+    fs, V, A = mk_fieldsplit('schur_block_diagonal')
+    fs.update(A)
+    S = mat_to_dense(fs.schur_matrix)
+
+    # The velocity block has no facet terms, so Ã is exactly A00
+    mat = A.mat()
+    A00 = mat_to_dense(mat.createSubMatrix(fs.is_u, fs.is_u))
+    A01 = mat_to_dense(mat.createSubMatrix(fs.is_u, fs.is_p))
+    A10 = mat_to_dense(mat.createSubMatrix(fs.is_p, fs.is_u))
+    A11 = mat_to_dense(mat.createSubMatrix(fs.is_p, fs.is_p))
+    expected = A11 - A10.dot(numpy.linalg.solve(A00, A01))
+    assert abs(S - expected).max() < 1e-10 * abs(expected).max()
+
+    # The Schur complement is positive definite with this sign convention
+    assert numpy.linalg.eigvalsh((S + S.T) / 2).min() > 0
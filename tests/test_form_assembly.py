@@ -0,0 +1,72 @@
+import dolfin
+from dolfin import Constant, dot, grad, dx
+from ocellaris import Simulation
+from ocellaris.utils import SplitFormAssembler
+import pytest
+
+
+def mk_assembler(with_function, split=True):
+    """
+    A split form assembler for a bilinear form with a constant part, a
+    time step part and optionally a part with a Function coefficient
+    """
+    mesh = dolfin.UnitSquareMesh(dolfin.MPI.comm_world, 4, 4)
+    V = dolfin.FunctionSpace(mesh, 'DG', 1)
+    u, v = dolfin.TrialFunction(V), dolfin.TestFunction(V)
+    dt, c = Constant(0.1), Constant(2.0)
+    a = c * u * v * dx + u / dt * v * dx + dot(grad(u), grad(v)) * dx
+    if with_function:
+        w = dolfin.Function(dolfin.VectorFunctionSpace(mesh, 'DG', 1))
+        w.vector()[:] = 1.0
+        a += dot(w, grad(u)) * v * dx
+
+    sim = Simulation()
+    sim.input.set_value('solver/split_lhs_assembly', split)
+    sim.data['dt'] = dt
+    return SplitFormAssembler(sim, a), a, dt, c
+
+
+def assert_same_matrix(A, form):
+    expected = dolfin.assemble(form).array()
+    assert abs(A.array() - expected).max() < 1e-12 * abs(expected).max()
+
+
+@pytest.mark.parametrize("with_function", [False, True])
+def test_split_form_assembler_changes(with_function):
+    assembler, a, dt, c = mk_assembler(with_function)
+    assert [part.name for part in assembler.parts] == (
+        ['constant', 'dt', 'functions'] if with_function else ['constant', 'dt']
+    )
+
+    A = assembler.assemble()
+    assert assembler.changed
+    assert_same_matrix(A, a)
+
+    # Unchanged coefficients, only the functions part is re-assembled
+    A.zero()  # as if modified by boundary conditions
+    assert assembler.assemble() is A
+    assert assembler.changed == with_function
+    assert_same_matrix(A, a)
+
+    # A changed Constant gives a changed matrix
+    for coefficient, value in [(c, 3.0), (dt, 0.05)]:
+        coefficient.assign(Constant(value))
+        assert assembler.assemble() is A
+        assert assembler.changed
+        assert_same_matrix(A, a)
+
+        assembler.assemble()
+        assert assembler.changed == with_function
+
+
+def test_split_form_assembler_disabled():
+    assembler, a, _dt, c = mk_assembler(False, split=False)
+    assert assembler.parts is None
+    A = assembler.assemble()
+    assert_same_matrix(A, a)
+
+    # The full form is assembled every time
+    c.assign(Constant(5.0))
+    assert assembler.assemble() is A
+    assert assembler.changed
+    assert_same_matrix(A, a)
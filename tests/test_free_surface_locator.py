@@ -0,0 +1,102 @@
+import numpy
+import dolfin
+from ocellaris import Simulation
+from ocellaris.utils import get_local
+from ocellaris.probes.free_surface_locator.vof_dg0_surface_locator import (
+    FreeSurfaceLocatorImplDG0,
+)
+import pytest
+
+
+def mk_dg0_field(dim):
+    """
+    A DG0 field which is 0 or 1 on both sides of x = 0.5 for y < 0.5, so
+    the crossings there are exactly half way between the cell midpoints
+    (fac == 0.5), and a smooth field for y > 0.5
+    """
+    if dim == 2:
+        mesh = dolfin.UnitSquareMesh(dolfin.MPI.comm_world, 6, 6)
+    else:
+        mesh = dolfin.UnitCubeMesh(dolfin.MPI.comm_world, 3, 3, 3)
+    sim = Simulation()
+    sim.set_mesh(mesh)
+
+    V = dolfin.FunctionSpace(mesh, 'DG', 0)
+    c = dolfin.Function(V)
+    dm = V.dofmap()
+    values = c.vector().get_local()
+    for cell in dolfin.cells(mesh, 'all'):
+        mp = cell.midpoint()
+        dofs = dm.cell_dofs(cell.index())
+        if dofs[0] >= len(values):
+            continue
+        if mp.y() < 0.5:
+            values[dofs[0]] = 1.0 if mp.x() > 0.5 else 0.0
+        else:
+            values[dofs[0]] = 0.9 * mp.x() + 0.3 * mp.y()
+    c.vector().set_local(values)
+    c.vector().apply('insert')
+    c.vector().update_ghost_values()
+    return sim, c
+
+
+def old_crossing_points(sim, field, value, ghost_cells):
+    """
+    The cell by cell implementation that returned the crossings as a dict
+    """
+    mesh = sim.data['mesh']
+    conFC = sim.data['connectivity_FC']
+    dofmap = field.function_space().dofmap()
+    all_values = get_local(field)
+    crossing_points = {}
+    for facet in dolfin.facets(mesh, 'all'):
+        cell_ids = conFC(facet.index())
+        if len(cell_ids) != 2:
+            continue
+        cells = [dolfin.Cell(mesh, cid) for cid in cell_ids]
+        coords0, coords1 = [cell.midpoint().array() for cell in cells]
+        v0, v1 = [all_values[dofmap.cell_dofs(cid)[0]] for cid in cell_ids]
+        if (v0 < value) == (v1 < value):
+            continue
+
+        uvec = coords0 - coords1
+        uvec /= (uvec ** 2).sum() ** 0.5
+        fac = (v0 - value) / (v0 - v1)
+        crossing_point = tuple((1 - fac) * coords0 + fac * coords1)
+        direction = uvec * (v0 - v1)
+
+        i = 0 if fac <= 0.5 else 1
+        if not cells[i].is_ghost() and int(cell_ids[i]) not in ghost_cells:
+            crossing_points.setdefault(int(cell_ids[i]), []).append((crossing_point, direction))
+    return crossing_points
+
+
+@pytest.mark.parametrize("dim", [2, 3])
+def test_dg0_crossings_vs_old(dim):
+    sim, c = mk_dg0_field(dim)
+    locator = FreeSurfaceLocatorImplDG0(sim, c, 0.5)
+    facet_cells, _facet_dofs, is_ghost = locator.cache[:3]
+
+    # Mark the cell containing one of the fac == 0.5 crossings as ghost owned,
+    # the crossing points in real ghost cells are only found in parallel runs
+    ghost_cells = set()
+    crossings = locator.compute_crossing_points()
+    half_way = numpy.where(crossings.points[:, 1] < 0.5)[0]
+    if len(half_way):
+        cid = crossings.cells[half_way[0]]
+        ghost_cells.add(int(cid))
+        is_ghost[facet_cells == cid] = True
+
+    new = locator.compute_crossing_points().to_dict()
+    old = old_crossing_points(sim, c, 0.5, ghost_cells)
+    assert sorted(new) == sorted(old)
+    assert not ghost_cells & set(new)
+    for cid, old_values in old.items():
+        assert len(new[cid]) == len(old_values)
+        for (pt1, d1), (pt2, d2) in zip(new[cid], old_values):
+            assert numpy.allclose(pt1, pt2, rtol=0, atol=1e-14)
+            assert numpy.allclose(d1, d2, rtol=0, atol=1e-14)
+
+    # There must be crossings half way between the cells
+    num_half_way = dolfin.MPI.sum(dolfin.MPI.comm_world, float(len(half_way)))
+    assert num_half_way > 0
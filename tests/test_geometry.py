@@ -0,0 +1,88 @@
+import numpy
+import dolfin
+from ocellaris import Simulation
+from ocellaris.utils.geometry import CellGeometry, FacetGeometry
+import pytest
+
+
+def mk_mesh(dim):
+    """
+    A small mesh where the vertices are moved so that the cells have
+    different shapes and sizes
+    """
+    if dim == 2:
+        mesh = dolfin.UnitSquareMesh(dolfin.MPI.comm_world, 4, 3)
+    else:
+        mesh = dolfin.UnitCubeMesh(dolfin.MPI.comm_world, 2, 3, 2)
+    coords = mesh.coordinates()
+    coords[:] += 0.05 * numpy.sin(7 * coords[:, ::-1] + numpy.arange(dim))
+    return mesh
+
+
+@pytest.mark.parametrize("dim", [2, 3])
+def test_cell_geometry(dim):
+    mesh = mk_mesh(dim)
+    sim = Simulation()
+    sim.set_mesh(mesh)
+    cell_info = sim.data['cell_info']
+    assert isinstance(cell_info, CellGeometry)
+    assert len(cell_info) == mesh.num_cells()
+    assert cell_info.midpoints.shape == (mesh.num_cells(), dim)
+
+    for cell in dolfin.cells(mesh, 'all'):
+        cidx = cell.index()
+        midpoint = cell.midpoint().array()[:dim]
+        assert abs(cell_info.volumes[cidx] - cell.volume()) < 1e-14
+        assert numpy.allclose(cell_info.midpoints[cidx], midpoint, rtol=0, atol=1e-14)
+
+        # The old tuple interface gives the same values
+        info = cell_info[cidx]
+        assert info.volume == cell_info.volumes[cidx]
+        assert numpy.all(info.midpoint == cell_info.midpoints[cidx])
+
+
+@pytest.mark.parametrize("dim", [2, 3])
+def test_facet_geometry(dim):
+    mesh = mk_mesh(dim)
+    sim = Simulation()
+    sim.set_mesh(mesh)
+    conFC = sim.data['connectivity_FC']
+    cell_info = sim.data['cell_info']
+    facet_info = sim.data['facet_info']
+    assert isinstance(facet_info, FacetGeometry)
+    assert len(facet_info) == mesh.num_facets()
+
+    # Facet areas as seen from the cells
+    areas = numpy.zeros(mesh.num_facets(), float)
+    for cell in dolfin.cells(mesh, 'all'):
+        for i, fidx in enumerate(cell.entities(dim - 1)):
+            areas[fidx] = cell.facet_area(i)
+
+    num_boundary = 0
+    for facet in dolfin.facets(mesh, 'all'):
+        fidx = facet.index()
+        midpoint = facet.midpoint().array()[:dim]
+        assert abs(facet_info.areas[fidx] - areas[fidx]) < 1e-14
+        assert numpy.allclose(facet_info.midpoints[fidx], midpoint, rtol=0, atol=1e-14)
+
+        # The connected cells are the same, the normal points out of the first
+        connected_cells = facet.entities(dim)
+        assert list(conFC(fidx)) == list(connected_cells)
+        on_boundary = len(connected_cells) == 1
+        assert facet_info.on_boundary[fidx] == on_boundary
+        num_boundary += on_boundary
+
+        normal = facet.normal().array()[:dim]
+        if numpy.dot(midpoint - cell_info.midpoints[connected_cells[0]], normal) < 0:
+            normal *= -1
+        assert numpy.allclose(facet_info.normals[fidx], normal, rtol=0, atol=1e-14)
+
+        # The old tuple interface gives the same values
+        info = facet_info[fidx]
+        assert info.area == facet_info.areas[fidx]
+        assert numpy.all(info.normal == facet_info.normals[fidx])
+        assert info.on_boundary is on_boundary
+
+    # Make sure the boundary facets were tested
+    num_boundary = dolfin.MPI.sum(mesh.mpi_comm(), float(num_boundary))
+    assert num_boundary > 0
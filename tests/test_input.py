@@ -57,3 +57,51 @@ def test_ensure_path():
     c = sim.input.ensure_path('does_not_exist/c')
     assert len(c) == 0
     assert len(sim.input.get_value('does_not_exist')) == 1
+
+
+def test_accessor():
+    fn = get_test_file_name('base.inp')
+    sim = Simulation()
+    sim.input.read_yaml(fn)
+
+    acc = sim.input.get_accessor('some_vals/computed', required_type='float')
+    assert acc.get() == 2.0
+    assert acc.volatile is False
+
+    # Changing the input must invalidate the cached value
+    sim.input.set_value('user_code/constants/A', 3)
+    assert acc.get() == 3.0
+
+    # Returned lists can be modified without changing the cached value
+    acc_list = sim.input.get_accessor('some_vals/floats', required_type='list(float)')
+    vals = acc_list.get()
+    vals.append(42)
+    assert tuple(acc_list.get()) == (1.1, 2, 3.0e3)
+
+    # Missing values give the default value
+    acc_missing = sim.input.get_accessor('some_vals/missing', 4, 'int')
+    assert acc_missing.get() == 4
+    sim.input.set_value('some_vals/missing', 5)
+    assert acc_missing.get() == 5
+
+
+def test_accessor_volatile():
+    fn = get_test_file_name('base.inp')
+    sim = Simulation()
+    sim.input.read_yaml(fn)
+
+    sim.input.set_value('some_vals/time_dependent', 'py$ 2 * t')
+    acc = sim.input.get_accessor('some_vals/time_dependent', required_type='float')
+    sim.time = 1.0
+    assert acc.get() == 2.0
+    assert acc.volatile is True
+    sim.time = 2.0
+    assert acc.get() == 4.0
+
+    # Explicitly marking the value as not volatile gives a cached value
+    acc2 = sim.input.get_accessor(
+        'some_vals/time_dependent', required_type='float', volatile=False
+    )
+    assert acc2.get() == 4.0
+    sim.time = 3.0
+    assert acc2.get() == 4.0
@@ -4,6 +4,7 @@ Test restart file handling and general IO
 import numpy
 import os
 from ocellaris import Simulation, setup_simulation
+from ocellaris.utils import OcellarisError
 from poisson_solver import BASE_INPUT as BASE_INPUT_PHI
 from helpers import mpi_tmpdir
 import pytest
@@ -98,6 +99,158 @@ def test_restart_file_io(tmpdir_factory):
         assert sim.data['mesh'].hash() == sim2.data['mesh'].hash()
 
 
+def setup_phi_simulation(prefix):
+    sim = Simulation()
+    sim.input.read_yaml(yaml_string=BASE_INPUT_PHI)
+    sim.input.set_value('output/prefix', prefix)
+    sim.input.set_value('time/tstart', 42.0)
+    sim.input.set_value('time/dt', 1.0)
+    setup_simulation(sim)
+
+    # Fill in the phi function
+    phi = sim.data['phi']
+    phi_arr = phi.vector().get_local()
+    phi_arr[:] = numpy.random.rand(*phi_arr.shape)
+    phi.vector().set_local(phi_arr)
+    phi.vector().apply('insert')
+    return sim
+
+
+def check_restart_file_results(file_name, expected):
+    """
+    Load the results in the given restart file into a new simulation and
+    compare the phi function with the expected dolfin vector
+    """
+    sim2 = Simulation()
+    sim2.io.load_restart_file_input(file_name)
+    setup_simulation(sim2)
+    sim2.io.load_restart_file_results(file_name)
+
+    phi2 = sim2.data['phi']
+    if sim2.data['mesh'].mpi_comm().size == 1:
+        assert all(expected.get_local() == phi2.vector().get_local())
+    else:
+        # The dof numbering depends on the partitioning
+        assert abs(expected.sum() - phi2.vector().sum()) < 1e-10
+        assert abs(expected.norm('l2') - phi2.vector().norm('l2')) < 1e-10
+    return sim2
+
+
+def test_restart_file_io_async(tmpdir_factory):
+    dir_name = mpi_tmpdir(tmpdir_factory, 'test_restart_file_io_async')
+    prefix = os.path.join(dir_name, 'ocellaris')
+    sim = setup_phi_simulation(prefix)
+
+    # Save restart file in the background
+    phi = sim.data['phi']
+    expected = phi.vector().copy()
+    file_name = sim.io.restart.write(asynchronous=True)
+    assert file_name.startswith(prefix)
+
+    # The values are copied before write() returns
+    phi.vector().zero()
+    sim.io.restart.wait_for_writes()
+    assert sim.io.restart.finished_writes() == [file_name]
+    assert sim.io.restart.finished_writes() == []
+    assert os.path.isfile(file_name)
+    assert not os.path.isfile(file_name + '.partial')
+
+    sim2 = check_restart_file_results(file_name, expected)
+    assert sim2.input.get_value('time/tstart') == 42.0
+
+
+def test_restart_file_io_async_error(tmpdir_factory, monkeypatch):
+    dir_name = mpi_tmpdir(tmpdir_factory, 'test_restart_file_io_async_error')
+    prefix = os.path.join(dir_name, 'ocellaris')
+    sim = setup_phi_simulation(prefix)
+
+    # Make the background writer fail on the root process only
+    from ocellaris.simulation.io_impl import restart_h5
+
+    def write_part_files(parts):
+        if sim.rank == 0:
+            raise IOError('Disk full')
+        for part in parts:
+            part.write()
+
+    monkeypatch.setattr(restart_h5, 'write_part_files', write_part_files)
+
+    # All processes must get the error
+    file_name = sim.io.restart.write(asynchronous=True)
+    with pytest.raises(OcellarisError) as excinfo:
+        sim.io.restart.wait_for_writes()
+    assert 'Disk full' in str(excinfo.value)
+    assert not os.path.isfile(file_name)
+
+    # The failed write is not pending any more
+    assert sim.io.restart.finished_writes() == []
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_restart_file_io_format3(asynchronous, tmpdir_factory):
+    dir_name = mpi_tmpdir(tmpdir_factory, 'test_restart_file_io_format3')
+    prefix = os.path.join(dir_name, 'ocellaris')
+    sim = setup_phi_simulation(prefix)
+    sim.input.set_value('output/restart_file_format', 3)
+    phi = sim.data['phi']
+
+    def write(i):
+        file_name = '%s_savepoint_%d.h5' % (prefix, i)
+        sim.io.restart.write(file_name, asynchronous=asynchronous)
+        sim.io.restart.wait_for_writes()
+        return file_name, phi.vector().copy()
+
+    # The second file references the unchanged phi values in the run file
+    file_name1, expected1 = write(1)
+    file_name2, expected2 = write(2)
+    phi.vector().set_local(phi.vector().get_local() * 2.0)
+    phi.vector().apply('insert')
+    file_name3, expected3 = write(3)
+    if asynchronous:
+        assert sim.io.restart.finished_writes() == [file_name1, file_name2, file_name3]
+
+    from ocellaris.simulation.io_impl import restart_h5
+    import h5py
+
+    for file_name, kind in [
+        (file_name1, restart_h5.IN_SAVEPOINT_PART),
+        (file_name2, restart_h5.IN_RUN_PART),
+        (file_name3, restart_h5.IN_SAVEPOINT_PART),
+    ]:
+        with h5py.File(file_name, 'r') as hdf:
+            assert hdf['ocellaris'].attrs['restart_file_format'] == 3
+            parts = hdf['phi/parts'][()]
+            assert all(parts[:, restart_h5.VECTOR_FILE] == kind)
+            assert all(parts[:, restart_h5.LAYOUT_FILE] == restart_h5.IN_RUN_PART)
+
+    check_restart_file_results(file_name1, expected1)
+    check_restart_file_results(file_name2, expected2)
+    check_restart_file_results(file_name3, expected3)
+
+
+def test_restart_file_format3_post_processing(tmpdir_factory):
+    dir_name = mpi_tmpdir(tmpdir_factory, 'test_restart_file_format3_post')
+    prefix = os.path.join(dir_name, 'ocellaris')
+    sim = setup_phi_simulation(prefix)
+    sim.input.set_value('output/restart_file_format', 3)
+
+    file_name = sim.io.write_restart_file()
+    full_log = sim.log.get_full_log()
+    sim.log.info('This line is not in the restart file')
+
+    # The log is read from the run file
+    from ocellaris_post.results import read_h5_data
+
+    class Results:
+        pass
+
+    res = Results()
+    res.file_name = file_name
+    read_h5_data(res)
+    assert res.log == full_log
+    assert res.input['time']['tstart'] == 42.0
+
+
 @pytest.mark.parametrize("iotype", ['vtk', 'xdmf'])
 def test_plot_io_3D(iotype, tmpdir_factory):
     dir_name = mpi_tmpdir(tmpdir_factory, 'test_plot_io_3D')
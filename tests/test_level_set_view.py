@@ -201,3 +201,24 @@ def test_level_set_view(case_name, extra_tall):
             xdmf.write(lsf)
 
     assert error < error_lim
+
+
+@pytest.mark.parametrize('use_cpp', [True, False])
+def test_level_set_view_narrow_band(use_cpp):
+    def modifier(sim):
+        sim.input.set_value('multiphase_solver/level_set_view_use_cpp', use_cpp)
+
+    # Full level set view
+    vof_sim = mk_vof_sim('DG0_2D_y', modifier)
+    lsv = vof_sim.multi_phase_model.get_level_set_view()
+    vof_sim.hooks.run_custom_hook('MultiPhaseModelUpdated')
+    arr_full = lsv.level_set_function.vector().get_local()
+
+    # Level set view restricted to a narrow band around the free surface
+    lsv.band_width = 0.3
+    vof_sim.hooks.run_custom_hook('MultiPhaseModelUpdated')
+    arr_band = lsv.level_set_function.vector().get_local()
+
+    inside = arr_full <= 0.3
+    assert numpy.allclose(arr_band[inside], arr_full[inside])
+    assert numpy.all(arr_band[~inside] == 0.3)
@@ -1,6 +1,13 @@
 import numpy
 import dolfin
-from ocellaris.utils import gather_lines_on_root, sync_arrays, get_local, set_local
+from ocellaris.utils import (
+    gather_lines_on_root,
+    sync_arrays,
+    get_local,
+    set_local,
+    local_vector_view,
+    global_max_and_sum,
+)
 
 
 def test_gather_points_on_root():
@@ -102,3 +109,50 @@ def test_get_set_local_with_ghosts():
     print(rank, start, end, global_ghost_dofs)
     print(rank, numpy.array(arr2, dtype=numpy.intc), '\n ', dofs, diff)
     assert diff == 0
+
+
+def test_local_vector_view():
+    dolfin.parameters['ghost_mode'] = 'shared_vertex'
+    mesh = dolfin.UnitSquareMesh(dolfin.MPI.comm_world, 4, 4)
+    V = dolfin.FunctionSpace(mesh, 'DG', 0)
+    u = dolfin.Function(V)
+    im = V.dofmap().index_map()
+    Nown = im.size(im.MapSize.OWNED)
+
+    # Write global dof number into the owned dofs through the view
+    start, end = u.vector().local_range()
+    with local_vector_view(u, writable=True) as arr:
+        assert arr.shape == (im.size(im.MapSize.ALL),)
+        arr[:Nown] = numpy.arange(start, end)
+
+    # The ghost values should have been updated
+    expected = numpy.concatenate([numpy.arange(start, end), im.local_to_global_unowned()])
+    with local_vector_view(u) as arr:
+        assert abs(arr - expected).max() == 0
+    assert abs(get_local(u) - expected).max() == 0
+
+
+def test_global_max_and_sum():
+    comm = dolfin.MPI.comm_world
+    rank, size = comm.rank, comm.size
+
+    # The last rank has no cells, which gives -inf local maxima
+    maxima = [rank, -rank, 0.5]
+    if rank == size - 1 and size > 1:
+        maxima[2] = -numpy.inf
+    sums = [1.0, rank + 0.25]
+    gmax, gsum = global_max_and_sum(maxima, sums)
+    assert list(gmax) == [size - 1, 0, 0.5]
+    assert list(gsum) == [size, size * (size - 1) / 2 + 0.25 * size]
+
+    # The results must be identical on all ranks
+    all_results = comm.allgather((list(gmax), list(gsum)))
+    assert all(res == all_results[0] for res in all_results)
+
+    # Empty arrays
+    gmax, gsum = global_max_and_sum([], [])
+    assert gmax.shape == (0,) and gsum.shape == (0,)
+    gmax, gsum = global_max_and_sum([], [rank])
+    assert gmax.shape == (0,) and list(gsum) == [size * (size - 1) / 2]
+    gmax, gsum = global_max_and_sum([rank], [])
+    assert list(gmax) == [size - 1] and gsum.shape == (0,)
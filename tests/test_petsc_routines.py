@@ -1,6 +1,16 @@
 import numpy
 import dolfin
-from ocellaris.utils import matmul, create_block_matrix
+from ocellaris.utils import (
+    matmul,
+    create_block_matrix,
+    invert_block_diagonal_matrix,
+    get_owned_cell_dofs,
+    linear_solver_from_input,
+    SchurComplement,
+    ConstantNullSpace,
+)
+from ocellaris.utils.linear_solvers import BlockDiagonalProduct
+from ocellaris import Simulation
 from helpers import skip_in_parallel
 import pytest
 
@@ -53,5 +63,239 @@ def test_matmul(use_block_matrix):
     assert (abs(Carr - Cnpy) < 1e-10).all()
 
 
-if __name__ == '__main__':
-    test_matmul(False)
+def mk_dg_mass_matrix(order=2):
+    mesh = dolfin.UnitSquareMesh(4, 4)
+    V = dolfin.FunctionSpace(mesh, 'DG', order)
+    u, v = dolfin.TrialFunction(V), dolfin.TestFunction(V)
+    x = dolfin.SpatialCoordinate(mesh)
+    M = dolfin.assemble((1 + x[0] ** 2) * u * v * dolfin.dx)
+    return V, dolfin.as_backend_type(M)
+
+
+def test_owned_cell_dofs():
+    V, _ = mk_dg_mass_matrix()
+    cell_dofs = get_owned_cell_dofs(V)
+    mesh = V.mesh()
+    num_cells = mesh.topology().ghost_offset(mesh.topology().dim())
+    assert cell_dofs.shape == (num_cells, V.element().space_dimension())
+    for i in range(num_cells):
+        assert (cell_dofs[i] == V.dofmap().cell_dofs(i)).all()
+
+    # The result is cached on the function space
+    assert get_owned_cell_dofs(V) is cell_dofs
+    V2 = dolfin.FunctionSpace(mesh, 'DG', 1)
+    assert get_owned_cell_dofs(V2).shape[1] == 3
+
+
+@pytest.mark.parametrize("reuse_tensor", [False, True])
+def test_invert_block_diagonal_batched_vs_loop(reuse_tensor):
+    V, M = mk_dg_mass_matrix()
+
+    Minv_loop = invert_block_diagonal_matrix(V, M, method='loop')
+    Minv = None
+    if reuse_tensor:
+        Minv = invert_block_diagonal_matrix(V, M)
+        M *= 2.0
+        Minv_loop = invert_block_diagonal_matrix(V, M, method='loop')
+    Minv = invert_block_diagonal_matrix(V, M, Minv)
+
+    # Compare the local rows
+    a = Minv.mat().getValuesCSR()
+    b = Minv_loop.mat().getValuesCSR()
+    istart, iend = M.mat().getOwnershipRange()
+    for row in range(iend - istart):
+        cols_a = a[1][a[0][row] : a[0][row + 1]]
+        vals_a = a[2][a[0][row] : a[0][row + 1]]
+        cols_b = b[1][b[0][row] : b[0][row + 1]]
+        vals_b = b[2][b[0][row] : b[0][row + 1]]
+        dense_a = dict(zip(cols_a, vals_a))
+        dense_b = dict(zip(cols_b, vals_b))
+        for col in set(dense_a) | set(dense_b):
+            assert abs(dense_a.get(col, 0.0) - dense_b.get(col, 0.0)) < 1e-10
+
+    # The inverse times the matrix is the identity
+    x = dolfin.Function(V).vector()
+    x.set_local(numpy.arange(x.local_size(), dtype=float) + 1.0)
+    x.apply('insert')
+    y = Minv * (M * x)
+    assert abs((y - x).norm('linf')) < 1e-8
+
+
+@pytest.mark.parametrize("reuse", [None, False, True])
+def test_ksp_reuse_unchanged_operator(reuse):
+    sim = Simulation()
+    sim.input.set_value('solver/phi/use_ksp', True)
+    sim.input.set_value('solver/phi/petsc_ksp_type', 'cg')
+    sim.input.set_value('solver/phi/petsc_pc_type', 'jacobi')
+    if reuse is not None:
+        sim.input.set_value('solver/phi/reuse_unchanged_operator', reuse)
+    solver = linear_solver_from_input(sim, 'solver/phi', default_parameters={})
+
+    V, A = mk_dg_mass_matrix()
+    x = dolfin.Function(V).vector()
+    b = dolfin.as_backend_type(A * dolfin.interpolate(dolfin.Constant(1.0), V).vector())
+
+    # The last solve has an explicit operator_changed argument
+    for operator_changed in (None, None, False):
+        solver.inner_solve(A, x, b, in_iter=1, co_iter=1, operator_changed=operator_changed)
+    assert solver.statistics.num_solves == 3
+
+    # Reusing the preconditioner is opt-in and the explicit argument is only
+    # used when it is enabled
+    if reuse:
+        assert solver.statistics.num_pc_setups == 1
+    else:
+        assert solver.statistics.num_pc_setups == 3
+
+
+def mk_mixed_matrices(block_diagonal=True):
+    """
+    Matrices Ã⁻¹, B and C as in the pressure correction equations, where
+    Ã⁻¹ is the inverse of a DG mass matrix, or a CG mass matrix, which is
+    not block diagonal
+    """
+    V, M = mk_dg_mass_matrix()
+    Q = dolfin.FunctionSpace(V.mesh(), 'CG', 1)
+    u, v = dolfin.TrialFunction(V), dolfin.TestFunction(V)
+    p, q = dolfin.TrialFunction(Q), dolfin.TestFunction(Q)
+    B = dolfin.as_backend_type(dolfin.assemble(v * p.dx(0) * dolfin.dx))
+    C = dolfin.as_backend_type(dolfin.assemble(q * u * dolfin.dx))
+    if block_diagonal:
+        Ainv = invert_block_diagonal_matrix(V, M)
+    else:
+        W = dolfin.FunctionSpace(V.mesh(), 'CG', 2)
+        w, r = dolfin.TrialFunction(W), dolfin.TestFunction(W)
+        Ainv = dolfin.as_backend_type(dolfin.assemble(w * r * dolfin.dx))
+        B = dolfin.as_backend_type(dolfin.assemble(r * p.dx(0) * dolfin.dx))
+        C = dolfin.as_backend_type(dolfin.assemble(q * w * dolfin.dx))
+    return Ainv, B, C
+
+
+def mk_test_vector(B):
+    x = dolfin.PETScVector(B.mat().createVecRight())
+    x.set_local(numpy.arange(x.local_size(), dtype=float) % 7 + 1.0)
+    x.apply('insert')
+    return x
+
+
+def assert_same_vector(y1, y2):
+    assert y2.norm('l2') > 0
+    diff = y1.copy()
+    diff.axpy(-1, y2)
+    assert diff.norm('l2') < 1e-12 * y2.norm('l2')
+
+
+@pytest.mark.parametrize("block_diagonal", [True, False])
+def test_block_diagonal_product(block_diagonal):
+    Ainv, B, _ = mk_mixed_matrices(block_diagonal)
+    blk = BlockDiagonalProduct(Ainv, B)
+    assert blk.supported == block_diagonal
+    if not block_diagonal:
+        return
+
+    x = mk_test_vector(B)
+    AinvB = blk.update(Ainv, B)
+    assert_same_vector(AinvB * x, matmul(Ainv, B) * x)
+
+    # Only the values change, the same matrix is returned
+    B *= 2.0
+    assert blk.update(Ainv, B) is AinvB
+    assert_same_vector(AinvB * x, matmul(Ainv, B) * x)
+
+    # A changed sparsity pattern is detected
+    Ainv2, B2, _ = mk_mixed_matrices(False)
+    assert blk.update(Ainv2, B2) is None
+
+
+@pytest.mark.parametrize("matrix_free", [False, True])
+@pytest.mark.parametrize("method", ['block_diagonal', 'matmul'])
+@pytest.mark.parametrize("block_diagonal", [True, False])
+def test_schur_complement(block_diagonal, method, matrix_free):
+    sim = Simulation()
+    sim.input.set_value('solver/schur_complement_method', method)
+    sim.input.set_value('solver/schur_complement_matrix_free', matrix_free)
+    schur = SchurComplement(sim, 'test')
+
+    Ainv, B, C = mk_mixed_matrices(block_diagonal)
+    x = mk_test_vector(B)
+    for scale in (1.0, 2.0):
+        B *= scale
+        schur.update(C, Ainv, B)
+        Sx = matmul(C, matmul(Ainv, B)) * x
+        assert_same_vector(schur.mult(x), Sx)
+        assert_same_vector(schur.preconditioner_matrix * x, Sx)
+
+    if not block_diagonal:
+        assert schur.method == 'matmul'
+
+
+def mk_pressure(family, degree, offset=0.0):
+    mesh = dolfin.UnitSquareMesh(dolfin.MPI.comm_world, 4, 4)
+    V = dolfin.FunctionSpace(mesh, family, degree)
+    e = dolfin.Expression('A + sin(3*x[0]) + x[1]*x[1]', degree=degree + 1, A=offset)
+    return dolfin.interpolate(e, V)
+
+
+@pytest.mark.parametrize("family,degree", [('CG', 1), ('CG', 2), ('DG', 1), ('DG', 2)])
+def test_constant_null_space_mean(family, degree):
+    p = mk_pressure(family, degree)
+    null_space = ConstantNullSpace(Simulation(), p.function_space())
+    mesh = p.function_space().mesh()
+    volume = dolfin.assemble(dolfin.Constant(1.0) * dolfin.dx(domain=mesh))
+    expected = dolfin.assemble(p * dolfin.dx) / volume
+    assert abs(null_space.mean(p.vector()) - expected) < 1e-13
+
+    null_space.remove_mean(p.vector())
+    assert abs(dolfin.assemble(p * dolfin.dx)) < 1e-13
+
+
+@pytest.mark.parametrize("family", ['CG', 'DG'])
+def test_constant_null_space_remove_large_mean(family):
+    p = mk_pressure(family, 1, offset=1e10)
+    null_space = ConstantNullSpace(Simulation(), p.function_space())
+    null_space.remove_mean(p.vector(), tolerance=1e-10)
+    assert abs(null_space.mean(p.vector())) <= 1e-10
+
+    # The shape of the function is kept
+    q = mk_pressure(family, 1)
+    null_space.remove_mean(q.vector())
+    diff = p.vector().copy()
+    diff.axpy(-1, q.vector())
+    assert diff.norm('linf') < 1e-5
+
+
+def test_constant_null_space_mesh_moved():
+    sim = Simulation()
+    sim.hooks.register_custom_hook_point('MeshMoved')
+    sim.mesh_morpher = object()
+    p = mk_pressure('DG', 1)
+    null_space = ConstantNullSpace(sim, p.function_space())
+    mean1 = null_space.mean(p.vector())
+
+    # Stretch the mesh, the mean value of the dof values changes
+    mesh = p.function_space().mesh()
+    mesh.coordinates()[:, 0] *= 1 + mesh.coordinates()[:, 0]
+    sim.hooks.run_custom_hook('MeshMoved')
+
+    volume = dolfin.assemble(dolfin.Constant(1.0) * dolfin.dx(domain=mesh))
+    mean2 = null_space.mean(p.vector())
+    assert abs(mean2 - dolfin.assemble(p * dolfin.dx) / volume) < 1e-13
+    assert abs(mean2 - mean1) > 1e-3
+
+
+def test_constant_null_space_remove_nan_mean():
+    p = mk_pressure('DG', 1, offset=1e10)
+    null_space = ConstantNullSpace(Simulation(), p.function_space())
+
+    # An unreachable tolerance must not loop forever
+    null_space.remove_mean(p.vector(), tolerance=0.0)
+    assert abs(null_space.mean(p.vector())) < 1e-3
+
+    # A diverged solution is left unchanged instead of hanging
+    values = p.vector().get_local()
+    values[0] = numpy.nan
+    p.vector().set_local(values)
+    p.vector().apply('insert')
+    null_space.remove_mean(p.vector(), tolerance=1000)
+    assert numpy.isnan(null_space.mean(p.vector()))
+    assert numpy.isfinite(p.vector().get_local()[1:]).all()
@@ -0,0 +1,79 @@
+import numpy
+from ocellaris.simulation.profiling import ProfileData
+from ocellaris.utils.timer import TimingRecorder
+from ocellaris_post.readers.profile import Profile
+import pytest
+
+
+def mk_rows(rank, num_timesteps=3):
+    """
+    Profile rows as recorded by one process, the values depend on the rank
+    and on the time step. Rank 1 never calls the 'output' region
+    """
+    inner_iteration = [1]
+    recorder = TimingRecorder(lambda: inner_iteration[0])
+    rows = []
+    for i in range(num_timesteps):
+        inner_iteration[0] = 1
+        recorder.add('solve', 1.0 + rank + i)
+        recorder.add('solve', 0.5)
+        recorder.add('assemble', 2.0 * (rank + 1))
+        inner_iteration[0] = 2
+        if rank != 1:
+            recorder.add('output', 0.25)
+        recorder.count('krylov_iterations', 10 * (rank + 1) + i)
+        totals, inner, counters = recorder.reset()
+        rows.append((i + 1, 0.1 * (i + 1), totals, inner, counters, 1000.0 * (rank + 1)))
+    return rows
+
+
+def test_profile_round_trip(tmpdir):
+    num_ranks = 3
+    data = ProfileData()
+    data.add_rows([mk_rows(rank) for rank in range(num_ranks)])
+    file_name = str(tmpdir.join('test_profile.npz'))
+    data.save(file_name)
+
+    prof = Profile(file_name)
+    assert prof.num_ranks == num_ranks
+    assert sorted(prof.region_names) == ['assemble', 'output', 'solve']
+    assert prof.counter_names == ['krylov_iterations']
+    assert numpy.allclose(prof.time, [0.1, 0.2, 0.3])
+    assert list(prof.data['timesteps']) == [1, 2, 3]
+
+    # Min, mean and max over the processes for each time step
+    ranks = numpy.arange(num_ranks)
+    for i in range(3):
+        solve = 1.5 + ranks + i
+        assemble = 2.0 * (ranks + 1)
+        output = numpy.array([0.25, 0.0, 0.25])
+        for name, values in [('solve', solve), ('assemble', assemble), ('output', output)]:
+            assert prof.get_region(name, 'min')[i] == values.min()
+            assert prof.get_region(name, 'mean')[i] == pytest.approx(values.mean())
+            assert prof.get_region(name, 'max')[i] == values.max()
+        counter = 10 * (ranks + 1) + i
+        assert prof.get_counter('krylov_iterations', 'min')[i] == counter.min()
+        assert prof.get_counter('krylov_iterations', 'mean')[i] == pytest.approx(counter.mean())
+        assert prof.get_counter('krylov_iterations', 'max')[i] == counter.max()
+    col = prof.region_names.index('solve')
+    assert list(prof.data['calls'][:, col]) == [2, 2, 2]
+    assert list(prof.data['rss_max']) == [3000.0] * 3
+
+    # Inner iteration rows, both solve calls happen in inner iteration 1
+    timesteps, iterations, wall = prof.get_inner_iterations('solve', 'max')
+    assert list(timesteps) == [1, 2, 3]
+    assert list(iterations) == [1, 1, 1]
+    assert numpy.allclose(wall, [1.5 + 2, 1.5 + 3, 1.5 + 4])
+    timesteps, iterations, wall = prof.get_inner_iterations('output', 'min')
+    assert list(iterations) == [2, 2, 2]
+    assert list(wall) == [0.0] * 3
+
+    reps = prof.get_reports()
+    assert numpy.allclose(reps['Profile:assemble:max'], 6.0)
+    assert 'Profile:krylov_iterations' in reps
+
+
+def test_profile_different_row_counts():
+    data = ProfileData()
+    with pytest.raises(AssertionError):
+        data.add_rows([mk_rows(0, 3), mk_rows(1, 2)])
@@ -74,3 +74,28 @@ def test_limit_cell_flag():
     assert cpp_inp.limit_cell.shape == (Ncells,)
     assert cpp_inp.limit_cell[0] == 0
     assert cpp_inp.limit_cell[3] == 1
+
+
+@pytest.mark.parametrize('D', (2, 3))
+def test_dof_neighbours(D):
+    from ocellaris.utils import get_dof_neighbours
+
+    if D == 2:
+        mesh = dolfin.UnitSquareMesh(4, 4)
+    else:
+        mesh = dolfin.UnitCubeMesh(2, 2, 2)
+    V = dolfin.FunctionSpace(mesh, 'DG', 2)
+    num_neighbours, neighbours = get_dof_neighbours(V)
+
+    # Compare with a brute force search over all dof coordinates
+    dm = V.dofmap()
+    coords = V.tabulate_dof_coordinates().reshape((-1, D))
+    cell_for_dof = {}
+    for cell in dolfin.cells(mesh, 'all'):
+        for dof in dm.cell_dofs(cell.index()):
+            cell_for_dof[dof] = cell.index()
+    for dof, coord in enumerate(coords):
+        dist = numpy.abs(coords - coord).max(axis=1)
+        expected = [cell_for_dof[d] for d in numpy.flatnonzero(dist < 1e-10) if d != dof]
+        assert num_neighbours[dof] == len(expected)
+        assert list(neighbours[dof, : len(expected)]) == expected
@@ -6,7 +6,16 @@ from helpers import comm_self_to_comm_world
 import pytest
 
 
-def mk_limiter(degree, dim, use_cpp, comm_self=False):
+def mk_limiter(degree, dim, use_cpp, comm_self=False, num_threads=1):
+    phis, lims = mk_limiters(degree, dim, use_cpp, comm_self, num_threads)
+    return phis[0], lims[0]
+
+
+def mk_limiters(degree, dim, use_cpp, comm_self=False, num_threads=1, ncomp=1):
+    """
+    Create ncomp limited fields on the same function space, the first one
+    is named phi. The fields have jumps and differ between components
+    """
     dolfin.parameters['ghost_mode'] = 'shared_vertex'
 
     sim = Simulation()
@@ -29,33 +38,43 @@ def mk_limiter(degree, dim, use_cpp, comm_self=False):
     sim.input.set_value('solver/polynomial_degree', degree)
     sim.input.set_value('output/stdout_enabled', False)
     setup_simulation(sim)
-    phi = sim.data['phi']
-    V = phi.function_space()
-
-    # Create a phi field with some jumps
-    e = dolfin.Expression(cpp, element=V.ufl_element(), A=0.5, B=2.0)
-    phi.interpolate(e)
-    arr = phi.vector().get_local()
-    arr[arr > 0.8] = 2 * 0.8 - arr[arr > 0.8]
-    arr[arr < 0.2] = 0.5
-    phi.vector().set_local(arr)
-    phi.vector().apply('insert')
-
-    # Create slope limiter
-    sim.input.set_value('slope_limiter/phi/method', 'HierarchicalTaylor')
-    sim.input.set_value('slope_limiter/phi/use_cpp', use_cpp)
-    sim.input.set_value('slope_limiter/phi/skip_boundaries', [])
-    lim = SlopeLimiter(sim, 'phi', phi)
+    V = sim.data['phi'].function_space()
+
+    phis, lims = [], []
+    for icomp in range(ncomp):
+        name = 'phi' if icomp == 0 else 'phi%d' % icomp
+        if icomp == 0:
+            phi = sim.data['phi']
+        else:
+            phi = sim.data[name] = dolfin.Function(V)
+
+        # Create a phi field with some jumps
+        e = dolfin.Expression(cpp, element=V.ufl_element(), A=0.5, B=2.0 + icomp)
+        phi.interpolate(e)
+        arr = phi.vector().get_local()
+        arr[arr > 0.8] = 2 * 0.8 - arr[arr > 0.8]
+        arr[arr < 0.2] = 0.5
+        phi.vector().set_local(arr)
+        phi.vector().apply('insert')
+
+        # Create slope limiter
+        sim.input.set_value('slope_limiter/%s/method' % name, 'HierarchicalTaylor')
+        sim.input.set_value('slope_limiter/%s/use_cpp' % name, use_cpp)
+        sim.input.set_value('slope_limiter/%s/skip_boundaries' % name, [])
+        sim.input.set_value('slope_limiter/%s/num_threads' % name, num_threads)
+        lim = SlopeLimiter(sim, name, phi)
+        phis.append(phi)
+        lims.append(lim)
 
     if True:
         from matplotlib import pyplot
 
         pyplot.figure()
-        patches = dolfin.plot(phi)
+        patches = dolfin.plot(phis[0])
         pyplot.colorbar(patches)
         pyplot.savefig('ht_lim_phi.png')
 
-    return phi, lim
+    return phis, lims
 
 
 @pytest.mark.parametrize(
@@ -115,3 +134,100 @@ def test_htlim_cpp_vs_py(degree, dim, test_mpi):
     print(degree, dim, test_mpi, p0n, dn)
     assert 50 > p0n > 5  # not close to zero or very large
     assert dn < p0n / 1e15  # relative diff
+
+
+@pytest.mark.parametrize("degree,dim", [(1, 2), (1, 3), (2, 2), (2, 3)])
+def test_htlim_num_threads(degree, dim):
+    """
+    With more than one thread the C++ limiter computes the limiter
+    coefficients of all cells before any cell is limited, so the result
+    must not depend on the number of OpenMP threads
+    """
+    results = []
+    for num_threads in (2, 4):
+        phi, lim = mk_limiter(degree, dim, True, num_threads=num_threads)
+        if not lim.cpp_mod.has_openmp():
+            pytest.skip('The C++ limiter is compiled without OpenMP')
+        lim.run()
+        alphas = [alpha.vector().get_local() for alpha in lim.alpha_funcs]
+        results.append((phi.vector().get_local(), alphas))
+
+    (p0, a0), (p1, a1) = results
+    assert abs(p0).max() > 0.5
+    assert (p0 == p1).all()
+    for alpha0, alpha1 in zip(a0, a1):
+        assert (alpha0 == alpha1).all()
+
+
+@pytest.mark.parametrize("ncomp", [1, 2, 3])
+@pytest.mark.parametrize("degree,dim", [(1, 2), (2, 3)])
+def test_htlim_vector_vs_scalar(degree, dim, ncomp):
+    """
+    Apply the Hierarchical Taylor slope limiter through the vector
+    limiter entry point and verify that the result is identical to
+    running the scalar limiter on each component
+    """
+    from ocellaris.solver_parts.slope_limiter.hierarchical_taylor import (
+        HierarchicalTaylorSlopeLimiterVector,
+    )
+
+    phis, lims = mk_limiters(degree, dim, True, ncomp=ncomp)
+    phis0 = [phi.vector().copy() for phi in phis]
+    assert HierarchicalTaylorSlopeLimiterVector.supports(lims)
+
+    # Limit each component with the scalar limiter
+    p0, a0 = [], []
+    for phi, lim in zip(phis, lims):
+        lim.run()
+        p0.append(phi.vector().copy())
+        a0.append([alpha.vector().copy() for alpha in lim.alpha_funcs])
+
+    # Limit all components with the vector limiter
+    for phi, phi0 in zip(phis, phis0):
+        phi.vector()[:] = phi0
+    vlim = HierarchicalTaylorSlopeLimiterVector(lims)
+    vlim.run()
+
+    for phi, phi0, p, a, lim in zip(phis, phis0, p0, a0, lims):
+        diff = p.copy()
+        diff.axpy(-1, phi.vector())
+        assert p.norm('l2') > 5
+        assert diff.norm('l2') < p.norm('l2') / 1e15
+
+        # The limiter must have changed the component
+        changed = p.copy()
+        changed.axpy(-1, phi0)
+        assert changed.norm('l2') > 0
+
+        for alpha, alpha0 in zip(lim.alpha_funcs, a):
+            adiff = alpha0.copy()
+            adiff.axpy(-1, alpha.vector())
+            assert adiff.norm('l2') == 0
+
+
+@pytest.mark.parametrize("degree,dim", [(1, 2), (2, 2)])
+def test_htlim_phi_old(degree, dim):
+    """
+    The C++ limiter takes the previous values as a read only view. Check
+    that this works and that previous values equal to the current values
+    give the same result as running without previous values
+    """
+    phi, lim = mk_limiter(degree, dim, True)
+    phi0 = phi.vector().copy()
+
+    # Limit without previous values
+    lim.run()
+    p0 = phi.vector().copy()
+
+    # Limit with previous values
+    phi.vector()[:] = phi0
+    phi_old = dolfin.Function(phi.function_space())
+    phi_old.vector()[:] = phi0
+    lim.set_phi_old(phi_old)
+    lim.run()
+    p1 = phi.vector()
+
+    diff = p0.copy()
+    diff.axpy(-1, p1)
+    assert p0.norm('l2') > 5
+    assert diff.norm('l2') < p0.norm('l2') / 1e15
@@ -0,0 +1,106 @@
+import numpy
+import dolfin
+from dolfin import dot, dx
+from ocellaris import Simulation
+from ocellaris.simulation.solution_properties import SolutionProperties
+import pytest
+
+
+def mk_solution_properties(divergence_method):
+    """
+    Setup the solution property forms for a known velocity and density
+    without running a full simulation setup
+    """
+    mesh = dolfin.UnitSquareMesh(dolfin.MPI.comm_world, 6, 6)
+    Vu = dolfin.VectorFunctionSpace(mesh, 'DG', 2)
+    Vr = dolfin.FunctionSpace(mesh, 'DG', 1)
+    e = dolfin.Expression(('sin(3*x[1]) + x[0]*x[0]', 'cos(2*x[0])*x[1]'), degree=2)
+    u = dolfin.interpolate(e, Vu)
+    rho = dolfin.interpolate(dolfin.Expression('1000 + 50*x[0]', degree=1), Vr)
+
+    sim = Simulation()
+    sim.ndim = 2
+    sim.data['h'] = dolfin.CellDiameter(mesh)
+    sp = SolutionProperties(sim)
+    sp.mesh = mesh
+    sp.V0 = dolfin.FunctionSpace(mesh, 'DG', 0)
+
+    consts = dict(
+        u=u,
+        rho=rho,
+        dt=dolfin.Constant(0.1),
+        nu=dolfin.Constant(0.01),
+        g=dolfin.Constant((0, -9.81)),
+        x0=dolfin.Constant((0, 0)),
+    )
+    sp._setup_courant(u, consts['dt'])
+    sp._setup_peclet(u, consts['nu'])
+    sp._setup_divergence(u, divergence_method)
+    sp._setup_energy(rho, u, consts['g'], consts['x0'])
+    sp._setup_mass(rho)
+    return sp, consts
+
+
+def project_dg0(sp, form_func, global_rhs):
+    """
+    The DG0 projection with a LocalSolver that was used before the cell
+    quantities were computed with FusedCellQuantities
+    """
+    u, v = dolfin.TrialFunction(sp.V0), dolfin.TestFunction(sp.V0)
+    solver = dolfin.LocalSolver(u * v * dx, form_func(v))
+    solver.factorize()
+    func = dolfin.Function(sp.V0)
+    if global_rhs:
+        solver.solve_global_rhs(func)
+    else:
+        solver.solve_local_rhs(func)
+    return func
+
+
+@pytest.mark.parametrize("divergence_method", ['div', 'div0', 'gradq_avg'])
+@pytest.mark.parametrize("names", [('Co',), ('Co', 'Pe', 'div', 'mass', 'energy')])
+def test_fused_cell_quantities(names, divergence_method):
+    sp, consts = mk_solution_properties(divergence_method)
+    values = sp._compute(list(names))
+
+    # The cell averages must match the old DG0 projections
+    funcs = []
+    if 'Co' in names:
+        funcs.append((sp._components['Co'][0], sp._courant, False))
+    if 'Pe' in names:
+        funcs.append((sp._components['Pe'][0], sp._peclet, False))
+    if 'div' in names:
+        funcs.append((sp._components['div'][0], sp._div['u']['div_dS'], True))
+        funcs.append((sp._components['div'][1], sp._div['u']['div_dx'], True))
+    for (name, _kind, form_func, _func), func, global_rhs in funcs:
+        expected = project_dg0(sp, form_func, global_rhs).vector().get_local()
+        computed = func.vector().get_local()
+        scale = abs(expected).max()
+        assert scale > 0
+        assert abs(computed - expected).max() < 1e-12 * scale
+
+        # The global maximum of the cell averages is reported
+        gmax = dolfin.MPI.max(dolfin.MPI.comm_world, float(expected.max()))
+        assert abs(values[name] - gmax) < 1e-12 * scale
+
+    # The integrals must match assemble()
+    u, rho = consts['u'], consts['rho']
+    x = dolfin.SpatialCoordinate(sp.mesh)
+    integrals = {
+        'mass': rho * dx,
+        'Ek': 1 / 2 * rho * dot(u, u) * dx,
+        'Ep': rho * dot(-consts['g'], x - consts['x0']) * dx,
+    }
+    for name, form in integrals.items():
+        if name in values:
+            expected = dolfin.assemble(form)
+            assert abs(values[name] - expected) < 1e-12 * abs(expected)
+    assert ('mass' in values) == ('mass' in names)
+
+
+def test_solution_property_accessors():
+    sp, consts = mk_solution_properties('div')
+    mass = sp.total_mass()
+    assert abs(mass - dolfin.assemble(consts['rho'] * dx)) < 1e-12 * mass
+    Co = sp.courant_number()
+    assert numpy.all(Co.vector().get_local() > 0)
@@ -1,6 +1,9 @@
 import numpy
 import dolfin
 from ocellaris.utils import lagrange_to_taylor, taylor_to_lagrange
+from ocellaris.utils import taylor_basis
+from ocellaris.utils.taylor_basis import get_conversion_matrices
+from helpers import skip_in_parallel
 import pytest
 
 
@@ -184,3 +187,72 @@ def test_taylor_values(dim, degree):
         cell_dofs = dm.cell_dofs(cell.index())
         cell_vals = vals[cell_dofs]
         assert all(abs(cell_vals - coeffs) < 1e-13)
+
+
+def mk_mesh(dim, N=2):
+    if dim == 2:
+        return dolfin.UnitSquareMesh(N, N)
+    return dolfin.UnitCubeMesh(N, N, N)
+
+
+@skip_in_parallel
+@pytest.mark.parametrize("direction", ['lagrange_to_taylor', 'taylor_to_lagrange'])
+@pytest.mark.parametrize("dim", [2, 3])
+@pytest.mark.parametrize("degree", [1, 2])
+def test_conversion_matrices_moved_mesh(dim, degree, direction):
+    """
+    Check that the cached conversion matrices are updated when some of the
+    mesh vertices move
+    """
+    taylor_basis.CACHE.clear()
+    mesh = mk_mesh(dim, 4)
+    V = dolfin.FunctionSpace(mesh, 'DG', degree)
+    matrices = get_conversion_matrices(V, direction)
+    before = matrices.copy()
+
+    # Compress the mesh in the x-direction for x < 0.4 only
+    coords = mesh.coordinates()
+    coords[coords[:, 0] < 0.4, 0] *= 0.95
+    matrices2 = get_conversion_matrices(V, direction)
+    assert matrices2 is matrices
+
+    # Compare with matrices built from scratch
+    taylor_basis.CACHE.clear()
+    expected = get_conversion_matrices(V, direction)
+    assert expected is not matrices
+    assert abs(matrices - expected).max() < 1e-14 * abs(expected).max()
+
+    # Only the matrices of the cells with moved vertices have changed
+    changed = (matrices != before).any(axis=(1, 2))
+    assert 0 < changed.sum() < len(changed)
+
+
+def test_conversion_matrices_two_meshes():
+    taylor_basis.CACHE.clear()
+    mesh1, mesh2 = mk_mesh(2), mk_mesh(2, 3)
+    V1 = dolfin.FunctionSpace(mesh1, 'DG', 1)
+    V2 = dolfin.FunctionSpace(mesh2, 'DG', 1)
+
+    m1 = get_conversion_matrices(V1, 'lagrange_to_taylor')
+    m2 = get_conversion_matrices(V2, 'lagrange_to_taylor')
+    for _ in range(3):
+        assert get_conversion_matrices(V1, 'lagrange_to_taylor') is m1
+        assert get_conversion_matrices(V2, 'lagrange_to_taylor') is m2
+    assert len(taylor_basis.CACHE) == 2
+
+
+def test_conversion_matrices_eviction():
+    taylor_basis.CACHE.clear()
+    N = taylor_basis.CACHE_SIZE + 1
+    spaces = [dolfin.FunctionSpace(mk_mesh(2, 1), 'DG', 1) for _ in range(N)]
+    matrices = [get_conversion_matrices(V, 'lagrange_to_taylor') for V in spaces]
+    assert len(taylor_basis.CACHE) == taylor_basis.CACHE_SIZE
+
+    # The newest entries are kept, the oldest is rebuilt
+    for V, mat in zip(spaces[2:], matrices[2:]):
+        assert get_conversion_matrices(V, 'lagrange_to_taylor') is mat
+    assert get_conversion_matrices(spaces[0], 'lagrange_to_taylor') is not matrices[0]
+
+    # Rebuilding the oldest entry evicted the least recently used one
+    assert get_conversion_matrices(spaces[1], 'lagrange_to_taylor') is not matrices[1]
+    assert len(taylor_basis.CACHE) == taylor_basis.CACHE_SIZE
@@ -0,0 +1,155 @@
+from types import SimpleNamespace
+from ocellaris import Simulation
+from ocellaris.solver_parts.timestepping import (
+    bdf_coefficients,
+    extrapolation_coefficients,
+    update_timestep,
+)
+from ocellaris.solver_parts.dt_controller import CflDtController, land_on_time
+import pytest
+
+
+def test_constant_step_coefficients():
+    """
+    With an unchanged time step the variable step coefficients must be the
+    standard BDF coefficients and the standard linear extrapolation
+    """
+    assert bdf_coefficients(0, 1.0) == [0.0, 0.0, 0.0]
+    assert bdf_coefficients(1, 1.0) == [1.0, -1.0, 0.0]
+    assert bdf_coefficients(2, 1.0) == [1.5, -2.0, 0.5]
+    assert bdf_coefficients(2) == bdf_coefficients(2, 1.0)
+    assert extrapolation_coefficients(1, 1.0) == [1.0, 0.0]
+    assert extrapolation_coefficients(2, 1.0) == [2.0, -1.0]
+    assert extrapolation_coefficients(2) == extrapolation_coefficients(2, 1.0)
+
+
+@pytest.mark.parametrize("ratio", [0.25, 0.5, 1.0, 1.3, 2.0, 4.0])
+def test_variable_step_bdf2_exact_on_quadratics(ratio):
+    """
+    Variable step BDF2 must give the exact time derivative of a quadratic
+    and the extrapolation must be exact for a linear function
+    """
+    dt = 0.3
+    dt_prev = dt / ratio
+    t = 2.0
+    times = [t, t - dt, t - dt - dt_prev]
+
+    def quadratic(t):
+        return 1.5 - 0.7 * t + 2.3 * t ** 2
+
+    def linear(t):
+        return 1.5 - 0.7 * t
+
+    c1, c2, c3 = bdf_coefficients(2, ratio)
+    u, up, upp = [quadratic(tt) for tt in times]
+    dudt = (c1 * u + c2 * up + c3 * upp) / dt
+    assert abs(dudt - (-0.7 + 2 * 2.3 * t)) < 1e-12
+
+    # The coefficients of a consistent difference formula sum to zero
+    assert abs(c1 + c2 + c3) < 1e-14
+
+    e1, e2 = extrapolation_coefficients(2, ratio)
+    u, up, upp = [linear(tt) for tt in times]
+    assert abs(e1 * up + e2 * upp - u) < 1e-12
+
+
+def mk_cfl_controller(Co_max, dt_prev, inner_iteration=None, **params):
+    """
+    Create a CFL time step controller for a simulation where the previous
+    time step was dt_prev and gave the Courant number Co_max
+    """
+    sim = Simulation()
+    for key, value in params.items():
+        sim.input.set_value('time/dt_controller/%s' % key, value)
+    sim.solution_properties = SimpleNamespace(active=True, intervals={'Co': 1}, Co_max=Co_max)
+    if inner_iteration is not None:
+        sim.solver = SimpleNamespace(inner_iteration=inner_iteration)
+    sim.dt = dt_prev
+    return CflDtController(sim)
+
+
+def test_land_on_time():
+    # Far from the target the time step is not changed
+    assert land_on_time(0.0, 0.1, 1.0) == 0.1
+    # The last step lands exactly on the target
+    assert land_on_time(0.95, 0.1, 1.0) == 1.0 - 0.95
+    # Less than two steps from the target the remaining time is split in two
+    assert land_on_time(0.85, 0.1, 1.0) == (1.0 - 0.85) / 2
+    # Exactly two steps from the target
+    assert land_on_time(0.5, 0.25, 1.0) == 0.25
+    # Time steps starting at or after the target are not changed
+    assert land_on_time(1.0, 0.1, 1.0) == 0.1
+    assert land_on_time(1.5, 0.1, 1.0) == 0.1
+    # A step that ends within the landing tolerance of the target lands on it
+    assert land_on_time(0.9, 0.1 * (1 - 1e-10), 1.0) == 1.0 - 0.9
+
+
+@pytest.mark.parametrize(
+    "Co_max,dt_expected",
+    [
+        (0.5, 0.01),  # On target
+        (0.25, 0.012),  # Growth limited by max_growth
+        (0.45, 0.01 * 0.5 / 0.45),  # Unlimited growth
+        (5.0, 0.005),  # Shrinking limited by max_shrink
+        (0.625, 0.008),  # Unlimited shrinking
+        (None, 0.012),  # No Courant number, grow as fast as allowed
+        (0.0, 0.012),
+    ],
+)
+def test_cfl_growth_and_shrink_limits(Co_max, dt_expected):
+    ctrl = mk_cfl_controller(Co_max, 0.01, target_Co=0.5, max_growth=1.2, max_shrink=0.5)
+    dt = ctrl.get_dt(0.0, 100.0)
+    assert abs(dt - dt_expected) < 1e-15
+
+
+@pytest.mark.parametrize("Co_max,dt_expected", [(0.01, 0.015), (100.0, 0.008)])
+def test_cfl_dt_min_and_dt_max(Co_max, dt_expected):
+    ctrl = mk_cfl_controller(
+        Co_max, 0.01, max_growth=10.0, max_shrink=0.01, dt_min=0.008, dt_max=0.015
+    )
+    assert ctrl.get_dt(0.0, 100.0) == dt_expected
+
+
+def test_cfl_output_interval():
+    ctrl = mk_cfl_controller(0.5, 0.01, output_interval=0.1)
+    # The step starting at 0.195 lands on 0.2
+    assert abs(ctrl.get_dt(0.195, 100.0) - 0.005) < 1e-15
+    # The step starting at 0.2 is not shortened by the output time 0.2
+    assert ctrl.get_dt(0.2, 100.0) == 0.01
+    # The step is always shortened to land on tmax
+    assert abs(ctrl.get_dt(0.2, 0.205) - 0.005) < 1e-15
+
+
+@pytest.mark.parametrize(
+    "inner_iteration,grows",
+    [
+        (None, True),  # Solver without inner iterations
+        (2, True),  # 1 inner iteration performed
+        (3, True),  # 2 inner iterations performed
+        (4, False),  # 3 inner iterations performed, equal to the limit
+        (5, False),  # 4 inner iterations performed
+    ],
+)
+def test_cfl_inner_iter_limit(inner_iteration, grows):
+    ctrl = mk_cfl_controller(0.25, 0.01, inner_iteration, inner_iter_limit=3)
+    if inner_iteration is not None:
+        assert ctrl.previous_inner_iterations() == inner_iteration - 1
+    dt = ctrl.get_dt(0.0, 100.0)
+    assert dt == (0.012 if grows else 0.01)
+
+    # Shrinking is never prevented
+    ctrl.simulation.solution_properties.Co_max = 1.0
+    assert ctrl.get_dt(0.0, 100.0) == 0.005
+
+
+def test_update_timestep_without_controller():
+    sim = Simulation()
+    sim.input.set_value('time/dt', 0.1)
+    assert update_timestep(sim, 0.0, 1.0) == 0.1
+    accessor = sim.input_dt
+    assert update_timestep(sim, 0.1, 1.0) == 0.1
+    assert sim.input_dt is accessor
+
+    # Changes to the input are seen through the accessor
+    sim.input.set_value('time/dt', 0.2)
+    assert update_timestep(sim, 0.2, 1.0) == 0.2
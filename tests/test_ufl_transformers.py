@@ -5,7 +5,11 @@ import dolfin
 from dolfin import UnitSquareMesh, FunctionSpace, VectorFunctionSpace, MixedElement
 from dolfin import TestFunction, TestFunctions, TrialFunction, TrialFunctions
 from dolfin import assemble, as_vector, Constant, dot, grad, dx
-from ocellaris.utils import is_zero_ufl_expression, split_form_into_matrix
+from ocellaris.utils import (
+    is_zero_ufl_expression,
+    split_form_into_matrix,
+    split_form_by_coefficients,
+)
 import pytest
 
 
@@ -174,3 +178,28 @@ def compare_split_matrices(eq, mat, vec, Wv, Wu, eps=1e-14):
     # Check that the original and rebuilt systems are identical
     assert compute_diff(M, M2) < eps
     assert compute_diff(v, v2) < eps
+
+
+def test_split_form_by_coefficients():
+    mesh = UnitSquareMesh(4, 4)
+    V = FunctionSpace(mesh, 'DG', 1)
+    W = VectorFunctionSpace(mesh, 'DG', 1)
+    u, v = TrialFunction(V), TestFunction(V)
+    dt, c = Constant(0.1), Constant(2.0)
+    w = dolfin.Function(W)
+    w.vector()[:] = 1.0
+
+    a = c * u * v * dx + u / dt * v * dx + dot(w, grad(u)) * v * dx + dot(grad(u), grad(v)) * dx
+
+    def classify(coefficients):
+        if w in coefficients:
+            return 'w'
+        return 'dt' if dt in coefficients else 'const'
+
+    parts = split_form_by_coefficients(a, classify)
+    assert [key for key, _, _ in parts] == ['const', 'dt', 'w']
+
+    # The sum of the parts must be equal to the full form
+    A = assemble(a).array()
+    A2 = sum(assemble(part).array() for _, part, _ in parts)
+    assert numpy.allclose(A, A2)
@@ -1,6 +1,10 @@
 import sys
 import os
+import numpy
+import dolfin
 from ocellaris import Simulation, setup_simulation
+from ocellaris.utils import CodedExpression, RunnablePythonString
+import pytest
 
 
 TEST_DIR = os.path.dirname(__file__)
@@ -94,3 +98,85 @@ def test_use_code():
 
     assert dummy_mod in sys.modules
     sys.modules.pop(dummy_mod)
+
+
+def setup_coded_expression_simulation(vectorised=True):
+    sim = Simulation()
+    sim.input.read_yaml(yaml_string=INPUT_USER_CONSTANTS)
+    sim.input.set_value('user_code/vectorised_expressions', vectorised)
+    assert setup_simulation(sim)
+    V = dolfin.FunctionSpace(sim.data['mesh'], 'DG', 2)
+    return sim, V
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        'sin(pi * x[0]) * x[1] + A',
+        'value[0] = exp(x[0]) - x[1] ** 2',
+        'x[0] * t + x[1] * dt',
+    ],
+)
+def test_vectorised_coded_expression(code):
+    sim, V = setup_coded_expression_simulation()
+    sim.time = 0.5
+    func = CodedExpression(sim, code, 'test vectorised', V=V)
+    assert isinstance(func, dolfin.Function)
+
+    # Compare with the per point evaluation in each dof
+    runnable = RunnablePythonString(sim, code, 'test scalar', 'value')
+    coords = V.tabulate_dof_coordinates().reshape((-1, 2))
+    arr = func.vector().get_local()
+    expected = [runnable.run_point(coords[i].copy()) for i in range(len(arr))]
+    assert numpy.allclose(arr, expected)
+
+    # Compare with the Expression used without vectorisation
+    if 'dt' not in code:
+        expr = CodedExpression(sim, code, 'test expression')
+        assert not isinstance(expr, dolfin.Function)
+        arr2 = dolfin.interpolate(expr, V).vector().get_local()
+        assert numpy.allclose(arr, arr2)
+
+
+def test_vectorised_coded_expression_opt_in():
+    sim, V = setup_coded_expression_simulation(vectorised=False)
+    func = CodedExpression(sim, 'x[0]', 'test opt-in', V=V)
+    assert not isinstance(func, dolfin.Function)
+
+
+def test_vectorised_coded_expression_fallback():
+    sim, V = setup_coded_expression_simulation()
+
+    # Runs with arrays, but gives the wrong result
+    func = CodedExpression(sim, 'min(x[0], 0.5)', 'test fallback', V=V)
+    assert not isinstance(func, dolfin.Function)
+
+    # Depends on simulation data
+    func = CodedExpression(sim, 'mesh.hmin() * x[0]', 'test fallback', V=V)
+    assert not isinstance(func, dolfin.Function)
+
+
+def test_vectorised_coded_expression_updates():
+    sim, V = setup_coded_expression_simulation()
+
+    # Code that does not depend on the time is not run again
+    func, updater = CodedExpression(sim, 'x[0]', 'test static', V=V, return_updater=True)
+    func.vector().zero()
+    sim.time += 1.0
+    updater(sim.timestep, sim.time, sim.dt)
+    assert func.vector().max() == 0.0
+
+    # Time dependent code is run again when the time changes
+    func, updater = CodedExpression(sim, 'x[0] + t', 'test time', V=V, return_updater=True)
+    t0 = sim.time
+    assert abs(func.vector().min() - t0) < 1e-12
+    sim.time += 1.0
+    updater(sim.timestep, sim.time, sim.dt)
+    assert abs(func.vector().min() - t0 - 1.0) < 1e-12
+
+    # The dof coordinates are updated when the mesh moves
+    func = CodedExpression(sim, 'x[0]', 'test ALE', V=V)
+    mesh = sim.data['mesh']
+    mesh.coordinates()[:, 0] += 2.0
+    sim.hooks.run_custom_hook('MeshMoved')
+    assert abs(func.vector().min() - 2.0) < 1e-12